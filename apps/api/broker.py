@@ -0,0 +1,141 @@
+"""In-process fan-out broker for live observation and alert messages."""
+
+import asyncio
+from functools import cached_property
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import orjson
+from loguru import logger
+
+WILDCARD = "*"
+
+
+def observation_topic(station: str, variable: str) -> str:
+    """Topic of the observations of one variable at one station."""
+    return f"obs:{station}:{variable}"
+
+
+def _observation_topics(station: Optional[str], variable: str) -> List[str]:
+    """Topics whose subscribers receive observations of a station and variable."""
+    topics = [observation_topic(WILDCARD, variable)]
+    if station:
+        topics += [observation_topic(station, variable), observation_topic(station, WILDCARD)]
+    return topics
+
+
+def alert_topic(user_id: str) -> str:
+    """Topic of the alerts raised by one user's rules."""
+    return f"alerts:{user_id}"
+
+
+class Message:
+    """A message serialized once and shared by every subscriber it is sent to."""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.payload = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+
+    @cached_property
+    def text(self) -> str:
+        """Payload as a WebSocket text frame."""
+        return self.payload.decode()
+
+    @cached_property
+    def event(self) -> bytes:
+        """Payload as a server-sent event."""
+        return b"data: " + self.payload + b"\n\n"
+
+
+class Subscription:
+    """A subscriber's topics and its bounded queue of pending messages."""
+
+    def __init__(self, topics: Set[str], max_pending: int):
+        self.topics = topics
+        self.queue: "asyncio.Queue[Message]" = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def offer(self, message: Message) -> None:
+        """Queue a message, dropping the oldest pending one if the client is behind."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"Slow subscriber: dropped {self.dropped} messages")
+        self.queue.put_nowait(message)
+
+    async def get(self) -> Message:
+        return await self.queue.get()
+
+
+class Broker:
+    """Routes messages to the subscriptions of their topics.
+
+    Each message is serialized once, whatever the number of recipients, and
+    handed to every subscriber's queue without awaiting it. A subscriber that
+    cannot keep up loses its oldest pending messages instead of slowing down
+    publishing or growing memory without bound.
+
+    Observation topics accept a wildcard for the station or the variable, so a
+    client can follow one station's variables or one variable everywhere.
+    """
+
+    def __init__(self, max_pending: int = 256):
+        """Initialize the broker.
+
+        Args:
+            max_pending: Messages buffered per subscriber before dropping
+        """
+        self.max_pending = max_pending
+        self._topics: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        """Create a subscription to a set of topics."""
+        subscription = Subscription(set(topics), self.max_pending)
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscription from all its topics."""
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+
+    @property
+    def subscriber_count(self) -> int:
+        return len({s for subscribers in self._topics.values() for s in subscribers})
+
+    def _recipients(self, topics: Iterable[str]) -> Set[Subscription]:
+        recipients: Set[Subscription] = set()
+        for topic in topics:
+            recipients.update(self._topics.get(topic, ()))
+        return recipients
+
+    def publish(self, topics: Iterable[str], data: Dict[str, Any]) -> int:
+        """Send a message to every subscription of any of the given topics.
+
+        Returns:
+            Number of subscriptions the message was queued for
+        """
+        recipients = self._recipients(topics)
+        if not recipients:
+            return 0
+        message = Message(data)
+        for subscription in recipients:
+            subscription.offer(message)
+        return len(recipients)
+
+    def publish_observations(
+        self,
+        station: Optional[str],
+        variable: str,
+        data: Dict[str, Any],
+    ) -> int:
+        """Publish new observations of a variable at a station."""
+        return self.publish(_observation_topics(station, variable), data)
+
+    def wants_observations(self, station: Optional[str], variable: str) -> bool:
+        """Whether any subscription would receive observations of a station/variable."""
+        return any(topic in self._topics for topic in _observation_topics(station, variable))
@@ -0,0 +1,259 @@
+"""Request-coalescing result cache for the time series read path."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from loguru import logger
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _retrieve(task: "asyncio.Future[Any]") -> None:
+    # Mark the exception of a load as retrieved in case every caller was cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+def snap_range(start: datetime, end: datetime, quantum: timedelta) -> Tuple[datetime, datetime]:
+    """Widen a time range outwards to whole multiples of a quantum.
+
+    Queries over nearly identical ranges (e.g. "the last 7 days" requested a few
+    seconds apart) then share one cache entry; results are trimmed back to the
+    requested range afterwards.
+    """
+    start = start - (start - _EPOCH) % quantum
+    remainder = (end - _EPOCH) % quantum
+    if remainder:
+        end = end + (quantum - remainder)
+    return start, end
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    """Normalized description of a time series query."""
+
+    variable: str
+    partition: str  # Station id, or the snapped location for lat/lon queries
+    start: datetime
+    end: datetime
+    resolution: Optional[int]  # Bucket width in seconds, None for raw rows
+    agg: Optional[str]
+    max_points: Optional[int]
+
+
+@dataclass
+class _Entry:
+    value: Any
+    size: int
+    expires: float
+    geohashes: FrozenSet[str]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+
+class ResultCache:
+    """LRU cache of query results bounded by an approximate memory budget.
+
+    Entries covering recent data (which ingestion may still extend) expire
+    quickly, while historical ranges are kept much longer. Concurrent misses
+    for the same key are coalesced into a single load, and ingestion can drop
+    every entry that reads from the geohash partitions it wrote to.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        recent_ttl: float = 60.0,
+        historical_ttl: float = 3600.0,
+        recent_window: timedelta = timedelta(days=2),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize the cache.
+
+        Args:
+            max_bytes: Memory budget for cached values
+            recent_ttl: Seconds to keep results whose range reaches into the recent window
+            historical_ttl: Seconds to keep results of older ranges
+            recent_window: How far back data is still considered recent
+            clock: Monotonic clock used for expiry (replaceable in tests)
+        """
+        self.max_bytes = max_bytes
+        self.recent_ttl = recent_ttl
+        self.historical_ttl = historical_ttl
+        self.recent_window = recent_window
+        self.clock = clock
+        self.stats = CacheStats()
+
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self._bytes = 0
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def ttl(self, end: datetime) -> float:
+        """Time to live of a result whose range ends at the given time (naive UTC)."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return self.recent_ttl if end >= now - self.recent_window else self.historical_ttl
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        """Return a cached value, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= self.clock():
+            self._remove(key)
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(
+        self,
+        key: CacheKey,
+        value: Any,
+        size: int,
+        geohashes: Iterable[str],
+    ) -> None:
+        """Store a value, evicting least recently used entries to stay within budget."""
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(
+            value=value,
+            size=size,
+            expires=self.clock() + self.ttl(key.end),
+            geohashes=frozenset(geohashes),
+        )
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    async def get_or_load(
+        self,
+        key: CacheKey,
+        loader: Callable[[], Awaitable[Any]],
+        size_of: Callable[[Any], int],
+        geohashes: Iterable[str],
+    ) -> Any:
+        """Return a cached value or load it, sharing one load between concurrent callers.
+
+        Args:
+            key: Normalized query key
+            loader: Coroutine function computing the value on a miss
+            size_of: Approximate size in bytes of a loaded value
+            geohashes: Lake partitions the value was read from
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        value = self.get(key)
+        if value is not None:
+            self.stats.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.stats.misses += 1
+        # The load runs detached, so a caller that is cancelled (a client that went
+        # away) neither stops it nor fails the callers coalesced onto it
+        task = asyncio.ensure_future(self._load(key, loader, size_of, geohashes))
+        task.add_done_callback(_retrieve)
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(
+        self,
+        key: CacheKey,
+        loader: Callable[[], Awaitable[Any]],
+        size_of: Callable[[Any], int],
+        geohashes: Iterable[str],
+    ) -> Any:
+        generation = self._generation
+        try:
+            value = await loader()
+        finally:
+            del self._inflight[key]
+        # Data written while loading may be missing from the value; don't keep it
+        if generation == self._generation:
+            self.put(key, value, size_of(value), geohashes)
+        return value
+
+    def invalidate(
+        self,
+        geohashes: Optional[Iterable[str]],
+        start: datetime,
+        end: datetime,
+    ) -> int:
+        """Drop entries that read from the given partitions and overlap a time range.
+
+        Args:
+            geohashes: Lake partitions that were written to (None for an
+                       unpartitioned dataset, which drops every partition)
+            start: Earliest timestamp written (naive UTC)
+            end: Latest timestamp written (naive UTC)
+
+        Returns:
+            Number of entries dropped
+        """
+        geohashes = set(geohashes) if geohashes is not None else None
+        self._generation += 1
+        stale = [
+            key
+            for key, entry in self._entries.items()
+            if (geohashes is None or entry.geohashes & geohashes)
+            and key.start <= end
+            and key.end >= start
+        ]
+        for key in stale:
+            self._remove(key)
+        self.stats.invalidations += len(stale)
+        if stale:
+            partitions = sorted(geohashes) if geohashes is not None else "every partition"
+            logger.debug(f"Invalidated {len(stale)} cached results for {partitions}")
+        return len(stale)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and occupancy for monitoring and sizing."""
+        lookups = self.stats.hits + self.stats.misses + self.stats.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "coalesced": self.stats.coalesced,
+            "evictions": self.stats.evictions,
+            "expirations": self.stats.expirations,
+            "invalidations": self.stats.invalidations,
+            "hit_ratio": round((self.stats.hits + self.stats.coalesced) / lookups, 4)
+            if lookups
+            else 0.0,
+        }
@@ -0,0 +1,123 @@
+"""Response encoders for time series results.
+
+The default ``points`` format builds one Pydantic model per sample. The
+``columnar`` and ``arrow`` formats encode the result arrays directly, so the
+cost of a response does not grow with per-point model construction.
+"""
+
+import json
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+if TYPE_CHECKING:
+    from seantral_data_pipeline.query.engine import TimeSeriesResult
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+FORMATS = ("points", "columnar", "arrow")
+
+
+def negotiate_format(format: Optional[str], accept: Optional[str]) -> str:
+    """Pick the response format from the format= parameter or the Accept header.
+
+    An explicit format= parameter wins; otherwise an Accept header asking for
+    an Arrow stream selects the Arrow format, and anything else gets points.
+    """
+    if format is not None:
+        if format not in FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported format: {format}. Use one of {', '.join(FORMATS)}",
+            )
+        return format
+    if accept and ARROW_STREAM in accept:
+        return "arrow"
+    return "points"
+
+
+def columnar_response(
+    result: "TimeSeriesResult",
+    location: Dict[str, float],
+    metadata: Dict[str, Any],
+) -> Response:
+    """Encode a result as parallel timestamps/values arrays with orjson."""
+    body = orjson.dumps(
+        {
+            "timestamps": result.timestamps,
+            "values": result.values,
+            "unit": result.unit,
+            "source": result.source,
+            "variable": result.variable,
+            "location": location,
+            "metadata": metadata,
+        },
+        option=orjson.OPT_SERIALIZE_NUMPY,
+    )
+    return Response(content=body, media_type="application/json", headers={"Vary": "Accept"})
+
+
+def arrow_response(
+    result: "TimeSeriesResult",
+    location: Dict[str, float],
+    metadata: Dict[str, Any],
+) -> Response:
+    """Encode a result as an Arrow IPC stream with the descriptors in schema metadata."""
+    # Imported on first use to keep pyarrow out of the API's startup
+    import pyarrow as pa
+
+    schema = pa.schema(
+        [("timestamp", pa.timestamp("us")), ("value", pa.float64())],
+        metadata={
+            "variable": result.variable,
+            "unit": result.unit,
+            "source": result.source,
+            "location": json.dumps(location),
+            "metadata": json.dumps(metadata, default=str),
+        },
+    )
+    table = pa.Table.from_arrays(
+        [
+            pa.array(result.timestamps.astype("datetime64[us]"), pa.timestamp("us")),
+            pa.array(result.values, pa.float64()),
+        ],
+        schema=schema,
+    )
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return Response(
+        content=sink.getvalue().to_pybytes(),
+        media_type=ARROW_STREAM,
+        headers={"Vary": "Accept"},
+    )
+
+
+def batch_response(series: List[Dict[str, Any]], metadata: Dict[str, Any]) -> Response:
+    """Encode several series as one orjson document of parallel arrays per series.
+
+    Args:
+        series: One dictionary per series with the result under ``result`` and
+                any other descriptors (location, station, ...) alongside it
+        metadata: Descriptors of the batch as a whole
+    """
+    body = orjson.dumps(
+        {
+            "series": [
+                {
+                    "variable": entry["result"].variable,
+                    "unit": entry["result"].unit,
+                    "source": entry["result"].source,
+                    **{key: value for key, value in entry.items() if key != "result"},
+                    "timestamps": entry["result"].timestamps,
+                    "values": entry["result"].values,
+                }
+                for entry in series
+            ],
+            "metadata": metadata,
+        },
+        option=orjson.OPT_SERIALIZE_NUMPY,
+    )
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,297 @@
+"""In-memory hot tier of the most recent observations per station.
+
+Near-real-time requests ("the latest reading", "the last 48 hours") are the
+most common ones and ask for the newest rows of a single station. The hot
+store keeps them in preallocated NumPy ring buffers so those requests never
+reach the lake:
+
+    station "44007" -> timestamps[variable, 2 * capacity]  (datetime64[us])
+                       values[variable, 2 * capacity]      (float64)
+
+Every sample is written twice, at ``slot`` and ``slot + capacity``, so the
+newest ``capacity`` samples of a series are always one contiguous slice and
+a query returns views of the buffers: a range lookup is two binary searches
+and allocates nothing. A station's buffers are allocated when its first
+observation arrives and never grow, so the footprint is fixed per station.
+
+A series only answers ranges it holds completely, so each series keeps a
+floor: the earliest time from which it holds every row of the lake. A new
+series has none and answers nothing until it is seeded with the rows the lake
+holds over the window (``seed``); rows posted to the API on
+``POST /v1/observations`` are merged in as they arrive. When a writer adds
+rows to the lake that may not have been posted, ``forget`` drops the floor of
+the station's series until they are seeded again. Samples pushed out of a full
+ring raise the floor past them, and ranges starting before it fall through to
+the lake.
+
+The store is only touched from the event loop, so it needs no locking;
+results are views that stay valid until the next write, which cannot happen
+before the request that read them has built its response.
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+_MICROSECOND = np.timedelta64(1, "us")
+
+# Floor of a series that has not been seeded, which no range starts after
+_UNSEEDED = np.datetime64("9999-12-31T00:00:00", "us")
+
+
+class _StationRings:
+    """Mirrored ring buffers of one station, one row per variable."""
+
+    __slots__ = ("timestamps", "values", "count", "floor")
+
+    def __init__(self, n_variables: int, capacity: int, floor: np.datetime64):
+        self.timestamps = np.zeros((n_variables, 2 * capacity), dtype="datetime64[us]")
+        self.values = np.zeros((n_variables, 2 * capacity), dtype=np.float64)
+        # Samples ever written per variable (the next one goes to count % capacity)
+        self.count = np.zeros(n_variables, dtype=np.int64)
+        # Earliest time from which each series is complete
+        self.floor = np.full(n_variables, floor, dtype="datetime64[us]")
+
+
+@dataclass
+class HotStats:
+    hits: int = 0
+    misses: int = 0
+    rows: int = 0
+
+
+class HotStore:
+    """Ring buffers of the newest observations of every station and variable."""
+
+    def __init__(
+        self,
+        variables: Sequence[str],
+        window: timedelta = timedelta(days=7),
+        interval: timedelta = timedelta(minutes=10),
+        started_at: Optional[datetime] = None,
+    ):
+        """Create an empty store.
+
+        Args:
+            variables: Variable names a series can be held for
+            window: Time span each series should hold
+            interval: Expected spacing of a station's samples; with window it
+                      fixes the capacity of every ring (denser series hold less
+                      than the window)
+            started_at: Naive UTC time after which every row of the lake is
+                        written to the store, so series are complete from
+                        their first row without seeding (by default they
+                        answer nothing until seeded)
+        """
+        self.variables = {name: i for i, name in enumerate(variables)}
+        self.window = window
+        self.capacity = max(math.ceil(window / interval), 1)
+        self.started_at = (
+            np.datetime64(started_at, "us") if started_at is not None else _UNSEEDED
+        )
+        self._stations: Dict[str, _StationRings] = {}
+        self.stats = HotStats()
+
+    @property
+    def station_bytes(self) -> int:
+        """Memory held by the buffers of one station."""
+        return len(self.variables) * 2 * self.capacity * (8 + 8) + len(self.variables) * 16
+
+    def write(
+        self,
+        station: str,
+        variable: str,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+    ) -> None:
+        """Add observations of one series.
+
+        Rows in time order after the newest held one are appended in place.
+        Anything else (late or repeated timestamps) re-sorts the series; a
+        timestamp already held keeps its first value, as the lake does.
+
+        Args:
+            station: Station identifier
+            variable: Variable name (ignored when the store does not hold it)
+            timestamps: Naive UTC datetime64 timestamps
+            values: Values aligned with timestamps (NaN rows should be left out)
+        """
+        index = self.variables.get(variable)
+        if index is None or len(timestamps) == 0:
+            return
+        rings = self._rings(station)
+        timestamps = np.asarray(timestamps, dtype="datetime64[us]")
+        values = np.asarray(values, dtype=np.float64)
+        if rings.count[index] == 0:
+            # Rows before the first one received may be in the lake only
+            rings.floor[index] = max(rings.floor[index], timestamps.min())
+        self.stats.rows += len(timestamps)
+        self._append(rings, index, timestamps, values)
+
+    def seed(
+        self,
+        station: str,
+        variable: str,
+        start: datetime,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+    ) -> None:
+        """Merge the rows the lake holds for a series since start and mark it complete.
+
+        Args:
+            station: Station identifier
+            variable: Variable name (ignored when the store does not hold it)
+            start: Naive UTC start of the range read from the lake
+            timestamps: Naive UTC datetime64 timestamps of every row since start
+            values: Values aligned with timestamps (NaN rows should be left out)
+        """
+        index = self.variables.get(variable)
+        if index is None:
+            return
+        rings = self._rings(station)
+        rings.floor[index] = np.datetime64(start, "us")
+        if len(timestamps):
+            self._append(
+                rings,
+                index,
+                np.asarray(timestamps, dtype="datetime64[us]"),
+                np.asarray(values, dtype=np.float64),
+            )
+
+    def forget(self, station: str, end: datetime) -> bool:
+        """Stop answering the series of a station until they are seeded again.
+
+        Called when rows of the station up to ``end`` were added to the lake
+        without being written to the store. Series whose floor is after
+        ``end`` do not cover those rows and stay complete.
+
+        Returns:
+            Whether any series of the station has to be seeded again
+        """
+        rings = self._stations.get(station)
+        if rings is None:
+            return False
+        stale = rings.floor <= np.datetime64(end, "us")
+        rings.floor[stale] = _UNSEEDED
+        return bool(stale.any())
+
+    def seeded(self, station: str) -> bool:
+        """Whether every series of a station is complete from some time."""
+        rings = self._stations.get(station)
+        return rings is not None and not bool((rings.floor == _UNSEEDED).any())
+
+    def _rings(self, station: str) -> _StationRings:
+        rings = self._stations.get(station)
+        if rings is None:
+            rings = self._stations[station] = _StationRings(
+                len(self.variables), self.capacity, self.started_at
+            )
+        return rings
+
+    def _append(
+        self,
+        rings: _StationRings,
+        index: int,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+    ) -> None:
+        """Write rows into a series' ring, merging them with the held ones if needed."""
+        held_ts, held_values = self._held(rings, index)
+        ordered = len(timestamps) == 1 or bool(np.all(timestamps[1:] > timestamps[:-1]))
+        if not ordered or (len(held_ts) and timestamps[0] <= held_ts[-1]):
+            merged_ts = np.concatenate([held_ts, timestamps])
+            merged_values = np.concatenate([held_values, values])
+            order = np.argsort(merged_ts, kind="stable")
+            merged_ts = merged_ts[order]
+            first = np.ones(len(merged_ts), dtype=bool)
+            first[1:] = merged_ts[1:] != merged_ts[:-1]
+            timestamps, values = merged_ts[first], merged_values[order][first]
+            rings.count[index] = 0
+
+        capacity = self.capacity
+        if len(timestamps) > capacity:
+            self._evicted(rings, index, timestamps[-capacity - 1])
+            timestamps, values = timestamps[-capacity:], values[-capacity:]
+        total = rings.count[index] + len(timestamps)
+        if total > capacity:
+            # The newest sample pushed out is the one just before the kept window
+            evicted = total - capacity - 1
+            self._evicted(rings, index, rings.timestamps[index, evicted % capacity])
+        slots = (rings.count[index] + np.arange(len(timestamps))) % capacity
+        for offset in (0, capacity):
+            rings.timestamps[index, slots + offset] = timestamps
+            rings.values[index, slots + offset] = values
+        rings.count[index] = total
+
+    def query(
+        self,
+        station: str,
+        variable: str,
+        start: datetime,
+        end: datetime,
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Rows of a series in [start, end], if the store holds the whole range.
+
+        Returns:
+            (timestamps, values) views of the ring buffers, or None when the
+            range must be read from the lake
+        """
+        index = self.variables.get(variable)
+        rings = self._stations.get(station)
+        if (
+            index is None
+            or rings is None
+            or rings.count[index] == 0
+            or np.datetime64(start, "us") < rings.floor[index]
+        ):
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        timestamps, values = self._held(rings, index)
+        lo = np.searchsorted(timestamps, np.datetime64(start, "us"), side="left")
+        hi = np.searchsorted(timestamps, np.datetime64(end, "us"), side="right")
+        return timestamps[lo:hi], values[lo:hi]
+
+    def latest(self, station: str, variable: str) -> Optional[Tuple[np.datetime64, float]]:
+        """Newest observation of a series, or None when the store holds none."""
+        index = self.variables.get(variable)
+        rings = self._stations.get(station)
+        if (
+            index is None
+            or rings is None
+            or rings.count[index] == 0
+            or rings.floor[index] == _UNSEEDED
+        ):
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        slot = (rings.count[index] - 1) % self.capacity
+        return rings.timestamps[index, slot], float(rings.values[index, slot])
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters and footprint for monitoring."""
+        return {
+            "stations": len(self._stations),
+            "capacity": self.capacity,
+            "bytes": len(self._stations) * self.station_bytes,
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "rows": self.stats.rows,
+        }
+
+    def _held(self, rings: _StationRings, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Views of the samples a series holds, oldest first."""
+        count = int(rings.count[index])
+        held = min(count, self.capacity)
+        begin = (count - held) % self.capacity
+        return (
+            rings.timestamps[index, begin:begin + held],
+            rings.values[index, begin:begin + held],
+        )
+
+    @staticmethod
+    def _evicted(rings: _StationRings, index: int, timestamp: np.datetime64) -> None:
+        rings.floor[index] = max(rings.floor[index], timestamp + _MICROSECOND)
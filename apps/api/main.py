@@ -1,37 +1,124 @@
 """Main FastAPI application for Seantral API."""
 
+import asyncio
+import dataclasses
 import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union, Any
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Union, Any
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import (
+    APIRouter,
+    FastAPI,
+    HTTPException,
+    Query,
+    Header,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from loguru import logger
+
+from seantral_data_pipeline.storage.catalog import Catalog, Change, to_naive_utc
+from seantral_data_pipeline.timing import add_listener
+
+from broker import WILDCARD, Broker, Subscription, alert_topic, observation_topic
+from cache import CacheKey, ResultCache, snap_range
+from formats import arrow_response, batch_response, columnar_response, negotiate_format
+from metrics import Metrics, MetricsMiddleware
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from seantral_data_pipeline.alerts.engine import Alert, AlertEngine
+    from seantral_data_pipeline.copernicus.grid import GridCatalog
+    from seantral_data_pipeline.query.engine import QueryEngine, TimeSeriesResult
+    from seantral_data_pipeline.spatial.stations import StationRegistry
+    from seantral_data_pipeline.storage.recent import RecentReader
 
-import pandas as pd
-import numpy as np
+    from hot import HotStore
 
 # Load environment variables
 load_dotenv()
 
-# Create FastAPI app
-app = FastAPI(
-    title="Seantral API",
-    description="API for Seantral coastal and marine data platform",
-    version="0.0.1",
-)
+# Root of the Parquet data lake written by the ingestion pipeline
+LAKE_PATH = Path(os.getenv("SEANTRAL_LAKE_PATH", "data/lake"))
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # TODO: Update with proper origins for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+# Station coordinates used to resolve a lat/lon to a station and its lake partition
+STATIONS_PATH = Path(
+    os.getenv("SEANTRAL_STATIONS_PATH", str(LAKE_PATH / "stations.parquet"))
 )
 
+# Seconds between polls of the lake catalog's change log. Every writer of the
+# lake (the runner, backfills, save_to_parquet) registers its files there, so
+# each worker drops cached results over rows it was never posted.
+LAKE_POLL_SECONDS = float(os.getenv("SEANTRAL_LAKE_POLL_SECONDS", "1.0"))
+
+# Raw queries are widened to whole minutes so nearby ranges share cache entries
+RAW_QUANTUM = timedelta(minutes=1)
+
+# Half-width in degrees of the box searched around a point without a station
+SEARCH_RADIUS = 0.25
+
+# Upper bound on locations x variables in one batch request
+MAX_BATCH_SERIES = int(os.getenv("SEANTRAL_MAX_BATCH_SERIES", "1000"))
+
+# Seconds between keepalive comments on idle SSE streams
+SSE_KEEPALIVE = 15.0
+
+# Span of recent observations per station served from memory (0 turns the hot tier off)
+HOT_WINDOW = timedelta(hours=float(os.getenv("SEANTRAL_HOT_WINDOW_HOURS", "168")))
+
+# Expected spacing of a station's observations, which sizes the hot tier's ring buffers
+HOT_INTERVAL = timedelta(seconds=float(os.getenv("SEANTRAL_HOT_INTERVAL_SECONDS", "600")))
+
+# Recent series published by the pipeline and memory-mapped by every worker
+RECENT_PATH = os.getenv("SEANTRAL_RECENT_PATH")
+
+# Age past which published series no longer answer ranges up to now (set it
+# above the interval between pipeline runs)
+RECENT_MAX_AGE = timedelta(seconds=float(os.getenv("SEANTRAL_RECENT_MAX_AGE_SECONDS", "900")))
+
+# State of the worker, built by create_app (see _build_state)
+stations: "StationRegistry"
+engine: "QueryEngine"
+grids: "GridCatalog"
+result_cache: ResultCache
+alert_engine: "AlertEngine"
+broker: Broker
+hot_store: Optional[Union["HotStore", "RecentReader"]]
+COLUMN_VARIABLES: Dict[str, str]
+
+# How far back the lake is searched for a latest reading the hot tier does not hold
+LATEST_LOOKBACK = timedelta(days=7)
+
+# Stations whose hot tier series are being seeded, and per station a count of
+# lake changes that a seed started before them would miss
+_seeding: Dict[str, asyncio.Task] = {}
+_station_changes: Dict[str, int] = {}
+
+# Route latencies and per-query scan statistics exported on /metrics
+metrics = Metrics()
+add_listener(metrics.observe_span)
+
+# Alert rules and alerts, stream subscriptions and the fan-out of posted
+# observations live in the worker, so a single worker must serve them all
+# (0 leaves these routes out, for serving with several workers)
+LIVE_ENDPOINTS = os.getenv("SEANTRAL_LIVE_ENDPOINTS", "1") != "0"
+
+# Routes of the API, mounted on the application by create_app
+router = APIRouter()
+
+# Routes of the alerts and live streams, mounted with LIVE_ENDPOINTS
+live_router = APIRouter()
+
 # Models
 class TimeSeriesPoint(BaseModel):
     """A single point in a time series."""
@@ -49,6 +136,11 @@ class TimeSeriesResponse(BaseModel):
     location: Dict[str, float] = Field(..., description="Location coordinates")
     metadata: Dict[str, Any] = Field(default_factory=dict, description="Additional metadata")
 
+def _default_radius_km() -> float:
+    from seantral_data_pipeline.alerts.engine import RADIUS_KM
+
+    return RADIUS_KM
+
 class AlertRule(BaseModel):
     """Alert rule definition."""
     
@@ -58,6 +150,10 @@ class AlertRule(BaseModel):
     operator: str = Field(..., description="gt, lt, eq, gte, lte")
     duration: Optional[int] = Field(None, description="Duration in minutes")
     location: Dict[str, float]
+    radius_km: float = Field(
+        default_factory=_default_radius_km, gt=0, description="Watch stations within this distance"
+    )
+    station: Optional[str] = Field(None, description="Only watch this station")
     active: bool = True
     
 class AlertResponse(BaseModel):
@@ -68,14 +164,67 @@ class AlertResponse(BaseModel):
     triggered_at: datetime
     value: float
     status: str = Field(..., description="active, acknowledged, resolved")
+    station: Optional[str] = Field(None, description="Station whose readings raised it")
+    resolved_at: Optional[datetime] = None
+
+class ObservationBatch(BaseModel):
+    """Columnar batch of new observations pushed by the ingestion pipeline."""
+    
+    timestamp: List[datetime]
+    lat: List[float]
+    lon: List[float]
+    buoy_id: Optional[List[str]] = None
+    values: Dict[str, List[Optional[float]]] = Field(
+        ..., description="Lake column name (e.g. water_temperature) mapped to values"
+    )
+
+class TimeSeriesBatchRequest(BaseModel):
+    """Several variables at several locations over one time range."""
+    
+    variables: List[str]
+    locations: List[Dict[str, float]] = Field(..., description="Points with lat and lon")
+    start_time: datetime
+    end_time: datetime
+    max_distance_km: float = Field(
+        50.0, gt=0, description="Maximum distance to the nearest station in km"
+    )
+    max_points: Optional[int] = Field(
+        None, ge=3, le=100000, description="Maximum number of points per series"
+    )
+    agg: Optional[str] = Field(
+        None, description="Downsampling method: lttb (default), mean, min, max or minmax"
+    )
+
+def _alert_response(alert: "Alert") -> AlertResponse:
+    """Convert an engine alert to its API model."""
+    rule = alert.rule
+    return AlertResponse(
+        id=alert.id,
+        rule=AlertRule(
+            id=rule.id,
+            variable=rule.variable,
+            threshold=rule.threshold,
+            operator=rule.operator,
+            duration=rule.duration,
+            location={"lat": rule.lat, "lon": rule.lon},
+            radius_km=rule.radius_km,
+            station=rule.station,
+            active=rule.active,
+        ),
+        triggered_at=alert.triggered_at,
+        value=alert.value,
+        status=alert.status,
+        station=alert.station,
+        resolved_at=alert.resolved_at,
+    )
 
 # Routes
-@app.get("/")
+@router.get("/")
 async def root():
     """Root endpoint."""
     return {"message": "Welcome to Seantral API", "version": "0.0.1"}
 
-@app.get("/v1/timeseries", response_model=TimeSeriesResponse)
+@router.get("/v1/timeseries", response_model=TimeSeriesResponse)
 async def get_timeseries(
     variable: str = Query(..., description="Variable to query"),
     lat: float = Query(..., description="Latitude"),
@@ -83,88 +232,975 @@ async def get_timeseries(
     start_time: datetime = Query(..., description="Start time"),
     end_time: datetime = Query(..., description="End time"),
     source: Optional[str] = Query(None, description="Data source"),
+    max_distance_km: float = Query(
+        50.0, gt=0, description="Maximum distance to the nearest station in km"
+    ),
+    format: Optional[str] = Query(
+        None, description="Response format: points (default), columnar or arrow"
+    ),
+    max_points: Optional[int] = Query(
+        None, ge=3, le=100000, description="Maximum number of points to return"
+    ),
+    agg: Optional[str] = Query(
+        None, description="Downsampling method: lttb (default), mean, min, max or minmax"
+    ),
+    accept: Optional[str] = Header(None),
 ):
-    """Get time series data for a location."""
-    # TODO: Implement actual data retrieval from storage
-    
-    # Mock response for now
-    hours = int((end_time - start_time).total_seconds() / 3600) + 1
-    timestamps = [start_time + timedelta(hours=i) for i in range(hours)]
-    
-    if variable == "sst":
-        # Sea surface temperature
-        values = [20 + 2 * np.sin(i / 24 * 2 * np.pi) + np.random.normal(0, 0.5) for i in range(hours)]
-        unit = "°C"
-        source = source or "CMEMS"
-    elif variable == "wave_height":
-        # Wave height
-        values = [1.5 + 1 * np.sin(i / 12 * 2 * np.pi) + np.random.normal(0, 0.3) for i in range(hours)]
-        unit = "m"
-        source = source or "NDBC"
-    else:
+    """Get time series data for a location.
+    
+    The columnar format returns parallel timestamps/values arrays and the arrow
+    format (also selected with Accept: application/vnd.apache.arrow.stream)
+    returns an Arrow IPC stream; both skip per-point model construction.
+    
+    With max_points the series is downsampled on the server: mean, min, max and
+    minmax aggregate fixed time buckets inside the query engine, while lttb
+    picks the visually significant raw points.
+    
+    Points without a station within max_distance_km (or any point with
+    source=Copernicus) are answered from the gridded field of the variable,
+    interpolated bilinearly, when one has been built.
+    """
+    from seantral_data_pipeline.query.downsample import (
+        BUCKET_AGGREGATIONS,
+        METHODS,
+        bucket_width,
+        downsample,
+    )
+    from seantral_data_pipeline.query.engine import TimeSeriesResult, format_resolution
+    from seantral_data_pipeline.spatial.geohash import PARTITION_PRECISION, encode
+
+    response_format = negotiate_format(format, accept)
+    location = {"lat": lat, "lon": lon}
+    
+    start_time = to_naive_utc(start_time)
+    end_time = to_naive_utc(end_time)
+    if end_time < start_time:
+        raise HTTPException(status_code=400, detail="end_time must not be before start_time")
+    
+    if agg is not None and max_points is None:
+        raise HTTPException(status_code=400, detail="agg requires max_points")
+    method = agg or "lttb"
+    if method not in METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported agg: {method}. Use one of {', '.join(METHODS)}",
+        )
+    resolution = None
+    if max_points is not None and method in BUCKET_AGGREGATIONS:
+        resolution = bucket_width(
+            end_time - start_time, max_points, 2 if method == "minmax" else 1
+        )
+    
+    try:
+        spec = engine.get_variable(variable)
+    except KeyError:
         raise HTTPException(status_code=400, detail=f"Unsupported variable: {variable}")
     
+    grid = grids.variables.get(variable)
+    use_grid = grid is not None and source == grid.source
+    if source is not None and source != spec.source and not use_grid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Variable {variable} is not available from source {source}",
+        )
+    
+    # Resolve the point to its nearest station so only that station's partition is read
+    station_id = None
+    geohash = None
+    if len(stations) and not use_grid:
+        nearest = stations.nearest(lat, lon, max_distance_km)
+        if nearest is not None:
+            station, distance = nearest
+            station_id = station.station_id
+            geohash = station.geohash
+    
+    if len(stations) and station_id is None and source is None:
+        use_grid = grids.covers(variable, lat, lon)
+    
+    if use_grid:
+        try:
+            # Pages of mapped chunks are faulted in from disk, so keep them off the event loop
+            result = await run_in_threadpool(
+                _grid_timeseries, variable, lat, lon, start_time, end_time,
+                max_points, method, resolution,
+            )
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    elif len(stations) and station_id is None:
+        result = TimeSeriesResult.empty(variable, spec, {"station": None})
+    else:
+        # Normalize the query so that equivalent requests share a cache entry:
+        # the location snaps to its station (or to ~100 m without a registry)
+        # and the range widens to whole buckets
+        if station_id is not None:
+            partition = station_id
+            geohashes = {geohash}
+        else:
+            lat, lon = round(lat, 3), round(lon, 3)
+            partition = f"{lat},{lon}"
+            geohashes = {
+                encode(lat + dlat, lon + dlon, PARTITION_PRECISION)
+                for dlat in (-SEARCH_RADIUS, SEARCH_RADIUS)
+                for dlon in (-SEARCH_RADIUS, SEARCH_RADIUS)
+            }
+        query_start, query_end = snap_range(start_time, end_time, resolution or RAW_QUANTUM)
+        key = CacheKey(
+            variable=variable,
+            partition=partition,
+            start=query_start,
+            end=query_end,
+            resolution=int(resolution.total_seconds()) if resolution else None,
+            agg=method if max_points is not None else None,
+            max_points=max_points,
+        )
+        
+        # Ranges the hot tier holds completely never reach the lake or the cache
+        held = None
+        if hot_store is not None and station_id is not None:
+            held = hot_store.query(station_id, variable, query_start, query_end)
+            if held is None:
+                _seed_station(station_id, geohash)
+        
+        async def load() -> TimeSeriesResult:
+            # DuckDB calls block, so keep them off the event loop
+            loaded = await run_in_threadpool(
+                engine.query_timeseries,
+                variable,
+                query_start,
+                query_end,
+                lat=lat,
+                lon=lon,
+                radius=SEARCH_RADIUS,
+                station=station_id,
+                geohash=geohash,
+                resolution=resolution,
+                agg=method,
+            )
+            if max_points is not None and resolution is None and len(loaded) > max_points:
+                loaded.timestamps, loaded.values = await run_in_threadpool(
+                    downsample, loaded.timestamps, loaded.values, max_points, method
+                )
+                loaded.metadata["agg"] = method
+            return loaded
+        
+        if held is not None:
+            cached = _reduce(
+                TimeSeriesResult(
+                    variable=variable,
+                    unit=spec.unit,
+                    source=spec.source,
+                    timestamps=held[0],
+                    values=held[1],
+                    metadata={
+                        "resolution": format_resolution(resolution),
+                        "dataset": spec.dataset,
+                        "tier": "hot",
+                    },
+                ),
+                max_points,
+                method,
+                resolution,
+            )
+        else:
+            try:
+                cached = await result_cache.get_or_load(key, load, _result_size, geohashes)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        # Buckets are stamped with their start, so keep the one holding start_time
+        result = _trim(cached, start_time if resolution is None else query_start, end_time)
+        if station_id is not None:
+            result.metadata.update(station=station_id, distance_km=round(distance, 3))
+    
+    metadata = {**result.metadata, "count": len(result)}
+    if response_format == "columnar":
+        return columnar_response(result, location, metadata)
+    if response_format == "arrow":
+        return arrow_response(result, location, metadata)
+    
+    timestamps = result.timestamps.astype("datetime64[us]").tolist()
     data = [
-        TimeSeriesPoint(timestamp=ts, value=val, unit=unit)
-        for ts, val in zip(timestamps, values)
+        TimeSeriesPoint(timestamp=ts, value=val, unit=result.unit)
+        for ts, val in zip(timestamps, result.values.tolist(), strict=True)
     ]
     
     return TimeSeriesResponse(
         data=data,
-        source=source,
+        source=result.source,
         variable=variable,
-        location={"lat": lat, "lon": lon},
-        metadata={
-            "resolution": "hourly",
-            "quality": "good",
+        location=location,
+        metadata=metadata,
+    )
+
+def _grid_timeseries(
+    variable: str,
+    lat: float,
+    lon: float,
+    start: datetime,
+    end: datetime,
+    max_points: Optional[int],
+    method: str,
+    resolution: Optional[timedelta],
+) -> "TimeSeriesResult":
+    """Point series from a gridded field, downsampled like lake results."""
+    return _reduce(
+        grids.query_timeseries(variable, lat, lon, start, end), max_points, method, resolution
+    )
+
+def _reduce(
+    result: "TimeSeriesResult",
+    max_points: Optional[int],
+    method: str,
+    resolution: Optional[timedelta],
+) -> "TimeSeriesResult":
+    """Aggregate or downsample an in-memory result as the query engine would."""
+    from seantral_data_pipeline.query.downsample import aggregate, downsample
+
+    if resolution is not None:
+        result.timestamps, result.values = aggregate(
+            result.timestamps, result.values, resolution, method
+        )
+        result.metadata["agg"] = method
+    elif max_points is not None and len(result) > max_points:
+        result.timestamps, result.values = downsample(
+            result.timestamps, result.values, max_points, method
+        )
+        result.metadata["agg"] = method
+    return result
+
+def _result_size(result: "TimeSeriesResult") -> int:
+    """Approximate memory held by a cached result."""
+    return result.timestamps.nbytes + result.values.nbytes + 512
+
+def _trim(result: "TimeSeriesResult", start: datetime, end: datetime) -> "TimeSeriesResult":
+    """Copy of a (shared, cached) result restricted to [start, end]."""
+    import numpy as np
+
+    lo = np.searchsorted(result.timestamps, np.datetime64(start), side="left")
+    hi = np.searchsorted(result.timestamps, np.datetime64(end), side="right")
+    return dataclasses.replace(
+        result,
+        timestamps=result.timestamps[lo:hi],
+        values=result.values[lo:hi],
+        metadata=dict(result.metadata),
+    )
+
+@router.post("/v1/timeseries/batch")
+async def get_timeseries_batch(request: TimeSeriesBatchRequest):
+    """Get time series for every combination of a set of locations and variables.
+    
+    Locations are resolved to their nearest stations and grouped by lake
+    partition, so each geohash partition (and dataset) is scanned once for all
+    the stations and variables it serves. The scans of different partitions run
+    concurrently and every series is returned in one columnar document, in
+    location-major order.
+    
+    Bucket aggregations (mean, min, max) are pushed into the scans; lttb and
+    minmax are applied to each series afterwards.
+    """
+    from seantral_data_pipeline.query.downsample import (
+        BUCKET_AGGREGATIONS,
+        METHODS,
+        bucket_width,
+        downsample,
+    )
+    from seantral_data_pipeline.query.engine import TimeSeriesResult
+
+    n_series = len(request.locations) * len(request.variables)
+    if n_series == 0:
+        raise HTTPException(status_code=400, detail="locations and variables must not be empty")
+    if n_series > MAX_BATCH_SERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many series: {n_series} (at most {MAX_BATCH_SERIES})",
+        )
+    for point in request.locations:
+        if "lat" not in point or "lon" not in point:
+            raise HTTPException(status_code=400, detail="Every location needs lat and lon")
+    
+    start_time = to_naive_utc(request.start_time)
+    end_time = to_naive_utc(request.end_time)
+    if end_time < start_time:
+        raise HTTPException(status_code=400, detail="end_time must not be before start_time")
+    
+    max_points = request.max_points
+    if request.agg is not None and max_points is None:
+        raise HTTPException(status_code=400, detail="agg requires max_points")
+    method = request.agg or "lttb"
+    if method not in METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported agg: {method}. Use one of {', '.join(METHODS)}",
+        )
+    # Grouped scans aggregate one value per bucket; minmax is applied per series
+    resolution = None
+    if max_points is not None and method in BUCKET_AGGREGATIONS and method != "minmax":
+        resolution = bucket_width(end_time - start_time, max_points)
+    
+    specs = {}
+    for variable in request.variables:
+        try:
+            specs[variable] = engine.get_variable(variable)
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Unsupported variable: {variable}")
+    
+    variables_by_dataset: Dict[str, List[str]] = {}
+    for variable, spec in specs.items():
+        variables_by_dataset.setdefault(spec.dataset, []).append(variable)
+    
+    # Group the stations serving the locations by dataset and partition
+    nearest: List[Optional[tuple]] = []
+    groups: Dict[tuple, set] = {}
+    for point in request.locations:
+        match = (
+            stations.nearest(point["lat"], point["lon"], request.max_distance_km)
+            if len(stations)
+            else None
+        )
+        nearest.append(match)
+        if match is None:
+            continue
+        station = match[0]
+        for dataset in variables_by_dataset:
+            groups.setdefault((dataset, station.geohash), set()).add(station.station_id)
+    
+    def run_group(dataset: str, geohash: Optional[str], ids: set):
+        return engine.query_stations(
+            variables_by_dataset[dataset],
+            sorted(ids),
+            start_time,
+            end_time,
+            geohash=geohash,
+            resolution=resolution,
+            agg=method,
+        )
+    
+    def run_point(variable: str, lat: float, lon: float):
+        return engine.query_timeseries(
+            variable,
+            start_time,
+            end_time,
+            lat=lat,
+            lon=lon,
+            radius=SEARCH_RADIUS,
+            resolution=resolution,
+            agg=method,
+        )
+    
+    # Independent scans run concurrently in the threadpool (DuckDB releases the GIL)
+    tasks = [
+        run_in_threadpool(run_group, dataset, geohash, ids)
+        for (dataset, geohash), ids in groups.items()
+    ]
+    # Without a station registry every point is a bounding box query of its own
+    points = []
+    if not len(stations):
+        points = [(i, variable) for i in range(len(request.locations)) for variable in specs]
+        tasks += [
+            run_in_threadpool(
+                run_point, variable, request.locations[i]["lat"], request.locations[i]["lon"]
+            )
+            for i, variable in points
+        ]
+    try:
+        done = await asyncio.gather(*tasks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    by_station: Dict[tuple, TimeSeriesResult] = {}
+    for grouped in done[:len(groups)]:
+        by_station.update(grouped)
+    by_point = dict(zip(points, done[len(groups):], strict=True))
+    
+    def assemble() -> List[Dict[str, Any]]:
+        series = []
+        for i, point in enumerate(request.locations):
+            location = {"lat": point["lat"], "lon": point["lon"]}
+            match = nearest[i]
+            for variable, spec in specs.items():
+                if match is not None:
+                    station, distance = match
+                    result = by_station[(station.station_id, variable)]
+                    extra = {"station": station.station_id, "distance_km": round(distance, 3)}
+                elif (i, variable) in by_point:
+                    result = by_point[(i, variable)]
+                    extra = {}
+                else:
+                    result = TimeSeriesResult.empty(variable, spec, {"station": None})
+                    extra = {"station": None}
+                if max_points is not None and resolution is None and len(result) > max_points:
+                    metadata = {**result.metadata, "agg": method}
+                    result = dataclasses.replace(result, metadata=metadata)
+                    result.timestamps, result.values = downsample(
+                        result.timestamps, result.values, max_points, method
+                    )
+                series.append(
+                    {
+                        "result": result,
+                        "location": location,
+                        "metadata": {**result.metadata, **extra, "count": len(result)},
+                    }
+                )
+        return series
+    
+    series = await run_in_threadpool(assemble)
+    return batch_response(
+        series,
+        {
+            "scans": len(tasks),
+            "series": len(series),
+            "start_time": start_time,
+            "end_time": end_time,
         },
     )
 
-@app.get("/v1/alerts", response_model=List[AlertResponse])
+@router.get("/v1/latest")
+async def get_latest(
+    lat: float = Query(..., description="Latitude"),
+    lon: float = Query(..., description="Longitude"),
+    variables: Optional[str] = Query(None, description="Comma-separated variables (default: all)"),
+    max_distance_km: float = Query(
+        50.0, gt=0, description="Maximum distance to the nearest station in km"
+    ),
+):
+    """Latest observation of each variable at the station nearest to a point.
+    
+    Series held by the hot tier are answered from memory; the others are
+    looked up in the last LATEST_LOOKBACK of the lake, one scan per dataset.
+    """
+    names = [v for v in (variables or "").split(",") if v] or list(engine.variables)
+    unknown = [v for v in names if v not in engine.variables]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported variables: {unknown}")
+    
+    nearest = stations.nearest(lat, lon, max_distance_km) if len(stations) else None
+    if nearest is None:
+        return {"station": None, "observations": {name: None for name in names}}
+    station, distance = nearest
+    
+    observations: Dict[str, Any] = {}
+    missing: Dict[str, List[str]] = {}
+    for name in names:
+        latest = hot_store.latest(station.station_id, name) if hot_store is not None else None
+        if latest is None:
+            if hot_store is not None:
+                _seed_station(station.station_id, station.geohash)
+            missing.setdefault(engine.variables[name].dataset, []).append(name)
+            continue
+        timestamp, value = latest
+        observations[name] = {
+            "timestamp": timestamp.item(),
+            "value": value,
+            "unit": engine.variables[name].unit,
+            "tier": "hot",
+        }
+    
+    if missing:
+        end = datetime.now(timezone.utc).replace(tzinfo=None)
+        try:
+            scans = await asyncio.gather(
+                *(
+                    run_in_threadpool(
+                        engine.query_stations,
+                        dataset_variables,
+                        [station.station_id],
+                        end - LATEST_LOOKBACK,
+                        end,
+                        geohash=station.geohash,
+                    )
+                    for dataset_variables in missing.values()
+                )
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        for found in scans:
+            for (_, name), result in found.items():
+                observations[name] = None if not len(result) else {
+                    "timestamp": result.timestamps[-1].astype("datetime64[us]").item(),
+                    "value": float(result.values[-1]),
+                    "unit": result.unit,
+                    "tier": "lake",
+                }
+    
+    return {
+        "station": station.station_id,
+        "distance_km": round(distance, 3),
+        "observations": {name: observations.get(name) for name in names},
+    }
+
+@router.get("/v1/cache/stats")
+async def get_cache_stats():
+    """Hit, miss and eviction counters of the time series result cache and the hot tier."""
+    return {
+        **result_cache.snapshot(),
+        "grids": grids.cache_info(),
+        "hot": hot_store.snapshot() if hot_store is not None else None,
+    }
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics of this worker process."""
+    gauges = {
+        "result_cache": result_cache.snapshot(),
+        **{f"grid_cache_{name}": info for name, info in grids.cache_info().items()},
+        "stream": {"subscribers": broker.subscriber_count},
+        "hot_store": hot_store.snapshot() if hot_store is not None else {},
+    }
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@live_router.get("/v1/alerts", response_model=List[AlertResponse])
 async def get_alerts(
     user_id: str = Query(..., description="User ID"),
     status: Optional[str] = Query(None, description="Filter by status"),
 ):
     """Get alerts for a user."""
-    # TODO: Implement actual alert retrieval from database
-    
-    # Mock response for now
-    alerts = [
-        AlertResponse(
-            id="alert-001",
-            rule=AlertRule(
-                id="rule-001",
-                variable="sst",
-                threshold=25.0,
-                operator="gt",
-                duration=60,
-                location={"lat": 43.25, "lon": -70.5},
-            ),
-            triggered_at=datetime.now() - timedelta(hours=3),
-            value=25.8,
-            status="active",
-        ),
-        AlertResponse(
-            id="alert-002",
-            rule=AlertRule(
-                id="rule-002",
-                variable="wave_height",
-                threshold=3.0,
-                operator="gt",
-                duration=None,
-                location={"lat": 43.25, "lon": -70.5},
-            ),
-            triggered_at=datetime.now() - timedelta(days=1),
-            value=3.5,
-            status="resolved",
+    return [_alert_response(alert) for alert in alert_engine.alerts(user_id, status)]
+
+@live_router.post("/v1/alerts/rules", response_model=AlertRule)
+async def create_alert_rule(
+    rule: AlertRule,
+    user_id: str = Query(..., description="User ID"),
+):
+    """Register (or replace) an alert rule for a user."""
+    from seantral_data_pipeline.alerts.engine import Rule
+
+    try:
+        alert_engine.add_rule(
+            Rule(
+                id=rule.id,
+                variable=rule.variable,
+                operator=rule.operator,
+                threshold=rule.threshold,
+                lat=rule.location["lat"],
+                lon=rule.location["lon"],
+                duration=rule.duration,
+                user_id=user_id,
+                active=rule.active,
+                radius_km=rule.radius_km,
+                station=rule.station,
+            )
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return rule
+
+@live_router.delete("/v1/alerts/rules/{rule_id}")
+async def delete_alert_rule(rule_id: str):
+    """Remove an alert rule."""
+    if alert_engine.get_rule(rule_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown rule: {rule_id}")
+    alert_engine.remove_rule(rule_id)
+    return {"deleted": rule_id}
+
+@live_router.post("/v1/observations")
+async def ingest_observations(batch: ObservationBatch):
+    """Accept a batch of new observations from the ingestion pipeline.
+    
+    Cached results reading from the partitions the batch was written to are
+    dropped, and every active alert rule is evaluated against the batch in one
+    pass. The cache and the alert engine are only touched from the event loop,
+    so they need no locking.
+    """
+    n = len(batch.timestamp)
+    columns = [batch.lat, batch.lon, *batch.values.values()]
+    if batch.buoy_id is not None:
+        columns.append(batch.buoy_id)
+    if any(len(column) != n for column in columns):
+        raise HTTPException(status_code=400, detail="All batch columns must have the same length")
+    
+    import pandas as pd
+
+    from seantral_data_pipeline.spatial.geohash import PARTITION_PRECISION, encode_many
+
+    from hot import HotStore
+
+    df = pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(batch.timestamp, utc=True).tz_localize(None),
+            "lat": batch.lat,
+            "lon": batch.lon,
+            **{name: pd.array(values, dtype="Float64") for name, values in batch.values.items()},
+        }
+    )
+    if batch.buoy_id is not None:
+        df["buoy_id"] = batch.buoy_id
+    
+    if n:
+        written = encode_many(df["lat"].to_numpy(), df["lon"].to_numpy(), PARTITION_PRECISION)
+        result_cache.invalidate(
+            set(written.tolist()),
+            df["timestamp"].min().to_pydatetime(),
+            df["timestamp"].max().to_pydatetime(),
+        )
+    
+    if isinstance(hot_store, HotStore) and "buoy_id" in df:
+        _hold_batch(df)
+    
+    changed = alert_engine.evaluate(df)
+    alerts = [_alert_response(alert) for alert in changed]
+    _publish_batch(df)
+    for alert, response in zip(changed, alerts, strict=True):
+        broker.publish(
+            [alert_topic(alert.rule.user_id)],
+            {"type": "alert", **response.model_dump(mode="json")},
+        )
+    return {"rows": n, "alerts": alerts}
+
+def _seed_station(station: str, geohash: Optional[str]) -> None:
+    """Start loading a station's series into the hot tier, unless it holds them already."""
+    from hot import HotStore
+
+    if not isinstance(hot_store, HotStore) or station in _seeding or hot_store.seeded(station):
+        return
+    task = asyncio.get_running_loop().create_task(_load_station(station, geohash))
+    _seeding[station] = task
+    task.add_done_callback(lambda _: _seeding.pop(station, None))
+
+async def _load_station(station: str, geohash: Optional[str]) -> None:
+    """Seed the hot tier's series of a station with the lake's rows over its window."""
+    import duckdb
+    import numpy as np
+
+    changes = _station_changes.get(station, 0)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    # Rows stamped slightly ahead of the clock are held too
+    start, end = now - HOT_WINDOW, now + timedelta(days=1)
+    names = list(engine.variables)
+    scans = await asyncio.gather(
+        *(
+            run_in_threadpool(
+                engine.query_stations, [name], [station], start, end, geohash=geohash
+            )
+            for name in names
         ),
-    ]
+        return_exceptions=True,
+    )
+    if _station_changes.get(station, 0) != changes:
+        return  # Rows added while loading may be missing; the next miss seeds again
+    for name, found in zip(names, scans, strict=True):
+        if isinstance(found, duckdb.BinderException):
+            # The dataset has no column for the variable, so the lake holds no rows of it
+            hot_store.seed(station, name, start, np.empty(0, "datetime64[us]"), np.empty(0))
+        elif isinstance(found, Exception):
+            logger.warning(f"Could not seed the hot tier with {station} {name}: {found}")
+        else:
+            result = found[(station, name)]
+            hot_store.seed(station, name, start, result.timestamps, result.values)
+
+def _station_rows(df: "pd.DataFrame") -> tuple:
+    """Timestamps of a batch and the row indices of each station (None without buoy_id)."""
+    import numpy as np
+
+    timestamps = df["timestamp"].to_numpy().astype("datetime64[us]")
+    if "buoy_id" in df:
+        groups = list(df.groupby("buoy_id", sort=False).indices.items())
+    else:
+        groups = [(None, np.arange(len(df)))]
+    return timestamps, groups
+
+def _hold_batch(df: "pd.DataFrame") -> None:
+    """Add the observations of a batch to the hot tier, per station and variable."""
+    import numpy as np
+
+    timestamps, groups = _station_rows(df)
+    for column, variable in COLUMN_VARIABLES.items():
+        if column not in df:
+            continue
+        values = df[column].to_numpy(np.float64, na_value=np.nan)
+        for station, rows in groups:
+            rows = rows[~np.isnan(values[rows])]
+            if len(rows):
+                hot_store.write(station, variable, timestamps[rows], values[rows])
+
+def _publish_batch(df: "pd.DataFrame") -> None:
+    """Send the new observations of a batch to live subscribers, per station and variable."""
+    import numpy as np
+
+    timestamps, groups = _station_rows(df)
     
-    if status:
-        alerts = [a for a in alerts if a.status == status]
+    for column, variable in COLUMN_VARIABLES.items():
+        if column not in df:
+            continue
+        values = df[column].to_numpy(np.float64, na_value=np.nan)
+        for station, rows in groups:
+            if not broker.wants_observations(station, variable):
+                continue
+            rows = rows[~np.isnan(values[rows])]
+            if len(rows) == 0:
+                continue
+            broker.publish_observations(
+                station,
+                variable,
+                {
+                    "type": "observations",
+                    "station": station,
+                    "variable": variable,
+                    "unit": engine.variables[variable].unit,
+                    "timestamps": timestamps[rows],
+                    "values": values[rows],
+                },
+            )
+
+def _stream_topics(
+    stations: Optional[str],
+    variables: Optional[str],
+    user_id: Optional[str],
+) -> List[str]:
+    """Build the broker topics of a stream subscription from its query parameters."""
+    station_ids = [s for s in (stations or "").split(",") if s]
+    variable_names = [v for v in (variables or "").split(",") if v]
+    unknown = [v for v in variable_names if v not in engine.variables]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported variables: {unknown}")
+    
+    topics = []
+    if station_ids or variable_names:
+        topics = [
+            observation_topic(station, variable)
+            for station in station_ids or [WILDCARD]
+            for variable in variable_names or [WILDCARD]
+        ]
+    if user_id:
+        topics.append(alert_topic(user_id))
+    if not topics:
+        raise HTTPException(
+            status_code=400, detail="Subscribe to stations, variables or a user's alerts"
+        )
+    return topics
+
+@live_router.websocket("/v1/stream")
+async def stream_websocket(
+    websocket: WebSocket,
+    stations: Optional[str] = None,
+    variables: Optional[str] = None,
+    user_id: Optional[str] = None,
+):
+    """Push new observations and alerts to a WebSocket client.
+    
+    Subscribe with comma-separated stations and/or variables (either one alone
+    means all of the other) and a user_id for that user's alerts.
+    """
+    try:
+        topics = _stream_topics(stations, variables, user_id)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
     
-    return alerts
+    await websocket.accept()
+    subscription = broker.subscribe(topics)
+    receive = asyncio.ensure_future(websocket.receive())
+    try:
+        while True:
+            pending = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {pending, receive}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if receive in done:
+                pending.cancel()
+                if receive.result()["type"] == "websocket.disconnect":
+                    break
+                # Clients have nothing to say; ignore anything they send
+                receive = asyncio.ensure_future(websocket.receive())
+                continue
+            await websocket.send_text(pending.result().text)
+    except (WebSocketDisconnect, RuntimeError):
+        # The client went away while a message was being sent
+        pass
+    finally:
+        receive.cancel()
+        broker.unsubscribe(subscription)
+
+@live_router.get("/v1/stream/sse")
+async def stream_sse(
+    request: Request,
+    stations: Optional[str] = Query(None, description="Comma-separated station IDs"),
+    variables: Optional[str] = Query(None, description="Comma-separated variables"),
+    user_id: Optional[str] = Query(None, description="User whose alerts to receive"),
+):
+    """Push new observations and alerts as server-sent events."""
+    subscription = broker.subscribe(_stream_topics(stations, variables, user_id))
+    return StreamingResponse(
+        _sse_events(request, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _sse_events(request: Request, subscription: Subscription):
+    try:
+        while not await request.is_disconnected():
+            try:
+                message = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield message.event
+    finally:
+        broker.unsubscribe(subscription)
+
+async def _watch_lake() -> None:
+    """Apply the files registered in the lake catalog since the worker started."""
+    catalog = Catalog(LAKE_PATH)
+    after = catalog.last_change()
+    try:
+        while True:
+            await asyncio.sleep(LAKE_POLL_SECONDS)
+            try:
+                changes = catalog.changes(after)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read the changes of {catalog.path}: {e}")
+                continue
+            for change in changes:
+                _lake_changed(change)
+                after = change.id
+    finally:
+        catalog.close()
+
+def _lake_changed(change: Change) -> None:
+    """Drop cached results and hot tier series over the rows of a file added to the lake."""
+    from hot import HotStore
+
+    if change.start is None or change.end is None:
+        return
+    partition = change.partition
+    result_cache.invalidate(
+        {partition} if partition is not None else None, change.start, change.end
+    )
+    if isinstance(hot_store, HotStore):
+        # The rows may never have been posted; reseed the station on its next query
+        for station in change.stations:
+            _station_changes[station] = _station_changes.get(station, 0) + 1
+            hot_store.forget(station, change.end)
+
+def _build_state() -> None:
+    """Load the station registry and create the engine, caches and stores of the worker."""
+    global stations, engine, grids, result_cache, alert_engine, broker, hot_store
+    global COLUMN_VARIABLES
+    from seantral_data_pipeline.alerts.engine import AlertEngine
+    from seantral_data_pipeline.copernicus.grid import GRID_DIR, GridCatalog
+    from seantral_data_pipeline.query.engine import QueryEngine
+    from seantral_data_pipeline.spatial.stations import StationRegistry
+    from seantral_data_pipeline.storage.recent import RecentReader
+    from seantral_data_pipeline.storage.snapshot import load_snapshot
+
+    from hot import HotStore
+
+    # The snapshot written by the pipeline spares the start of every worker from
+    # pyarrow and from listing the lake; without a current one the registry is read
+    snapshot = load_snapshot(LAKE_PATH, STATIONS_PATH)
+    if snapshot is not None:
+        stations = snapshot.registry()
+    elif STATIONS_PATH.exists():
+        stations = StationRegistry.load(STATIONS_PATH)
+    else:
+        stations = StationRegistry()
+
+    # One query engine per worker process; it opens its DuckDB connection on the first query
+    engine = QueryEngine(
+        LAKE_PATH,
+        threads=int(os.environ["DUCKDB_THREADS"]) if os.getenv("DUCKDB_THREADS") else None,
+        memory_limit=os.getenv("DUCKDB_MEMORY_LIMIT"),
+    )
+
+    # Gridded fields (e.g. Copernicus SST) queried at points without a nearby station
+    grids = GridCatalog(Path(os.getenv("SEANTRAL_GRIDS_PATH", str(LAKE_PATH / GRID_DIR))))
+
+    # Shared results of identical time series queries, invalidated on ingest
+    result_cache = ResultCache(
+        max_bytes=int(os.getenv("SEANTRAL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    )
+
+    # Alert rules live in memory and are evaluated as observation batches arrive
+    alert_engine = AlertEngine()
+
+    # Live observation and alert messages fanned out to WebSocket/SSE clients
+    broker = Broker(max_pending=int(os.getenv("SEANTRAL_STREAM_MAX_PENDING", "256")))
+
+    # Lake columns in ingested batches mapped back to public variable names
+    COLUMN_VARIABLES = {spec.column: name for name, spec in engine.variables.items()}
+
+    # Newest observations of every station: with several workers, the series the
+    # pipeline published (shared by all of them through the page cache); otherwise
+    # those of the stations queried since the worker started, seeded from the lake
+    # and kept current by the rows the pipeline posts to /v1/observations
+    if RECENT_PATH:
+        hot_store = RecentReader(Path(RECENT_PATH), max_age=RECENT_MAX_AGE)
+    elif HOT_WINDOW:
+        hot_store = HotStore(list(engine.variables), HOT_WINDOW, HOT_INTERVAL)
+    else:
+        hot_store = None
+    _seeding.clear()
+    _station_changes.clear()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    watcher = asyncio.create_task(_watch_lake())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+
+def create_app() -> FastAPI:
+    """Build the application and the state of the worker serving it.
+
+    Only the web framework is imported with this module: numpy comes with the
+    station registry and the stores built here, and pandas, pyarrow and DuckDB
+    are loaded by the first request that needs them, so a worker is ready to
+    serve within a fraction of a second. Serve it with
+    ``uvicorn --factory main:create_app``, or ``uvicorn main:app``, which
+    builds the application on first access.
+    """
+    _build_state()
+    app = FastAPI(
+        title="Seantral API",
+        description="API for Seantral coastal and marine data platform",
+        version="0.0.1",
+        lifespan=lifespan,
+    )
+
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # TODO: Update with proper origins for production
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Server-Timing"],
+    )
+
+    # Outermost, so latencies include the other middleware. Requests sent with
+    # X-Seantral-Profile: 1 get their pipeline spans in a Server-Timing header.
+    app.add_middleware(
+        MetricsMiddleware,
+        metrics=metrics,
+        allow_profiling=os.getenv("SEANTRAL_ALLOW_PROFILING", "1") != "0",
+    )
+
+    app.include_router(router)
+    if LIVE_ENDPOINTS:
+        app.include_router(live_router)
+    return app
+
+def __getattr__(name: str) -> Any:
+    # ``main:app`` is created on first access, so importing the module builds nothing
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=3001) 
\ No newline at end of file
+
+    workers = int(os.getenv("SEANTRAL_WORKERS", "1"))
+    if workers > 1 and LIVE_ENDPOINTS:
+        # Each worker would hold its own rules and subscribers and see only the
+        # observations posted to it
+        raise SystemExit(
+            "Several workers need SEANTRAL_LIVE_ENDPOINTS=0: alert rules, streams "
+            "and posted observations are kept per worker"
+        )
+    # Workers share the recent series only when SEANTRAL_RECENT_PATH is set
+    uvicorn.run("main:app", host="0.0.0.0", port=3001, workers=workers) 
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""Prometheus metrics of the API and of the pipeline spans it runs.
+
+Route latencies are recorded by an ASGI middleware into fixed-bucket
+histograms labelled with the route template (not the raw path, which would
+blow up the number of series). Query spans of the pipeline's timing module
+feed the rows scanned and bytes read histograms, and the span totals, cache
+statistics and any other gauges are rendered alongside them by ``render`` in
+the text exposition format.
+
+A request sent with ``X-Seantral-Profile: 1`` also collects the spans it ran
+and returns them in a ``Server-Timing`` response header.
+"""
+
+import bisect
+import math
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from seantral_data_pipeline.timing import Span, profile, totals
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+BYTES_BUCKETS = tuple(1024 * 4**i for i in range(12))  # 1 KiB to 4 GiB
+
+# Request header turning on span collection for one request
+PROFILE_HEADER = b"x-seantral-profile"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative histogram with a fixed set of buckets per label combination."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float],
+        labels: Sequence[str] = (),
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # Label values -> (per-bucket counts with a final +Inf bucket, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {
+                labels: (list(counts), total[0])
+                for labels, (counts, total) in self._series.items()
+            }
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts, strict=True):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """Metrics registry of one API worker process."""
+
+    def __init__(self) -> None:
+        self.request_seconds = Histogram(
+            "seantral_http_request_duration_seconds",
+            "Time from receiving a request to sending the end of its response",
+            LATENCY_BUCKETS,
+            ("method", "route", "status"),
+        )
+        self.query_seconds = Histogram(
+            "seantral_query_duration_seconds",
+            "Time spent in lake queries",
+            LATENCY_BUCKETS,
+            ("query",),
+        )
+        self.query_rows_scanned = Histogram(
+            "seantral_query_rows_scanned",
+            "Parquet rows read by DuckDB per lake query",
+            ROWS_BUCKETS,
+            ("query",),
+        )
+        self.query_bytes_read = Histogram(
+            "seantral_query_bytes_read",
+            "Size of the Parquet files scanned per lake query",
+            BYTES_BUCKETS,
+            ("query",),
+        )
+
+    def observe_span(self, span: Span) -> None:
+        """Span listener recording the per-query histograms."""
+        if not span.name.startswith("query."):
+            return
+        self.query_seconds.observe(span.seconds, span.name)
+        if "rows_scanned" in span.counts:
+            self.query_rows_scanned.observe(span.counts["rows_scanned"], span.name)
+        if "bytes" in span.counts:
+            self.query_bytes_read.observe(span.counts["bytes"], span.name)
+
+    def render(self, gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """All metrics in the Prometheus text exposition format.
+
+        Args:
+            gauges: Groups of current values (e.g. {"result_cache": cache.snapshot()}),
+                    rendered as seantral_<group>_<name>; non-numeric values are skipped
+        """
+        lines: List[str] = []
+        for histogram in (
+            self.request_seconds,
+            self.query_seconds,
+            self.query_rows_scanned,
+            self.query_bytes_read,
+        ):
+            lines.extend(histogram.render())
+        lines.extend(_span_lines(totals().items()))
+        for group, values in (gauges or {}).items():
+            for name, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"seantral_{group}_{name}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _span_lines(items: Iterable[Tuple[str, Any]]) -> List[str]:
+    """Counters of the pipeline spans run by this process, per span name."""
+    families: Dict[str, List[str]] = {}
+    for name, span_totals in sorted(items):
+        label = _labels(("span",), (name,))
+        families.setdefault("calls", []).append(
+            f"seantral_span_calls_total{label} {span_totals.calls}"
+        )
+        families.setdefault("errors", []).append(
+            f"seantral_span_errors_total{label} {span_totals.errors}"
+        )
+        families.setdefault("seconds", []).append(
+            f"seantral_span_seconds_total{label} {_number(span_totals.seconds)}"
+        )
+        for key, value in span_totals.counts.items():
+            families.setdefault(key, []).append(f"seantral_span_{key}_total{label} {value}")
+    lines = []
+    for key, samples in families.items():
+        lines.append(f"# TYPE seantral_span_{key}_total counter")
+        lines.extend(samples)
+    return lines
+
+
+def server_timing(spans: Sequence[Span], total: float) -> bytes:
+    """Server-Timing header value listing the spans of a request, in milliseconds."""
+    entries = [f"total;dur={total * 1000:.2f}"]
+    entries.extend(f"{span.name};dur={span.seconds * 1000:.2f}" for span in spans)
+    return ", ".join(entries).encode("latin-1")
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests per route.
+
+    Written against raw ASGI rather than as an HTTP middleware so streaming
+    responses are passed through untouched and timed until their last chunk.
+    """
+
+    def __init__(self, app: Any, metrics: Metrics, allow_profiling: bool = True):
+        self.app = app
+        self.metrics = metrics
+        self.allow_profiling = allow_profiling
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        begin = time.perf_counter()
+        status = 500
+        profiling = self.allow_profiling and dict(scope["headers"]).get(PROFILE_HEADER) == b"1"
+        spans: List[Span] = []
+
+        async def send_timed(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profiling:
+                    header = server_timing(spans, time.perf_counter() - begin)
+                    headers = [*message.get("headers", []), (b"server-timing", header)]
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            if profiling:
+                with profile() as spans:
+                    await self.app(scope, receive, send_timed)
+            else:
+                await self.app(scope, receive, send_timed)
+        finally:
+            route = scope.get("route")
+            self.metrics.request_seconds.observe(
+                time.perf_counter() - begin,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            )
@@ -2,10 +2,17 @@
 
 import requests
 import json
-from datetime import datetime, timedelta
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
 BASE_URL = "http://localhost:8000"  # Default FastAPI port
 
+# Seconds a fresh worker may take to import the app and answer its first request
+COLD_START_BUDGET = float(os.getenv("SEANTRAL_COLD_START_BUDGET", "2.0"))
+
 def test_root_endpoint():
     """Test the root endpoint."""
     response = requests.get(f"{BASE_URL}/")
@@ -33,12 +40,152 @@ def test_timeseries_endpoint():
     if response.status_code == 200:
         data = response.json()
         print(f"Data points: {len(data['data'])}")
-        print(f"First point: {data['data'][0]}")
-        print(f"Last point: {data['data'][-1]}")
+        if data['data']:
+            print(f"First point: {data['data'][0]}")
+            print(f"Last point: {data['data'][-1]}")
     else:
         print("Error:", response.text)
     print()
 
+def test_timeseries_formats():
+    """Test the columnar and Arrow formats of the timeseries endpoint."""
+    now = datetime.now()
+    params = {
+        "variable": "sst",
+        "lat": 43.25,
+        "lon": -70.5,
+        "start_time": (now - timedelta(days=1)).isoformat(),
+        "end_time": now.isoformat(),
+    }
+    
+    response = requests.get(f"{BASE_URL}/v1/timeseries", params={**params, "format": "columnar"})
+    print("Columnar timeseries response:", response.status_code)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["timestamps"]) == len(data["values"]) == data["metadata"]["count"]
+    print(f"Data points: {len(data['values'])}")
+    
+    response = requests.get(
+        f"{BASE_URL}/v1/timeseries",
+        params=params,
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+    print("Arrow timeseries response:", response.status_code)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    print(f"Arrow stream bytes: {len(response.content)}")
+    print()
+
+def test_cache_stats():
+    """Test that repeated timeseries requests are served from the cache."""
+    before = requests.get(f"{BASE_URL}/v1/cache/stats").json()
+    params = {
+        "variable": "sst",
+        "lat": 43.25,
+        "lon": -70.5,
+        "start_time": "2025-01-01T00:00:00",
+        "end_time": "2025-01-02T00:00:00",
+        "format": "columnar",
+    }
+    for _ in range(3):
+        requests.get(f"{BASE_URL}/v1/timeseries", params=params)
+    after = requests.get(f"{BASE_URL}/v1/cache/stats").json()
+    print("Cache stats:", after)
+    assert after["hits"] - before["hits"] >= 2
+    print()
+
+def test_timeseries_grid():
+    """Test point series interpolated from a gridded field."""
+    params = {
+        "variable": "sst",
+        "lat": 43.25,
+        "lon": -70.5,
+        "start_time": "2025-01-01T00:00:00",
+        "end_time": "2025-12-31T00:00:00",
+        "source": "Copernicus",
+        "format": "columnar",
+    }
+    response = requests.get(f"{BASE_URL}/v1/timeseries", params=params)
+    print("Grid timeseries response:", response.status_code)
+    # 404 until a grid store has been built under the lake
+    assert response.status_code in (200, 404)
+    if response.status_code == 200:
+        data = response.json()
+        assert data["metadata"]["interpolation"] == "bilinear"
+        print(f"Data points: {len(data['values'])}")
+    print()
+
+def test_timeseries_batch():
+    """Test fetching several locations and variables in one request."""
+    body = {
+        "variables": ["sst", "wind_speed"],
+        "locations": [{"lat": 43.25, "lon": -70.5}, {"lat": 34.7, "lon": -72.7}],
+        "start_time": "2025-01-01T00:00:00",
+        "end_time": "2025-01-02T00:00:00",
+        "max_points": 10,
+        "agg": "mean",
+    }
+    response = requests.post(f"{BASE_URL}/v1/timeseries/batch", json=body)
+    print(f"Status code: {response.status_code}")
+    assert response.status_code == 200
+    data = response.json()
+    print("Batch metadata:", data["metadata"])
+    assert len(data["series"]) == 4
+    for series in data["series"]:
+        assert len(series["timestamps"]) == len(series["values"]) <= 10
+    print()
+
+def test_alert_rules():
+    """Test registering a rule and raising an alert from an observation batch."""
+    rule = {
+        "id": "test-rule-sst",
+        "variable": "sst",
+        "threshold": 25.0,
+        "operator": "gt",
+        "duration": None,
+        "location": {"lat": 43.25, "lon": -70.5},
+    }
+    response = requests.post(
+        f"{BASE_URL}/v1/alerts/rules", params={"user_id": "test_user"}, json=rule
+    )
+    print("Create rule response:", response.status_code)
+    assert response.status_code == 200
+    
+    batch = {
+        "timestamp": [datetime.now().isoformat()],
+        "lat": [43.25],
+        "lon": [-70.5],
+        "values": {"water_temperature": [26.0]},
+    }
+    response = requests.post(f"{BASE_URL}/v1/observations", json=batch)
+    print("Observations response:", response.status_code)
+    assert response.status_code == 200
+    print(f"Alerts raised: {len(response.json()['alerts'])}")
+    
+    response = requests.delete(f"{BASE_URL}/v1/alerts/rules/{rule['id']}")
+    assert response.status_code == 200
+    print()
+
+def test_stream_sse():
+    """Test that the SSE stream delivers a pushed observation."""
+    url = f"{BASE_URL}/v1/stream/sse"
+    with requests.get(url, params={"stations": "test-station"}, stream=True, timeout=10) as stream:
+        batch = {
+            "timestamp": [datetime.now().isoformat()],
+            "lat": [43.25],
+            "lon": [-70.5],
+            "buoy_id": ["test-station"],
+            "values": {"water_temperature": [12.5]},
+        }
+        requests.post(f"{BASE_URL}/v1/observations", json=batch)
+        for line in stream.iter_lines():
+            if line.startswith(b"data: "):
+                event = json.loads(line[len(b"data: "):])
+                print("SSE event:", event["type"], event["variable"], event["values"])
+                assert event["station"] == "test-station"
+                break
+    print()
+
 def test_alerts_endpoint():
     """Test the alerts endpoint."""
     params = {
@@ -56,9 +203,214 @@ def test_alerts_endpoint():
         print("Error:", response.text)
     print()
 
+def test_metrics():
+    """Test the Prometheus metrics and the per-request profiling header."""
+    params = {
+        "variable": "sst",
+        "lat": 43.25,
+        "lon": -70.5,
+        "start_time": "2025-01-01T00:00:00",
+        "end_time": "2025-01-02T00:00:00",
+    }
+    response = requests.get(
+        f"{BASE_URL}/v1/timeseries", params=params, headers={"X-Seantral-Profile": "1"}
+    )
+    print("Server-Timing:", response.headers.get("Server-Timing"))
+    assert response.headers["Server-Timing"].startswith("total;dur=")
+    
+    response = requests.get(f"{BASE_URL}/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/v1/timeseries"' in response.text
+    assert "seantral_result_cache_hits" in response.text
+    print()
+
+def test_cold_start():
+    """Test that a fresh process imports the app without heavy modules, within budget."""
+    script = """
+import asyncio, json, sys, time
+begin = time.perf_counter()
+import main
+imported = time.perf_counter()
+heavy = [name for name in ("numpy", "pandas", "pyarrow", "duckdb") if name in sys.modules]
+import httpx
+
+async def first():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return (await client.get("/")).status_code
+
+status = asyncio.run(first())
+print(json.dumps({"import": imported - begin, "total": time.perf_counter() - begin,
+                  "heavy": heavy, "status": status}))
+"""
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    print("Cold start:", result)
+    assert result["heavy"] == []
+    assert result["status"] == 200
+    assert result["total"] < COLD_START_BUDGET
+    print()
+
+def test_hot_store():
+    """Test the hot tier's ring buffers and that ingested batches feed it."""
+    import numpy as np
+    from hot import HotStore
+    
+    store = HotStore(["sst"], window=timedelta(hours=1), interval=timedelta(minutes=10),
+                     started_at=datetime(2025, 1, 1))
+    times = np.datetime64("2025-01-01T00:00", "us") + np.arange(12) * np.timedelta64(10, "m")
+    store.write("44007", "sst", times[:4], np.arange(4.0))
+    held = store.query("44007", "sst", datetime(2025, 1, 1), datetime(2025, 1, 2))
+    assert held is not None and held[1].tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert store.query("44007", "sst", datetime(2024, 12, 31), datetime(2025, 1, 2)) is None
+    
+    # A full ring keeps the newest samples and stops answering ranges it dropped
+    store.write("44007", "sst", times[4:], np.arange(4.0, 12.0))
+    assert store.query("44007", "sst", datetime(2025, 1, 1), datetime(2025, 1, 2)) is None
+    timestamps, values = store.query("44007", "sst", datetime(2025, 1, 1, 1), datetime(2025, 1, 2))
+    assert values.tolist() == [6.0, 7.0, 8.0, 9.0, 10.0, 11.0]
+    assert values.base is not None  # A view of the ring, not a copy
+    
+    # Late and repeated rows are merged in order; a held timestamp keeps its value
+    store.write("44007", "sst", times[[11, 8]], np.array([99.0, 99.0]))
+    assert store.query("44007", "sst", datetime(2025, 1, 1, 1), datetime(2025, 1, 2))[1].tolist() == \
+        [6.0, 7.0, 8.0, 9.0, 10.0, 11.0]
+    assert store.latest("44007", "sst")[1] == 11.0
+    assert store.snapshot()["bytes"] == store.station_bytes
+    
+    # Without a start time, a series only answers once it is seeded from the lake
+    store = HotStore(["sst"], window=timedelta(hours=1), interval=timedelta(minutes=10))
+    store.write("44007", "sst", times[10:], np.array([10.0, 11.0]))
+    assert store.query("44007", "sst", datetime(2025, 1, 1, 1, 40), datetime(2025, 1, 2)) is None
+    assert store.latest("44007", "sst") is None
+    store.seed("44007", "sst", datetime(2025, 1, 1, 1), times[6:11], np.arange(6.0, 11.0))
+    assert store.seeded("44007")
+    assert store.query("44007", "sst", datetime(2025, 1, 1, 1), datetime(2025, 1, 2))[1].tolist() == \
+        [6.0, 7.0, 8.0, 9.0, 10.0, 11.0]
+    # Rows added to the lake without passing through the store call for a new seed
+    assert not store.forget("44007", datetime(2025, 1, 1, 0, 50))
+    assert store.forget("44007", datetime(2025, 1, 1, 1, 50)) and not store.seeded("44007")
+    assert store.query("44007", "sst", datetime(2025, 1, 1, 1), datetime(2025, 1, 2)) is None
+    
+    # Batches posted to the API are held per station
+    before = requests.get(f"{BASE_URL}/v1/cache/stats").json()["hot"]["rows"]
+    now = datetime.now(timezone.utc)
+    batch = {
+        "timestamp": [(now - timedelta(minutes=10)).isoformat(), now.isoformat()],
+        "lat": [43.5, 43.5],
+        "lon": [-70.1, -70.1],
+        "buoy_id": ["hot-station", "hot-station"],
+        "values": {"water_temperature": [12.5, None]},
+    }
+    assert requests.post(f"{BASE_URL}/v1/observations", json=batch).status_code == 200
+    after = requests.get(f"{BASE_URL}/v1/cache/stats").json()["hot"]["rows"]
+    print("Hot tier rows:", before, "->", after)
+    assert after == before + 1
+    print()
+
+def test_cache_coalescing():
+    """Test that callers sharing a load still get its value when the first one is cancelled."""
+    import asyncio
+    from cache import CacheKey, ResultCache
+    
+    async def scenario():
+        cache = ResultCache()
+        key = CacheKey("sst", "44007", datetime(2025, 1, 1), datetime(2025, 1, 2),
+                       None, None, None)
+        release = asyncio.Event()
+        loads = []
+        
+        async def load():
+            loads.append(1)
+            await release.wait()
+            return "series"
+        
+        def get():
+            return asyncio.ensure_future(cache.get_or_load(key, load, lambda _: 100, {"drt"}))
+        
+        leader, follower = get(), get()
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        assert await follower == "series"
+        assert leader.cancelled() and len(loads) == 1
+        assert cache.stats.coalesced == 1 and len(cache) == 1
+    
+    asyncio.run(scenario())
+    print()
+
+def test_lake_changes():
+    """Test that files registered in the lake catalog drop the cached results they affect."""
+    import main
+    from cache import CacheKey, ResultCache
+    from seantral_data_pipeline.storage.catalog import Change
+    
+    main.create_app()
+    main.result_cache = ResultCache()
+    for partition in ("44007", "41001"):
+        key = CacheKey("sst", partition, datetime(2025, 1, 1), datetime(2025, 1, 2),
+                       None, None, None)
+        main.result_cache.put(key, object(), 100, {"drt" if partition == "44007" else "dq2"})
+    
+    # Rows of another time range or partition leave the entries alone
+    main._lake_changed(Change(1, "ndbc", "geohash=drt/part-1.parquet",
+                              datetime(2025, 2, 1), datetime(2025, 2, 2), ["44007"]))
+    assert len(main.result_cache) == 2
+    main._lake_changed(Change(2, "ndbc", "geohash=drt/part-2.parquet",
+                              datetime(2025, 1, 1, 12), datetime(2025, 1, 1, 13), ["44007"]))
+    assert len(main.result_cache) == 1
+    # Files of an unpartitioned dataset may hold rows of any partition
+    main._lake_changed(Change(3, "ndbc", "part-3.parquet",
+                              datetime(2025, 1, 1, 12), datetime(2025, 1, 1, 13), ["41001"]))
+    assert len(main.result_cache) == 0
+    print()
+
+def test_live_endpoints():
+    """Test that the per-worker alert and stream routes can be left out, and must be with workers."""
+    import main
+    
+    main.LIVE_ENDPOINTS = False
+    try:
+        paths = set(main.create_app().openapi()["paths"])
+    finally:
+        main.LIVE_ENDPOINTS = True
+    assert "/v1/timeseries" in paths
+    assert not paths & {"/v1/alerts", "/v1/alerts/rules", "/v1/observations", "/v1/stream/sse"}
+    
+    # Serving several workers refuses to start while those routes are on
+    result = subprocess.run(
+        [sys.executable, "main.py"],
+        cwd=Path(__file__).resolve().parent,
+        env={**os.environ, "SEANTRAL_WORKERS": "2"},
+        capture_output=True,
+        text=True,
+    )
+    print("Several workers:", result.stderr.strip().splitlines()[-1])
+    assert result.returncode != 0 and "SEANTRAL_LIVE_ENDPOINTS=0" in result.stderr
+    print()
+
 if __name__ == "__main__":
     print("Testing API endpoints...")
     test_root_endpoint()
     test_timeseries_endpoint()
+    test_timeseries_formats()
+    test_cache_stats()
+    test_timeseries_grid()
+    test_timeseries_batch()
+    test_alert_rules()
+    test_stream_sse()
     test_alerts_endpoint()
+    test_metrics()
+    test_hot_store()
+    test_cache_coalescing()
+    test_lake_changes()
+    test_live_endpoints()
+    test_cold_start()
     print("API tests completed.") 
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""Compare two benchmark results files.
+
+    python benchmarks/compare.py results/base.json results/head.json --threshold 0.1
+
+Cases are compared by median; the exit status is 1 when any case present in
+both files got slower by more than the threshold, so the script can gate CI.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two Seantral benchmark results")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("head", type=Path)
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Relative slowdown counted as a regression"
+    )
+    args = parser.parse_args(argv)
+
+    base = json.loads(args.base.read_text())
+    head = json.loads(args.head.read_text())
+    if base.get("scale") != head.get("scale") or base.get("seed") != head.get("seed"):
+        print("Warning: the results were generated with different scales or seeds")
+    if base.get("machine") != head.get("machine"):
+        print("Warning: the results come from different machines")
+
+    print(f"{'case':40s} {'base ms':>10s} {'head ms':>10s} {'change':>8s}")
+    regressions = []
+    for name in sorted(set(base["results"]) | set(head["results"])):
+        before = base["results"].get(name)
+        after = head["results"].get(name)
+        if before is None or after is None:
+            print(f"{name:40s} {'only in ' + ('head' if before is None else 'base'):>30s}")
+            continue
+        change = after["median"] / before["median"] - 1 if before["median"] else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -args.threshold:
+            flag = "  improved"
+        print(
+            f"{name:40s} {before['median'] * 1000:10.3f} {after['median'] * 1000:10.3f} "
+            f"{change:+8.1%}{flag}"
+        )
+
+    if regressions:
+        names = ", ".join(regressions)
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {names}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,592 @@
+"""Reproducible benchmarks of the pipeline and the API.
+
+    python benchmarks/run.py                       # medium scale, results/<commit>.json
+    python benchmarks/run.py --scale small --only parse parquet
+    python benchmarks/compare.py results/base.json results/head.json
+
+Inputs are generated from a fixed seed (see synthetic.py) into a temporary
+directory, so runs differ only in the code under test and the machine. The API
+is called in process through httpx's ASGI transport: latencies include routing,
+validation, the query engine and serialization, but no sockets. Only the
+startup cases start fresh interpreters, to time importing the API and its
+first response from a cold process.
+
+Every case reports min, median, p95 and mean seconds over its repetitions and,
+where it processes rows or requests, throughput per second of the median.
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "packages" / "data-pipeline" / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seantral_data_pipeline.noaa.client import NDBCClient  # noqa: E402
+from seantral_data_pipeline.noaa.parser import parse_stdmet  # noqa: E402
+from seantral_data_pipeline.spatial.geohash import PARTITION_PRECISION  # noqa: E402
+from seantral_data_pipeline.storage.catalog import Catalog  # noqa: E402
+from seantral_data_pipeline.storage.layout import RECENT_DIR  # noqa: E402
+from seantral_data_pipeline.storage.parquet import (  # noqa: E402
+    iter_batches,
+    read_from_parquet,
+    read_table,
+    save_to_parquet,
+)
+from seantral_data_pipeline.storage.recent import RecentReader, publish_recent  # noqa: E402
+from seantral_data_pipeline.storage.snapshot import write_snapshot  # noqa: E402
+
+from synthetic import SCALES, Scale, make_stations, write_sst_netcdf, write_stdmet_files  # noqa: E402
+
+# Start of the synthetic data
+START = datetime(2025, 1, 1)
+
+# Groups of cases that can be selected with --only
+GROUPS = ("parse", "parquet", "grid", "api", "startup")
+
+# Run in a fresh interpreter per startup sample; prints the import and first response seconds
+STARTUP_SCRIPT = """
+import asyncio, json, sys, time
+begin = time.perf_counter()
+import main
+imported = time.perf_counter()
+import httpx
+
+async def first():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get("/v1/timeseries", params=json.loads(sys.argv[1]))
+        response.raise_for_status()
+
+asyncio.run(first())
+print(json.dumps({"import": imported - begin, "first_response": time.perf_counter() - imported}))
+"""
+
+# Format version of the results file
+RESULTS_VERSION = 1
+
+
+def summarize(samples: List[float], items: Optional[int] = None) -> Dict[str, Any]:
+    """Statistics of the durations of one case, in seconds."""
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    summary = {
+        "repeat": len(ordered),
+        "min": ordered[0],
+        "median": median,
+        "p95": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "mean": statistics.fmean(ordered),
+    }
+    if items is not None:
+        summary["items"] = items
+        summary["throughput"] = items / median if median > 0 else None
+    return summary
+
+
+def measure(
+    fn: Callable[[], Any], repeat: int, warmup: int = 1, items: Optional[int] = None
+) -> Dict[str, Any]:
+    """Time a callable after warming it up."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - begin)
+    return summarize(samples, items)
+
+
+async def ameasure(
+    fn: Callable[[], Awaitable[Any]],
+    repeat: int,
+    warmup: int = 1,
+    items: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Time a coroutine function after warming it up."""
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - begin)
+    return summarize(samples, items)
+
+
+class Suite:
+    """Generated inputs and the cases run against them."""
+
+    def __init__(self, workdir: Path, scale: Scale, seed: int, repeat: int):
+        self.workdir = workdir
+        self.scale = scale
+        self.seed = seed
+        self.repeat = repeat
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+        self.stations = make_stations(scale.stations, seed)
+        self.raw_dir = workdir / "raw"
+        self.lake = workdir / "lake"
+        self.files = write_stdmet_files(self.raw_dir, self.stations, scale, START, seed)
+        self.frame = self._lake_frame()
+
+    def _lake_frame(self) -> pd.DataFrame:
+        """The parsed files of every station with coordinates, as ingestion writes them."""
+        frames = []
+        for path, station in zip(self.files, self.stations, strict=True):
+            df = parse_stdmet(path, buoy_id=station.station_id).to_pandas()
+            frames.append(df.assign(lat=station.lat, lon=station.lon))
+        return pd.concat(frames, ignore_index=True)
+
+    def record(self, name: str, result: Dict[str, Any]) -> None:
+        self.results[name] = result
+        rate = result.get("throughput")
+        suffix = f"  {rate:,.0f}/s" if rate else ""
+        median, p95 = result["median"] * 1000, result["p95"] * 1000
+        print(f"{name:40s} median {median:9.3f} ms  p95 {p95:9.3f} ms{suffix}")
+
+    def run_parse(self) -> None:
+        client = NDBCClient(output_dir=self.workdir / "ndbc")
+        path = self.files[0]
+        rows = self.scale.rows_per_station
+        self.record(
+            "parse.parse_buoy_data",
+            measure(lambda: client.parse_buoy_data(path), self.repeat, items=rows),
+        )
+        self.record(
+            "parse.parse_stdmet",
+            measure(lambda: parse_stdmet(path, buoy_id="41000"), self.repeat, items=rows),
+        )
+
+    def run_parquet(self) -> None:
+        rows = len(self.frame)
+        single = self.workdir / "parquet" / "single.parquet"
+        partitioned = self.workdir / "parquet" / "partitioned"
+
+        def write_partitioned() -> None:
+            shutil.rmtree(partitioned, ignore_errors=True)
+            catalog, dataset = Catalog.for_dataset(partitioned)
+            catalog.drop(dataset)
+            catalog.close()
+            save_to_parquet(self.frame, partitioned, geohash_precision=PARTITION_PRECISION)
+
+        self.record(
+            "parquet.write_single",
+            measure(lambda: save_to_parquet(self.frame, single), self.repeat, items=rows),
+        )
+        self.record(
+            "parquet.write_partitioned", measure(write_partitioned, self.repeat, items=rows)
+        )
+        self.record(
+            "parquet.read_single",
+            measure(lambda: read_from_parquet(single), self.repeat, items=rows),
+        )
+        self.record(
+            "parquet.read_partitioned",
+            measure(lambda: read_from_parquet(partitioned), self.repeat, items=rows),
+        )
+        self.record(
+            "parquet.read_table_partitioned",
+            measure(lambda: read_table(partitioned), self.repeat, items=rows),
+        )
+        self.record(
+            "parquet.iter_batches_partitioned",
+            measure(
+                lambda: sum(batch.num_rows for batch in iter_batches(partitioned)),
+                self.repeat,
+                items=rows,
+            ),
+        )
+        station = next(iter(self.stations))
+        station_rows = int((self.frame["buoy_id"] == station.station_id).sum())
+        self.record(
+            "parquet.read_partition_filtered",
+            measure(
+                lambda: read_from_parquet(partitioned, filters=[("geohash", "=", station.geohash)]),
+                self.repeat,
+                items=station_rows,
+            ),
+        )
+
+    def build_lake(self) -> None:
+        """The lake the API reads: geohash-partitioned NDBC rows, stations and the SST grid."""
+        save_to_parquet(self.frame, self.lake / "ndbc", geohash_precision=PARTITION_PRECISION)
+        self.stations.save(self.lake / "stations.parquet")
+        self.grid_available = False
+        nc_path = write_sst_netcdf(self.workdir / "sst.nc", self.scale, START, self.seed)
+        if nc_path is not None:
+            from seantral_data_pipeline.copernicus.grid import GRID_DIR, netcdf_to_grid
+
+            netcdf_to_grid(nc_path, self.lake / GRID_DIR / "sst")
+            self.grid_available = True
+        self.nc_path = nc_path
+        write_snapshot(self.lake)
+
+    def run_grid(self) -> None:
+        if self.nc_path is None:
+            print("grid: skipped, netCDF4 is not installed")
+            return
+        from seantral_data_pipeline.copernicus.grid import GridStore, netcdf_to_grid
+
+        store_path = self.workdir / "grid" / "sst"
+        self.record(
+            "grid.build",
+            measure(
+                lambda: netcdf_to_grid(self.nc_path, store_path),
+                max(1, self.repeat // 5),
+                warmup=0,
+                items=self.scale.grid_days * self.scale.grid_lat * self.scale.grid_lon,
+            ),
+        )
+        store = GridStore(store_path)
+        rng = np.random.default_rng(self.seed)
+        points = list(zip(rng.uniform(25.5, 39.5, 64), rng.uniform(-79.5, -65.5, 64), strict=True))
+        end = START + timedelta(days=self.scale.grid_days)
+
+        def queries() -> None:
+            for lat, lon in points:
+                store.point_series("analysed_sst", lat, lon, START, end)
+
+        self.record("grid.point_series", measure(queries, self.repeat, items=len(points)))
+
+    def run_api(self) -> None:
+        asyncio.run(self._run_api())
+
+    async def _run_api(self) -> None:
+        import httpx
+
+        os.environ["SEANTRAL_LAKE_PATH"] = str(self.lake)
+        os.environ.pop("SEANTRAL_STATIONS_PATH", None)
+        os.environ.pop("SEANTRAL_GRIDS_PATH", None)
+        sys.path.insert(0, str(ROOT / "apps" / "api"))
+        import main
+        from cache import ResultCache
+
+        station = next(iter(self.stations))
+        end = START + timedelta(days=self.scale.days)
+        window = {"start_time": START.isoformat(), "end_time": end.isoformat()}
+        point = {"variable": "sst", "lat": station.lat, "lon": station.lon, **window}
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def get(params: Dict[str, Any], path: str = "/v1/timeseries") -> None:
+                response = await client.get(path, params=params)
+                response.raise_for_status()
+
+            # Every request goes to the query engine
+            main.result_cache = ResultCache(max_bytes=0)
+            rows = self.scale.rows_per_station
+            self.record(
+                "api.timeseries_raw", await ameasure(lambda: get(point), self.repeat, items=rows)
+            )
+            columnar = {**point, "format": "columnar"}
+            self.record(
+                "api.timeseries_raw_columnar",
+                await ameasure(lambda: get(columnar), self.repeat, items=rows),
+            )
+            self.record(
+                "api.timeseries_raw_arrow",
+                await ameasure(lambda: get({**point, "format": "arrow"}), self.repeat, items=rows),
+            )
+            self.record(
+                "api.timeseries_minmax",
+                await ameasure(
+                    lambda: get({**point, "max_points": 500, "agg": "minmax"}), self.repeat
+                ),
+            )
+            self.record(
+                "api.timeseries_lttb",
+                await ameasure(lambda: get({**point, "max_points": 500}), self.repeat),
+            )
+            if self.grid_available:
+                # Between stations, so the point is answered from the grid
+                grid_point = {
+                    **point,
+                    "lat": 30.0,
+                    "lon": -72.0,
+                    "max_distance_km": 1.0,
+                    "end_time": (START + timedelta(days=self.scale.grid_days)).isoformat(),
+                }
+                self.record(
+                    "api.timeseries_grid", await ameasure(lambda: get(grid_point), self.repeat)
+                )
+
+            concurrency = 32
+            queries = [
+                {**point, "lat": s.lat, "lon": s.lon, "format": "columnar"} for s in self.stations
+            ]
+
+            async def burst() -> None:
+                await asyncio.gather(
+                    *(get(queries[i % len(queries)]) for i in range(concurrency))
+                )
+
+            self.record(
+                "api.timeseries_concurrent",
+                await ameasure(burst, max(1, self.repeat // 2), items=concurrency),
+            )
+
+            # Repeated queries served by the result cache
+            main.result_cache = ResultCache()
+            self.record("api.timeseries_cached", await ameasure(lambda: get(point), self.repeat))
+
+            await self._run_alerts(client)
+            await self._run_hot(client, station)
+
+    async def _run_hot(self, client: Any, station: Any) -> None:
+        """Recent and latest queries answered by the hot tier, and the same range from the lake."""
+        import main
+        from cache import ResultCache
+        from hot import HotStore
+
+        # The synthetic data is historical, so the hot tier must accept rows from its start
+        main.hot_store = HotStore(list(main.engine.variables), started_at=START)
+        rows = self.frame[self.frame["buoy_id"] == station.station_id]
+        last = rows["timestamp"].max()
+        rows = rows[rows["timestamp"] > last - main.HOT_WINDOW]
+        payload = {
+            "timestamp": [ts.isoformat() for ts in rows["timestamp"]],
+            "lat": rows["lat"].tolist(),
+            "lon": rows["lon"].tolist(),
+            "buoy_id": rows["buoy_id"].astype(str).tolist(),
+            "values": {
+                "water_temperature": [
+                    None if pd.isna(v) else float(v) for v in rows["water_temperature"]
+                ],
+            },
+        }
+        response = await client.post("/v1/observations", json=payload)
+        response.raise_for_status()
+
+        recent = {
+            "variable": "sst",
+            "lat": station.lat,
+            "lon": station.lon,
+            "start_time": (last - timedelta(hours=48)).isoformat(),
+            "end_time": last.isoformat(),
+            "format": "columnar",
+        }
+        items = int((rows["timestamp"] >= last - timedelta(hours=48)).sum())
+
+        async def get(params: Dict[str, Any], path: str = "/v1/timeseries") -> None:
+            response = await client.get(path, params=params)
+            response.raise_for_status()
+
+        self.record(
+            "api.timeseries_hot", await ameasure(lambda: get(recent), self.repeat, items=items)
+        )
+        latest = {"lat": station.lat, "lon": station.lon, "variables": "sst"}
+        self.record(
+            "api.latest_hot", await ameasure(lambda: get(latest, "/v1/latest"), self.repeat)
+        )
+
+        # The same ranges from the series the pipeline publishes for all workers
+        output = self.lake / RECENT_DIR
+        self.record(
+            "recent.publish",
+            measure(
+                lambda: publish_recent(self.lake, output, since=last - main.HOT_WINDOW),
+                max(1, self.repeat // 4),
+            ),
+        )
+        main.hot_store = RecentReader(output)
+        self.record(
+            "api.timeseries_recent_mapped",
+            await ameasure(lambda: get(recent), self.repeat, items=items),
+        )
+
+        main.hot_store = None
+        main.result_cache = ResultCache(max_bytes=0)
+        self.record(
+            "api.timeseries_recent_lake",
+            await ameasure(lambda: get(recent), self.repeat, items=items),
+        )
+
+    def run_startup(self) -> None:
+        """Import time of the API and its first time series response, in fresh processes."""
+        station = next(iter(self.stations))
+        params = {
+            "variable": "sst",
+            "lat": station.lat,
+            "lon": station.lon,
+            "start_time": START.isoformat(),
+            "end_time": (START + timedelta(days=self.scale.days)).isoformat(),
+        }
+        env = {
+            **os.environ,
+            "SEANTRAL_LAKE_PATH": str(self.lake),
+            "PYTHONPATH": os.pathsep.join(
+                [str(ROOT / "packages" / "data-pipeline" / "src"), os.environ.get("PYTHONPATH", "")]
+            ),
+        }
+        env.pop("SEANTRAL_STATIONS_PATH", None)
+        env.pop("SEANTRAL_GRIDS_PATH", None)
+        samples: Dict[str, List[float]] = {"import": [], "first_response": [], "total": []}
+        for _ in range(max(1, self.repeat // 4)):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT, json.dumps(params)],
+                cwd=ROOT / "apps" / "api",
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            timings = json.loads(output.strip().splitlines()[-1])
+            samples["import"].append(timings["import"])
+            samples["first_response"].append(timings["first_response"])
+            samples["total"].append(timings["import"] + timings["first_response"])
+        for name, values in samples.items():
+            self.record(f"startup.{name}", summarize(values))
+
+    async def _run_alerts(self, client: Any) -> None:
+        """Rule evaluation on ingested batches and alert listing."""
+        rules = 100
+        for i, station in enumerate(self.stations):
+            for j in range(rules // len(self.stations) + 1):
+                response = await client.post(
+                    "/v1/alerts/rules",
+                    params={"user_id": f"user-{j % 10}"},
+                    json={
+                        "id": f"bench-{i}-{j}",
+                        "variable": "sst",
+                        "threshold": 14.0 + j * 0.1,
+                        "operator": "gt",
+                        "location": {"lat": station.lat, "lon": station.lon},
+                    },
+                )
+                response.raise_for_status()
+
+        # One hour of every station per batch
+        per_station = 60 // self.scale.interval_minutes
+        batch = self.frame.groupby("buoy_id", sort=False).head(per_station)
+        payload = {
+            "timestamp": [ts.isoformat() for ts in batch["timestamp"]],
+            "lat": batch["lat"].tolist(),
+            "lon": batch["lon"].tolist(),
+            "buoy_id": batch["buoy_id"].tolist(),
+            "values": {
+                "water_temperature": [
+                    None if pd.isna(v) else float(v) for v in batch["water_temperature"]
+                ],
+            },
+        }
+
+        async def post() -> None:
+            response = await client.post("/v1/observations", json=payload)
+            response.raise_for_status()
+
+        self.record(
+            "api.observations_alerts", await ameasure(post, self.repeat, items=len(batch))
+        )
+
+        async def alerts() -> None:
+            response = await client.get("/v1/alerts", params={"user_id": "user-0"})
+            response.raise_for_status()
+
+        self.record("api.alerts_list", await ameasure(alerts, self.repeat))
+
+
+def git_commit() -> Dict[str, Any]:
+    """Commit of the tree under test and whether it has uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=ROOT,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the Seantral benchmarks")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions per case")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, help="Groups of cases to run")
+    parser.add_argument("--output", type=Path, help="Results file (default: results/<commit>.json)")
+    parser.add_argument("--keep", type=Path, help="Keep the generated data in this directory")
+    args = parser.parse_args(argv)
+
+    # Benchmarks would otherwise measure log formatting
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    groups = args.only or GROUPS
+    scale = SCALES[args.scale]
+    workdir = args.keep or Path(tempfile.mkdtemp(prefix="seantral-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    try:
+        suite = Suite(workdir, scale, args.seed, args.repeat)
+        if "parse" in groups:
+            suite.run_parse()
+        if "parquet" in groups:
+            suite.run_parquet()
+        if "grid" in groups or "api" in groups or "startup" in groups:
+            suite.build_lake()
+        if "grid" in groups:
+            suite.run_grid()
+        if "startup" in groups:
+            suite.run_startup()
+        if "api" in groups:
+            suite.run_api()
+    finally:
+        if args.keep is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    revision = git_commit()
+    name = (revision["commit"] or "unknown")[:12]
+    output = args.output or Path(__file__).resolve().parent / "results" / f"{name}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps(
+            {
+                "version": RESULTS_VERSION,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                **revision,
+                "machine": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "processor": platform.machine(),
+                    "cpus": os.cpu_count(),
+                },
+                "scale": {"name": args.scale, **dataclasses.asdict(scale)},
+                "seed": args.seed,
+                "results": suite.results,
+            },
+            indent=2,
+        )
+    )
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Deterministic synthetic NDBC buoy files and gridded SST fields.
+
+Everything is drawn from a seeded generator, so the same scale and seed give
+byte-identical inputs on every machine and every commit.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from seantral_data_pipeline.spatial.stations import Station, StationRegistry
+
+STDMET_HEADER = (
+    "#YY  MM DD hh mm WDIR WSPD GST  WVHT   DPD   APD MWD   PRES  ATMP  WTMP  DEWP  VIS"
+    " PTDY  TIDE\n"
+    "#yr  mo dy hr mn degT m/s  m/s     m   sec   sec degT   hPa  degC  degC  degC  nmi"
+    "  hPa    ft\n"
+)
+
+# Column formats of a stdmet row after the date, with NDBC's fill values
+_FORMATS = (
+    ("{:3.0f}", "999"),  # WDIR
+    ("{:4.1f}", "99.0"),  # WSPD
+    ("{:4.1f}", "99.0"),  # GST
+    ("{:5.2f}", "99.00"),  # WVHT
+    ("{:5.2f}", "99.00"),  # DPD
+    ("{:5.2f}", "99.00"),  # APD
+    ("{:3.0f}", "999"),  # MWD
+    ("{:6.1f}", "9999.0"),  # PRES
+    ("{:5.1f}", "999.0"),  # ATMP
+    ("{:5.1f}", "999.0"),  # WTMP
+    ("{:5.1f}", "999.0"),  # DEWP
+    ("{:4.1f}", "99.0"),  # VIS
+    ("{:+4.1f}", "99.0"),  # PTDY
+    ("{:5.2f}", "99.00"),  # TIDE
+)
+
+
+@dataclass(frozen=True)
+class Scale:
+    """Size of a synthetic data set."""
+
+    stations: int = 20
+    days: int = 30
+    interval_minutes: int = 10
+    grid_days: int = 365
+    grid_lat: int = 200
+    grid_lon: int = 200
+
+    @property
+    def rows_per_station(self) -> int:
+        return self.days * 24 * 60 // self.interval_minutes
+
+
+SCALES = {
+    "small": Scale(stations=5, days=7, grid_days=30, grid_lat=50, grid_lon=50),
+    "medium": Scale(),
+    "large": Scale(stations=200, days=90, grid_days=730, grid_lat=720, grid_lon=1440),
+}
+
+
+def make_stations(count: int, seed: int = 0) -> StationRegistry:
+    """Stations scattered over the US East and Gulf coasts."""
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(25.0, 45.0, count)
+    lons = rng.uniform(-80.0, -65.0, count)
+    return StationRegistry(
+        Station(f"{41000 + i}", round(float(lat), 3), round(float(lon), 3))
+        for i, (lat, lon) in enumerate(zip(lats, lons, strict=True))
+    )
+
+
+def stdmet_text(
+    start: datetime,
+    rows: int,
+    interval_minutes: int = 10,
+    seed: int = 0,
+    missing: float = 0.02,
+) -> str:
+    """An NDBC stdmet realtime-style file with seasonal and diurnal cycles.
+
+    A fraction of values is replaced by "MM" or a numeric fill value, as in
+    real files, and rows are written newest first like NDBC's realtime files.
+
+    Args:
+        start: Timestamp of the oldest row
+        rows: Number of rows
+        interval_minutes: Minutes between rows
+        seed: Seed of the generator
+        missing: Fraction of missing values
+
+    Returns:
+        File contents
+    """
+    rng = np.random.default_rng(seed)
+    hours = np.arange(rows) * interval_minutes / 60.0
+    diurnal = np.sin(2 * np.pi * hours / 24.0)
+    values = np.column_stack(
+        [
+            rng.uniform(0, 360, rows),
+            np.abs(6 + 3 * diurnal + rng.normal(0, 1.5, rows)),
+            np.abs(8 + 4 * diurnal + rng.normal(0, 2.0, rows)),
+            np.abs(1.2 + 0.4 * diurnal + rng.normal(0, 0.2, rows)),
+            np.abs(8 + rng.normal(0, 1.0, rows)),
+            np.abs(5.5 + rng.normal(0, 0.5, rows)),
+            rng.uniform(0, 360, rows),
+            1013 + 5 * np.sin(2 * np.pi * hours / 120.0) + rng.normal(0, 0.5, rows),
+            12 + 4 * diurnal + rng.normal(0, 0.5, rows),
+            14 + 1 * diurnal + rng.normal(0, 0.2, rows),
+            8 + 2 * diurnal + rng.normal(0, 0.5, rows),
+            np.abs(10 + rng.normal(0, 2.0, rows)),
+            rng.normal(0, 1.0, rows),
+            np.abs(rng.normal(0, 1.0, rows)),
+        ]
+    )
+    gaps = rng.random(values.shape) < missing
+    filled = rng.random(values.shape) < 0.5
+
+    lines = [STDMET_HEADER]
+    step = timedelta(minutes=interval_minutes)
+    for i in range(rows - 1, -1, -1):
+        ts = start + i * step
+        cells = [f"{ts:%Y %m %d %H %M}"]
+        for j, (fmt, fill) in enumerate(_FORMATS):
+            if gaps[i, j]:
+                cells.append(fill if filled[i, j] else "MM")
+            else:
+                cells.append(fmt.format(values[i, j]))
+        lines.append(" ".join(cells) + "\n")
+    return "".join(lines)
+
+
+def write_stdmet_files(
+    directory: Path,
+    stations: StationRegistry,
+    scale: Scale,
+    start: datetime = datetime(2025, 1, 1),
+    seed: int = 0,
+) -> List[Path]:
+    """One stdmet file per station, named like NDBCClient downloads."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, station in enumerate(stations):
+        path = directory / f"{station.station_id}_stdmet_{start.year}_{start.month:02d}.txt"
+        path.write_text(
+            stdmet_text(start, scale.rows_per_station, scale.interval_minutes, seed=seed + i)
+        )
+        paths.append(path)
+    return paths
+
+
+def write_sst_netcdf(
+    path: Path,
+    scale: Scale,
+    start: datetime = datetime(2025, 1, 1),
+    seed: int = 0,
+) -> Optional[Path]:
+    """A daily global-style SST analysis over the stations' region, in kelvin.
+
+    Returns None when netCDF4 is not installed.
+    """
+    try:
+        import netCDF4
+    except ImportError:
+        return None
+
+    rng = np.random.default_rng(seed)
+    lats = np.linspace(25.0, 45.0, scale.grid_lat)
+    lons = np.linspace(-80.0, -65.0, scale.grid_lon)
+    base = 300.0 - 0.6 * (lats[:, None] - 25.0) + 0.02 * (lons[None, :] + 80.0)
+    # Land in the north-west corner
+    land = (lats[:, None] > 40.0) & (lons[None, :] < -75.0)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with netCDF4.Dataset(path, "w") as ds:
+        ds.createDimension("time", scale.grid_days)
+        ds.createDimension("lat", scale.grid_lat)
+        ds.createDimension("lon", scale.grid_lon)
+        time = ds.createVariable("time", "f8", ("time",))
+        time.units = f"days since {start:%Y-%m-%d %H:%M:%S}"
+        time[:] = np.arange(scale.grid_days)
+        ds.createVariable("lat", "f4", ("lat",))[:] = lats
+        ds.createVariable("lon", "f4", ("lon",))[:] = lons
+        sst = ds.createVariable(
+            "analysed_sst", "f4", ("time", "lat", "lon"), fill_value=-32768.0
+        )
+        sst.units = "kelvin"
+        for t in range(scale.grid_days):
+            season = 3.0 * np.sin(2 * np.pi * t / 365.0)
+            field = base + season + rng.normal(0, 0.1, base.shape)
+            sst[t] = np.where(land, -32768.0, field).astype(np.float32)
+    return path
@@ -0,0 +1 @@
+"""Alert rule evaluation over ingested observations."""
@@ -0,0 +1,451 @@
+"""Incremental, vectorized evaluation of threshold alert rules.
+
+A rule watches either one station or every station within a radius of its
+location. Rules are compiled into flat NumPy arrays and indexed by variable
+and by the geohash cells their radius overlaps (or by station), so a batch of
+observations is matched to candidate rules with a few array lookups instead of
+a loop over rules, and the candidates are then filtered by exact distance.
+Duration conditions ("above 25 °C for 60 minutes") are tracked with two
+numbers per rule and station carried from batch to batch, so history never
+has to be re-scanned and one station's readings never advance or resolve
+another station's alert.
+"""
+
+import itertools
+import math
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from seantral_data_pipeline.query.engine import VARIABLES
+from seantral_data_pipeline.spatial.geohash import bbox, encode, encode_many
+from seantral_data_pipeline.spatial.index import EARTH_RADIUS_KM, _unit_vectors, km_to_chord
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+OPERATORS = ("gt", "lt", "eq", "gte", "lte")
+
+# Precision of the cells rules are indexed by (~39 x 20 km)
+CELL_PRECISION = 4
+
+# Default distance from a rule's location within which stations are watched
+RADIUS_KM = 25.0
+
+# Largest radius a rule may watch, which bounds the cells it is indexed under
+MAX_RADIUS_KM = 500.0
+
+_NOT_SINCE = np.iinfo(np.int64).min
+
+# State of a rule at one station: (rule id, station id or None)
+_Track = Tuple[str, Optional[str]]
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A threshold condition on a variable near a location or at one station."""
+
+    id: str
+    variable: str
+    operator: str
+    threshold: float
+    lat: float
+    lon: float
+    duration: Optional[int] = None  # Minutes the condition must hold
+    user_id: str = ""
+    active: bool = True
+    radius_km: float = RADIUS_KM  # Stations watched around lat/lon
+    station: Optional[str] = None  # Only watch this station instead
+
+    def __post_init__(self) -> None:
+        if self.operator not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {self.operator}")
+        if not 0 < self.radius_km <= MAX_RADIUS_KM:
+            raise ValueError(f"Radius must be in (0, {MAX_RADIUS_KM:g}] km")
+
+
+@dataclass
+class Alert:
+    """An alert raised by a rule."""
+
+    id: str
+    rule: Rule
+    triggered_at: datetime
+    value: float
+    status: str = "active"
+    station: Optional[str] = None
+    resolved_at: Optional[datetime] = None
+
+
+@dataclass
+class _RuleIndex:
+    """Rules of one variable, sorted by a key (a cell or a station)."""
+
+    keys: np.ndarray  # Sorted unique keys
+    starts: np.ndarray  # Offset of each key's rules in positions
+    positions: np.ndarray  # Rule positions grouped by key
+
+    @classmethod
+    def build(cls, keys: np.ndarray, positions: np.ndarray) -> "_RuleIndex":
+        order = np.argsort(keys, kind="stable")
+        unique, starts = np.unique(keys[order], return_index=True)
+        return cls(unique, starts, positions[order])
+
+    def expand(self, keys: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Pair each row with every rule indexed under the row's key.
+
+        Returns:
+            Tuple of (row, rule position) arrays, one entry per pair
+        """
+        slot = np.searchsorted(self.keys, keys[rows])
+        slot = np.minimum(slot, len(self.keys) - 1)
+        hit = self.keys[slot] == keys[rows]
+        rows, slot = rows[hit], slot[hit]
+        starts = self.starts[slot]
+        stops = np.append(self.starts[1:], len(self.positions))[slot]
+
+        counts = stops - starts
+        pair_rows = np.repeat(rows, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return pair_rows, self.positions[np.repeat(starts, counts) + offsets]
+
+
+@dataclass
+class _CompiledRules:
+    """Columnar copy of the active rules."""
+
+    rules: List[Rule]
+    operator: np.ndarray
+    threshold: np.ndarray
+    duration: np.ndarray  # Nanoseconds
+    xyz: np.ndarray  # Unit vector of each rule's location
+    reach: np.ndarray  # Squared chord length of each rule's radius
+    by_cell: Dict[str, _RuleIndex] = field(default_factory=dict)
+    by_station: Dict[str, _RuleIndex] = field(default_factory=dict)
+
+
+class AlertEngine:
+    """Evaluates every active rule against each batch of new observations.
+
+    Per rule and station the engine keeps when the condition started to hold
+    continuously (``since``) and whether it is currently firing. An alert is
+    raised when a condition has held at a station for the rule's duration and
+    resolved on the first observation of that station that breaks it.
+    """
+
+    def __init__(
+        self,
+        columns: Optional[Dict[str, str]] = None,
+        cell_precision: int = CELL_PRECISION,
+        history: int = 10000,
+    ):
+        """Initialize the alert engine.
+
+        Args:
+            columns: Variable names mapped to the batch columns holding them
+                     (defaults to the lake columns of the query engine registry)
+            cell_precision: Geohash precision of the cells rules are indexed by
+            history: Number of alerts kept for lookups
+        """
+        self.columns = columns or {name: spec.column for name, spec in VARIABLES.items()}
+        self.cell_precision = cell_precision
+
+        self._rules: Dict[str, Rule] = {}
+        self._compiled: Optional[_CompiledRules] = None
+        # Per rule id, so that replacing a rule only touches the stations it watched
+        self._since: Dict[str, Dict[Optional[str], int]] = {}
+        self._firing: Dict[str, Dict[Optional[str], Alert]] = {}
+        self._alerts: Deque[Alert] = deque(maxlen=history)
+        self._ids = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def __iter__(self) -> Iterator[Rule]:
+        return iter(self._rules.values())
+
+    def add_rule(self, rule: Rule) -> None:
+        """Register or replace a rule; the open alerts of a replaced rule are resolved."""
+        if rule.variable not in self.columns:
+            raise KeyError(f"Unsupported variable: {rule.variable}")
+        self._forget(rule.id)
+        self._rules[rule.id] = rule
+        self._compiled = None
+
+    def remove_rule(self, rule_id: str) -> None:
+        """Unregister a rule; its open alerts are resolved."""
+        self._forget(rule_id)
+        self._rules.pop(rule_id, None)
+        self._compiled = None
+
+    def _forget(self, rule_id: str) -> None:
+        """Drop the state of a rule at every station and resolve its open alerts."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        self._since.pop(rule_id, None)
+        for alert in self._firing.pop(rule_id, {}).values():
+            alert.status = "resolved"
+            alert.resolved_at = now
+
+    def get_rule(self, rule_id: str) -> Optional[Rule]:
+        """Return a rule by id, or None if it is not registered."""
+        return self._rules.get(rule_id)
+
+    def alerts(
+        self,
+        user_id: Optional[str] = None,
+        status: Optional[str] = None,
+    ) -> List[Alert]:
+        """Return recent alerts, newest first.
+
+        Args:
+            user_id: Only alerts of this user's rules
+            status: Only alerts with this status
+
+        Returns:
+            List of alerts
+        """
+        return [
+            alert
+            for alert in reversed(self._alerts)
+            if (user_id is None or alert.rule.user_id == user_id)
+            and (status is None or alert.status == status)
+        ]
+
+    def _compile(self) -> _CompiledRules:
+        """Build the columnar rule arrays and the variable/cell/station indexes."""
+        if self._compiled is not None:
+            return self._compiled
+
+        rules = [rule for rule in self._rules.values() if rule.active]
+        compiled = _CompiledRules(
+            rules=rules,
+            operator=np.array([OPERATORS.index(r.operator) for r in rules], dtype=np.int8),
+            threshold=np.array([r.threshold for r in rules], dtype=np.float64),
+            duration=np.array(
+                [(r.duration or 0) * 60 * 1_000_000_000 for r in rules], dtype=np.int64
+            ),
+            xyz=_unit_vectors(
+                np.array([r.lat for r in rules], dtype=np.float64),
+                np.array([r.lon for r in rules], dtype=np.float64),
+            ),
+            reach=np.array([km_to_chord(r.radius_km) for r in rules], dtype=np.float64),
+        )
+        variables = np.array([r.variable for r in rules], dtype=object)
+        for variable in set(variables.tolist()):
+            positions = np.flatnonzero(variables == variable)
+            cells: List[str] = []
+            near: List[int] = []
+            at_station: List[int] = []
+            for position in positions.tolist():
+                rule = rules[position]
+                if rule.station is not None:
+                    at_station.append(position)
+                    continue
+                covered = self._cover(rule)
+                cells += covered
+                near += [position] * len(covered)
+            if near:
+                compiled.by_cell[variable] = _RuleIndex.build(
+                    np.array(cells, dtype=f"U{self.cell_precision}"), np.array(near)
+                )
+            if at_station:
+                compiled.by_station[variable] = _RuleIndex.build(
+                    np.array([rules[p].station for p in at_station], dtype=str),
+                    np.array(at_station),
+                )
+
+        self._compiled = compiled
+        logger.debug(f"Compiled {len(rules)} alert rules")
+        return compiled
+
+    def _cover(self, rule: Rule) -> List[str]:
+        """Cells that overlap the bounding box of a rule's radius."""
+        min_lat, max_lat, min_lon, max_lon = bbox(encode(rule.lat, rule.lon, self.cell_precision))
+        height, width = max_lat - min_lat, max_lon - min_lon
+        dlat = math.degrees(rule.radius_km / EARTH_RADIUS_KM)
+        dlon = min(180.0, dlat / max(math.cos(math.radians(rule.lat)), 1e-9))
+        # Steps no larger than a cell, plus the far edge, sample every cell in the box
+        lats = np.append(np.arange(rule.lat - dlat, rule.lat + dlat, height), rule.lat + dlat)
+        lons = np.append(np.arange(rule.lon - dlon, rule.lon + dlon, width), rule.lon + dlon)
+        lats = np.clip(lats, -90.0, 90.0)
+        lons = (lons + 180.0) % 360.0 - 180.0
+        grid_lats, grid_lons = np.meshgrid(lats, lons, indexing="ij")
+        cells = encode_many(grid_lats.ravel(), grid_lons.ravel(), self.cell_precision)
+        return np.unique(cells).tolist()
+
+    def evaluate(self, batch: "pd.DataFrame") -> List[Alert]:
+        """Evaluate the active rules against a batch of observations.
+
+        Args:
+            batch: Observations with timestamp, lat and lon columns, one column
+                   per measured variable and optionally a buoy_id column
+                   (without it, rules bound to a station never match and all
+                   rows count as one station)
+
+        Returns:
+            Alerts raised or resolved by this batch
+        """
+        compiled = self._compile()
+        if not compiled.rules or batch.empty:
+            return []
+
+        import pandas as pd
+
+        timestamps = (
+            pd.to_datetime(batch["timestamp"]).to_numpy().astype("datetime64[ns]").astype(np.int64)
+        )
+        lats = batch["lat"].to_numpy(np.float64)
+        lons = batch["lon"].to_numpy(np.float64)
+        cells = encode_many(lats, lons, self.cell_precision)
+        xyz = _unit_vectors(lats, lons)
+        stations = batch["buoy_id"].to_numpy().astype(str) if "buoy_id" in batch else None
+
+        changed: List[Alert] = []
+        for variable in set(compiled.by_cell) | set(compiled.by_station):
+            column = self.columns[variable]
+            if column not in batch:
+                continue
+            values = batch[column].to_numpy(np.float64, na_value=np.nan)
+            rows = np.flatnonzero(~np.isnan(values))
+            if len(rows) == 0:
+                continue
+
+            # Rows paired with the rules indexed under their cell, kept when the
+            # station is within the rule's radius
+            pair_rows, pair_rules = np.empty(0, np.int64), np.empty(0, np.int64)
+            if variable in compiled.by_cell:
+                pair_rows, pair_rules = compiled.by_cell[variable].expand(cells, rows)
+                chord = np.sum((xyz[pair_rows] - compiled.xyz[pair_rules]) ** 2, axis=1)
+                near = chord <= compiled.reach[pair_rules]
+                pair_rows, pair_rules = pair_rows[near], pair_rules[near]
+            if variable in compiled.by_station and stations is not None:
+                station_rows, station_rules = compiled.by_station[variable].expand(stations, rows)
+                pair_rows = np.concatenate([pair_rows, station_rows])
+                pair_rules = np.concatenate([pair_rules, station_rules])
+            if len(pair_rows) == 0:
+                continue
+
+            changed.extend(
+                self._advance(
+                    compiled,
+                    pair_rules,
+                    timestamps[pair_rows],
+                    values[pair_rows],
+                    stations[pair_rows] if stations is not None else None,
+                )
+            )
+
+        # An alert raised and resolved within the batch is reported once
+        changed = list({alert.id: alert for alert in changed}.values())
+        if changed:
+            logger.info(f"Alert batch raised/resolved {len(changed)} alerts")
+        return changed
+
+    def _advance(
+        self,
+        compiled: _CompiledRules,
+        rules: np.ndarray,
+        times: np.ndarray,
+        values: np.ndarray,
+        stations: Optional[np.ndarray],
+    ) -> List[Alert]:
+        """Run the duration state machine for (rule, observation) pairs."""
+        # One track per rule and station; all rows count as one station without ids
+        if stations is None:
+            names = np.array([None], dtype=object)
+            codes = np.zeros(len(rules), dtype=np.int64)
+        else:
+            names, codes = np.unique(stations, return_inverse=True)
+        track = rules.astype(np.int64) * len(names) + codes
+
+        order = np.lexsort((times, track))
+        rules, times, values, track = rules[order], times[order], values[order], track[order]
+        tracks, inverse = np.unique(track, return_inverse=True)
+        keys: List[_Track] = [
+            (
+                compiled.rules[t // len(names)].id,
+                None if stations is None else str(names[t % len(names)]),
+            )
+            for t in tracks.tolist()
+        ]
+
+        threshold = compiled.threshold[rules]
+        operator = compiled.operator[rules]
+        condition = np.select(
+            [operator == i for i in range(len(OPERATORS))],
+            [
+                values > threshold,
+                values < threshold,
+                np.isclose(values, threshold),
+                values >= threshold,
+                values <= threshold,
+            ],
+        )
+
+        n = len(rules)
+        first = np.ones(n, dtype=bool)
+        first[1:] = track[1:] != track[:-1]
+        last = np.ones(n, dtype=bool)
+        last[:-1] = first[1:]
+
+        # State carried over from the previous batch
+        carried_since = np.array(
+            [self._since.get(rule, {}).get(station, _NOT_SINCE) for rule, station in keys],
+            dtype=np.int64,
+        )[inverse]
+        carried_firing = np.array(
+            [station in self._firing.get(rule, {}) for rule, station in keys], dtype=bool
+        )[inverse]
+
+        # A run of true conditions starts at a true pair that follows a false one
+        # or opens the track's segment; a run open at the end of the last batch
+        # keeps its original start time
+        previous = np.concatenate([[False], condition[:-1]]) & ~first
+        run_start = condition & ~previous
+        start_time = np.where(
+            first & condition & (carried_since != _NOT_SINCE),
+            carried_since,
+            times,
+        )
+        run_index = np.maximum.accumulate(np.where(run_start, np.arange(n), 0))
+        since = np.where(condition, start_time[run_index], _NOT_SINCE)
+        held = condition & (times - since >= compiled.duration[rules])
+
+        was_held = np.concatenate([[False], held[:-1]])
+        was_held = np.where(first, carried_firing, was_held)
+        triggered = np.flatnonzero(held & ~was_held)
+        resolved = np.flatnonzero(~held & was_held)
+
+        # Events of a track must be applied in time order
+        changed: List[Alert] = []
+        events = np.sort(np.concatenate([triggered, resolved]))
+        moments = times[events].astype("datetime64[ns]").astype("datetime64[us]").tolist()
+        for i, when in zip(events, moments, strict=True):
+            key = keys[inverse[i]]
+            if held[i]:
+                alert = Alert(
+                    id=f"alert-{next(self._ids):06d}",
+                    rule=compiled.rules[rules[i]],
+                    triggered_at=when,
+                    value=float(values[i]),
+                    station=key[1],
+                )
+                self._firing.setdefault(key[0], {})[key[1]] = alert
+                self._alerts.append(alert)
+            else:
+                alert = self._firing[key[0]].pop(key[1])
+                alert.status = "resolved"
+                alert.resolved_at = when
+            changed.append(alert)
+
+        for i in np.flatnonzero(last).tolist():
+            key = keys[inverse[i]]
+            if since[i] != _NOT_SINCE:
+                self._since.setdefault(key[0], {})[key[1]] = int(since[i])
+            else:
+                self._since.get(key[0], {}).pop(key[1], None)
+        return changed
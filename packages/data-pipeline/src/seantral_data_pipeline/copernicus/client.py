@@ -11,6 +11,11 @@ import pandas as pd
 import numpy as np
 from loguru import logger
 
+from seantral_data_pipeline.copernicus.convert import netcdf_to_parquet
+from seantral_data_pipeline.copernicus.download import TiledDownload
+from seantral_data_pipeline.copernicus.grid import netcdf_to_grid
+from seantral_data_pipeline.timing import span
+
 class CopernicusClient:
     """Client for downloading data from Copernicus Marine Service."""
     
@@ -19,6 +24,7 @@ class CopernicusClient:
         username: str,
         password: str,
         output_dir: Optional[Path] = None,
+        executable: str = "motuclient",
     ):
         """Initialize Copernicus client.
         
@@ -26,20 +32,64 @@ class CopernicusClient:
             username: Copernicus username
             password: Copernicus password
             output_dir: Directory for downloaded files
+            executable: motuclient command or path to it
         """
         self.username = username
         self.password = password
         self.output_dir = output_dir or Path(tempfile.gettempdir()) / "copernicus"
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.executable = executable
         
         # Check if motuclient is available
         try:
-            subprocess.run(["motuclient", "--version"], capture_output=True, check=True)
+            subprocess.run([self.executable, "--version"], capture_output=True, check=True)
             logger.info("Found motuclient")
         except (subprocess.SubprocessError, FileNotFoundError):
             logger.error("motuclient not found. Please install it with: pip install motuclient")
             raise RuntimeError("motuclient not found")
     
+    def build_command(
+        self,
+        dataset_id: str,
+        product_id: str,
+        variables: List[str],
+        start_date: datetime,
+        end_date: datetime,
+        min_lon: float,
+        max_lon: float,
+        min_lat: float,
+        max_lat: float,
+        out_dir: Path,
+        out_name: str,
+    ) -> List[str]:
+        """Build the motuclient command line for one subset request.
+        
+        Returns:
+            Command as a list of arguments
+        """
+        cmd = [
+            self.executable,
+            "--quiet",
+            "--user", self.username,
+            "--pwd", self.password,
+            "--motu", f"https://my.cmems-du.eu/motu-web/Motu",
+            "--service-id", dataset_id,
+            "--product-id", product_id,
+            "--longitude-min", str(min_lon),
+            "--longitude-max", str(max_lon),
+            "--latitude-min", str(min_lat),
+            "--latitude-max", str(max_lat),
+            "--date-min", start_date.strftime("%Y-%m-%d %H:%M:%S"),
+            "--date-max", end_date.strftime("%Y-%m-%d %H:%M:%S"),
+            "--out-dir", str(out_dir),
+            "--out-name", out_name,
+        ]
+        
+        # Add variables
+        for var in variables:
+            cmd.extend(["--variable", var])
+        return cmd
+    
     def download_data(
         self,
         dataset_id: str,
@@ -75,43 +125,68 @@ class CopernicusClient:
         
         output_file = self.output_dir / output_filename
         
-        # Build motuclient command
-        cmd = [
-            "motuclient",
-            "--quiet",
-            "--user", self.username,
-            "--pwd", self.password,
-            "--motu", f"https://my.cmems-du.eu/motu-web/Motu",
-            "--service-id", dataset_id,
-            "--product-id", product_id,
-            "--longitude-min", str(min_lon),
-            "--longitude-max", str(max_lon),
-            "--latitude-min", str(min_lat),
-            "--latitude-max", str(max_lat),
-            "--date-min", start_date.strftime("%Y-%m-%d %H:%M:%S"),
-            "--date-max", end_date.strftime("%Y-%m-%d %H:%M:%S"),
-            "--out-dir", str(self.output_dir),
-            "--out-name", output_filename,
-        ]
-        
-        # Add variables
-        for var in variables:
-            cmd.extend(["--variable", var])
+        cmd = self.build_command(
+            dataset_id, product_id, variables, start_date, end_date,
+            min_lon, max_lon, min_lat, max_lat, self.output_dir, output_filename,
+        )
         
         # Execute command
         logger.info(f"Downloading data from Copernicus: {output_filename}")
         logger.debug(f"Command: {' '.join(cmd)}")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logger.error(f"Error downloading data: {result.stderr}")
-            raise RuntimeError(f"Failed to download data: {result.stderr}")
+        with span("copernicus.download", product_id=product_id, path=str(output_file)) as timing:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            
+            if result.returncode != 0:
+                logger.error(f"Error downloading data: {result.stderr}")
+                raise RuntimeError(f"Failed to download data: {result.stderr}")
+            if output_file.exists():
+                timing.count(bytes=output_file.stat().st_size)
         
         logger.success(f"Successfully downloaded data to {output_file}")
         return output_file
     
-    # TODO: Implement methods to process NetCDF files into parquet format
+    def download_tiled(
+        self,
+        dataset_id: str,
+        product_id: str,
+        variables: List[str],
+        start_date: datetime,
+        end_date: datetime,
+        min_lon: float,
+        max_lon: float,
+        min_lat: float,
+        max_lat: float,
+        max_workers: int = 4,
+        **tiling: Any,
+    ) -> TiledDownload:
+        """Download a large request as concurrent time/space tiles.
+        
+        Finished tiles are recorded in a manifest, so calling this again with
+        the same request after a failure only fetches the missing tiles.
+        
+        Args:
+            dataset_id: Copernicus dataset ID
+            product_id: Copernicus product ID
+            variables: List of variables to download
+            start_date: Start date
+            end_date: End date
+            min_lon: Minimum longitude
+            max_lon: Maximum longitude
+            min_lat: Minimum latitude
+            max_lat: Maximum latitude
+            max_workers: Maximum number of concurrent motuclient processes
+            **tiling: days, degrees and retries overrides
+            
+        Returns:
+            The completed download, whose tiles can be converted with convert_to_parquet
+        """
+        download = TiledDownload(
+            self, dataset_id, product_id, variables, start_date, end_date,
+            min_lon, max_lon, min_lat, max_lat, max_workers=max_workers, **tiling,
+        )
+        download.run()
+        return download
     
     def download_sst_data(
         self,
@@ -150,5 +225,57 @@ class CopernicusClient:
             max_lat=region["max_lat"],
             output_filename=f"sst_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.nc",
         )
-
-# TODO: Implement NetCDF to Parquet conversion utilities 
\ No newline at end of file
+    
+    def convert_to_parquet(
+        self,
+        nc_path: Path,
+        output_dir: Union[str, Path],
+        variables: Optional[List[str]] = None,
+        max_workers: Optional[int] = None,
+        **chunk_sizes: int,
+    ) -> List[Path]:
+        """Convert a downloaded NetCDF file into a date-partitioned Parquet dataset.
+        
+        Args:
+            nc_path: Path returned by download_data
+            output_dir: Root of the partitioned Parquet dataset
+            variables: Variables to convert (None for all gridded variables)
+            max_workers: Worker processes for chunk conversion
+            **chunk_sizes: time_chunk, lat_chunk and lon_chunk overrides
+            
+        Returns:
+            Paths of all written files
+        """
+        with span("copernicus.convert", path=str(nc_path)) as timing:
+            paths = netcdf_to_parquet(
+                nc_path,
+                output_dir,
+                variables=variables,
+                max_workers=max_workers,
+                **chunk_sizes,
+            )
+            timing.count(bytes=os.path.getsize(nc_path), files=len(paths))
+        return paths
+    
+    def convert_to_grid(
+        self,
+        nc_path: Path,
+        store_path: Union[str, Path],
+        variables: Optional[List[str]] = None,
+        **chunk_sizes: int,
+    ) -> Path:
+        """Convert a downloaded NetCDF file into a chunked grid store for point queries.
+        
+        Args:
+            nc_path: Path returned by download_data
+            store_path: Directory of the grid store (e.g. <lake>/grids/sst)
+            variables: Variables to convert (None for all gridded variables)
+            **chunk_sizes: time_chunk, lat_chunk and lon_chunk overrides
+            
+        Returns:
+            Path of the grid store
+        """
+        with span("copernicus.grid", path=str(nc_path)) as timing:
+            store = netcdf_to_grid(nc_path, store_path, variables=variables, **chunk_sizes)
+            timing.count(bytes=os.path.getsize(nc_path))
+        return store
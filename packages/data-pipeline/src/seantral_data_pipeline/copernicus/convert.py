@@ -0,0 +1,285 @@
+"""Streaming conversion of Copernicus NetCDF downloads into a partitioned Parquet dataset.
+
+Written files are recorded in the metadata catalog of the lake the dataset
+is in, when it has one, so readers pruning by the catalog see them.
+"""
+
+import concurrent.futures
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+from seantral_data_pipeline.storage.catalog import CATALOG_FILE, describe_file, register_files
+
+_TIME_NAMES = ("time", "t")
+_LAT_NAMES = ("lat", "latitude", "nav_lat")
+_LON_NAMES = ("lon", "longitude", "nav_lon")
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A block of a gridded variable, given as [start, stop) index ranges."""
+
+    time: Tuple[int, int]
+    lat: Tuple[int, int]
+    lon: Tuple[int, int]
+
+    @property
+    def name(self) -> str:
+        return f"t{self.time[0]}-y{self.lat[0]}-x{self.lon[0]}"
+
+
+def _open_dataset(nc_path: Union[str, Path]):
+    """Open a NetCDF file lazily; only the slices that are indexed get read."""
+    try:
+        import netCDF4
+    except ImportError:
+        raise ImportError(
+            "NetCDF conversion requires netCDF4. Install it with: "
+            "pip install 'seantral-data-pipeline[netcdf]'"
+        ) from None
+    return netCDF4.Dataset(str(nc_path), mode="r")
+
+
+def _find_variable(dataset, candidates: Sequence[str]) -> str:
+    for name in candidates:
+        if name in dataset.variables:
+            return name
+    raise KeyError(f"None of {list(candidates)} found in {list(dataset.variables)}")
+
+
+def _decode_times(time_var) -> np.ndarray:
+    """Decode a CF time coordinate to datetime64[ns]."""
+    import netCDF4
+
+    dates = netCDF4.num2date(
+        time_var[:],
+        units=time_var.units,
+        calendar=getattr(time_var, "calendar", "standard"),
+        only_use_cftime_datetimes=False,
+        only_use_python_datetimes=True,
+    )
+    return np.array(dates, dtype="datetime64[ns]")
+
+
+def _default_variables(dataset, dims: Tuple[str, str, str]) -> List[str]:
+    """All data variables laid out on the (time, lat, lon) grid."""
+    return [
+        name
+        for name, var in dataset.variables.items()
+        if tuple(var.dimensions) == dims and name not in dims
+    ]
+
+
+def plan_chunks(
+    n_time: int,
+    n_lat: int,
+    n_lon: int,
+    time_chunk: int,
+    lat_chunk: int,
+    lon_chunk: int,
+) -> List[Chunk]:
+    """Split a (time, lat, lon) grid into independent chunks.
+
+    Args:
+        n_time: Number of time steps
+        n_lat: Number of latitude rows
+        n_lon: Number of longitude columns
+        time_chunk: Time steps per chunk
+        lat_chunk: Latitude rows per chunk
+        lon_chunk: Longitude columns per chunk
+
+    Returns:
+        List of chunks covering the whole grid
+    """
+    chunks = []
+    for t0 in range(0, n_time, time_chunk):
+        for y0 in range(0, n_lat, lat_chunk):
+            for x0 in range(0, n_lon, lon_chunk):
+                chunks.append(
+                    Chunk(
+                        time=(t0, min(t0 + time_chunk, n_time)),
+                        lat=(y0, min(y0 + lat_chunk, n_lat)),
+                        lon=(x0, min(x0 + lon_chunk, n_lon)),
+                    )
+                )
+    return chunks
+
+
+def convert_chunk(
+    nc_path: Union[str, Path],
+    chunk: Chunk,
+    output_dir: Union[str, Path],
+    variables: Sequence[str],
+    compression: str = "snappy",
+) -> List[Path]:
+    """Convert one chunk of a NetCDF file into Parquet files.
+
+    The chunk is streamed one time step at a time: each step is read as a
+    lat/lon slab, flattened into rows (cells where every variable is missing,
+    such as land, are dropped) and appended as a row group to the file of its
+    date partition. Only one slab per variable is held in memory at a time.
+
+    Args:
+        nc_path: Path to the NetCDF file
+        chunk: Chunk to convert
+        output_dir: Root of the partitioned Parquet dataset
+        variables: Variables to convert
+        compression: Compression algorithm (snappy, gzip, brotli, none)
+
+    Returns:
+        Paths of the files written for this chunk
+    """
+    # Imported here so the grid reader, which shares this module's helpers,
+    # does not load pyarrow
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    output_dir = Path(output_dir)
+    writers: Dict[str, pq.ParquetWriter] = {}
+    paths: List[Path] = []
+
+    with _open_dataset(nc_path) as dataset:
+        time_name = _find_variable(dataset, _TIME_NAMES)
+        lat_name = _find_variable(dataset, _LAT_NAMES)
+        lon_name = _find_variable(dataset, _LON_NAMES)
+
+        times = _decode_times(dataset.variables[time_name])[chunk.time[0]:chunk.time[1]]
+        lats = np.asarray(dataset.variables[lat_name][chunk.lat[0]:chunk.lat[1]], np.float32)
+        lons = np.asarray(dataset.variables[lon_name][chunk.lon[0]:chunk.lon[1]], np.float32)
+        grid_lat = np.repeat(lats, len(lons))
+        grid_lon = np.tile(lons, len(lats))
+
+        schema = pa.schema(
+            [("timestamp", pa.timestamp("ns")), ("lat", pa.float32()), ("lon", pa.float32())]
+            + [(name, pa.float32()) for name in variables],
+            metadata={"source": "Copernicus Marine", "source_file": Path(nc_path).name},
+        )
+
+        try:
+            for offset, timestamp in enumerate(times):
+                step = chunk.time[0] + offset
+                columns = {}
+                for name in variables:
+                    slab = dataset.variables[name][
+                        step, chunk.lat[0]:chunk.lat[1], chunk.lon[0]:chunk.lon[1]
+                    ]
+                    columns[name] = np.ma.filled(
+                        np.ma.asarray(slab, dtype=np.float32), np.nan
+                    ).ravel()
+
+                valid = np.zeros(len(grid_lat), dtype=bool)
+                for values in columns.values():
+                    valid |= ~np.isnan(values)
+                if not valid.any():
+                    continue
+
+                table = pa.Table.from_arrays(
+                    [
+                        pa.array(np.full(int(valid.sum()), timestamp), pa.timestamp("ns")),
+                        pa.array(grid_lat[valid]),
+                        pa.array(grid_lon[valid]),
+                    ]
+                    + [pa.array(columns[name][valid]) for name in variables],
+                    schema=schema,
+                )
+
+                date = str(np.datetime64(timestamp, "D"))
+                writer = writers.get(date)
+                if writer is None:
+                    partition = output_dir / f"date={date}"
+                    partition.mkdir(parents=True, exist_ok=True)
+                    # Tiles of one download share date partitions, so name files by source too
+                    path = partition / f"part-{Path(nc_path).stem}-{chunk.name}.parquet"
+                    writer = pq.ParquetWriter(path, schema, compression=compression)
+                    writers[date] = writer
+                    paths.append(path)
+                writer.write_table(table)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    return paths
+
+
+def netcdf_to_parquet(
+    nc_path: Union[str, Path],
+    output_dir: Union[str, Path],
+    variables: Optional[Sequence[str]] = None,
+    time_chunk: int = 24,
+    lat_chunk: int = 512,
+    lon_chunk: int = 512,
+    max_workers: Optional[int] = None,
+    compression: str = "snappy",
+) -> List[Path]:
+    """Convert a gridded NetCDF file into a date-partitioned Parquet dataset.
+
+    The grid is split into time/space chunks that are converted independently
+    on a process pool. Each worker opens the file itself and streams its chunk
+    slab by slab, so peak memory depends on the chunk size, not the file size.
+
+    Args:
+        nc_path: Path to the NetCDF file
+        output_dir: Root of the partitioned Parquet dataset
+        variables: Variables to convert (None for every (time, lat, lon) variable)
+        time_chunk: Time steps per chunk
+        lat_chunk: Latitude rows per chunk
+        lon_chunk: Longitude columns per chunk
+        max_workers: Worker processes (None for CPU count, 1 to convert in-process)
+        compression: Compression algorithm (snappy, gzip, brotli, none)
+
+    Returns:
+        Paths of all written files
+    """
+    nc_path = Path(nc_path)
+    output_dir = Path(output_dir)
+
+    with _open_dataset(nc_path) as dataset:
+        time_name = _find_variable(dataset, _TIME_NAMES)
+        lat_name = _find_variable(dataset, _LAT_NAMES)
+        lon_name = _find_variable(dataset, _LON_NAMES)
+        dims = (time_name, lat_name, lon_name)
+        variables = list(variables) if variables else _default_variables(dataset, dims)
+        for name in variables:
+            if tuple(dataset.variables[name].dimensions) != dims:
+                raise ValueError(f"Variable {name} is not laid out as {dims}")
+        shape = tuple(len(dataset.dimensions[d]) for d in dims)
+
+    chunks = plan_chunks(*shape, time_chunk, lat_chunk, lon_chunk)
+    logger.info(
+        f"Converting {nc_path} ({shape[0]}x{shape[1]}x{shape[2]}, {variables}) "
+        f"to {output_dir} in {len(chunks)} chunks"
+    )
+
+    paths: List[Path] = []
+    if max_workers == 1:
+        for chunk in chunks:
+            paths.extend(convert_chunk(nc_path, chunk, output_dir, variables, compression))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    convert_chunk, nc_path, chunk, output_dir, variables, compression
+                ): chunk
+                for chunk in chunks
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    paths.extend(future.result())
+                except Exception as e:
+                    logger.error(f"Error converting chunk {futures[future].name}: {e}")
+                    raise
+
+    logger.success(f"Wrote {len(paths)} Parquet files to {output_dir}")
+    paths = sorted(paths)
+    # Files are only described when the lake has a catalog to record them in
+    if (output_dir.parent / CATALOG_FILE).exists():
+        register_files(
+            output_dir,
+            [describe_file(path, path.relative_to(output_dir).as_posix()) for path in paths],
+            create=False,
+        )
+    return paths
@@ -0,0 +1,311 @@
+"""Tiled, parallel and resumable Copernicus downloads.
+
+One motuclient request for a large region and date range is slow, runs into
+the server's request size limit and loses everything when it fails. A tiled
+download splits the request into time/space tiles, runs them on a bounded pool
+of motuclient processes and records every finished tile in a manifest, so a
+rerun of the same request only fetches the tiles that are still missing:
+
+    <output_dir>/<product_id>-<request hash>/manifest.json
+    <output_dir>/<product_id>-<request hash>/20250101-20250130_+30.00_-80.00.nc
+
+Tiles do not overlap: time tiles end one second before the next one starts
+and space tiles end just short of the next tile's edge, so converting every
+tile into the same dataset does not duplicate rows.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+from seantral_data_pipeline.copernicus.convert import netcdf_to_parquet
+
+MANIFEST = "manifest.json"
+
+# Default tile size, well under the per-request limits of the Motu server
+TILE_DAYS = 30
+TILE_DEGREES = 30.0
+
+# Keeps space tiles from sharing the grid cells on their common edge
+_EDGE = 1e-6
+
+
+@dataclass(frozen=True)
+class Tile:
+    """A time/space subset of a download request (bounds inclusive)."""
+
+    start: datetime
+    end: datetime
+    min_lon: float
+    max_lon: float
+    min_lat: float
+    max_lat: float
+
+    @property
+    def name(self) -> str:
+        return f"{self.start:%Y%m%d}-{self.end:%Y%m%d}_{self.min_lat:+.2f}_{self.min_lon:+.2f}"
+
+
+def _edges(lo: float, hi: float, size: float) -> List[float]:
+    count = max(int(np.ceil((hi - lo) / size)), 1)
+    return [lo + (hi - lo) * i / count for i in range(count + 1)]
+
+
+def plan_tiles(
+    start_date: datetime,
+    end_date: datetime,
+    min_lon: float,
+    max_lon: float,
+    min_lat: float,
+    max_lat: float,
+    days: int = TILE_DAYS,
+    degrees: float = TILE_DEGREES,
+) -> List[Tile]:
+    """Split a download request into non-overlapping time/space tiles.
+
+    Args:
+        start_date: Start date
+        end_date: End date (inclusive)
+        min_lon: Minimum longitude
+        max_lon: Maximum longitude
+        min_lat: Minimum latitude
+        max_lat: Maximum latitude
+        days: Days per tile
+        degrees: Degrees of latitude and longitude per tile (tiles are evened
+                 out, so no tile exceeds this)
+
+    Returns:
+        List of tiles covering the request, ordered by time
+    """
+    periods = []
+    step = timedelta(days=days)
+    cursor = start_date
+    while cursor <= end_date:
+        periods.append((cursor, min(cursor + step - timedelta(seconds=1), end_date)))
+        cursor += step
+
+    lons = _edges(min_lon, max_lon, degrees)
+    lats = _edges(min_lat, max_lat, degrees)
+    tiles = []
+    for start, end in periods:
+        for j in range(len(lats) - 1):
+            for i in range(len(lons) - 1):
+                tiles.append(
+                    Tile(
+                        start=start,
+                        end=end,
+                        min_lon=lons[i],
+                        max_lon=lons[i + 1] if i == len(lons) - 2 else lons[i + 1] - _EDGE,
+                        min_lat=lats[j],
+                        max_lat=lats[j + 1] if j == len(lats) - 2 else lats[j + 1] - _EDGE,
+                    )
+                )
+    return tiles
+
+
+class TiledDownload:
+    """A download request split into tiles that are fetched concurrently.
+
+    Usage:
+        download = TiledDownload(client, dataset_id, product_id, variables,
+                                 start, end, min_lon, max_lon, min_lat, max_lat)
+        paths = download.run()  # Rerun after a failure to fetch what is missing
+        download.convert_to_parquet(lake / "cmems_sst")
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        dataset_id: str,
+        product_id: str,
+        variables: List[str],
+        start_date: datetime,
+        end_date: datetime,
+        min_lon: float,
+        max_lon: float,
+        min_lat: float,
+        max_lat: float,
+        days: int = TILE_DAYS,
+        degrees: float = TILE_DEGREES,
+        max_workers: int = 4,
+        retries: int = 2,
+    ):
+        """Plan a tiled download.
+
+        Args:
+            client: CopernicusClient whose credentials and motuclient are used
+            dataset_id: Copernicus dataset ID
+            product_id: Copernicus product ID
+            variables: List of variables to download
+            start_date: Start date
+            end_date: End date
+            min_lon: Minimum longitude
+            max_lon: Maximum longitude
+            min_lat: Minimum latitude
+            max_lat: Maximum latitude
+            days: Days per tile
+            degrees: Degrees of latitude and longitude per tile
+            max_workers: Maximum number of concurrent motuclient processes
+            retries: Extra attempts per tile before giving up on it
+        """
+        self.client = client
+        self.dataset_id = dataset_id
+        self.product_id = product_id
+        self.variables = list(variables)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.tiles = plan_tiles(
+            start_date, end_date, min_lon, max_lon, min_lat, max_lat, days, degrees
+        )
+
+        # The request and its tiling identify the download directory
+        self.request = {
+            "dataset_id": dataset_id,
+            "product_id": product_id,
+            "variables": sorted(self.variables),
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "bbox": [min_lon, min_lat, max_lon, max_lat],
+            "days": days,
+            "degrees": degrees,
+        }
+        digest = hashlib.sha1(json.dumps(self.request, sort_keys=True).encode()).hexdigest()
+        self.directory = Path(client.output_dir) / f"{product_id}-{digest[:12]}"
+        self.manifest_path = self.directory / MANIFEST
+        self._lock = threading.Lock()
+        self._completed: Dict[str, Dict[str, Any]] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        if not self.manifest_path.exists():
+            return {}
+        manifest = json.loads(self.manifest_path.read_text())
+        # Tiles whose file went missing are fetched again
+        return {
+            name: entry
+            for name, entry in manifest.get("tiles", {}).items()
+            if (self.directory / entry["file"]).exists()
+        }
+
+    def _save_manifest(self) -> None:
+        """Write the manifest next to its target and swap it in."""
+        manifest = {"request": self.request, "tiles": self._completed}
+        partial = self.manifest_path.with_name(MANIFEST + ".tmp")
+        partial.write_text(json.dumps(manifest, indent=2))
+        os.replace(partial, self.manifest_path)
+
+    def pending(self) -> List[Tile]:
+        """Tiles that have not been downloaded yet."""
+        return [tile for tile in self.tiles if tile.name not in self._completed]
+
+    def completed(self) -> List[Path]:
+        """Files of the downloaded tiles, in plan order."""
+        return [
+            self.directory / self._completed[tile.name]["file"]
+            for tile in self.tiles
+            if tile.name in self._completed
+        ]
+
+    def _fetch(self, tile: Tile) -> Path:
+        """Run motuclient for one tile, retrying with backoff."""
+        filename = f"{tile.name}.nc"
+        partial = f"{filename}.part"
+        cmd = self.client.build_command(
+            self.dataset_id, self.product_id, self.variables, tile.start, tile.end,
+            tile.min_lon, tile.max_lon, tile.min_lat, tile.max_lat, self.directory, partial,
+        )
+        for attempt in range(self.retries + 1):
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode == 0 and (self.directory / partial).exists():
+                break
+            logger.warning(
+                f"Tile {tile.name} failed (attempt {attempt + 1}): {result.stderr.strip()}"
+            )
+            if attempt < self.retries:
+                time.sleep(2 ** attempt)
+        else:
+            raise RuntimeError(f"Failed to download tile {tile.name}: {result.stderr.strip()}")
+
+        path = self.directory / filename
+        os.replace(self.directory / partial, path)
+        with self._lock:
+            self._completed[tile.name] = {
+                "file": filename,
+                "bytes": path.stat().st_size,
+                "start": tile.start.isoformat(),
+                "end": tile.end.isoformat(),
+                "bbox": [tile.min_lon, tile.min_lat, tile.max_lon, tile.max_lat],
+            }
+            self._save_manifest()
+        return path
+
+    def run(self) -> List[Path]:
+        """Download every pending tile.
+
+        Tiles that keep failing do not stop the others; once all have been
+        attempted a RuntimeError names the failed tiles, and running again
+        retries only those.
+
+        Returns:
+            Files of all tiles, in plan order
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        pending = self.pending()
+        logger.info(
+            f"Downloading {len(pending)} of {len(self.tiles)} tiles of {self.product_id} "
+            f"to {self.directory} with {self.max_workers} workers"
+        )
+
+        failed = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._fetch, tile): tile for tile in pending}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(str(e))
+                    failed.append(futures[future].name)
+
+        if failed:
+            raise RuntimeError(
+                f"{len(failed)} of {len(self.tiles)} tiles failed: {', '.join(sorted(failed))}"
+            )
+        logger.success(f"Downloaded all {len(self.tiles)} tiles of {self.product_id}")
+        return self.completed()
+
+    def convert_to_parquet(
+        self,
+        output_dir: Union[str, Path],
+        variables: Optional[List[str]] = None,
+        max_workers: Optional[int] = None,
+        **chunk_sizes: int,
+    ) -> List[Path]:
+        """Convert every downloaded tile into one date-partitioned Parquet dataset.
+
+        Args:
+            output_dir: Root of the partitioned Parquet dataset
+            variables: Variables to convert (None for all gridded variables)
+            max_workers: Worker processes for chunk conversion
+            **chunk_sizes: time_chunk, lat_chunk and lon_chunk overrides
+
+        Returns:
+            Paths of all written files
+        """
+        paths: List[Path] = []
+        for path in self.completed():
+            paths.extend(
+                netcdf_to_parquet(
+                    path, output_dir, variables=variables, max_workers=max_workers, **chunk_sizes
+                )
+            )
+        return sorted(paths)
@@ -0,0 +1,381 @@
+"""Chunked on-disk store of gridded fields for fast point time series.
+
+Flattened into Parquet rows, a year of a global SST grid has to be scanned in
+full to answer a question about one point. A grid store keeps each variable as
+a (time, lat, lon) array split into chunks that are long in time and small in
+space, one uncompressed ``.npy`` file per chunk:
+
+    <lake>/grids/sst/grid.json                    shape, chunk shape, variables
+    <lake>/grids/sst/time.npy, lat.npy, lon.npy   coordinates
+    <lake>/grids/sst/analysed_sst/0.12.40.npy     chunk (time, lat, lon) indexes
+
+A point series only needs the chunks holding the four grid cells around the
+point, which are memory-mapped rather than read, so a year at one point
+touches a few hundred kilobytes. Chunks that are entirely missing (land) are
+not written. Mapped chunks are kept in an LRU cache shared by all queries.
+"""
+
+import json
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+from seantral_data_pipeline.copernicus.convert import (
+    _LAT_NAMES,
+    _LON_NAMES,
+    _TIME_NAMES,
+    _decode_times,
+    _default_variables,
+    _find_variable,
+    _open_dataset,
+    plan_chunks,
+)
+from seantral_data_pipeline.query.engine import TimeSeriesResult
+
+GRID_DIR = "grids"
+MANIFEST = "grid.json"
+
+# Default chunk shape: ~3 years of daily fields over a 16 x 16 cell tile (1 MiB)
+TIME_CHUNK = 1024
+LAT_CHUNK = 16
+LON_CHUNK = 16
+
+# Mapped chunks kept open per store
+CACHE_CHUNKS = 512
+
+
+@dataclass(frozen=True)
+class GridVariable:
+    """Location of a queryable variable in a grid store."""
+
+    store: str  # Directory of the store under the grids root
+    variable: str
+    unit: str
+    source: str
+    offset: float = 0.0  # Added to stored values to convert them to unit
+
+
+# Public variable names mapped to the gridded fields that store them
+GRID_VARIABLES: Dict[str, GridVariable] = {
+    "sst": GridVariable("sst", "analysed_sst", "°C", "Copernicus", offset=-273.15),
+}
+
+
+def _chunk_name(t: int, y: int, x: int) -> str:
+    return f"{t}.{y}.{x}.npy"
+
+
+def netcdf_to_grid(
+    nc_path: Union[str, Path],
+    store_path: Union[str, Path],
+    variables: Optional[Sequence[str]] = None,
+    time_chunk: int = TIME_CHUNK,
+    lat_chunk: int = LAT_CHUNK,
+    lon_chunk: int = LON_CHUNK,
+) -> Path:
+    """Convert a gridded NetCDF file into a chunked grid store.
+
+    The file is read one chunk at a time, so peak memory is one chunk per
+    variable. The store is built next to its target and swapped in once
+    complete, replacing an existing store of the same name.
+
+    Args:
+        nc_path: Path to the NetCDF file
+        store_path: Directory of the grid store
+        variables: Variables to convert (None for every (time, lat, lon) variable)
+        time_chunk: Time steps per chunk
+        lat_chunk: Latitude rows per chunk
+        lon_chunk: Longitude columns per chunk
+
+    Returns:
+        Path of the grid store
+    """
+    store_path = Path(store_path)
+    staged = store_path.with_name(f".{store_path.name}-{uuid.uuid4().hex[:8]}")
+    staged.mkdir(parents=True)
+
+    try:
+        with _open_dataset(nc_path) as dataset:
+            time_name = _find_variable(dataset, _TIME_NAMES)
+            lat_name = _find_variable(dataset, _LAT_NAMES)
+            lon_name = _find_variable(dataset, _LON_NAMES)
+            dims = (time_name, lat_name, lon_name)
+            variables = list(variables) if variables else _default_variables(dataset, dims)
+            for name in variables:
+                if tuple(dataset.variables[name].dimensions) != dims:
+                    raise ValueError(f"Variable {name} is not laid out as {dims}")
+
+            times = _decode_times(dataset.variables[time_name])
+            lats = np.asarray(dataset.variables[lat_name][:], np.float64)
+            lons = np.asarray(dataset.variables[lon_name][:], np.float64)
+            np.save(staged / "time.npy", times)
+            np.save(staged / "lat.npy", lats)
+            np.save(staged / "lon.npy", lons)
+
+            shape = (len(times), len(lats), len(lons))
+            chunks = plan_chunks(*shape, time_chunk, lat_chunk, lon_chunk)
+            written = 0
+            for name in variables:
+                (staged / name).mkdir()
+                for chunk in chunks:
+                    block = dataset.variables[name][
+                        chunk.time[0]:chunk.time[1],
+                        chunk.lat[0]:chunk.lat[1],
+                        chunk.lon[0]:chunk.lon[1],
+                    ]
+                    block = np.ma.filled(np.ma.asarray(block, dtype=np.float32), np.nan)
+                    if np.isnan(block).all():
+                        continue
+                    index = (
+                        chunk.time[0] // time_chunk,
+                        chunk.lat[0] // lat_chunk,
+                        chunk.lon[0] // lon_chunk,
+                    )
+                    np.save(staged / name / _chunk_name(*index), block)
+                    written += 1
+
+            manifest = {
+                "shape": shape,
+                "chunks": (time_chunk, lat_chunk, lon_chunk),
+                "variables": {
+                    name: {"units": getattr(dataset.variables[name], "units", "")}
+                    for name in variables
+                },
+                "source_file": Path(nc_path).name,
+                "created_at": datetime.now().isoformat(),
+            }
+            (staged / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    except BaseException:
+        shutil.rmtree(staged, ignore_errors=True)
+        raise
+
+    if store_path.exists():
+        retired = staged.with_name(staged.name + ".old")
+        store_path.rename(retired)
+        staged.rename(store_path)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        staged.rename(store_path)
+
+    logger.success(
+        f"Wrote {written} chunks of {nc_path} ({shape[0]}x{shape[1]}x{shape[2]}, "
+        f"{variables}) to {store_path}"
+    )
+    return store_path
+
+
+def _bracket(coords: np.ndarray, value: float) -> Tuple[int, int, float]:
+    """Indexes of the two coordinates around value and the weight of the second."""
+    n = len(coords)
+    if n == 1:
+        if value != coords[0]:
+            raise ValueError(f"{value} is outside of the grid")
+        return 0, 0, 0.0
+    descending = coords[-1] < coords[0]
+    ordered = coords[::-1] if descending else coords
+    if not ordered[0] <= value <= ordered[-1]:
+        raise ValueError(f"{value} is outside of the grid ({ordered[0]} to {ordered[-1]})")
+    i = min(int(np.searchsorted(ordered, value, side="right")) - 1, n - 2)
+    weight = float((value - ordered[i]) / (ordered[i + 1] - ordered[i]))
+    if descending:
+        return n - 1 - i, n - 2 - i, weight
+    return i, i + 1, weight
+
+
+class GridStore:
+    """Point time series from a chunked grid store, with bilinear interpolation."""
+
+    def __init__(self, path: Union[str, Path], cache_chunks: int = CACHE_CHUNKS):
+        """Open a grid store.
+
+        Args:
+            path: Directory of the grid store
+            cache_chunks: Number of mapped chunks kept open
+        """
+        self.path = Path(path)
+        self.version = (self.path / MANIFEST).stat().st_mtime_ns
+        manifest = json.loads((self.path / MANIFEST).read_text())
+        self.shape = tuple(manifest["shape"])
+        self.chunks = tuple(manifest["chunks"])
+        self.variables: Dict[str, Dict[str, str]] = manifest["variables"]
+        self.times = np.load(self.path / "time.npy")
+        self.lats = np.load(self.path / "lat.npy")
+        self.lons = np.load(self.path / "lon.npy")
+        self.cache_chunks = cache_chunks
+
+        self._cache: "OrderedDict[Tuple[str, int, int, int], Optional[np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def covers(self, lat: float, lon: float) -> bool:
+        """Whether a point lies inside the grid."""
+        return bool(
+            min(self.lats[0], self.lats[-1]) <= lat <= max(self.lats[0], self.lats[-1])
+            and min(self.lons[0], self.lons[-1]) <= lon <= max(self.lons[0], self.lons[-1])
+        )
+
+    def _chunk(self, variable: str, t: int, y: int, x: int) -> Optional[np.ndarray]:
+        """Memory-mapped chunk, or None where the chunk holds no data."""
+        key = (variable, t, y, x)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        path = self.path / variable / _chunk_name(t, y, x)
+        chunk = np.load(path, mmap_mode="r") if path.exists() else None
+        with self._lock:
+            self._cache[key] = chunk
+            while len(self._cache) > self.cache_chunks:
+                self._cache.popitem(last=False)
+        return chunk
+
+    def _cell_series(self, variable: str, y: int, x: int, start: int, stop: int) -> np.ndarray:
+        """Values of one grid cell over time steps [start, stop)."""
+        ct, cy, cx = self.chunks
+        out = np.full(stop - start, np.nan, dtype=np.float32)
+        for t in range(start // ct, (stop - 1) // ct + 1):
+            lo = max(start, t * ct)
+            hi = min(stop, (t + 1) * ct)
+            chunk = self._chunk(variable, t, y // cy, x // cx)
+            if chunk is not None:
+                out[lo - start:hi - start] = chunk[lo - t * ct:hi - t * ct, y % cy, x % cx]
+        return out
+
+    def point_series(
+        self,
+        variable: str,
+        lat: float,
+        lon: float,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Time series of a variable at a point, interpolated from the four cells around it.
+
+        Cells without a value (land, gaps) are left out and the weights of the
+        others renormalized; time steps where all four are missing are dropped.
+
+        Args:
+            variable: Name of the gridded variable
+            lat: Latitude of the point
+            lon: Longitude of the point
+            start: First time step to include (None for the start of the grid)
+            end: Last time step to include (None for the end of the grid)
+
+        Returns:
+            Tuple of (datetime64 timestamps, float64 values)
+        """
+        if variable not in self.variables:
+            raise KeyError(f"Variable {variable} not in grid store {self.path}")
+        y0, y1, wy = _bracket(self.lats, lat)
+        x0, x1, wx = _bracket(self.lons, lon)
+        lo = 0 if start is None else int(np.searchsorted(self.times, np.datetime64(start), "left"))
+        hi = (
+            len(self.times)
+            if end is None
+            else int(np.searchsorted(self.times, np.datetime64(end), "right"))
+        )
+        if hi <= lo:
+            return self.times[:0], np.array([], dtype=np.float64)
+
+        corners = np.stack(
+            [
+                self._cell_series(variable, y, x, lo, hi)
+                for y, x in ((y0, x0), (y0, x1), (y1, x0), (y1, x1))
+            ]
+        ).astype(np.float64)
+        weights = np.array(
+            [(1 - wy) * (1 - wx), (1 - wy) * wx, wy * (1 - wx), wy * wx]
+        )[:, None]
+        valid = ~np.isnan(corners)
+        total = (weights * valid).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.where(valid, corners * weights, 0.0).sum(axis=0) / total
+        keep = total > 0
+        return self.times[lo:hi][keep], values[keep]
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._lock:
+            return {"chunks": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+class GridCatalog:
+    """Grid stores under one directory, opened on first use."""
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        variables: Optional[Dict[str, GridVariable]] = None,
+        cache_chunks: int = CACHE_CHUNKS,
+    ):
+        """Initialize the catalog.
+
+        Args:
+            root: Directory holding one grid store per subdirectory (e.g. <lake>/grids)
+            variables: Public variable names mapped to gridded fields
+            cache_chunks: Number of mapped chunks kept open per store
+        """
+        self.root = Path(root)
+        self.variables = variables if variables is not None else GRID_VARIABLES
+        self.cache_chunks = cache_chunks
+        self._stores: Dict[str, GridStore] = {}
+        self._lock = threading.Lock()
+
+    def store(self, variable: str) -> Optional[GridStore]:
+        """The store of a public variable, or None if it has not been built."""
+        spec = self.variables.get(variable)
+        if spec is None:
+            return None
+        path = self.root / spec.store
+        try:
+            version = (path / MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            store = self._stores.get(spec.store)
+            # A rebuilt store is swapped in under the same name
+            if store is None or store.version != version:
+                store = self._stores[spec.store] = GridStore(path, self.cache_chunks)
+        return store if spec.variable in store.variables else None
+
+    def covers(self, variable: str, lat: float, lon: float) -> bool:
+        """Whether a public variable has a grid covering a point."""
+        store = self.store(variable)
+        return store is not None and store.covers(lat, lon)
+
+    def query_timeseries(
+        self,
+        variable: str,
+        lat: float,
+        lon: float,
+        start: datetime,
+        end: datetime,
+    ) -> TimeSeriesResult:
+        """Time series of a public variable at a point, in the variable's unit."""
+        spec = self.variables[variable]
+        store = self.store(variable)
+        if store is None:
+            raise KeyError(f"No grid store for {variable} under {self.root}")
+        timestamps, values = store.point_series(spec.variable, lat, lon, start, end)
+        return TimeSeriesResult(
+            variable=variable,
+            unit=spec.unit,
+            source=spec.source,
+            timestamps=timestamps.astype("datetime64[us]"),
+            values=values + spec.offset,
+            metadata={"grid": spec.store, "interpolation": "bilinear"},
+        )
+
+    def cache_info(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: store.cache_info() for name, store in self._stores.items()}
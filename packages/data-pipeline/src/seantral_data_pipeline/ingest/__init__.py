@@ -0,0 +1 @@
+"""Scheduled ingestion runs: fetch, parse and load stages over the data lake."""
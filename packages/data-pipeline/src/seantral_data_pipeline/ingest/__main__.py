@@ -0,0 +1,7 @@
+"""Allow running the ingestion runner with python -m seantral_data_pipeline.ingest."""
+
+import sys
+
+from seantral_data_pipeline.ingest.cli import main
+
+sys.exit(main())
@@ -0,0 +1,189 @@
+"""Command line entry point of the ingestion runner.
+
+    seantral-ingest ndbc 44007 44013 --lake data/lake --stations data/lake/stations.parquet
+    seantral-ingest cmems --start 2025-01-01 --end 2025-01-31 --bbox -72 40 -66 45
+    seantral-ingest ndbc 44007 --every 3600   # hourly, as the scheduler of the pipeline
+    seantral-ingest backfill 44007 44013 --years 1990 2025 --stations data/lake/stations.parquet
+    seantral-ingest snapshot                  # rewrite the snapshot the API starts from
+    seantral-ingest catalog ndbc              # catalog files written before the catalog existed
+    seantral-ingest --recent /dev/shm/seantral ndbc 44007 --every 600   # feed the API workers
+    seantral-ingest recent                    # publish the last week to <lake>/_recent once
+    seantral-ingest --api http://localhost:8000 ndbc 44007 --every 600   # alerts, live push
+
+Copernicus credentials are read from COPERNICUS_USERNAME and COPERNICUS_PASSWORD.
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+from seantral_data_pipeline.ingest.runner import PipelineRunner
+from seantral_data_pipeline.ingest.sources import (
+    CMEMSSource,
+    NDBCBackfillSource,
+    NDBCSource,
+    Source,
+)
+from seantral_data_pipeline.spatial.stations import StationRegistry
+from seantral_data_pipeline.storage.catalog import Catalog
+from seantral_data_pipeline.storage.layout import RECENT_DIR
+from seantral_data_pipeline.storage.recent import publish_recent
+from seantral_data_pipeline.storage.snapshot import write_snapshot
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="seantral-ingest", description="Fetch, parse and load data into the Seantral lake"
+    )
+    parser.add_argument(
+        "--lake",
+        type=Path,
+        default=Path(os.getenv("SEANTRAL_LAKE_PATH", "data/lake")),
+        help="Root of the data lake",
+    )
+    parser.add_argument(
+        "--recent",
+        type=Path,
+        default=os.getenv("SEANTRAL_RECENT_PATH"),
+        help="Publish recent series here for the API workers after each run",
+    )
+    parser.add_argument(
+        "--api",
+        default=os.getenv("SEANTRAL_API_URL"),
+        help="Post rows of live sources to this API's /v1/observations as they are committed",
+    )
+    parser.add_argument("--run-id", help="Checkpoint name; rerun with it to resume")
+    parser.add_argument("--parse-workers", type=int, default=4, help="Parser threads")
+    parser.add_argument(
+        "--every", type=float, help="Repeat the run every N seconds instead of running once"
+    )
+    sources = parser.add_subparsers(dest="source", required=True)
+
+    ndbc = sources.add_parser("ndbc", help="NOAA NDBC buoy stdmet files")
+    ndbc.add_argument("buoys", nargs="+", help="Buoy identifiers")
+    ndbc.add_argument("--year", type=int, help="Year (default: current)")
+    ndbc.add_argument("--month", type=int, help="Month (default: current)")
+    ndbc.add_argument("--stations", type=Path, help="Station registry for coordinates")
+    ndbc.add_argument("--concurrency", type=int, default=16, help="Downloads in flight")
+    ndbc.add_argument("--rate", type=float, default=10.0, help="Downloads started per second")
+
+    backfill = sources.add_parser("backfill", help="NOAA NDBC historical stdmet archives")
+    backfill.add_argument("buoys", nargs="+", help="Buoy identifiers")
+    backfill.add_argument(
+        "--years", type=int, nargs=2, metavar=("FIRST", "LAST"), required=True,
+        help="Years to load; months already backfilled are skipped",
+    )
+    backfill.add_argument("--stations", type=Path, help="Station registry for coordinates")
+    backfill.add_argument("--concurrency", type=int, default=8, help="Buoy years in flight")
+    backfill.add_argument("--rate", type=float, default=10.0, help="Buoy years started per second")
+
+    cmems = sources.add_parser("cmems", help="Copernicus Marine gridded fields")
+    cmems.add_argument("--start", type=datetime.fromisoformat, required=True)
+    cmems.add_argument("--end", type=datetime.fromisoformat, required=True)
+    cmems.add_argument(
+        "--bbox",
+        type=float,
+        nargs=4,
+        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+        default=(-180.0, -90.0, 180.0, 90.0),
+    )
+    cmems.add_argument("--days", type=int, default=1, help="Days per download")
+    cmems.add_argument("--concurrency", type=int, default=2, help="motuclient processes")
+    cmems.add_argument("--rate", type=float, default=0.5, help="Downloads started per second")
+
+    snapshot = sources.add_parser("snapshot", help="Only rewrite the lake snapshot")
+    snapshot.add_argument(
+        "--stations", type=Path, help="Station registry (default: <lake>/stations.parquet)"
+    )
+
+    catalog = sources.add_parser("catalog", help="Only rebuild the metadata catalog of datasets")
+    catalog.add_argument("datasets", nargs="+", help="Dataset names, e.g. ndbc")
+
+    recent = sources.add_parser("recent", help="Only publish the recent series once")
+    recent.add_argument("--days", type=float, default=7.0, help="Days published")
+    return parser
+
+
+def build_sources(args: argparse.Namespace) -> List[Source]:
+    if args.source == "ndbc":
+        stations = StationRegistry.load(args.stations) if args.stations else None
+        return [
+            NDBCSource(
+                args.buoys,
+                year=args.year,
+                month=args.month,
+                stations=stations,
+                max_concurrency=args.concurrency,
+                rate=args.rate,
+            )
+        ]
+    if args.source == "backfill":
+        stations = StationRegistry.load(args.stations) if args.stations else None
+        return [
+            NDBCBackfillSource(
+                args.buoys,
+                *args.years,
+                args.lake / NDBCBackfillSource.dataset,
+                stations=stations,
+                max_concurrency=args.concurrency,
+                rate=args.rate,
+            )
+        ]
+
+    from seantral_data_pipeline.copernicus.client import CopernicusClient
+
+    client = CopernicusClient(
+        os.environ["COPERNICUS_USERNAME"], os.environ["COPERNICUS_PASSWORD"]
+    )
+    min_lon, min_lat, max_lon, max_lat = args.bbox
+    return [
+        CMEMSSource(
+            client,
+            args.lake / CMEMSSource.dataset,
+            args.start,
+            args.end,
+            region={
+                "min_lon": min_lon, "max_lon": max_lon, "min_lat": min_lat, "max_lat": max_lat,
+            },
+            days=args.days,
+            max_concurrency=args.concurrency,
+            rate=args.rate,
+        )
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.source == "snapshot":
+        write_snapshot(args.lake, args.stations)
+        return 0
+    if args.source == "catalog":
+        catalog = Catalog(args.lake)
+        for dataset in args.datasets:
+            catalog.rebuild(dataset)
+        catalog.close()
+        return 0
+    if args.source == "recent":
+        publish_recent(args.lake, args.recent or args.lake / RECENT_DIR, timedelta(days=args.days))
+        return 0
+    while True:
+        started = time.monotonic()
+        runner = PipelineRunner(
+            args.lake,
+            build_sources(args),
+            run_id=args.run_id,
+            parse_workers=args.parse_workers,
+            recent_path=args.recent,
+            api_url=args.api,
+        )
+        stats = runner.run()
+        if args.every is None:
+            return 1 if stats["failed"] else 0
+        delay = max(args.every - (time.monotonic() - started), 0.0)
+        logger.info(f"Next run in {delay:.0f}s")
+        time.sleep(delay)
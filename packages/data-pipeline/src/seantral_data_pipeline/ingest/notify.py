@@ -0,0 +1,102 @@
+"""Posting rows committed to the lake to the API.
+
+The API evaluates alert rules, pushes live updates to WebSocket/SSE clients,
+drops cached results and feeds its hot tier from the batches posted to
+``/v1/observations``. The runner hands every file its writers move into a
+dataset to an ``ApiNotifier``, so those rows reach the API as soon as readers
+can see them in the lake:
+
+    AppendWriter (file rolled) -> ApiNotifier -> POST /v1/observations
+
+The lake stays the source of truth: a post that fails is logged and dropped,
+and the run carries on.
+"""
+
+import math
+from typing import Dict, List, Optional
+
+import httpx
+import pyarrow as pa
+import pyarrow.compute as pc
+from loguru import logger
+
+from seantral_data_pipeline.storage.catalog import KEY_COLUMNS
+
+# Rows per request, which bounds the size of one JSON body
+CHUNK_ROWS = 10000
+
+
+class ApiNotifier:
+    """Posts the rows of committed files to an API's observation endpoint.
+
+    Usage:
+        notifier = ApiNotifier("http://localhost:8000")
+        writer = AppendWriter(lake / "ndbc", geohash_precision=3, on_commit=notifier)
+    """
+
+    def __init__(
+        self,
+        url: str,
+        chunk_rows: int = CHUNK_ROWS,
+        timeout: float = 30.0,
+        transport: Optional[httpx.BaseTransport] = None,
+    ):
+        """Initialize the notifier.
+
+        Args:
+            url: Base URL of the API (e.g. http://localhost:8000)
+            chunk_rows: Rows per request
+            timeout: Seconds to wait for each request
+            transport: Custom httpx transport (e.g. for testing)
+        """
+        self.url = url.rstrip("/") + "/v1/observations"
+        self.chunk_rows = chunk_rows
+        self.timeout = timeout
+        self.transport = transport
+        self._client: Optional[httpx.Client] = None
+        self.stats = {"rows": 0, "requests": 0, "failures": 0}
+
+    def __call__(self, table: pa.Table) -> None:
+        """Post the station observations of a table; other rows are skipped."""
+        if not {"timestamp", "lat", "lon", "buoy_id"} <= set(table.column_names):
+            return
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout, transport=self.transport)
+        for offset in range(0, table.num_rows, self.chunk_rows):
+            payload = _payload(table.slice(offset, self.chunk_rows))
+            self.stats["requests"] += 1
+            try:
+                response = self._client.post(self.url, json=payload)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                self.stats["failures"] += 1
+                rows = len(payload["timestamp"])
+                logger.warning(f"Could not post {rows} rows to {self.url}: {e}")
+                continue
+            self.stats["rows"] += len(payload["timestamp"])
+
+    def close(self) -> None:
+        """Close the connections; a later post opens new ones."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def _payload(table: pa.Table) -> Dict[str, object]:
+    """An ObservationBatch body for the rows of a table."""
+    values: Dict[str, List[Optional[float]]] = {}
+    for column in table.schema:
+        numeric = pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+        if numeric and column.name not in KEY_COLUMNS:
+            values[column.name] = [
+                None if value is None or math.isnan(value) else value
+                for value in table[column.name].to_pylist()
+            ]
+    timestamps = pc.cast(table["timestamp"], pa.timestamp("us")).to_pylist()
+    return {
+        "timestamp": [timestamp.isoformat() for timestamp in timestamps],
+        "lat": table["lat"].to_pylist(),
+        "lon": table["lon"].to_pylist(),
+        "buoy_id": [str(station) for station in table["buoy_id"].to_pylist()],
+        "values": values,
+    }
@@ -0,0 +1,361 @@
+"""Pipelined ingestion runs with per-source limits and checkpoints.
+
+A run moves every task of its sources through three stages connected by
+bounded queues, so downloading, parsing and writing overlap and the run takes
+about as long as its slowest stage:
+
+    fetch (per source: N concurrent, rate limited)
+      -> parse (thread pool)
+        -> write (one AppendWriter per dataset)
+
+Progress is checkpointed to ``<lake>/_checkpoints/<run id>.json``: a task is
+recorded as fetched once its file is on disk (sources that keep downloads in
+memory skip this) and as done once its rows have been committed to the
+dataset. Rerunning an interrupted run with the same run id parses the fetched
+files again instead of downloading them and skips the tasks that are done.
+The checkpoint is removed when a run completes without failures.
+
+Runs that wrote rows refresh the lake snapshot the API starts from and, when
+given a location for them, republish the recent series its workers map.
+Given the API's URL, the rows of live sources are posted to it as each file
+is committed, so its alert rules, live subscribers and caches see them
+without waiting for the next run (``ingest/notify.py``).
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from loguru import logger
+
+from seantral_data_pipeline.ingest.notify import ApiNotifier
+from seantral_data_pipeline.ingest.sources import Source
+from seantral_data_pipeline.storage.append import AppendWriter
+from seantral_data_pipeline.storage.recent import publish_recent
+from seantral_data_pipeline.storage.snapshot import write_snapshot
+
+CHECKPOINT_DIR = "_checkpoints"
+
+_DONE = object()  # Marks the end of a queue
+
+
+class RateLimiter:
+    """Token bucket limiting how many operations start per second."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """Initialize the limiter.
+
+        Args:
+            rate: Operations per second
+            burst: Operations that may start back to back after an idle period
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until an operation may start."""
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._tokens = 1.0
+                self._updated = time.monotonic()
+            self._tokens -= 1
+
+
+class Checkpoint:
+    """Fetched and done tasks of a run, persisted as JSON."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.fetched: Dict[str, str] = {}
+        self.done: set = set()
+        if self.path.exists():
+            state = json.loads(self.path.read_text())
+            self.fetched = state.get("fetched", {})
+            self.done = set(state.get("done", []))
+
+    def fetched_path(self, key: str) -> Optional[Path]:
+        """File of a fetched task, if it is still on disk."""
+        path = self.fetched.get(key)
+        return Path(path) if path is not None and Path(path).exists() else None
+
+    def mark_fetched(self, key: str, path: Path) -> None:
+        self.fetched[key] = str(path)
+        self.save()
+
+    def mark_done(self, keys: Sequence[str]) -> None:
+        self.done.update(keys)
+        for key in keys:
+            self.fetched.pop(key, None)
+        self.save()
+
+    def save(self) -> None:
+        """Write the checkpoint next to its target and swap it in."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.path.with_name(self.path.name + ".tmp")
+        partial.write_text(json.dumps({"fetched": self.fetched, "done": sorted(self.done)}))
+        os.replace(partial, self.path)
+
+    def clear(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
+        try:
+            self.path.parent.rmdir()
+        except OSError:
+            pass  # Checkpoints of other runs
+
+
+class PipelineRunner:
+    """Runs the fetch, parse and write stages of an ingestion run concurrently.
+
+    Usage:
+        runner = PipelineRunner(lake, [NDBCSource(buoy_ids, stations=registry)])
+        stats = runner.run()
+    """
+
+    def __init__(
+        self,
+        lake_path: Union[str, Path],
+        sources: Sequence[Source],
+        run_id: Optional[str] = None,
+        parse_workers: int = 4,
+        queue_size: int = 16,
+        checkpoint_every: int = 50,
+        recent_path: Optional[Union[str, Path]] = None,
+        api_url: Optional[str] = None,
+    ):
+        """Initialize the runner.
+
+        Args:
+            lake_path: Root of the data lake
+            sources: Sources whose tasks make up the run
+            run_id: Name of the run's checkpoint (defaults to a hash of the
+                    task keys, so the same run started again resumes)
+            parse_workers: Threads parsing downloaded files
+            queue_size: Capacity of the queues between stages
+            checkpoint_every: Tasks written between commits of the datasets
+            recent_path: Directory to publish recent series to after runs that
+                         wrote rows (none are published by default)
+            api_url: Base URL of the API to post committed rows of live
+                     sources to (none are posted by default)
+        """
+        self.lake_path = Path(lake_path)
+        self.sources = list(sources)
+        if run_id is None:
+            keys = [f"{s.name}:{k}" for s in self.sources for k in s.tasks()]
+            run_id = hashlib.sha1("\n".join(keys).encode()).hexdigest()[:16]
+        self.run_id = run_id
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.checkpoint_every = checkpoint_every
+        self.recent_path = Path(recent_path) if recent_path else None
+        self.notifier = ApiNotifier(api_url) if api_url else None
+        self.checkpoint = Checkpoint(self.lake_path / CHECKPOINT_DIR / f"{run_id}.json")
+
+        self._writers: Dict[str, AppendWriter] = {}
+        self._busy = {"fetch": 0.0, "parse": 0.0, "write": 0.0}
+        self._failed: List[str] = []
+
+    def run(self) -> Dict[str, Any]:
+        """Run to completion; see arun."""
+        return asyncio.run(self.arun())
+
+    async def arun(self) -> Dict[str, Any]:
+        """Fetch, parse and write every task that is not done yet.
+
+        Tasks that fail to download or parse are logged and left out; they
+        stay in the checkpoint's pending set, so running again retries them.
+
+        Returns:
+            Statistics: task counts, rows written, wall time and the time each
+            stage spent working
+        """
+        started = time.monotonic()
+        self._failed = []
+        parse_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        executor = concurrent.futures.ThreadPoolExecutor(self.parse_workers)
+
+        pending = [
+            (source, key)
+            for source in self.sources
+            for key in source.tasks()
+            if f"{source.name}:{key}" not in self.checkpoint.done
+        ]
+        logger.info(f"Run {self.run_id}: {len(pending)} tasks from {len(self.sources)} sources")
+
+        async def fetch_all() -> None:
+            await asyncio.gather(
+                *(self._fetch_source(source, pending, parse_queue) for source in self.sources)
+            )
+            for _ in range(self.parse_workers):
+                await parse_queue.put(_DONE)
+
+        async def parse_all() -> None:
+            parsers = range(self.parse_workers)
+            await asyncio.gather(
+                *(self._parse(parse_queue, write_queue, executor) for _ in parsers)
+            )
+            await write_queue.put(_DONE)
+
+        stages = [
+            asyncio.create_task(stage)
+            for stage in (fetch_all(), parse_all(), self._write(write_queue))
+        ]
+        try:
+            done, _ = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+            for stage in done:
+                if stage.exception() is not None:
+                    raise stage.exception()
+        finally:
+            # A failed stage would leave the others blocked on its queue
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            executor.shutdown(wait=True)
+            for source in self.sources:
+                await source.aclose()
+            await asyncio.to_thread(self._close_writers)
+            if self.notifier is not None:
+                self.notifier.close()
+
+        if not self._failed:
+            self.checkpoint.clear()
+        if any(w.stats["rows_written"] for w in self._writers.values()):
+            # New partitions become visible to API processes started from now on
+            await asyncio.to_thread(write_snapshot, self.lake_path)
+            if self.recent_path is not None:
+                await asyncio.to_thread(publish_recent, self.lake_path, self.recent_path)
+        stats = {
+            "run_id": self.run_id,
+            "tasks": len(pending),
+            "failed": sorted(self._failed),
+            "rows": sum(w.stats["rows_written"] for w in self._writers.values()),
+            "duplicates": sum(w.stats["duplicates"] for w in self._writers.values()),
+            "seconds": round(time.monotonic() - started, 3),
+            **{f"{stage}_seconds": round(busy, 3) for stage, busy in self._busy.items()},
+        }
+        logger.success(
+            f"Run {self.run_id} finished {len(pending) - len(self._failed)}/{len(pending)} "
+            f"tasks in {stats['seconds']}s (busy: fetch {stats['fetch_seconds']}s, "
+            f"parse {stats['parse_seconds']}s, write {stats['write_seconds']}s)"
+        )
+        return stats
+
+    async def _fetch_source(
+        self,
+        source: Source,
+        pending: List[Tuple[Source, str]],
+        parse_queue: asyncio.Queue,
+    ) -> None:
+        """Fetch the pending tasks of one source within its limits."""
+        work: asyncio.Queue = asyncio.Queue()
+        for owner, key in pending:
+            if owner is source:
+                work.put_nowait(key)
+        limiter = RateLimiter(source.rate) if source.rate else None
+
+        async def worker() -> None:
+            while not work.empty():
+                key = work.get_nowait()
+                task = f"{source.name}:{key}"
+                fetched: Union[Path, bytes, None] = self.checkpoint.fetched_path(task)
+                if fetched is None:
+                    if limiter is not None:
+                        await limiter.acquire()
+                    begin = time.monotonic()
+                    try:
+                        fetched = await source.fetch(key)
+                    except Exception as e:
+                        logger.error(f"Error fetching {task}: {e}")
+                        self._failed.append(task)
+                        continue
+                    finally:
+                        self._busy["fetch"] += time.monotonic() - begin
+                    if isinstance(fetched, Path):
+                        self.checkpoint.mark_fetched(task, fetched)
+                # Blocks while the parsers are behind, bounding downloads held in memory
+                await parse_queue.put((source, key, fetched))
+
+        await asyncio.gather(*(worker() for _ in range(source.max_concurrency)))
+
+    async def _parse(
+        self,
+        parse_queue: asyncio.Queue,
+        write_queue: asyncio.Queue,
+        executor: concurrent.futures.Executor,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        while (item := await parse_queue.get()) is not _DONE:
+            source, key, fetched = item
+            begin = time.monotonic()
+            try:
+                table = await loop.run_in_executor(executor, source.parse, key, fetched)
+            except Exception as e:
+                origin = fetched if isinstance(fetched, Path) else f"{len(fetched)} bytes"
+                logger.error(f"Error parsing {source.name}:{key} from {origin}: {e}")
+                self._failed.append(f"{source.name}:{key}")
+                continue
+            finally:
+                self._busy["parse"] += time.monotonic() - begin
+            await write_queue.put((source, key, table))
+
+    async def _write(self, write_queue: asyncio.Queue) -> None:
+        """Append parsed tables to their datasets and checkpoint committed tasks."""
+        written: List[Tuple[Source, str]] = []
+        while (item := await write_queue.get()) is not _DONE:
+            source, key, table = item
+            begin = time.monotonic()
+            if table is not None and table.num_rows:
+                writer = await self._writer(source, table)
+                await asyncio.to_thread(writer.write, table)
+            written.append((source, key))
+            if len(written) >= self.checkpoint_every:
+                await asyncio.to_thread(self._commit, written)
+                written = []
+            self._busy["write"] += time.monotonic() - begin
+        await asyncio.to_thread(self._commit, written)
+
+    async def _writer(self, source: Source, table: pa.Table) -> AppendWriter:
+        writer = self._writers.get(source.dataset)
+        if writer is None:
+            writer = AppendWriter(
+                self.lake_path / source.dataset,
+                geohash_precision=source.geohash_precision,
+                on_commit=self.notifier if source.live else None,
+            )
+            # Rows stored by earlier runs are not written again. Tasks of a run
+            # cover about the same period, so the keys around the first table's
+            # rows are the ones that can recur.
+            if source.overlaps_lake:
+                first = pd.Timestamp(pc.min(table["timestamp"]).as_py())
+                since = first - pd.Timedelta(seconds=writer.index.window)
+                await asyncio.to_thread(writer.load_keys, since)
+            self._writers[source.dataset] = writer
+        return writer
+
+    def _commit(self, tasks: List[Tuple[Source, str]]) -> None:
+        for writer in self._writers.values():
+            writer.commit()
+        if tasks:
+            for source in self.sources:
+                source.committed([key for owner, key in tasks if owner is source])
+            self.checkpoint.mark_done([f"{source.name}:{key}" for source, key in tasks])
+
+    def _close_writers(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
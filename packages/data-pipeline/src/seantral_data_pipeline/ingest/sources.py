@@ -0,0 +1,459 @@
+"""Data sources the ingestion runner fetches from.
+
+A source turns a run's parameters into a list of task keys (e.g. one per buoy
+and month), downloads the raw file of a task (or keeps it in memory) and
+parses it into an Arrow table for the append writer. Each source carries its
+own concurrency and rate limits, so a run can hammer NDBC's static files
+while staying gentle with the Copernicus Motu server.
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from loguru import logger
+
+from seantral_data_pipeline.copernicus.convert import netcdf_to_parquet
+from seantral_data_pipeline.noaa.async_client import AsyncNDBCClient
+from seantral_data_pipeline.noaa.client import NDBCClient
+from seantral_data_pipeline.noaa.parser import parse_stdmet
+from seantral_data_pipeline.spatial.geohash import PARTITION_PRECISION
+from seantral_data_pipeline.spatial.stations import StationRegistry
+from seantral_data_pipeline.storage.parquet import iter_batches
+
+# Months of each buoy and year a backfill has committed, kept in the dataset
+BACKFILL_LEDGER = "_backfill.json"
+
+
+class Source:
+    """Base class of the data sources of an ingestion run.
+
+    Attributes:
+        name: Prefix of the source's task keys in checkpoints
+        dataset: Directory under the lake its rows are appended to
+        max_concurrency: Maximum number of fetches in flight
+        rate: Maximum fetches started per second (None for no limit)
+        geohash_precision: Partitioning of the dataset (None for unpartitioned)
+        overlaps_lake: Whether its rows may already be stored by earlier runs,
+                       so the writer first loads the keys stored around them
+        live: Whether its rows are new observations, which the runner posts
+              to the API (for alerts and live push) once they are committed
+    """
+
+    name = "source"
+    dataset = "source"
+    max_concurrency = 4
+    rate: Optional[float] = None
+    geohash_precision: Optional[int] = None
+    overlaps_lake = True
+    live = False
+
+    def tasks(self) -> List[str]:
+        """Keys of the tasks of this run, in the order they should be fetched."""
+        raise NotImplementedError
+
+    async def fetch(self, key: str) -> Union[Path, bytes]:
+        """Download the raw file of a task, or return its content.
+
+        Content returned in memory is not checkpointed, so an interrupted run
+        downloads it again.
+        """
+        raise NotImplementedError
+
+    def parse(self, key: str, path: Union[Path, bytes]) -> Optional[pa.Table]:
+        """Parse a downloaded file (or its content) into rows for the dataset.
+
+        Runs on a worker thread. Returns None when the source loaded the file
+        itself and there is nothing left for the writer.
+        """
+        raise NotImplementedError
+
+    def committed(self, keys: List[str]) -> None:
+        """Called with the tasks whose rows the writers just committed."""
+
+    async def aclose(self) -> None:
+        """Release connections held by the source."""
+
+
+class NDBCSource(Source):
+    """Standard meteorological files of a set of NDBC buoys."""
+
+    name = "ndbc"
+    dataset = "ndbc"
+    live = True
+
+    def __init__(
+        self,
+        buoy_ids: List[str],
+        year: Optional[int] = None,
+        month: Optional[int] = None,
+        stations: Optional[StationRegistry] = None,
+        client: Optional[AsyncNDBCClient] = None,
+        max_concurrency: int = 16,
+        rate: Optional[float] = 10.0,
+    ):
+        """Initialize the source.
+
+        Args:
+            buoy_ids: Buoys to fetch
+            year: Year to fetch (None for current year)
+            month: Month to fetch (None for the whole year when a year is
+                   given, otherwise the current month)
+            stations: Registry providing coordinates; rows then get lat/lon
+                      and the dataset is partitioned by geohash
+            client: Client to download with (one is created if None)
+            max_concurrency: Maximum number of downloads in flight
+            rate: Maximum downloads started per second
+        """
+        self.buoy_ids = list(buoy_ids)
+        now = datetime.now()
+        self.year = year or now.year
+        self.month = month if month is not None or year is not None else now.month
+        self.stations = stations
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.geohash_precision = PARTITION_PRECISION if stations is not None else None
+        self._client = client
+        self._owns_client = client is None
+
+    @property
+    def client(self) -> AsyncNDBCClient:
+        # Created lazily so it binds to the event loop of the run
+        if self._client is None:
+            self._client = AsyncNDBCClient(max_concurrency=self.max_concurrency)
+        return self._client
+
+    def tasks(self) -> List[str]:
+        if self.month is None:
+            return [f"{buoy_id}/{self.year}" for buoy_id in self.buoy_ids]
+        return [f"{buoy_id}/{self.year}-{self.month:02d}" for buoy_id in self.buoy_ids]
+
+    async def fetch(self, key: str) -> Path:
+        buoy_id = key.split("/")[0]
+        return await self.client.download_buoy_data(buoy_id, self.year, self.month)
+
+    def parse(self, key: str, path: Union[Path, bytes]) -> Optional[pa.Table]:
+        buoy_id = key.split("/")[0]
+        if not path:
+            return None
+        table = parse_stdmet(path, buoy_id=buoy_id)
+        if self.stations is None:
+            return table
+        station = self.stations.get(buoy_id)
+        if station is None:
+            logger.warning(f"Skipping {buoy_id}: not in the station registry")
+            return None
+        return table.append_column(
+            "lat", pa.array([station.lat] * table.num_rows, pa.float64())
+        ).append_column("lon", pa.array([station.lon] * table.num_rows, pa.float64()))
+
+    async def aclose(self) -> None:
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class NDBCBackfillSource(NDBCSource):
+    """Historical stdmet archives of a set of NDBC buoys over a range of years.
+
+    One task per buoy and year. Past years come from the annual archive and
+    the current year, or a year whose annual archive is not published yet,
+    from the archives of its months that are over, fetched concurrently.
+    Archives are decompressed in memory as they download and handed to the
+    parser as bytes, so a run holds at most the tasks in flight and queued
+    between the stages, whatever the number of years.
+
+    The months each task brought in are recorded in the dataset's
+    ``_backfill.json`` once the runner has committed their rows, and reruns
+    only fetch the months that are missing from it, so a year stays in the
+    run until its last archive is published. Rows a year may hold from
+    elsewhere (the realtime files cover the last 45 days) or from a run that
+    stopped between committing and recording are dropped against the stored
+    ones; years without rows skip that check, so the writer does not load
+    keys. Historical rows are not posted to the API; its cached results over
+    them are dropped when the catalog records the new files.
+    """
+
+    name = "ndbc-backfill"
+    overlaps_lake = False
+    live = False
+
+    def __init__(
+        self,
+        buoy_ids: List[str],
+        start_year: int,
+        end_year: int,
+        dataset_path: Union[str, Path],
+        stations: Optional[StationRegistry] = None,
+        client: Optional[AsyncNDBCClient] = None,
+        max_concurrency: int = 16,
+        rate: Optional[float] = 10.0,
+    ):
+        """Initialize the source.
+
+        Args:
+            buoy_ids: Buoys to fetch
+            start_year: First year to fetch
+            end_year: Last year to fetch (inclusive; capped at the current year)
+            dataset_path: Dataset the rows go to, checked for stored years
+            stations: Registry providing coordinates; rows then get lat/lon
+                      and the dataset is partitioned by geohash
+            client: Client to download with (one is created if None)
+            max_concurrency: Maximum number of years downloading at once
+            rate: Maximum years started per second
+        """
+        super().__init__(
+            buoy_ids,
+            stations=stations,
+            client=client,
+            max_concurrency=max_concurrency,
+            rate=rate,
+        )
+        self.start_year = start_year
+        self.end_year = min(end_year, datetime.now().year)
+        self.dataset_path = Path(dataset_path)
+        self.ledger_path = self.dataset_path / BACKFILL_LEDGER
+        self._tasks: Optional[List[str]] = None
+        # Months each task still needs, and whether the lake has rows of its year
+        self._pending: Dict[str, List[int]] = {}
+        self._stored: Set[str] = set()
+        # Months each fetched task covers, recorded once its rows are committed
+        self._covered: Dict[str, List[int]] = {}
+
+    def tasks(self) -> List[str]:
+        # The lake is scanned once per run, not again when the runner asks again
+        if self._tasks is None:
+            ledger = self._ledger()
+            stored = stored_years(
+                self.dataset_path, self.buoy_ids, self.start_year, self.end_year
+            )
+            self._tasks = []
+            now = datetime.now()
+            for year in range(self.start_year, self.end_year + 1):
+                over = range(1, 13) if year < now.year else range(1, now.month)
+                for buoy_id in self.buoy_ids:
+                    done = set(ledger.get(buoy_id, {}).get(str(year), []))
+                    pending = [month for month in over if month not in done]
+                    if not pending:
+                        continue
+                    key = f"{buoy_id}/{year}"
+                    self._tasks.append(key)
+                    self._pending[key] = pending
+                    if (buoy_id, year) in stored:
+                        self._stored.add(key)
+            skipped = len(self.buoy_ids) * (self.end_year - self.start_year + 1) - len(self._tasks)
+            if skipped:
+                logger.info(f"Skipping {skipped} buoy years already in {self.dataset_path}")
+        return self._tasks
+
+    async def fetch(self, key: str) -> bytes:
+        buoy_id, year = key.split("/")
+        year = int(year)
+        if year < datetime.now().year:
+            content = await self.client.fetch_archive(
+                buoy_id, NDBCClient.archive_url(buoy_id, year)
+            )
+            if content is not None:
+                self._covered[key] = list(range(1, 13))
+                return content
+        months = self._pending.get(key, [])
+        archives = await asyncio.gather(
+            *(
+                self.client.fetch_archive(buoy_id, NDBCClient.archive_url(buoy_id, year, month))
+                for month in months
+            )
+        )
+        # Archives not published yet (or never) are asked for again next run
+        self._covered[key] = [
+            month
+            for month, content in zip(months, archives, strict=True)
+            if content
+        ]
+        return _join_stdmet([content for content in archives if content])
+
+    def parse(self, key: str, path: Union[Path, bytes]) -> Optional[pa.Table]:
+        table = super().parse(key, path)
+        if table is None or not table.num_rows:
+            return table
+        months = pc.month(table["timestamp"])
+        table = table.filter(pc.is_in(months, pa.array(self._pending.get(key, []), months.type)))
+        if key in self._stored:
+            buoy_id, year = key.split("/")
+            stored = _stored_times(self.dataset_path, buoy_id, int(year))
+            times = _micros(table["timestamp"])
+            table = table.filter(~np.isin(times, stored))
+        return table
+
+    def committed(self, keys: List[str]) -> None:
+        covered = [(key, self._covered.pop(key, [])) for key in keys]
+        covered = [(key, months) for key, months in covered if months]
+        if not covered:
+            return
+        ledger = self._ledger()
+        for key, months in covered:
+            buoy_id, year = key.split("/")
+            years = ledger.setdefault(buoy_id, {})
+            years[year] = sorted(set(years.get(year, [])) | set(months))
+        self.ledger_path.parent.mkdir(parents=True, exist_ok=True)
+        partial = self.ledger_path.with_name(self.ledger_path.name + ".tmp")
+        partial.write_text(json.dumps(ledger, sort_keys=True))
+        os.replace(partial, self.ledger_path)
+
+    def _ledger(self) -> Dict[str, Dict[str, List[int]]]:
+        if not self.ledger_path.exists():
+            return {}
+        return json.loads(self.ledger_path.read_text())
+
+
+def _join_stdmet(files: List[bytes]) -> bytes:
+    """Concatenate stdmet files of the same layout under the header of the first."""
+    if not files:
+        return b""
+    rows = [files[0].rstrip(b"\n") + b"\n"]
+    for content in files[1:]:
+        lines = content.split(b"\n")
+        body = b"\n".join(line for line in lines if line and not line.startswith(b"#"))
+        if body:
+            rows.append(body + b"\n")
+    return b"".join(rows)
+
+
+def _micros(timestamps: Union[pa.Array, pa.ChunkedArray]) -> np.ndarray:
+    """Microseconds since the epoch of a timestamp column."""
+    return pc.cast(timestamps, pa.timestamp("us")).cast(pa.int64()).to_numpy(
+        zero_copy_only=False
+    )
+
+
+def _stored_times(dataset_path: Path, buoy_id: str, year: int) -> np.ndarray:
+    """Timestamps (microseconds since the epoch) of a buoy's stored rows in a year."""
+    filters = [
+        ("buoy_id", "=", buoy_id),
+        ("timestamp", ">=", datetime(year, 1, 1)),
+        ("timestamp", "<", datetime(year + 1, 1, 1)),
+    ]
+    batches = iter_batches(dataset_path, columns=["timestamp"], filters=filters)
+    return np.concatenate([np.empty(0, np.int64)] + [_micros(b.column(0)) for b in batches])
+
+
+def stored_years(
+    dataset_path: Union[str, Path],
+    buoy_ids: List[str],
+    start_year: int,
+    end_year: int,
+) -> Set[Tuple[str, int]]:
+    """(buoy, year) pairs of a dataset with rows, scanning only its key columns batch by batch.
+
+    Args:
+        dataset_path: Dataset directory
+        buoy_ids: Buoys to look for
+        start_year: First year to look at
+        end_year: Last year to look at (inclusive)
+
+    Returns:
+        The pairs with at least one row
+    """
+    dataset_path = Path(dataset_path)
+    if not dataset_path.exists() or not buoy_ids:
+        return set()
+    filters = [
+        ("buoy_id", "in", list(buoy_ids)),
+        ("timestamp", ">=", datetime(start_year, 1, 1)),
+        ("timestamp", "<", datetime(end_year + 1, 1, 1)),
+    ]
+    stored: Set[Tuple[str, int]] = set()
+    for batch in iter_batches(dataset_path, columns=["buoy_id", "timestamp"], filters=filters):
+        stations = batch.column(0)
+        if pa.types.is_dictionary(stations.type):
+            names = stations.dictionary.to_pylist()
+            codes = stations.indices.to_numpy(zero_copy_only=False)
+        else:
+            encoded = stations.dictionary_encode()
+            names = encoded.dictionary.to_pylist()
+            codes = encoded.indices.to_numpy(zero_copy_only=False)
+        years = batch.column(1).to_numpy().astype("datetime64[Y]").astype(np.int64) + 1970
+        pairs = np.unique(codes.astype(np.int64) * 10_000 + years)
+        stored.update((names[pair // 10_000], int(pair % 10_000)) for pair in pairs)
+    return stored
+
+
+class CMEMSSource(Source):
+    """Copernicus Marine fields over a region, one download per time period."""
+
+    name = "cmems"
+    dataset = "cmems"
+
+    def __init__(
+        self,
+        client: Any,
+        dataset_path: Union[str, Path],
+        start_date: datetime,
+        end_date: datetime,
+        region: Dict[str, float],
+        dataset_id: str = "SST_GLO_SST_L4_NRT_OBSERVATIONS_010_001",
+        product_id: str = "METOFFICE-GLO-SST-L4-NRT-OBS-SST-V2",
+        variables: Optional[List[str]] = None,
+        days: int = 1,
+        max_concurrency: int = 2,
+        rate: Optional[float] = 0.5,
+    ):
+        """Initialize the source.
+
+        Args:
+            client: CopernicusClient to download with
+            dataset_path: Parquet dataset the fields are converted into
+            start_date: Start date
+            end_date: End date (inclusive)
+            region: Dict with min_lon, max_lon, min_lat, max_lat
+            dataset_id: Copernicus dataset ID
+            product_id: Copernicus product ID
+            variables: Variables to download
+            days: Days per download
+            max_concurrency: Maximum number of motuclient processes
+            rate: Maximum downloads started per second
+        """
+        self.client = client
+        self.dataset_path = Path(dataset_path)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.region = region
+        self.dataset_id = dataset_id
+        self.product_id = product_id
+        self.variables = variables or ["analysed_sst", "analysis_error"]
+        self.days = days
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+
+    def tasks(self) -> List[str]:
+        keys = []
+        cursor = self.start_date
+        while cursor <= self.end_date:
+            end = min(cursor + timedelta(days=self.days) - timedelta(seconds=1), self.end_date)
+            keys.append(f"{cursor:%Y%m%dT%H%M%S}-{end:%Y%m%dT%H%M%S}")
+            cursor += timedelta(days=self.days)
+        return keys
+
+    async def fetch(self, key: str) -> Path:
+        start, end = (datetime.strptime(part, "%Y%m%dT%H%M%S") for part in key.split("-"))
+        # motuclient is a blocking subprocess
+        return await asyncio.to_thread(
+            self.client.download_data,
+            dataset_id=self.dataset_id,
+            product_id=self.product_id,
+            variables=self.variables,
+            start_date=start,
+            end_date=end,
+            output_filename=f"{self.product_id}_{key}.nc",
+            **self.region,
+        )
+
+    def parse(self, key: str, path: Path) -> Optional[pa.Table]:
+        # Gridded files are streamed into the dataset chunk by chunk
+        netcdf_to_parquet(path, self.dataset_path, max_workers=1)
+        return None
@@ -0,0 +1,305 @@
+"""Asyncio client for bulk downloads from the NOAA National Data Buoy Center."""
+
+import asyncio
+import os
+import random
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import httpx
+from loguru import logger
+
+from seantral_data_pipeline.noaa.client import NDBCClient
+from seantral_data_pipeline.noaa.parser import GZIP_MAGIC
+from seantral_data_pipeline.timing import span
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# zlib window bits selecting the gzip container
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+T = TypeVar("T")
+
+
+class GzipStream:
+    """Incremental decompressor of a body that may be gzipped.
+
+    Bodies that do not start like gzip (e.g. already decoded by the server's
+    Content-Encoding) pass through unchanged; concatenated gzip members are
+    decompressed one after the other, as gzip itself does.
+    """
+
+    def __init__(self) -> None:
+        self.bytes_in = 0
+        self._head = b""
+        self._inflater: Optional["zlib._Decompress"] = None
+        self._plain = False
+        # Whether the body stopped inside a gzip member so far
+        self._partial = False
+
+    def feed(self, chunk: bytes) -> bytes:
+        """Decompress the next chunk of the body."""
+        self.bytes_in += len(chunk)
+        if self._inflater is None and not self._plain:
+            self._head += chunk
+            if len(self._head) < len(GZIP_MAGIC):
+                return b""
+            chunk, self._head = self._head, b""
+            if chunk.startswith(GZIP_MAGIC):
+                self._inflater = zlib.decompressobj(GZIP_WBITS)
+            else:
+                self._plain = True
+        if self._plain:
+            return chunk
+        parts = []
+        while chunk:
+            parts.append(self._inflater.decompress(chunk))
+            self._partial = not self._inflater.eof
+            if self._partial:
+                break
+            chunk = self._inflater.unused_data
+            self._inflater = zlib.decompressobj(GZIP_WBITS)
+        return b"".join(parts)
+
+    def finish(self) -> bytes:
+        """End the body.
+
+        Returns:
+            Bytes held back from a body too short to be recognized
+
+        Raises:
+            EOFError: If the body was cut off inside a gzip member
+        """
+        if self._partial:
+            raise EOFError("Truncated gzip stream")
+        head, self._head = self._head, b""
+        return head
+
+
+class AsyncNDBCClient:
+    """Asyncio counterpart of NDBCClient for syncing large buoy fleets.
+
+    All requests go through one shared httpx.AsyncClient, so connections to
+    the NDBC host are kept alive and reused instead of paying a TCP/TLS
+    handshake per file. A semaphore bounds the number of requests in flight.
+
+    Use it as an async context manager so the connection pool gets closed:
+
+        async with AsyncNDBCClient() as client:
+            paths = await client.download_multiple_buoys(buoy_ids)
+    """
+
+    BASE_URL = NDBCClient.BASE_URL
+
+    def __init__(
+        self,
+        output_dir: Optional[Path] = None,
+        timeout: int = 30,
+        max_concurrency: int = 32,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        chunk_size: int = 64 * 1024,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """Initialize async NDBC client.
+
+        Args:
+            output_dir: Directory for downloaded files
+            timeout: Request timeout in seconds
+            max_concurrency: Maximum number of requests in flight
+            max_retries: Retries per file after the first attempt
+            backoff_base: Base delay in seconds for exponential backoff
+            backoff_max: Maximum delay in seconds between retries
+            chunk_size: Size of the chunks streamed to disk
+            transport: Custom httpx transport (e.g. httpx.MockTransport in tests)
+        """
+        self.output_dir = output_dir or Path(tempfile.gettempdir()) / "ndbc"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.chunk_size = chunk_size
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+            ),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> "AsyncNDBCClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the shared connection pool."""
+        await self._client.aclose()
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Delay before the next attempt, using full jitter exponential backoff."""
+        if retry_after is not None:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def _stream_to_file(self, url: str, output_file: Path) -> None:
+        """Stream a response body to disk, replacing the target only on success."""
+        partial = output_file.with_name(output_file.name + ".part")
+        try:
+            async with self._client.stream("GET", url) as response:
+                response.raise_for_status()
+                with open(partial, "wb") as f:
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        f.write(chunk)
+            os.replace(partial, output_file)
+        finally:
+            if partial.exists():
+                partial.unlink()
+
+    async def download_buoy_data(
+        self,
+        buoy_id: str,
+        year: Optional[int] = None,
+        month: Optional[int] = None,
+        data_type: str = "stdmet",
+    ) -> Path:
+        """Download data for a specific buoy.
+
+        Transient failures (connection errors, timeouts, 429 and 5xx responses)
+        are retried with jittered exponential backoff; other HTTP errors such as
+        404 for an unknown buoy are raised immediately.
+
+        Args:
+            buoy_id: Buoy identifier (e.g., '46013')
+            year: Year to download (None for current year)
+            month: Month to download (None for current month)
+            data_type: Type of data to download
+
+        Returns:
+            Path to downloaded file
+        """
+        url, filename = NDBCClient.build_request(buoy_id, year, month, data_type)
+        output_file = self.output_dir / filename
+
+        async def download() -> None:
+            logger.debug(f"Downloading {buoy_id} data from NDBC: {url}")
+            with span("ndbc.download", buoy_id=buoy_id, url=url) as timing:
+                await self._stream_to_file(url, output_file)
+                timing.count(bytes=output_file.stat().st_size)
+
+        await self._retrying(buoy_id, download)
+        logger.info(f"Downloaded {buoy_id} data to {output_file}")
+        return output_file
+
+    async def fetch_archive(self, buoy_id: str, url: str) -> Optional[bytes]:
+        """Download a gzipped NDBC archive into memory, decompressed.
+
+        The body is inflated chunk by chunk as it arrives, so nothing touches
+        the disk and decompression overlaps the download. Retries as
+        download_buoy_data does.
+
+        Args:
+            buoy_id: Buoy identifier, for logs
+            url: URL of the archive (see NDBCClient.archive_url)
+
+        Returns:
+            The decompressed file, or None when there is no such archive (404)
+        """
+
+        async def download() -> Optional[bytes]:
+            with span("ndbc.download", buoy_id=buoy_id, url=url) as timing:
+                async with self._client.stream("GET", url) as response:
+                    if response.status_code == 404:
+                        return None
+                    response.raise_for_status()
+                    stream = GzipStream()
+                    parts = [
+                        stream.feed(chunk)
+                        async for chunk in response.aiter_bytes(self.chunk_size)
+                    ]
+                    parts.append(stream.finish())
+                timing.count(bytes=stream.bytes_in)
+            return b"".join(parts)
+
+        content = await self._retrying(buoy_id, download)
+        logger.debug(
+            f"Fetched {buoy_id} archive {url}" if content is not None
+            else f"No {buoy_id} archive at {url}"
+        )
+        return content
+
+    async def _retrying(self, buoy_id: str, request: Callable[[], Awaitable[T]]) -> T:
+        """Run a request within the concurrency limit, retrying transient failures."""
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    return await request()
+
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if status not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    logger.error(f"HTTP error downloading {buoy_id} data: {e}")
+                    raise
+                delay = self._backoff(attempt, e.response.headers.get("Retry-After"))
+
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"Request error downloading {buoy_id} data: {e}")
+                    raise
+                delay = self._backoff(attempt)
+
+            attempt += 1
+            logger.warning(
+                f"Retrying {buoy_id} in {delay:.2f}s (attempt {attempt}/{self.max_retries})"
+            )
+            await asyncio.sleep(delay)
+
+    async def download_multiple_buoys(
+        self,
+        buoy_ids: List[str],
+        year: Optional[int] = None,
+        month: Optional[int] = None,
+        data_type: str = "stdmet",
+    ) -> Dict[str, Path]:
+        """Download data for many buoys concurrently.
+
+        Args:
+            buoy_ids: List of buoy identifiers
+            year: Year to download
+            month: Month to download
+            data_type: Type of data to download
+
+        Returns:
+            Dictionary mapping buoy IDs to downloaded file paths; buoys that
+            failed are logged and left out
+        """
+        results = await asyncio.gather(
+            *(self.download_buoy_data(b, year, month, data_type) for b in buoy_ids),
+            return_exceptions=True,
+        )
+
+        paths = {}
+        for buoy_id, result in zip(buoy_ids, results, strict=True):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                logger.error(f"Error downloading data for buoy {buoy_id}: {result}")
+            else:
+                paths[buoy_id] = result
+
+        logger.success(f"Downloaded {len(paths)}/{len(buoy_ids)} buoys")
+        return paths
@@ -3,18 +3,30 @@
 import os
 import tempfile
 from pathlib import Path
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Tuple, Union, Any
 from datetime import datetime, timedelta
 import concurrent.futures
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import httpx
 from loguru import logger
 
+from seantral_data_pipeline.noaa.parser import parse_stdmet
+from seantral_data_pipeline.timing import span
+
 class NDBCClient:
     """Client for downloading data from NOAA NDBC."""
     
     BASE_URL = "https://www.ndbc.noaa.gov/data/"
+    STATION_TABLE_URL = "https://www.ndbc.noaa.gov/data/stations/station_table.txt"
+    
+    # Monthly archives of the current year live under the month's abbreviation
+    # and name it with one character (1-9, a, b, c)
+    MONTH_DIRS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                  "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+    MONTH_CODES = "123456789abc"
     
     def __init__(
         self,
@@ -34,49 +46,106 @@ class NDBCClient:
         self.timeout = timeout
         self.max_workers = max_workers
         
-    def download_buoy_data(
-        self,
+    @classmethod
+    def build_request(
+        cls,
         buoy_id: str,
         year: Optional[int] = None,
         month: Optional[int] = None,
         data_type: str = "stdmet",
-    ) -> Path:
-        """Download data for a specific buoy.
+    ) -> Tuple[str, str]:
+        """Build the download URL and local filename for a buoy data file.
         
         Args:
             buoy_id: Buoy identifier (e.g., '46013')
             year: Year to download (None for current year)
-            month: Month to download (None for current month)
+            month: Month to download (None for the whole year when a year is
+                   given, otherwise the current month)
             data_type: Type of data to download
-                       Options: stdmet, adcp, adcp2, cwind, dart, mmbcur, ocean, specs, wlevel
-                       
+            
         Returns:
-            Path to downloaded file
+            Tuple of (url, filename)
         """
         now = datetime.now()
+        if year is None and month is None:
+            month = now.month
         year = year or now.year
-        month = month or now.month
         
         # Determine URL and filename based on parameters
         if month is not None:
             # Monthly data
-            url = f"{self.BASE_URL}{data_type}/{month:02d}/{buoy_id}_{data_type}.txt"
+            url = f"{cls.BASE_URL}{data_type}/{month:02d}/{buoy_id}_{data_type}.txt"
             filename = f"{buoy_id}_{data_type}_{year}_{month:02d}.txt"
         else:
-            # Annual data
-            url = f"{self.BASE_URL}{data_type}/hist/{buoy_id}_{data_type}h{year}.txt"
-            filename = f"{buoy_id}_{data_type}_{year}.txt"
+            # Annual data, published gzipped
+            url = cls.archive_url(buoy_id, year, data_type=data_type)
+            filename = f"{buoy_id}_{data_type}_{year}.txt.gz"
+        
+        return url, filename
+    
+    @classmethod
+    def archive_url(
+        cls,
+        buoy_id: str,
+        year: int,
+        month: Optional[int] = None,
+        data_type: str = "stdmet",
+    ) -> str:
+        """URL of the gzipped historical file of a buoy for a year or a month.
+        
+        Years are archived some time after they end; until then, the months
+        of the year that are over are archived one file each.
+        
+        Args:
+            buoy_id: Buoy identifier (e.g., '46013')
+            year: Year of the archive
+            month: Month of the archive (None for the annual archive)
+            data_type: Type of data
+            
+        Returns:
+            URL of the archive
+        """
+        if month is None:
+            return f"{cls.BASE_URL}historical/{data_type}/{buoy_id.lower()}h{year}.txt.gz"
+        return (
+            f"{cls.BASE_URL}{data_type}/{cls.MONTH_DIRS[month - 1]}/"
+            f"{buoy_id.lower()}{cls.MONTH_CODES[month - 1]}{year}.txt.gz"
+        )
+    
+    def download_buoy_data(
+        self,
+        buoy_id: str,
+        year: Optional[int] = None,
+        month: Optional[int] = None,
+        data_type: str = "stdmet",
+    ) -> Path:
+        """Download data for a specific buoy.
+        
+        Args:
+            buoy_id: Buoy identifier (e.g., '46013')
+            year: Year to download (None for current year)
+            month: Month to download (None for the whole year when a year is
+                   given, otherwise the current month)
+            data_type: Type of data to download
+                       Options: stdmet, adcp, adcp2, cwind, dart, mmbcur, ocean, specs, wlevel
+                       
+        Returns:
+            Path to downloaded file
+        """
+        url, filename = self.build_request(buoy_id, year, month, data_type)
         
         output_file = self.output_dir / filename
         
         try:
             logger.info(f"Downloading {buoy_id} data from NDBC: {url}")
-            with httpx.Client(timeout=self.timeout) as client:
-                response = client.get(url)
-                response.raise_for_status()
-                
-                with open(output_file, "wb") as f:
-                    f.write(response.content)
+            with span("ndbc.download", buoy_id=buoy_id, url=url) as timing:
+                with httpx.Client(timeout=self.timeout) as client:
+                    response = client.get(url)
+                    response.raise_for_status()
+                    
+                    with open(output_file, "wb") as f:
+                        f.write(response.content)
+                timing.count(bytes=len(response.content))
                     
             logger.success(f"Successfully downloaded {buoy_id} data to {output_file}")
             return output_file
@@ -88,67 +157,73 @@ class NDBCClient:
             logger.error(f"Request error downloading {buoy_id} data: {e}")
             raise
     
-    def parse_buoy_data(self, file_path: Path) -> pd.DataFrame:
-        """Parse NDBC buoy data file into a DataFrame.
+    def download_station_table(self) -> Path:
+        """Download the NDBC station table with station coordinates.
+        
+        The file can be loaded with StationRegistry.from_ndbc_station_table.
+        
+        Returns:
+            Path to downloaded file
+        """
+        output_file = self.output_dir / "station_table.txt"
+        
+        try:
+            logger.info(f"Downloading NDBC station table: {self.STATION_TABLE_URL}")
+            with httpx.Client(timeout=self.timeout) as client:
+                response = client.get(self.STATION_TABLE_URL)
+                response.raise_for_status()
+                
+                with open(output_file, "wb") as f:
+                    f.write(response.content)
+                    
+            logger.success(f"Successfully downloaded station table to {output_file}")
+            return output_file
+            
+        except httpx.HTTPError as e:
+            logger.error(f"Error downloading NDBC station table: {e}")
+            raise
+    
+    def parse_buoy_table(self, file_path: Path) -> pa.Table:
+        """Parse an NDBC stdmet file into a typed Arrow table ready for storage.
         
         Args:
             file_path: Path to data file
             
         Returns:
-            DataFrame with parsed data
+            Table with timestamp, float32 measurements (missing values as nulls)
+            and buoy_id columns
         """
         try:
-            # Read the data file, skipping comment lines and header
-            df = pd.read_csv(file_path, delim_whitespace=True, skiprows=[0, 1])
-            
-            # Standard column names for stdmet data
-            # Adjust as needed for other data types
-            column_map = {
-                "#YY": "year",
-                "MM": "month",
-                "DD": "day",
-                "hh": "hour",
-                "mm": "minute",
-                "WDIR": "wind_direction",
-                "WSPD": "wind_speed",
-                "GST": "gust_speed",
-                "WVHT": "wave_height",
-                "DPD": "dominant_wave_period",
-                "APD": "average_wave_period",
-                "MWD": "mean_wave_direction",
-                "PRES": "pressure",
-                "ATMP": "air_temperature",
-                "WTMP": "water_temperature",
-                "DEWP": "dewpoint_temperature",
-                "VIS": "visibility",
-                "PTDY": "pressure_tendency",
-                "TIDE": "tide_level",
-            }
-            
-            # Rename columns if they exist
-            df.rename(columns={k: v for k, v in column_map.items() if k in df.columns}, inplace=True)
-            
-            # Convert date columns to datetime
-            if all(c in df.columns for c in ["year", "month", "day", "hour", "minute"]):
-                df["timestamp"] = pd.to_datetime(
-                    df[["year", "month", "day", "hour", "minute"]],
-                    errors="coerce"
-                )
-            
             # Extract buoy ID from filename
             buoy_id = file_path.stem.split("_")[0]
-            df["buoy_id"] = buoy_id
-            
-            # Add metadata
-            df["source"] = "NOAA NDBC"
-            df["file_path"] = str(file_path)
-            
-            return df
+            with span("ndbc.parse", buoy_id=buoy_id, path=str(file_path)) as timing:
+                table = parse_stdmet(file_path, buoy_id=buoy_id)
+                timing.count(rows=table.num_rows, bytes=os.path.getsize(file_path))
+            return table
             
         except Exception as e:
             logger.error(f"Error parsing buoy data: {e}")
             raise
     
+    def parse_buoy_data(self, file_path: Path) -> pd.DataFrame:
+        """Parse NDBC buoy data file into a DataFrame.
+        
+        Args:
+            file_path: Path to data file
+            
+        Returns:
+            DataFrame with parsed data; buoy_id, source and file_path are
+            categorical, holding their one value once instead of per row
+        """
+        df = self.parse_buoy_table(file_path).to_pandas()
+        
+        # Add metadata
+        codes = np.zeros(len(df), dtype=np.int8)
+        df["source"] = pd.Categorical.from_codes(codes, ["NOAA NDBC"])
+        df["file_path"] = pd.Categorical.from_codes(codes, [str(file_path)])
+        
+        return df
+    
     def download_multiple_buoys(
         self,
         buoy_ids: List[str],
@@ -0,0 +1 @@
+"""Query engine for reading time series from the Parquet data lake."""
@@ -0,0 +1,223 @@
+"""Downsampling of time series to a bounded number of points for charting."""
+
+from datetime import timedelta
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Aggregations computed per time bucket by the query engine
+BUCKET_AGGREGATIONS = ("mean", "min", "max", "minmax")
+# Every supported downsampling method
+METHODS = ("lttb",) + BUCKET_AGGREGATIONS
+
+# Bucket widths in seconds, from one minute to one week. Snapping to these keeps
+# bucket boundaries stable when the requested range slides a little.
+NICE_WIDTHS = (
+    60, 120, 300, 600, 900, 1800,
+    3600, 2 * 3600, 3 * 3600, 6 * 3600, 12 * 3600,
+    86400, 2 * 86400, 7 * 86400,
+)
+
+
+def bucket_width(span: timedelta, max_points: int, points_per_bucket: int = 1) -> timedelta:
+    """Pick a bucket width that yields at most max_points over a time span.
+
+    Buckets are aligned to the epoch, so a span can straddle one extra bucket;
+    the width is chosen for max_points - 1 buckets to stay within budget.
+
+    Args:
+        span: Length of the queried time range
+        max_points: Maximum number of points to return
+        points_per_bucket: Points each bucket produces (2 for minmax)
+
+    Returns:
+        Bucket width, rounded up to the next nice width
+    """
+    buckets = max(1, max_points // points_per_bucket - 1)
+    seconds = max(span.total_seconds() / buckets, 1.0)
+    for width in NICE_WIDTHS:
+        if width >= seconds:
+            return timedelta(seconds=width)
+    # Beyond a week, round up to whole days
+    return timedelta(days=int(np.ceil(seconds / 86400)))
+
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, max_points: int) -> np.ndarray:
+    """Select points with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The points in between are split
+    into max_points - 2 equal buckets and from each bucket the point forming the
+    largest triangle with the previously selected point and the average of the
+    next bucket is kept, which preserves the visual shape of the series.
+    NaN values are never selected.
+
+    Args:
+        timestamps: Sorted datetime64 timestamps
+        values: Values aligned with timestamps
+        max_points: Number of points to keep (at least 3)
+
+    Returns:
+        Sorted indices of the selected points
+    """
+    valid = _valid_rows(values)
+    if valid is not None:
+        return valid[lttb(timestamps[valid], np.asarray(values)[valid], max_points)]
+    n = len(values)
+    if max_points >= n or n < 3:
+        return np.arange(n)
+    if max_points < 3:
+        raise ValueError("LTTB needs max_points >= 3")
+
+    x = timestamps.astype("datetime64[us]").astype(np.int64).astype(np.float64)
+    x -= x[0]
+    y = np.asarray(values, dtype=np.float64)
+
+    # Bucket boundaries over the interior points 1..n-2
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(max_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_stop = n - 1, n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+
+        # Twice the triangle area; the constant factor does not change the argmax
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
+def _valid_rows(values: np.ndarray) -> Optional[np.ndarray]:
+    """Indices of the non-NaN values, or None when there is no NaN to leave out."""
+    missing = np.isnan(np.asarray(values, dtype=np.float64))
+    return np.flatnonzero(~missing) if missing.any() else None
+
+
+def minmax(values: np.ndarray, max_points: int) -> np.ndarray:
+    """Keep the minimum and maximum of each of max_points // 2 equal-count buckets.
+
+    NaN values are left out before bucketing.
+
+    Args:
+        values: Series values
+        max_points: Maximum number of points to keep
+
+    Returns:
+        Sorted indices of the selected points
+    """
+    valid = _valid_rows(values)
+    if valid is not None:
+        return valid[minmax(np.asarray(values)[valid], max_points)]
+    n = len(values)
+    buckets = max_points // 2
+    if max_points >= n or buckets < 1:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    y = np.asarray(values, dtype=np.float64)
+    lows = np.minimum.reduceat(y, edges[:-1])
+    highs = np.maximum.reduceat(y, edges[:-1])
+    # Map each bucket's min/max back to the first row holding it
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    rows = np.arange(n)
+    keep = []
+    for extremes in (lows, highs):
+        hit = y == extremes[bucket]
+        first = np.full(buckets, n)
+        np.minimum.at(first, bucket[hit], rows[hit])
+        keep.append(first)
+    return np.unique(np.concatenate(keep))
+
+
+def aggregate(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    width: timedelta,
+    agg: str,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Aggregate an in-memory series into epoch-aligned buckets, as the query engine does.
+
+    mean, min and max produce one point per bucket stamped with the bucket
+    start; minmax keeps the rows holding each bucket's minimum and maximum.
+    NaN values are left out, as DuckDB leaves out nulls, and buckets without
+    any other value produce no point.
+
+    Args:
+        timestamps: Sorted datetime64 timestamps
+        values: Values aligned with timestamps
+        width: Bucket width
+        agg: mean, min, max or minmax
+
+    Returns:
+        Tuple of (timestamps, values) of the aggregated points
+    """
+    if agg not in BUCKET_AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation: {agg}")
+    valid = _valid_rows(values)
+    if valid is not None:
+        timestamps, values = timestamps[valid], np.asarray(values)[valid]
+    n = len(values)
+    if n == 0:
+        return timestamps, values
+    step = np.timedelta64(int(width.total_seconds()), "s")
+    starts = timestamps.astype("datetime64[s]")
+    starts = starts - (starts - np.datetime64(0, "s")) % step
+    buckets, edges, bucket = np.unique(starts, return_index=True, return_inverse=True)
+    y = np.asarray(values, dtype=np.float64)
+
+    if agg == "mean":
+        sums = np.add.reduceat(y, edges)
+        return buckets.astype(timestamps.dtype), sums / np.diff(np.append(edges, n))
+    lows = np.minimum.reduceat(y, edges)
+    highs = np.maximum.reduceat(y, edges)
+    if agg == "min":
+        return buckets.astype(timestamps.dtype), lows
+    if agg == "max":
+        return buckets.astype(timestamps.dtype), highs
+
+    rows = np.arange(n)
+    keep = []
+    for extremes in (lows, highs):
+        hit = y == extremes[bucket]
+        first = np.full(len(buckets), n)
+        np.minimum.at(first, bucket[hit], rows[hit])
+        keep.append(first)
+    keep = np.unique(np.concatenate(keep))
+    return timestamps[keep], values[keep]
+
+
+def downsample(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    max_points: int,
+    method: str = "lttb",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce an in-memory series to at most max_points points.
+
+    Args:
+        timestamps: Sorted datetime64 timestamps
+        values: Values aligned with timestamps
+        max_points: Maximum number of points to return
+        method: lttb or minmax
+
+    Returns:
+        Tuple of (timestamps, values) of the kept points
+    """
+    if method == "lttb":
+        keep = lttb(timestamps, values, max_points)
+    elif method == "minmax":
+        keep = minmax(values, max_points)
+    else:
+        raise ValueError(f"Unsupported downsampling method: {method}")
+    return timestamps[keep], values[keep]
@@ -0,0 +1,672 @@
+"""Embedded DuckDB query engine over the Parquet data lake."""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+from seantral_data_pipeline.query.downsample import BUCKET_AGGREGATIONS
+from seantral_data_pipeline.storage.catalog import Catalog, CatalogFile, to_naive_utc
+from seantral_data_pipeline.storage.layout import ROLLUPS, rollup_path
+from seantral_data_pipeline.timing import span
+
+if TYPE_CHECKING:
+    import duckdb
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_DATASET = re.compile(r"^[A-Za-z0-9_\-]+(/[A-Za-z0-9_\-]+)*$")
+
+# Origin of time buckets; DuckDB's default (2000-01-03, a Monday) would shift
+# buckets wider than a day away from the epoch-aligned ones used everywhere else
+BUCKET_ORIGIN = "TIMESTAMP '1970-01-01'"
+
+# Session variable holding the catalog's file list for the next prepared scan;
+# variables live on the cursor, and every thread has its own
+_FILES_VARIABLE = "scan_files"
+
+# DuckDB profiler metrics read back after every query; cheap enough to keep on
+_PROFILING_SETTINGS = '{"CUMULATIVE_ROWS_SCANNED": "true"}'
+
+
+@dataclass(frozen=True)
+class VariableSpec:
+    """Location of a queryable variable in the data lake."""
+
+    dataset: str
+    column: str
+    unit: str
+    source: str
+
+    def __post_init__(self) -> None:
+        # Dataset and column names end up inside SQL text, so only allow plain names
+        if not _DATASET.match(self.dataset):
+            raise ValueError(f"Invalid dataset name: {self.dataset!r}")
+        if not _IDENTIFIER.match(self.column):
+            raise ValueError(f"Invalid column name: {self.column!r}")
+
+
+# Public variable names mapped to the lake columns that store them
+VARIABLES: Dict[str, VariableSpec] = {
+    "sst": VariableSpec("ndbc", "water_temperature", "°C", "NDBC"),
+    "air_temperature": VariableSpec("ndbc", "air_temperature", "°C", "NDBC"),
+    "wave_height": VariableSpec("ndbc", "wave_height", "m", "NDBC"),
+    "wave_period": VariableSpec("ndbc", "dominant_wave_period", "s", "NDBC"),
+    "wind_speed": VariableSpec("ndbc", "wind_speed", "m/s", "NDBC"),
+    "wind_direction": VariableSpec("ndbc", "wind_direction", "degT", "NDBC"),
+    "pressure": VariableSpec("ndbc", "pressure", "hPa", "NDBC"),
+}
+
+
+@dataclass
+class TimeSeriesResult:
+    """Columnar result of a time series query."""
+
+    variable: str
+    unit: str
+    source: str
+    timestamps: np.ndarray
+    values: np.ndarray
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def empty(
+        cls,
+        variable: str,
+        spec: VariableSpec,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> "TimeSeriesResult":
+        """Build a result without any points."""
+        return cls(
+            variable=variable,
+            unit=spec.unit,
+            source=spec.source,
+            timestamps=np.array([], dtype="datetime64[us]"),
+            values=np.array([], dtype=np.float64),
+            metadata=dict(metadata or {}),
+        )
+
+
+def _sql_literal(value: Any) -> str:
+    """Render a query parameter as a SQL literal for an EXECUTE statement."""
+    if isinstance(value, datetime):
+        return f"TIMESTAMP '{value.isoformat(sep=' ')}'"
+    if isinstance(value, (bool, np.bool_)):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        number = float(value)
+        if not np.isfinite(number):
+            raise ValueError(f"Non-finite query parameter: {value!r}")
+        return repr(int(value)) if isinstance(value, (int, np.integer)) else repr(number)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    raise TypeError(f"Unsupported query parameter type: {type(value).__name__}")
+
+
+def format_resolution(resolution: Optional[timedelta]) -> str:
+    """Describe a bucket width for result metadata, e.g. '3600s' (or 'raw')."""
+    if resolution is None:
+        return "raw"
+    return f"{int(resolution.total_seconds())}s"
+
+
+class QueryEngine:
+    """Time series queries over the Parquet lake using an embedded DuckDB database.
+
+    One engine is meant to live for the lifetime of a worker process. It owns a
+    single in-memory DuckDB database; every thread gets its own cursor with its
+    own set of prepared statements, so queries never pay connection setup and
+    the SQL is planned once per thread rather than once per request.
+
+    DuckDB is imported and the database opened by the first query, so creating
+    an engine costs nothing at process start.
+
+    Raw rows of a dataset covered by the lake's metadata catalog are scanned
+    from the files the catalog selects for the query's time range, stations
+    or box, without listing the dataset; a query no file can match never
+    reaches DuckDB. Other datasets and the rollups are scanned by glob.
+    """
+
+    def __init__(
+        self,
+        lake_path: Union[str, Path],
+        variables: Optional[Dict[str, VariableSpec]] = None,
+        threads: Optional[int] = None,
+        memory_limit: Optional[str] = None,
+    ):
+        """Initialize the query engine.
+
+        Args:
+            lake_path: Root directory of the Parquet data lake
+            variables: Variable registry (defaults to VARIABLES)
+            threads: Number of DuckDB worker threads (None for DuckDB default)
+            memory_limit: DuckDB memory limit, e.g. '1GB' (None for DuckDB default)
+        """
+        self.lake_path = Path(lake_path)
+        self.variables = variables or VARIABLES
+
+        self.threads = threads
+        self.memory_limit = memory_limit
+
+        self._conn: Optional["duckdb.DuckDBPyConnection"] = None
+        self._catalogs: Dict[str, Tuple[Catalog, str]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiling = True
+
+    def close(self) -> None:
+        """Close the underlying DuckDB database."""
+        if self._conn is not None:
+            self._conn.close()
+        for catalog, _ in self._catalogs.values():
+            catalog.close()
+
+    def _connect(self) -> "duckdb.DuckDBPyConnection":
+        import duckdb
+
+        conn = duckdb.connect(database=":memory:")
+        # Keep Parquet footers cached between queries instead of re-reading them
+        conn.execute("SET enable_object_cache = true")
+        if self.threads is not None:
+            conn.execute(f"SET threads = {int(self.threads)}")
+        if self.memory_limit is not None:
+            conn.execute(f"SET memory_limit = {_sql_literal(str(self.memory_limit))}")
+        return conn
+
+    def _cursor(self) -> "duckdb.DuckDBPyConnection":
+        """Return the calling thread's cursor, creating it on first use."""
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            import duckdb
+
+            with self._lock:
+                if self._conn is None:
+                    self._conn = self._connect()
+                cursor = self._conn.cursor()
+            if self._profiling:
+                try:
+                    cursor.execute("PRAGMA enable_profiling = 'no_output'")
+                    cursor.execute(f"SET custom_profiling_settings = '{_PROFILING_SETTINGS}'")
+                except duckdb.Error as e:
+                    logger.warning(
+                        f"DuckDB profiling unavailable, rows scanned are not reported: {e}"
+                    )
+                    self._profiling = False
+            self._local.cursor = cursor
+            self._local.prepared = set()
+        return cursor
+
+    def _rows_scanned(self) -> Optional[int]:
+        """Rows DuckDB read from Parquet for the calling thread's last query."""
+        if not self._profiling:
+            return None
+        import duckdb
+
+        try:
+            info = json.loads(self._cursor().get_profiling_information(format="json"))
+        except (duckdb.Error, TypeError, ValueError):
+            return None
+        value = info.get("cumulative_rows_scanned")
+        return int(value) if value is not None else None
+
+    def _partition_bytes(self, dataset: str, geohash: str, rollup: Optional[str] = None) -> int:
+        """Size of the Parquet files in one geohash partition of a dataset or rollup."""
+        path = self.dataset_path(dataset)
+        if rollup is not None:
+            path = rollup_path(path, rollup)
+        size = 0
+        for root, _, files in os.walk(path / f"geohash={geohash}"):
+            size += sum(
+                os.path.getsize(os.path.join(root, f)) for f in files if f.endswith(".parquet")
+            )
+        return size
+
+    def _catalog_files(
+        self,
+        dataset: str,
+        start_time: datetime,
+        end_time: datetime,
+        columns: Sequence[str],
+        stations: Optional[Sequence[str]] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        geohash: Optional[str] = None,
+    ) -> Optional[List[CatalogFile]]:
+        """Raw files of a dataset a query has to scan, or None if the dataset is not cataloged."""
+        with self._lock:
+            if dataset not in self._catalogs:
+                self._catalogs[dataset] = Catalog.for_dataset(self.dataset_path(dataset))
+            catalog, name = self._catalogs[dataset]
+        return catalog.files(
+            name,
+            start=start_time,
+            end=end_time,
+            stations=stations,
+            bbox=bbox,
+            variables=columns,
+            partition=f"geohash={geohash}" if geohash is not None else None,
+        )
+
+    def _execute_prepared(
+        self,
+        name: str,
+        sql: str,
+        params: list,
+        files: Optional[List[CatalogFile]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Execute a named prepared statement, preparing it on first use in this thread.
+
+        Args:
+            name: Statement name; statements with the same name must have the same SQL
+            sql: Statement text with $n placeholders
+            params: Values of the placeholders
+            files: Files the statement's catalog scan reads (see scan_expression)
+        """
+        cursor = self._cursor()
+        if files is not None:
+            # The list can hold thousands of paths, so it is bound rather than
+            # rendered into the EXECUTE statement below; DuckDB reads it when
+            # binding PREPARE as well as on every EXECUTE
+            cursor.execute(
+                f"SET VARIABLE {_FILES_VARIABLE} = ?", [[f.path.as_posix() for f in files]]
+            )
+        prepared: Set[str] = self._local.prepared
+        if name not in prepared:
+            cursor.execute(f"PREPARE {name} AS {sql}")
+            prepared.add(name)
+
+        # DuckDB does not accept bound parameters on EXECUTE, so the scalar values
+        # are rendered as typed literals; the statement itself stays prepared.
+        arguments = ", ".join(_sql_literal(value) for value in params)
+        return cursor.execute(f"EXECUTE {name}({arguments})").fetchnumpy()
+
+    def dataset_path(self, dataset: str) -> Path:
+        """Return the directory holding a lake dataset."""
+        return self.lake_path / dataset
+
+    def scan_expression(
+        self,
+        dataset: str,
+        rollup: Optional[str] = None,
+        files: bool = False,
+    ) -> str:
+        """Return the DuckDB table expression that scans a lake dataset or one of its rollups.
+
+        Args:
+            dataset: Dataset name
+            rollup: Rollup of the dataset to scan instead of its raw rows
+            files: Scan the raw files selected by the catalog, which are passed to
+                   _execute_prepared, instead of all of them
+        """
+        if files:
+            return (
+                f"read_parquet(getvariable('{_FILES_VARIABLE}')::VARCHAR[], "
+                f"hive_partitioning = true, "
+                f"union_by_name = true)"
+            )
+        path = self.dataset_path(dataset)
+        if rollup is not None:
+            path = rollup_path(path, rollup)
+        glob = (path / "**" / "*.parquet").as_posix().replace("'", "''")
+        return f"read_parquet('{glob}', hive_partitioning = true, union_by_name = true)"
+
+    def plan_rollup(self, dataset: str, resolution: timedelta) -> Optional[str]:
+        """Pick the coarsest materialized rollup that can serve a resolution.
+
+        A rollup qualifies when its buckets nest exactly inside the requested
+        ones, i.e. the requested width is a whole multiple of the rollup width.
+
+        Returns:
+            Rollup name, or None if the raw rows have to be aggregated
+        """
+        by_width = sorted(ROLLUPS.items(), key=lambda item: item[1], reverse=True)
+        for name, width in by_width:
+            if resolution % width == timedelta(0):
+                if rollup_path(self.dataset_path(dataset), name).is_dir():
+                    return name
+        return None
+
+    def get_variable(self, variable: str) -> VariableSpec:
+        """Look up a variable in the registry.
+
+        Raises:
+            KeyError: If the variable is not supported
+        """
+        try:
+            return self.variables[variable]
+        except KeyError:
+            raise KeyError(f"Unsupported variable: {variable}") from None
+
+    def query_timeseries(
+        self,
+        variable: str,
+        start_time: datetime,
+        end_time: datetime,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None,
+        radius: float = 0.25,
+        station: Optional[str] = None,
+        geohash: Optional[str] = None,
+        resolution: Optional[timedelta] = None,
+        agg: str = "mean",
+    ) -> TimeSeriesResult:
+        """Query a time series for a location or a station.
+
+        The time range and the location (a lat/lon box of +/- radius degrees, or
+        a station id) are expressed as predicates on the Parquet scan, so DuckDB
+        skips row groups whose min/max statistics cannot match. Passing the
+        geohash partition of a station restricts the scan to that one directory.
+
+        With a resolution, rows are grouped into aligned time buckets inside
+        DuckDB and only one aggregated row per bucket (two for minmax) leaves
+        the engine, so the result size depends on the range and the resolution
+        rather than on the sampling rate of the source. When an hourly or daily
+        rollup of the dataset nests inside the requested buckets, the coarsest
+        such rollup is aggregated instead of the raw rows.
+
+        Args:
+            variable: Variable name from the registry
+            start_time: Start of the time range (inclusive)
+            end_time: End of the time range (inclusive)
+            lat: Latitude of the location
+            lon: Longitude of the location
+            radius: Half-width of the lat/lon search box in degrees
+            station: Station identifier; takes precedence over lat/lon
+            geohash: Geohash partition holding the station's rows
+            resolution: Width of the time buckets to aggregate into (None for raw rows)
+            agg: Bucket aggregation: mean, min, max or minmax
+
+        Returns:
+            Time series sorted by timestamp
+        """
+        spec = self.get_variable(variable)
+        start_time = to_naive_utc(start_time)
+        end_time = to_naive_utc(end_time)
+        if end_time < start_time:
+            raise ValueError("end_time must not be before start_time")
+
+        bbox = None
+        if station is not None and geohash is not None:
+            where = "geohash = $3 AND buoy_id = $4"
+            params: list = [start_time, end_time, geohash, station]
+            kind = "partition"
+        elif station is not None:
+            where = "buoy_id = $3"
+            params = [start_time, end_time, station]
+            kind = "station"
+        elif lat is not None and lon is not None:
+            where = "lat BETWEEN $3 AND $4 AND lon BETWEEN $5 AND $6"
+            params = [start_time, end_time, lat - radius, lat + radius, lon - radius, lon + radius]
+            bbox = (lat - radius, lon - radius, lat + radius, lon + radius)
+            kind = "bbox"
+        else:
+            raise ValueError("Either station or lat/lon must be given")
+
+        if resolution is not None:
+            if agg not in BUCKET_AGGREGATIONS:
+                raise ValueError(f"Unsupported aggregation: {agg}")
+            if resolution.total_seconds() < 1:
+                raise ValueError("resolution must be at least one second")
+
+        metadata: Dict[str, Any] = {
+            "resolution": format_resolution(resolution),
+            "dataset": spec.dataset,
+        }
+        if resolution is not None:
+            metadata["agg"] = agg
+        if not self.dataset_path(spec.dataset).is_dir():
+            logger.warning(f"Dataset {spec.dataset} not found in {self.lake_path}")
+            return TimeSeriesResult.empty(variable, spec, metadata)
+
+        rollup = None
+        if resolution is not None:
+            rollup = self.plan_rollup(spec.dataset, resolution)
+        name = f"ts_{spec.dataset.replace('/', '_').replace('-', '_')}_{spec.column}_{kind}"
+        if rollup is not None:
+            # Rollup rows are stamped with their bucket start, so widen the range
+            # to include the bucket holding start_time
+            width = ROLLUPS[rollup]
+            params[0] = start_time - (start_time - datetime(1970, 1, 1)) % width
+            present = f"{spec.column}_count > 0"
+            metadata["rollup"] = rollup
+            name = f"{name}_{rollup}"
+        else:
+            present = f"{spec.column} IS NOT NULL"
+
+        files = None
+        if rollup is None:
+            files = self._catalog_files(
+                spec.dataset,
+                start_time,
+                end_time,
+                [spec.column],
+                stations=[station] if station is not None else None,
+                bbox=bbox,
+                geohash=geohash if kind == "partition" else None,
+            )
+            if files == []:
+                return TimeSeriesResult.empty(variable, spec, metadata)
+
+        if files is not None:
+            name = f"{name}_files"
+        scan = (
+            f"FROM {self.scan_expression(spec.dataset, rollup, files is not None)} "
+            f"WHERE timestamp BETWEEN $1 AND $2 AND {where} AND {present}"
+        )
+        if resolution is None:
+            sql = f"SELECT timestamp, {spec.column} AS value {scan} ORDER BY timestamp"
+        else:
+            sql = self._bucket_sql(spec.column, scan, len(params) + 1, agg, rollup is not None)
+            params.append(int(resolution.total_seconds() * 1_000_000))
+            name = f"{name}_{agg}"
+        with span("query.timeseries", variable=variable, kind=kind, rollup=rollup) as timing:
+            columns = self._execute_prepared(name, sql, params, files)
+            timing.count(rows=len(next(iter(columns.values()))), rows_scanned=self._rows_scanned())
+            if files is not None:
+                timing.count(files=len(files), bytes=sum(f.bytes for f in files))
+            elif kind == "partition":
+                timing.count(bytes=self._partition_bytes(spec.dataset, geohash, rollup))
+
+        if resolution is not None and agg == "minmax":
+            timestamps, values = _interleave_minmax(columns)
+        else:
+            timestamps = columns["timestamp"]
+            values = np.asarray(columns["value"], dtype=np.float64)
+
+        return TimeSeriesResult(
+            variable=variable,
+            unit=spec.unit,
+            source=spec.source,
+            timestamps=timestamps,
+            values=values,
+            metadata=metadata,
+        )
+
+    @staticmethod
+    def _bucket_sql(
+        column: str,
+        scan: str,
+        width_param: int,
+        agg: str,
+        rollup: bool = False,
+    ) -> str:
+        """Build the time-bucket aggregation query over a filtered scan."""
+        bucket = f"time_bucket(to_microseconds(${width_param}), timestamp, {BUCKET_ORIGIN})"
+        if rollup:
+            low, high = f"{column}_min", f"{column}_max"
+        else:
+            low = high = column
+
+        if agg == "minmax":
+            # Keep the extremes at the time they were observed
+            select = (
+                f"arg_min(timestamp, {low}) AS low_time, min({low}) AS low, "
+                f"arg_max(timestamp, {high}) AS high_time, max({high}) AS high"
+            )
+        else:
+            select = f"{bucket} AS timestamp, {_aggregate(column, agg, rollup)} AS value"
+        return f"SELECT {select} {scan} GROUP BY {bucket} ORDER BY {bucket}"
+
+    def query_stations(
+        self,
+        variables: Sequence[str],
+        stations: Sequence[str],
+        start_time: datetime,
+        end_time: datetime,
+        geohash: Optional[str] = None,
+        resolution: Optional[timedelta] = None,
+        agg: str = "mean",
+    ) -> Dict[Tuple[str, str], TimeSeriesResult]:
+        """Query several variables for several stations with a single scan.
+
+        All variables must live in the same dataset. Rows of every requested
+        station and column are read together (from one geohash partition when
+        given) and split into one series per (station, variable) afterwards,
+        so serving many series costs about as much as serving one.
+
+        Args:
+            variables: Variable names from the registry
+            stations: Station identifiers
+            start_time: Start of the time range (inclusive)
+            end_time: End of the time range (inclusive)
+            geohash: Geohash partition holding all of the stations' rows
+            resolution: Width of the time buckets to aggregate into (None for raw rows)
+            agg: Bucket aggregation: mean, min or max
+
+        Returns:
+            Dictionary mapping (station, variable) to its time series
+        """
+        specs = {variable: self.get_variable(variable) for variable in variables}
+        datasets = {spec.dataset for spec in specs.values()}
+        if len(datasets) != 1:
+            raise ValueError("Grouped queries need variables from a single dataset")
+        dataset = datasets.pop()
+        start_time = to_naive_utc(start_time)
+        end_time = to_naive_utc(end_time)
+        if end_time < start_time:
+            raise ValueError("end_time must not be before start_time")
+        if resolution is not None and agg not in ("mean", "min", "max"):
+            raise ValueError(f"Unsupported aggregation for grouped queries: {agg}")
+
+        metadata: Dict[str, Any] = {"resolution": format_resolution(resolution), "dataset": dataset}
+        if resolution is not None:
+            metadata["agg"] = agg
+        rollup = self.plan_rollup(dataset, resolution) if resolution is not None else None
+        if rollup is not None:
+            metadata["rollup"] = rollup
+        results = {
+            (station, variable): TimeSeriesResult.empty(variable, spec, metadata)
+            for station in stations
+            for variable, spec in specs.items()
+        }
+        if not stations or not self.dataset_path(dataset).is_dir():
+            return results
+
+        columns = sorted({spec.column for spec in specs.values()})
+        params: list = [start_time, end_time]
+        if rollup is not None:
+            width = ROLLUPS[rollup]
+            params[0] = start_time - (start_time - datetime(1970, 1, 1)) % width
+            present = " OR ".join(f"{c}_count > 0" for c in columns)
+        else:
+            present = " OR ".join(f"{c} IS NOT NULL" for c in columns)
+        where = f"timestamp BETWEEN $1 AND $2 AND ({present})"
+        if geohash is not None:
+            params.append(geohash)
+            where += f" AND geohash = ${len(params)}"
+        first = len(params) + 1
+        params.extend(stations)
+        where += f" AND buoy_id IN ({', '.join(f'${i}' for i in range(first, len(params) + 1))})"
+
+        files = None
+        if rollup is None:
+            files = self._catalog_files(
+                dataset, start_time, end_time, columns, stations=stations, geohash=geohash
+            )
+            if files == []:
+                return results
+
+        scan = f"FROM {self.scan_expression(dataset, rollup, files is not None)} WHERE {where}"
+        if resolution is None:
+            sql = (
+                f"SELECT buoy_id, timestamp, {', '.join(columns)} {scan} "
+                f"ORDER BY buoy_id, timestamp"
+            )
+        else:
+            params.append(int(resolution.total_seconds() * 1_000_000))
+            bucket = f"time_bucket(to_microseconds(${len(params)}), timestamp, {BUCKET_ORIGIN})"
+            aggregates = ", ".join(
+                f"{_aggregate(c, agg, rollup is not None)} AS {c}" for c in columns
+            )
+            sql = (
+                f"SELECT buoy_id, {bucket} AS timestamp, {aggregates} {scan} "
+                f"GROUP BY ALL ORDER BY buoy_id, timestamp"
+            )
+        # The column set and station count vary between requests, so the statement
+        # is named after its SQL and each shape is planned once per thread
+        name = "st_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+        with span("query.timeseries_group", dataset=dataset, stations=len(stations)) as timing:
+            fetched = self._execute_prepared(name, sql, params, files)
+            timing.count(rows=len(fetched["buoy_id"]), rows_scanned=self._rows_scanned())
+            if files is not None:
+                timing.count(files=len(files), bytes=sum(f.bytes for f in files))
+            elif geohash is not None:
+                timing.count(bytes=self._partition_bytes(dataset, geohash, rollup))
+
+        # Rows are ordered by station, so each station is one contiguous slice
+        ids = np.asarray(fetched["buoy_id"], dtype=object)
+        bounds = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1], [True]]))
+        for lo, hi in zip(bounds[:-1], bounds[1:], strict=True):
+            station = str(ids[lo])
+            timestamps = fetched["timestamp"][lo:hi]
+            for variable, spec in specs.items():
+                values = np.ma.filled(
+                    np.ma.asarray(fetched[spec.column][lo:hi], dtype=np.float64), np.nan
+                )
+                present_rows = ~np.isnan(values)
+                results[(station, variable)] = TimeSeriesResult(
+                    variable=variable,
+                    unit=spec.unit,
+                    source=spec.source,
+                    timestamps=timestamps[present_rows],
+                    values=values[present_rows],
+                    metadata=dict(metadata),
+                )
+        return results
+
+
+def _aggregate(column: str, agg: str, rollup: bool) -> str:
+    """SQL aggregate of a column over a time bucket, from raw rows or rollup statistics."""
+    if rollup:
+        # Means are re-weighted by the number of raw rows behind each rollup row
+        return {
+            "mean": f"sum({column}_mean * {column}_count) / sum({column}_count)",
+            "min": f"min({column}_min)",
+            "max": f"max({column}_max)",
+        }[agg]
+    return {"mean": f"avg({column})", "min": f"min({column})", "max": f"max({column})"}[agg]
+
+
+def _interleave_minmax(columns: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-bucket minimum and maximum rows into one time-ordered series."""
+    same = columns["low_time"] == columns["high_time"]
+    first_is_low = columns["low_time"] <= columns["high_time"]
+    first_time = np.where(first_is_low, columns["low_time"], columns["high_time"])
+    first_value = np.where(first_is_low, columns["low"], columns["high"])
+    second_time = np.where(first_is_low, columns["high_time"], columns["low_time"])
+    second_value = np.where(first_is_low, columns["high"], columns["low"])
+
+    timestamps = np.stack([first_time, second_time], axis=1).ravel()
+    values = np.stack([first_value, second_value], axis=1).ravel().astype(np.float64)
+    # A bucket with a single distinct extreme contributes one point
+    keep = np.stack([np.ones_like(same), ~same], axis=1).ravel()
+    return timestamps[keep], values[keep]
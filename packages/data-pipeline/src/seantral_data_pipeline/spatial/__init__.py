@@ -0,0 +1 @@
+"""Spatial indexing and partitioning utilities for point lookups."""
@@ -0,0 +1,147 @@
+"""Geohash encoding used to lay out the data lake spatially."""
+
+from typing import Tuple
+
+import numpy as np
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_BYTES = np.frombuffer(BASE32.encode(), dtype=np.uint8)
+_DECODE = {c: i for i, c in enumerate(BASE32)}
+
+# Precision of the geohash partition column in the lake (cells of ~156 x 156 km)
+PARTITION_PRECISION = 3
+
+# 12 characters = 60 bits, which still fits in an int64
+MAX_PRECISION = 12
+
+
+def _check_precision(precision: int) -> None:
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ValueError(f"Geohash precision must be between 1 and {MAX_PRECISION}")
+
+
+def encode(lat: float, lon: float, precision: int = PARTITION_PRECISION) -> str:
+    """Encode a single point as a geohash.
+
+    Args:
+        lat: Latitude in degrees
+        lon: Longitude in degrees
+        precision: Number of geohash characters
+
+    Returns:
+        Geohash string
+    """
+    _check_precision(precision)
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def encode_many(
+    lats: np.ndarray,
+    lons: np.ndarray,
+    precision: int = PARTITION_PRECISION,
+) -> np.ndarray:
+    """Encode arrays of points as geohashes in a single vectorized pass.
+
+    Args:
+        lats: Latitudes in degrees
+        lons: Longitudes in degrees
+        precision: Number of geohash characters
+
+    Returns:
+        Array of geohash strings
+    """
+    _check_precision(precision)
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+
+    # Quantize each axis to an integer cell index, then interleave the bits
+    # (longitude first) exactly as the bisection in encode() does
+    lon_cells = np.floor((lons + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64)
+    lat_cells = np.floor((lats + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64)
+    lon_cells = np.clip(lon_cells, 0, (1 << lon_bits) - 1)
+    lat_cells = np.clip(lat_cells, 0, (1 << lat_bits) - 1)
+
+    code = np.zeros(lats.shape, dtype=np.int64)
+    for i in range(total_bits):
+        if i % 2 == 0:
+            bit = (lon_cells >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_cells >> (lat_bits - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+
+    shifts = np.arange(precision - 1, -1, -1, dtype=np.int64) * 5
+    digits = (code[..., None] >> shifts) & 31
+    chars = _BASE32_BYTES[digits]
+    return chars.view(f"S{precision}").reshape(lats.shape).astype(str)
+
+
+def bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Return the bounding box of a geohash cell.
+
+    Args:
+        geohash: Geohash string
+
+    Returns:
+        Tuple of (min_lat, max_lat, min_lon, max_lon)
+    """
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+
+    for char in geohash:
+        try:
+            value = _DECODE[char]
+        except KeyError:
+            raise ValueError(f"Invalid geohash: {geohash!r}") from None
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                if bit:
+                    lon_lo = mid
+                else:
+                    lon_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+
+    return lat_lo, lat_hi, lon_lo, lon_hi
@@ -0,0 +1,213 @@
+"""Nearest-neighbour indexes for resolving a lat/lon to a station or grid cell."""
+
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Convert lat/lon degrees to 3D unit vectors on the sphere."""
+    lat_r = np.radians(np.asarray(lats, dtype=np.float64))
+    lon_r = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat_r)
+    return np.column_stack([cos_lat * np.cos(lon_r), cos_lat * np.sin(lon_r), np.sin(lat_r)])
+
+
+def chord_to_km(chord_sq: float) -> float:
+    """Convert a squared chord length on the unit sphere to great-circle kilometres."""
+    return 2.0 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_sq) / 2.0))
+
+
+def km_to_chord(distance_km: float) -> float:
+    """Convert a great-circle distance in kilometres to a squared chord length."""
+    angle = min(math.pi, distance_km / EARTH_RADIUS_KM)
+    return (2.0 * math.sin(angle / 2.0)) ** 2
+
+
+class SpatialIndex:
+    """Static KD-tree over points on the sphere.
+
+    Points are stored as 3D unit vectors, where straight-line (chord) distance
+    is monotonic in great-circle distance, so a plain Euclidean KD-tree answers
+    nearest-neighbour queries correctly across the antimeridian and the poles.
+    The tree is flattened into lists and leaves are scanned in pure Python,
+    which keeps a single lookup in the order of microseconds.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        lats: Sequence[float],
+        lons: Sequence[float],
+        leaf_size: int = 8,
+    ):
+        """Build the index.
+
+        Args:
+            ids: Identifier of each point
+            lats: Latitude of each point in degrees
+            lons: Longitude of each point in degrees
+            leaf_size: Maximum number of points per leaf
+        """
+        if not (len(ids) == len(lats) == len(lons)):
+            raise ValueError("ids, lats and lons must have the same length")
+
+        self.ids = list(ids)
+        self.leaf_size = max(1, leaf_size)
+        xyz = _unit_vectors(np.asarray(lats), np.asarray(lons))
+
+        # Flattened tree: per node the split axis/value, children, and the
+        # [start, end) range of its points in the permuted point list
+        self._axis: List[int] = []
+        self._split: List[float] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._start: List[int] = []
+        self._end: List[int] = []
+
+        order = np.arange(len(self.ids))
+        if len(order):
+            self._build(xyz, order, 0, len(order))
+
+        self._points = [tuple(p) for p in xyz[order].tolist()]
+        self._point_ids = [self.ids[i] for i in order.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _build(self, xyz: np.ndarray, order: np.ndarray, start: int, end: int) -> int:
+        node = len(self._axis)
+        self._axis.append(-1)
+        self._split.append(0.0)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._start.append(start)
+        self._end.append(end)
+
+        if end - start <= self.leaf_size:
+            return node
+
+        points = xyz[order[start:end]]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        mid = (end - start) // 2
+        part = np.argpartition(points[:, axis], mid)
+        order[start:end] = order[start:end][part]
+
+        self._axis[node] = axis
+        self._split[node] = float(xyz[order[start + mid], axis])
+        self._left[node] = self._build(xyz, order, start, start + mid)
+        self._right[node] = self._build(xyz, order, start + mid, end)
+        return node
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        max_distance_km: Optional[float] = None,
+    ) -> Optional[Tuple[str, float]]:
+        """Find the point closest to a location.
+
+        Args:
+            lat: Latitude in degrees
+            lon: Longitude in degrees
+            max_distance_km: Ignore points further away than this
+
+        Returns:
+            Tuple of (id, distance in km), or None if no point is in range
+        """
+        if not self._axis:
+            return None
+
+        lat_r = math.radians(lat)
+        lon_r = math.radians(lon)
+        cos_lat = math.cos(lat_r)
+        query = (cos_lat * math.cos(lon_r), cos_lat * math.sin(lon_r), math.sin(lat_r))
+
+        best = km_to_chord(max_distance_km) if max_distance_km is not None else math.inf
+        best_index = -1
+        qx, qy, qz = query
+        points = self._points
+        stack = [(0, 0.0)]
+
+        while stack:
+            node, bound = stack.pop()
+            # Skip subtrees whose splitting plane is further away than the best hit
+            if bound > best:
+                continue
+            axis = self._axis[node]
+            if axis < 0:
+                for i in range(self._start[node], self._end[node]):
+                    px, py, pz = points[i]
+                    d = (px - qx) ** 2 + (py - qy) ** 2 + (pz - qz) ** 2
+                    if d <= best:
+                        best = d
+                        best_index = i
+                continue
+
+            diff = query[axis] - self._split[node]
+            if diff >= 0:
+                near, far = self._right[node], self._left[node]
+            else:
+                near, far = self._left[node], self._right[node]
+            stack.append((far, diff * diff))
+            stack.append((near, 0.0))
+
+        if best_index < 0:
+            return None
+        return self._point_ids[best_index], chord_to_km(best)
+
+
+class RegularGrid:
+    """Nearest-cell lookup on a regular lat/lon grid, such as a CMEMS product."""
+
+    def __init__(
+        self,
+        lat_start: float,
+        lon_start: float,
+        lat_step: float,
+        lon_step: float,
+        n_lat: int,
+        n_lon: int,
+    ):
+        """Describe the grid by the centre of its first cell and its spacing.
+
+        Args:
+            lat_start: Latitude of the first row of cell centres
+            lon_start: Longitude of the first column of cell centres
+            lat_step: Latitude spacing (may be negative for north-to-south grids)
+            lon_step: Longitude spacing
+            n_lat: Number of rows
+            n_lon: Number of columns
+        """
+        if lat_step == 0 or lon_step == 0:
+            raise ValueError("Grid steps must be non-zero")
+        self.lat_start = lat_start
+        self.lon_start = lon_start
+        self.lat_step = lat_step
+        self.lon_step = lon_step
+        self.n_lat = n_lat
+        self.n_lon = n_lon
+
+    @classmethod
+    def from_coordinates(cls, lats: np.ndarray, lons: np.ndarray) -> "RegularGrid":
+        """Build a grid description from its 1D coordinate arrays."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        lat_step = float(lats[1] - lats[0]) if len(lats) > 1 else 1.0
+        lon_step = float(lons[1] - lons[0]) if len(lons) > 1 else 1.0
+        return cls(float(lats[0]), float(lons[0]), lat_step, lon_step, len(lats), len(lons))
+
+    def nearest_cell(self, lat: float, lon: float) -> Optional[Tuple[int, int]]:
+        """Return the (row, column) of the cell containing a point, or None if outside."""
+        row = int(round((lat - self.lat_start) / self.lat_step))
+        col = int(round((lon - self.lon_start) / self.lon_step))
+        if not (0 <= row < self.n_lat and 0 <= col < self.n_lon):
+            return None
+        return row, col
+
+    def cell_center(self, row: int, col: int) -> Tuple[float, float]:
+        """Return the (lat, lon) of a cell centre."""
+        return self.lat_start + row * self.lat_step, self.lon_start + col * self.lon_step
@@ -0,0 +1,204 @@
+"""Station registry with coordinates for buoys and other fixed platforms."""
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+from seantral_data_pipeline.spatial.geohash import PARTITION_PRECISION, encode
+from seantral_data_pipeline.spatial.index import SpatialIndex
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# "43.525 N 70.141 W (43&#176;31'30" N ...)" in the NDBC station table
+_NDBC_LOCATION = re.compile(r"([\d.]+)\s*([NS])\s+([\d.]+)\s*([EW])")
+
+
+@dataclass(frozen=True)
+class Station:
+    """A fixed observing platform."""
+
+    station_id: str
+    lat: float
+    lon: float
+    name: str = ""
+    source: str = "NOAA NDBC"
+
+    @property
+    def geohash(self) -> str:
+        """Geohash of the lake partition holding this station's rows."""
+        return encode(self.lat, self.lon, PARTITION_PRECISION)
+
+
+class StationRegistry:
+    """Registry of stations with a spatial index for nearest-station lookups."""
+
+    def __init__(self, stations: Iterable[Station] = ()):
+        """Initialize the registry.
+
+        Args:
+            stations: Stations to register
+        """
+        self._stations: Dict[str, Station] = {s.station_id: s for s in stations}
+        self._index: Optional[SpatialIndex] = None
+
+    def __len__(self) -> int:
+        return len(self._stations)
+
+    def __contains__(self, station_id: object) -> bool:
+        return station_id in self._stations
+
+    def __iter__(self) -> Iterator[Station]:
+        return iter(self._stations.values())
+
+    def get(self, station_id: str) -> Optional[Station]:
+        """Return a station by id, or None if it is not registered."""
+        return self._stations.get(station_id)
+
+    def add(self, station: Station) -> None:
+        """Register or replace a station."""
+        self._stations[station.station_id] = station
+        self._index = None
+
+    @property
+    def index(self) -> SpatialIndex:
+        """Spatial index over all stations, built on first use."""
+        if self._index is None:
+            stations = list(self._stations.values())
+            self._index = SpatialIndex(
+                [s.station_id for s in stations],
+                [s.lat for s in stations],
+                [s.lon for s in stations],
+            )
+        return self._index
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        max_distance_km: Optional[float] = None,
+    ) -> Optional[Tuple[Station, float]]:
+        """Find the station closest to a location.
+
+        Args:
+            lat: Latitude in degrees
+            lon: Longitude in degrees
+            max_distance_km: Ignore stations further away than this
+
+        Returns:
+            Tuple of (station, distance in km), or None if no station is in range
+        """
+        hit = self.index.nearest(lat, lon, max_distance_km)
+        if hit is None:
+            return None
+        station_id, distance = hit
+        return self._stations[station_id], distance
+
+    def annotate(self, df: "pd.DataFrame", id_column: str = "buoy_id") -> "pd.DataFrame":
+        """Attach lat/lon columns to rows keyed by station id.
+
+        Args:
+            df: DataFrame with a station id column
+            id_column: Name of the station id column
+
+        Returns:
+            Copy of the DataFrame with lat and lon columns
+        """
+        ids = df[id_column].astype(str)
+        lats = {s.station_id: s.lat for s in self._stations.values()}
+        lons = {s.station_id: s.lon for s in self._stations.values()}
+        unknown = set(ids.unique()) - set(lats)
+        if unknown:
+            logger.warning(f"No coordinates registered for stations: {sorted(unknown)}")
+        return df.assign(
+            lat=ids.map(lats).astype(np.float64),
+            lon=ids.map(lons).astype(np.float64),
+        )
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """Save the registry to a Parquet file.
+
+        Args:
+            path: Output file path
+
+        Returns:
+            Path to saved file
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stations = list(self._stations.values())
+        table = pa.table(
+            {
+                "station_id": pa.array([s.station_id for s in stations], pa.string()),
+                "lat": pa.array([s.lat for s in stations], pa.float64()),
+                "lon": pa.array([s.lon for s in stations], pa.float64()),
+                "name": pa.array([s.name for s in stations], pa.string()),
+                "source": pa.array([s.source for s in stations], pa.string()),
+            }
+        )
+        pq.write_table(table, path)
+        logger.info(f"Saved {len(stations)} stations to {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "StationRegistry":
+        """Load a registry saved with save().
+
+        Args:
+            path: Registry file path
+
+        Returns:
+            Station registry
+        """
+        import pyarrow.parquet as pq
+
+        columns = pq.read_table(path).to_pydict()
+        stations = [
+            Station(station_id=sid, lat=lat, lon=lon, name=name or "", source=source)
+            for sid, lat, lon, name, source in zip(
+                columns["station_id"],
+                columns["lat"],
+                columns["lon"],
+                columns["name"],
+                columns["source"],
+                strict=True,
+            )
+        ]
+        logger.info(f"Loaded {len(stations)} stations from {path}")
+        return cls(stations)
+
+    @classmethod
+    def from_ndbc_station_table(cls, path: Union[str, Path]) -> "StationRegistry":
+        """Build a registry from the NDBC station_table.txt file.
+
+        Args:
+            path: Path to the pipe-delimited NDBC station table
+
+        Returns:
+            Station registry
+        """
+        stations = []
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+                fields = line.rstrip("\n").split("|")
+                if len(fields) < 7:
+                    continue
+                match = _NDBC_LOCATION.search(fields[6])
+                if match is None:
+                    continue
+                lat = float(match.group(1)) * (1 if match.group(2) == "N" else -1)
+                lon = float(match.group(3)) * (1 if match.group(4) == "E" else -1)
+                stations.append(
+                    Station(station_id=fields[0].strip(), lat=lat, lon=lon, name=fields[4].strip())
+                )
+        logger.info(f"Parsed {len(stations)} stations from {path}")
+        return cls(stations)
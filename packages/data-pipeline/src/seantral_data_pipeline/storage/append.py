@@ -0,0 +1,421 @@
+"""Streaming append writer for continuous ingestion.
+
+``save_to_parquet`` writes a whole DataFrame at once. Near-real-time ingestion
+instead receives many small batches, and consecutive NDBC realtime files
+overlap heavily (each holds the last 45 days). The append writer buffers
+incoming batches up to a row or byte budget, drops rows whose
+(``buoy_id``, ``timestamp``) it has already stored, and writes the rest as row
+groups of open files that are rolled by size and age.
+
+Open files are written in a staging directory outside the dataset and moved
+into their partition once closed, and only then recorded in the lake's
+metadata catalog, so readers and compaction only ever see complete files:
+
+    <lake>/_ingest/ndbc/geohash=drt/part-....parquet   open, being appended to
+    <lake>/ndbc/geohash=drt/part-....parquet           rolled
+
+When the dataset has hourly/daily rollups, the buckets covered by a rolled
+file are recomputed right after it is moved in, so queries planned on a rollup
+see the same rows as queries on the raw dataset. An ``on_commit`` callback
+receives the rows of every rolled file at the same point (the ingestion
+runner uses it to post them to the API).
+
+Duplicates are detected with a compact key index: one int64 per stored row,
+packing a station code and the timestamp in seconds, in sorted NumPy arrays.
+Keys older than ``key_window`` behind the newest row of their station are
+pruned, so the index (and the writer's memory) stays flat over long runs.
+"""
+
+import os
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from loguru import logger
+
+from seantral_data_pipeline.spatial.geohash import encode_many
+from seantral_data_pipeline.storage.catalog import FileEntry, register_files
+from seantral_data_pipeline.storage.layout import ROLLUPS, rollup_path
+from seantral_data_pipeline.storage.parquet import encode_dictionaries
+from seantral_data_pipeline.storage.rollups import update_rollups
+
+INGEST_DIR = "_ingest"
+
+# Buffered rows are written out once either budget is exceeded
+BUFFER_ROWS = 100_000
+BUFFER_BYTES = 32 * 1024 * 1024
+
+# Open files are rolled once either limit is reached
+FILE_BYTES = 128 * 1024 * 1024
+FILE_AGE = timedelta(minutes=15)
+
+# NDBC realtime files cover the last 45 days; keys older than that never recur
+KEY_WINDOW = timedelta(days=46)
+
+# Keys pack a station code above the timestamp in seconds (offset to allow
+# dates before 1970), which leaves room for 2**27 stations
+_TIME_BITS = 36
+_TIME_OFFSET = 1 << (_TIME_BITS - 1)
+_TIME_MASK = (1 << _TIME_BITS) - 1
+
+Batch = Union[pa.Table, pa.RecordBatch, pd.DataFrame]
+
+
+class KeyIndex:
+    """Set of (station, timestamp) keys seen recently, as sorted int64 arrays.
+
+    New keys go to a small sorted delta that is merged into the main array
+    once it grows past a fraction of it, so inserting a batch costs about the
+    size of the batch rather than the size of the index.
+    """
+
+    def __init__(self, window: timedelta = KEY_WINDOW):
+        """Initialize an empty index.
+
+        Args:
+            window: How far behind its station's newest key a key is kept
+        """
+        self.window = int(window.total_seconds())
+        self._codes: Dict[str, int] = {}
+        self._latest = np.full(0, np.iinfo(np.int64).min, dtype=np.int64)
+        self._main = np.empty(0, dtype=np.int64)
+        self._delta = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._main) + len(self._delta)
+
+    @property
+    def nbytes(self) -> int:
+        return self._main.nbytes + self._delta.nbytes + self._latest.nbytes
+
+    def keys(
+        self, stations: Union[pa.Array, pa.ChunkedArray], seconds: np.ndarray
+    ) -> np.ndarray:
+        """Pack station IDs and timestamps (seconds since the epoch) into keys."""
+        if isinstance(stations, pa.ChunkedArray):
+            stations = stations.combine_chunks()
+        if pa.types.is_dictionary(stations.type):
+            encoded = stations
+        else:
+            encoded = pc.dictionary_encode(stations)
+        lookup = np.array(
+            [self._code(str(station)) for station in encoded.dictionary.to_pylist()],
+            dtype=np.int64,
+        )
+        codes = lookup[encoded.indices.to_numpy(zero_copy_only=False)]
+        return (codes << _TIME_BITS) | (seconds + _TIME_OFFSET)
+
+    def _code(self, station: str) -> int:
+        code = self._codes.get(station)
+        if code is None:
+            code = self._codes[station] = len(self._codes)
+            self._latest = np.append(self._latest, np.iinfo(np.int64).min)
+        return code
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Boolean mask of the keys already in the index."""
+        found = np.zeros(len(keys), dtype=bool)
+        for array in (self._main, self._delta):
+            if len(array):
+                positions = np.searchsorted(array, keys).clip(max=len(array) - 1)
+                found |= array[positions] == keys
+        return found
+
+    def add(self, keys: np.ndarray) -> None:
+        """Insert keys not in the index yet and prune keys that left the window."""
+        if len(keys) == 0:
+            return
+        codes = keys >> _TIME_BITS
+        np.maximum.at(self._latest, codes, (keys & _TIME_MASK) - _TIME_OFFSET)
+        self._delta = np.union1d(self._delta, keys)
+        if len(self._delta) * 8 > len(self._main):
+            self._main = self._prune(np.union1d(self._main, self._delta))
+            self._delta = np.empty(0, dtype=np.int64)
+
+    def _prune(self, keys: np.ndarray) -> np.ndarray:
+        cutoff = self._latest[keys >> _TIME_BITS] - self.window
+        return keys[(keys & _TIME_MASK) - _TIME_OFFSET >= cutoff]
+
+
+class _OpenFile:
+    """A Parquet file of one partition that batches are appended to."""
+
+    def __init__(self, staged: Path, target: Path, schema: pa.Schema, compression: str):
+        staged.parent.mkdir(parents=True, exist_ok=True)
+        self.staged = staged
+        self.target = target
+        self.schema = schema
+        self.opened = time.monotonic()
+        self.entry = FileEntry(target.name)
+        self.writer = pq.ParquetWriter(staged, schema, compression=compression)
+
+    def write(self, table: pa.Table) -> None:
+        self.writer.write_table(table)
+        self.entry.add(table)
+
+    @property
+    def rows(self) -> int:
+        return self.entry.rows
+
+    @property
+    def nbytes(self) -> int:
+        return self.staged.stat().st_size
+
+    def close(self) -> Path:
+        """Close the file and move it into its partition of the dataset."""
+        self.writer.close()
+        self.target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.staged, self.target)
+        return self.target
+
+
+class AppendWriter:
+    """Appends batches of observations to a Parquet dataset, skipping duplicates.
+
+    Usage:
+        with AppendWriter(lake / "ndbc", geohash_precision=3) as writer:
+            for path in files:
+                writer.write(parse_stdmet(path, buoy_id=...))
+    """
+
+    def __init__(
+        self,
+        dataset_path: Union[str, Path],
+        geohash_precision: Optional[int] = None,
+        buffer_rows: int = BUFFER_ROWS,
+        buffer_bytes: int = BUFFER_BYTES,
+        file_bytes: int = FILE_BYTES,
+        file_age: timedelta = FILE_AGE,
+        key_window: timedelta = KEY_WINDOW,
+        compression: str = "zstd",
+        on_commit: Optional[Callable[[pa.Table], None]] = None,
+    ):
+        """Initialize the writer.
+
+        Args:
+            dataset_path: Root of the dataset (e.g. <lake>/ndbc)
+            geohash_precision: If set, derive a geohash column of this precision
+                               from the lat/lon columns and partition by it
+            buffer_rows: Buffered rows that trigger a write
+            buffer_bytes: Buffered bytes that trigger a write
+            file_bytes: Size at which an open file is rolled
+            file_age: Age at which an open file is rolled
+            key_window: How long keys are remembered for deduplication
+            compression: Compression codec of written files
+            on_commit: Called with the rows of each file once it is in the dataset
+        """
+        self.dataset_path = Path(dataset_path)
+        self.staging_path = self.dataset_path.parent / INGEST_DIR / self.dataset_path.name
+        self.geohash_precision = geohash_precision
+        self.buffer_rows = buffer_rows
+        self.buffer_bytes = buffer_bytes
+        self.file_bytes = file_bytes
+        self.file_age = file_age.total_seconds()
+        self.compression = compression
+        self.on_commit = on_commit
+        self.index = KeyIndex(key_window)
+
+        self._buffer: Dict[str, List[pa.Table]] = {}
+        self._buffered_rows = 0
+        self._buffered_bytes = 0
+        self._files: Dict[str, _OpenFile] = {}
+        self.stats = {"rows_received": 0, "rows_written": 0, "duplicates": 0, "files": 0}
+
+    def __enter__(self) -> "AppendWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def load_keys(self, since: Optional[pd.Timestamp] = None) -> int:
+        """Seed the key index from rows already in the dataset.
+
+        Args:
+            since: Oldest timestamp to load (defaults to the key window before now)
+
+        Returns:
+            Number of keys loaded
+        """
+        if not self.dataset_path.exists():
+            return 0
+        if since is None:
+            since = pd.Timestamp.now() - pd.Timedelta(seconds=self.index.window)
+        dataset = ds.dataset(self.dataset_path, format="parquet", partitioning="hive")
+        table = dataset.to_table(
+            columns=["buoy_id", "timestamp"],
+            filter=ds.field("timestamp") >= pa.scalar(since, pa.timestamp("us")),
+        )
+        keys = self.index.keys(table["buoy_id"], _seconds(table["timestamp"]))
+        self.index.add(keys)
+        logger.info(f"Loaded {len(keys)} keys of {self.dataset_path} since {since}")
+        return len(keys)
+
+    def write(self, batch: Batch) -> int:
+        """Buffer the rows of a batch that were not written before.
+
+        Args:
+            batch: Rows with buoy_id and timestamp columns (and lat/lon when
+                   partitioning by geohash)
+
+        Returns:
+            Number of new rows accepted
+        """
+        table = _to_table(batch)
+        self.stats["rows_received"] += table.num_rows
+        if table.num_rows:
+            table = self._deduplicate(table)
+            for partition, rows in self._partition(table).items():
+                self._buffer.setdefault(partition, []).append(rows)
+            self._buffered_rows += table.num_rows
+            self._buffered_bytes += table.nbytes
+
+        if self._buffered_rows >= self.buffer_rows or self._buffered_bytes >= self.buffer_bytes:
+            self.flush()
+        else:
+            self._roll(expired_only=True)
+        return table.num_rows
+
+    def flush(self) -> None:
+        """Write buffered rows to the open files and roll full or old files."""
+        for partition, tables in self._buffer.items():
+            table = pa.concat_tables(tables, promote_options="permissive")
+            current = self._files.get(partition)
+            if current is not None and not current.schema.equals(table.schema):
+                self._close(partition)
+                current = None
+            if current is None:
+                name = f"part-{uuid.uuid4().hex}.parquet"
+                directory = Path(partition) if partition else Path()
+                current = self._files[partition] = _OpenFile(
+                    self.staging_path / directory / name,
+                    self.dataset_path / directory / name,
+                    table.schema,
+                    self.compression,
+                )
+            current.write(table)
+            self.stats["rows_written"] += table.num_rows
+        self._buffer.clear()
+        self._buffered_rows = 0
+        self._buffered_bytes = 0
+        self._roll(expired_only=False)
+
+    def commit(self) -> None:
+        """Write buffered rows and move every open file into the dataset.
+
+        Every row accepted so far is visible to readers afterwards. The writer
+        stays usable and opens new files for later batches.
+        """
+        self.flush()
+        for partition in list(self._files):
+            self._close(partition)
+
+    def close(self) -> None:
+        """Commit and remove the writer's staging directories."""
+        self.commit()
+        leftovers = sorted(self.staging_path.rglob("*"), reverse=True)
+        for directory in [*leftovers, self.staging_path, self.staging_path.parent]:
+            try:
+                directory.rmdir()
+            except OSError:
+                pass  # Another writer is still open, or files are left over
+        logger.info(
+            f"Appended {self.stats['rows_written']} rows to {self.dataset_path} "
+            f"({self.stats['duplicates']} duplicates skipped)"
+        )
+
+    def _deduplicate(self, table: pa.Table) -> pa.Table:
+        """Drop rows stored before and repeated rows within the batch."""
+        if "buoy_id" not in table.column_names or "timestamp" not in table.column_names:
+            raise ValueError("Appending requires buoy_id and timestamp columns")
+        keys = self.index.keys(table["buoy_id"], _seconds(table["timestamp"]))
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        first = first[~self.index.contains(keys[first])]
+        self.index.add(keys[first])
+        self.stats["duplicates"] += table.num_rows - len(first)
+        if len(first) == table.num_rows:
+            return table
+        return table.take(pa.array(first))
+
+    def _partition(self, table: pa.Table) -> Dict[str, pa.Table]:
+        """Split rows by the directory of the partition they belong to."""
+        if self.geohash_precision is None:
+            return {"": table}
+        if "lat" not in table.column_names or "lon" not in table.column_names:
+            raise ValueError("Geohash partitioning requires lat and lon columns")
+        lat = table["lat"].to_numpy()
+        lon = table["lon"].to_numpy()
+        if np.isnan(lat).any() or np.isnan(lon).any():
+            raise ValueError("Geohash partitioning requires coordinates on every row")
+        geohashes, inverse = np.unique(
+            encode_many(lat, lon, self.geohash_precision), return_inverse=True
+        )
+        if "geohash" in table.column_names:
+            table = table.drop_columns(["geohash"])
+        return {
+            f"geohash={geohash}": table.take(pa.array(np.flatnonzero(inverse == i)))
+            for i, geohash in enumerate(geohashes)
+        }
+
+    def _roll(self, expired_only: bool) -> None:
+        now = time.monotonic()
+        for partition, current in list(self._files.items()):
+            if now - current.opened >= self.file_age or (
+                not expired_only and current.nbytes >= self.file_bytes
+            ):
+                self._close(partition)
+
+    def _close(self, partition: str) -> None:
+        current = self._files.pop(partition)
+        path = current.close()
+        current.entry.path = path.relative_to(self.dataset_path).as_posix()
+        current.entry.bytes = path.stat().st_size
+        register_files(self.dataset_path, [current.entry])
+        self.stats["files"] += 1
+        logger.debug(f"Rolled {path} with {current.rows} rows")
+        self._update_rollups(path, partition, current.schema)
+        if self.on_commit is not None:
+            self.on_commit(pq.read_table(path))
+
+    def _update_rollups(self, path: Path, partition: str, schema: pa.Schema) -> None:
+        """Recompute the rollup buckets covered by a file just moved in."""
+        rollups = [name for name in ROLLUPS if rollup_path(self.dataset_path, name).is_dir()]
+        if not rollups:
+            return
+        keys = [name for name in ("timestamp", "buoy_id", "lat", "lon") if name in schema.names]
+        columns = [
+            field.name
+            for field in schema
+            if field.name not in keys
+            and field.name != "geohash"
+            and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type))
+        ]
+        rows = pq.read_table(path, columns=keys).to_pandas()
+        if partition:
+            rows["geohash"] = partition.split("=", 1)[1]
+        update_rollups(self.dataset_path, rows, columns=columns, rollups=rollups)
+
+
+def _to_table(batch: Batch) -> pa.Table:
+    if isinstance(batch, pd.DataFrame):
+        table = pa.Table.from_pandas(batch, preserve_index=False)
+    elif isinstance(batch, pa.RecordBatch):
+        table = pa.Table.from_batches([batch])
+    else:
+        table = batch.replace_schema_metadata(None)
+    # Station columns from any producer share one type so buffers concatenate
+    return encode_dictionaries(table)
+
+
+def _seconds(timestamps: Union[pa.Array, pa.ChunkedArray]) -> np.ndarray:
+    """Timestamps as int64 seconds since the epoch."""
+    values = timestamps.to_numpy()
+    return values.astype("datetime64[s]").astype(np.int64)
@@ -0,0 +1,579 @@
+"""Metadata catalog of the Parquet files in the lake.
+
+Pruning with Parquet alone means listing every directory of a dataset and
+opening every footer before a single file can be skipped, and on object
+storage each of those is a round trip. The writers of the lake therefore
+record every file they add in an embedded SQLite database at the root of the
+lake, with the statistics readers prune by:
+
+    <lake>/_catalog.sqlite
+        datasets(dataset, complete)
+        files(dataset, path, rows, bytes, min_time, max_time,
+              min_lat, max_lat, min_lon, max_lon, variables, written_at)
+        file_stations(dataset, path, station)
+        changes(id, dataset, path, min_time, max_time, stations)
+
+Paths are relative to the dataset directory and times are microseconds since
+the epoch in naive UTC, the convention of the lake. A dataset is only served
+from the catalog once it is ``complete``: the first writer to register files
+of a dataset marks it incomplete when other files are already there (written
+before the catalog existed), and ``rebuild`` catalogs those from their
+footers. Readers fall back to listing the dataset until then. Files removed
+by anything but the lake's writers must be dropped from the catalog the same
+way, or with ``drop`` when the whole dataset is deleted.
+
+Every registered file is also appended to ``changes``, a log with increasing
+ids that processes serving the lake poll (``changes(after)``) to learn which
+stations, partitions and time ranges any writer has added rows to.
+
+SQLite rather than DuckDB because several ingest processes may register
+files at the same time, and opening it costs no import at API startup.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+CATALOG_FILE = "_catalog.sqlite"
+
+# Columns that describe a row rather than measure something
+KEY_COLUMNS = {"timestamp", "buoy_id", "lat", "lon", "geohash"}
+
+# Seconds a writer waits for another one to finish its transaction
+BUSY_TIMEOUT = 30.0
+
+# Entries of the change log kept for readers that poll it
+CHANGE_LOG_ROWS = 100000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    dataset TEXT PRIMARY KEY,
+    complete INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    dataset TEXT NOT NULL,
+    path TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    min_time INTEGER,
+    max_time INTEGER,
+    min_lat REAL,
+    max_lat REAL,
+    min_lon REAL,
+    max_lon REAL,
+    variables TEXT NOT NULL,
+    written_at TEXT NOT NULL,
+    PRIMARY KEY (dataset, path)
+);
+CREATE TABLE IF NOT EXISTS file_stations (
+    dataset TEXT NOT NULL,
+    path TEXT NOT NULL,
+    station TEXT NOT NULL,
+    PRIMARY KEY (dataset, station, path)
+);
+CREATE INDEX IF NOT EXISTS file_stations_path ON file_stations (dataset, path);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dataset TEXT NOT NULL,
+    path TEXT NOT NULL,
+    min_time INTEGER,
+    max_time INTEGER,
+    stations TEXT NOT NULL
+);
+"""
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Normalize a datetime to naive UTC, the convention used in the lake."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def to_micros(value: datetime) -> int:
+    """Microseconds since the epoch of a datetime (naive values are taken as UTC)."""
+    return (to_naive_utc(value) - _EPOCH) // timedelta(microseconds=1)
+
+
+@dataclass
+class FileEntry:
+    """Statistics of one Parquet file of a dataset."""
+
+    path: str
+    rows: int = 0
+    bytes: int = 0
+    min_time: Optional[int] = None
+    max_time: Optional[int] = None
+    min_lat: Optional[float] = None
+    max_lat: Optional[float] = None
+    min_lon: Optional[float] = None
+    max_lon: Optional[float] = None
+    stations: Set[str] = field(default_factory=set)
+    variables: Set[str] = field(default_factory=set)
+
+    def add(self, table: "pa.Table") -> None:
+        """Widen the statistics by the rows of a table written to the file."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        self.rows += table.num_rows
+        if table.num_rows == 0:
+            return
+        names = set(table.column_names)
+        if "timestamp" in names and pa.types.is_timestamp(table.schema.field("timestamp").type):
+            column = table["timestamp"]
+            bounds = pc.min_max(column.cast(pa.timestamp("us", column.type.tz)))
+            self.min_time = _lower(self.min_time, bounds["min"].value)
+            self.max_time = _upper(self.max_time, bounds["max"].value)
+        if "lat" in names:
+            bounds = pc.min_max(table["lat"])
+            self.min_lat = _lower(self.min_lat, bounds["min"].as_py())
+            self.max_lat = _upper(self.max_lat, bounds["max"].as_py())
+        if "lon" in names:
+            bounds = pc.min_max(table["lon"])
+            self.min_lon = _lower(self.min_lon, bounds["min"].as_py())
+            self.max_lon = _upper(self.max_lon, bounds["max"].as_py())
+        if "buoy_id" in names:
+            self.stations.update(
+                str(station)
+                for station in pc.unique(table["buoy_id"]).to_pylist()
+                if station is not None
+            )
+        for column in table.schema:
+            numeric = pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+            if (
+                numeric
+                and column.name not in KEY_COLUMNS
+                and table[column.name].null_count < table.num_rows
+            ):
+                self.variables.add(column.name)
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _lower(current: Optional[float], value: Optional[float]) -> Optional[float]:
+    if value is None:
+        return current
+    return value if current is None else min(current, value)
+
+
+def _upper(current: Optional[float], value: Optional[float]) -> Optional[float]:
+    if value is None:
+        return current
+    return value if current is None else max(current, value)
+
+
+class CatalogFile(NamedTuple):
+    """A file selected by the catalog for a scan."""
+
+    path: Path
+    rows: int
+    bytes: int
+
+
+class Change(NamedTuple):
+    """A file registered in the catalog, as recorded in its change log."""
+
+    id: int
+    dataset: str
+    path: str  # Relative to the dataset, e.g. "geohash=drt/part-....parquet"
+    start: Optional[datetime]
+    end: Optional[datetime]
+    stations: List[str]
+
+    @property
+    def partition(self) -> Optional[str]:
+        """Value of the geohash partition the file is in, if any."""
+        head = self.path.split("/", 1)[0]
+        return head.split("=", 1)[1] if head.startswith("geohash=") else None
+
+
+def describe_file(path: Union[str, Path], relative: str) -> FileEntry:
+    """Statistics of a Parquet file already on disk, read from its key columns and footer.
+
+    Args:
+        path: The file
+        relative: Its path relative to the dataset directory
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    names = parquet_file.schema_arrow.names
+    entry = FileEntry(relative, bytes=os.path.getsize(path))
+    entry.add(parquet_file.read(columns=[name for name in names if name in KEY_COLUMNS]))
+    entry.rows = parquet_file.metadata.num_rows
+
+    # Null counts in the footer tell which measurements have values; without
+    # statistics a column is assumed to have some
+    metadata = parquet_file.metadata
+    for index, name in enumerate(names):
+        if name in KEY_COLUMNS or name.startswith("__index_level_"):
+            continue
+        arrow_type = parquet_file.schema_arrow.field(name).type
+        if not (pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)):
+            continue
+        nulls = 0
+        for group in range(metadata.num_row_groups):
+            statistics = metadata.row_group(group).column(index).statistics
+            if statistics is None or not statistics.has_null_count:
+                nulls = None
+                break
+            nulls += statistics.null_count
+        if nulls is None or nulls < metadata.num_rows:
+            entry.variables.add(name)
+    return entry
+
+
+def dataset_files(dataset_path: Union[str, Path]) -> Iterator[Path]:
+    """Parquet files of a dataset, skipping hidden and system directories."""
+    for root, dirs, files in os.walk(dataset_path):
+        dirs[:] = [d for d in dirs if not d.startswith((".", "_"))]
+        for name in files:
+            if name.endswith(".parquet") and not name.startswith((".", "_")):
+                yield Path(root) / name
+
+
+class Catalog:
+    """The metadata catalog of one lake.
+
+    Usage:
+        catalog, dataset = Catalog.for_dataset(lake / "ndbc")
+        catalog.register(dataset, [entry])
+        files = catalog.files(dataset, start=start, end=end, stations=["44007"])
+    """
+
+    def __init__(self, lake_path: Union[str, Path]):
+        self.lake_path = Path(lake_path)
+        self.path = self.lake_path / CATALOG_FILE
+        self._lock = threading.Lock()
+        self._idle: List[sqlite3.Connection] = []
+        self._created = False
+
+    @classmethod
+    def for_dataset(cls, dataset_path: Union[str, Path]) -> Tuple["Catalog", str]:
+        """The catalog of the lake a dataset directory belongs to, and the dataset's name in it."""
+        dataset_path = Path(dataset_path)
+        return cls(dataset_path.parent), dataset_path.name
+
+    @contextmanager
+    def _connect(self, create: bool) -> Iterator[Optional[sqlite3.Connection]]:
+        """Borrow a connection, or None when the catalog does not exist.
+
+        Connections stay open between calls and are lent to one thread at a
+        time, so a lookup costs one query and threads that come and go (a
+        server's thread pool) do not leave connections behind; ``close``
+        closes them all.
+
+        Args:
+            create: Create the database and its tables if needed, for writing
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            if not create and not self.path.exists():
+                yield None
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+            )
+        try:
+            if create and not self._created:
+                # Readers skip this, so a lookup costs one query on an open connection
+                conn.executescript(_SCHEMA)
+                self._created = True
+            yield conn
+        finally:
+            with self._lock:
+                self._idle.append(conn)
+
+    def close(self) -> None:
+        """Close the open connections; later calls open new ones."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def is_complete(self, dataset: str) -> bool:
+        """Whether every file of a dataset is in the catalog."""
+        with self._connect(create=False) as conn:
+            return conn is not None and _is_complete(conn, dataset)
+
+    def register(
+        self,
+        dataset: str,
+        entries: Sequence[FileEntry],
+        replaced: Iterable[str] = (),
+    ) -> None:
+        """Add written files to the catalog and drop the ones they replaced, in one transaction.
+
+        Args:
+            dataset: Name of the dataset in the catalog
+            entries: Files that were added to the dataset
+            replaced: Paths (relative to the dataset) of files that were removed
+        """
+        written_at = datetime.now().isoformat()
+        with self._connect(create=True) as conn, _transaction(conn):
+            known = conn.execute("SELECT 1 FROM datasets WHERE dataset = ?", (dataset,)).fetchone()
+            if known is None:
+                # Files the catalog has never seen are already in the dataset
+                new = {entry.path for entry in entries}
+                dataset_path = self.lake_path / dataset
+                complete = not any(
+                    path.relative_to(dataset_path).as_posix() not in new
+                    for path in dataset_files(dataset_path)
+                )
+                conn.execute("INSERT INTO datasets VALUES (?, ?)", (dataset, int(complete)))
+                if not complete:
+                    logger.warning(
+                        f"{dataset_path} holds files written before its catalog; "
+                        f"it is read by listing until the catalog is rebuilt"
+                    )
+            for path in replaced:
+                self._remove(conn, dataset, path)
+            for entry in entries:
+                self._remove(conn, dataset, entry.path)
+                conn.execute(
+                    "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        dataset, entry.path, entry.rows, entry.bytes,
+                        entry.min_time, entry.max_time,
+                        entry.min_lat, entry.max_lat, entry.min_lon, entry.max_lon,
+                        ",".join(sorted(entry.variables)), written_at,
+                    ),
+                )
+                conn.executemany(
+                    "INSERT INTO file_stations VALUES (?, ?, ?)",
+                    [(dataset, entry.path, station) for station in sorted(entry.stations)],
+                )
+                conn.execute(
+                    "INSERT INTO changes (dataset, path, min_time, max_time, stations) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        dataset, entry.path, entry.min_time, entry.max_time,
+                        ",".join(sorted(entry.stations)),
+                    ),
+                )
+            if entries:
+                conn.execute(
+                    "DELETE FROM changes WHERE id <= (SELECT max(id) FROM changes) - ?",
+                    (CHANGE_LOG_ROWS,),
+                )
+
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, dataset: str, path: str) -> None:
+        conn.execute("DELETE FROM files WHERE dataset = ? AND path = ?", (dataset, path))
+        conn.execute("DELETE FROM file_stations WHERE dataset = ? AND path = ?", (dataset, path))
+
+    def drop(self, dataset: str) -> None:
+        """Forget a dataset, e.g. after deleting its directory."""
+        with self._connect(create=False) as conn:
+            if conn is None:
+                return
+            with _transaction(conn):
+                for table in ("datasets", "files", "file_stations"):
+                    conn.execute(f"DELETE FROM {table} WHERE dataset = ?", (dataset,))
+
+    def rebuild(self, dataset: str) -> int:
+        """Catalog every file of a dataset from its footer and mark the dataset complete.
+
+        Returns:
+            Number of files in the catalog afterwards
+        """
+        dataset_path = self.lake_path / dataset
+        with self._connect(create=True) as conn:
+            cataloged = {
+                row[0]
+                for row in conn.execute("SELECT path FROM files WHERE dataset = ?", (dataset,))
+            }
+        on_disk = {
+            path.relative_to(dataset_path).as_posix(): path for path in dataset_files(dataset_path)
+        }
+        entries = [
+            describe_file(path, relative)
+            for relative, path in on_disk.items()
+            if relative not in cataloged
+        ]
+        with self._connect(create=True) as conn, _transaction(conn):
+            conn.execute("INSERT OR IGNORE INTO datasets VALUES (?, 0)", (dataset,))
+        self.register(dataset, entries, replaced=cataloged - set(on_disk))
+        with self._connect(create=True) as conn, _transaction(conn):
+            conn.execute("UPDATE datasets SET complete = 1 WHERE dataset = ?", (dataset,))
+        logger.info(
+            f"Catalog of {dataset_path}: {len(on_disk)} files, {len(entries)} newly described"
+        )
+        return len(on_disk)
+
+    def last_change(self) -> int:
+        """Id of the newest entry of the change log (0 when it is empty)."""
+        with self._connect(create=False) as conn:
+            if conn is None:
+                return 0
+            try:
+                row = conn.execute("SELECT max(id) FROM changes").fetchone()
+            except sqlite3.OperationalError:
+                return 0  # Written before the change log existed
+        return row[0] or 0
+
+    def changes(self, after: int = 0) -> List[Change]:
+        """Files registered since an entry of the change log, oldest first.
+
+        Args:
+            after: Id of the last entry already seen (see ``last_change``)
+        """
+        with self._connect(create=False) as conn:
+            if conn is None:
+                return []
+            try:
+                rows = conn.execute(
+                    "SELECT id, dataset, path, min_time, max_time, stations FROM changes "
+                    "WHERE id > ? ORDER BY id",
+                    (after,),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        return [
+            Change(
+                change_id,
+                dataset,
+                path,
+                None if min_time is None else _from_micros(min_time),
+                None if max_time is None else _from_micros(max_time),
+                stations.split(",") if stations else [],
+            )
+            for change_id, dataset, path, min_time, max_time, stations in rows
+        ]
+
+    def files(
+        self,
+        dataset: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        stations: Optional[Sequence[str]] = None,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        variables: Optional[Sequence[str]] = None,
+        partition: Optional[str] = None,
+    ) -> Optional[List[CatalogFile]]:
+        """Files of a dataset that may hold rows matching all the given conditions.
+
+        Args:
+            dataset: Name of the dataset in the catalog
+            start: Rows at or after this time
+            end: Rows at or before this time
+            stations: Rows of one of these stations
+            bbox: Rows inside (min_lat, min_lon, max_lat, max_lon)
+            variables: Rows with a value in one of these columns
+            partition: Files under this partition directory, e.g. "geohash=drt"
+
+        Returns:
+            The files ordered by path, or None when the catalog does not
+            cover the dataset and it has to be listed instead
+        """
+        where = ["dataset = ?"]
+        params: list = [dataset]
+        if start is not None:
+            where.append("max_time >= ?")
+            params.append(to_micros(start))
+        if end is not None:
+            where.append("min_time <= ?")
+            params.append(to_micros(end))
+        if bbox is not None:
+            where.append("max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?")
+            params.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+        if partition is not None:
+            where.append("substr(path, 1, ?) = ?")
+            params.extend([len(partition) + 1, partition + "/"])
+        if stations is not None:
+            where.append(
+                f"path IN (SELECT path FROM file_stations WHERE dataset = ? "
+                f"AND station IN ({', '.join('?' for _ in stations)}))"
+            )
+            params.extend([dataset, *stations])
+        with self._connect(create=False) as conn:
+            if conn is None or not _is_complete(conn, dataset):
+                return None
+            rows = conn.execute(
+                f"SELECT path, rows, bytes, variables FROM files "
+                f"WHERE {' AND '.join(where)} ORDER BY path",
+                params,
+            ).fetchall()
+
+        dataset_path = self.lake_path / dataset
+        wanted = set(variables) if variables is not None else None
+        return [
+            CatalogFile(dataset_path / path, count, size)
+            for path, count, size, columns in rows
+            if wanted is None or not wanted.isdisjoint(columns.split(","))
+        ]
+
+
+def _is_complete(conn: sqlite3.Connection, dataset: str) -> bool:
+    try:
+        row = conn.execute("SELECT complete FROM datasets WHERE dataset = ?", (dataset,)).fetchone()
+    except sqlite3.OperationalError:
+        return False  # Tables not created yet
+    return bool(row and row[0])
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Write transaction on an autocommit connection, rolled back on errors."""
+    # IMMEDIATE takes the write lock up front, so concurrent writers wait on
+    # the busy timeout instead of failing when they upgrade a read lock
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def register_files(
+    dataset_path: Union[str, Path],
+    entries: Sequence[FileEntry],
+    replaced: Iterable[str] = (),
+    create: bool = True,
+) -> None:
+    """Record files a writer added to (or removed from) a dataset in its lake's catalog.
+
+    Args:
+        dataset_path: Dataset directory
+        entries: Files that were added to the dataset
+        replaced: Paths (relative to the dataset) of files that were removed
+        create: Create the catalog next to the dataset if there is none yet;
+                otherwise directories outside a cataloged lake are left alone
+    """
+    catalog, dataset = Catalog.for_dataset(dataset_path)
+    if not create and not catalog.path.exists():
+        return
+    try:
+        catalog.register(dataset, entries, replaced)
+    finally:
+        catalog.close()
@@ -0,0 +1,439 @@
+"""Compaction of the small Parquet files left behind by incremental ingestion.
+
+Every ingest batch adds one file to each partition it touches, so a partition
+fed hourly accumulates thousands of tiny files and reading it is dominated by
+opening files and parsing footers. Compaction rewrites the small files of a
+partition into a few large ones, sorted by station and timestamp, with row
+groups of a target size and column statistics so readers can skip row groups
+by their min/max values.
+
+A compacted partition is built in a staging directory outside the dataset.
+How it is swapped in depends on how the dataset is read:
+
+- Datasets the metadata catalog covers are read through it, so the catalog
+  update is the commit point. The new files are linked into the partition
+  first (readers only open files the catalog lists), then the catalog swaps
+  the entries of the merged files for theirs in one transaction. The merged
+  files stay on disk for ``RETIRED_GRACE``, for queries that listed them just
+  before, and a later run deletes them.
+- Other datasets are read by listing, so the staging directory is exchanged
+  with the partition in a single atomic rename and readers see either the
+  old files or the new ones. Where the platform cannot exchange directories,
+  the new files are linked in and the merged ones unlinked right after, and
+  listers may see both for that instant.
+
+Before swapping, the merged and written file names are recorded in a journal
+next to the staging copy. Every compaction of the dataset first finishes the
+swaps earlier runs left behind (or undoes them, when the new files were not
+all in place) and deletes the merged files whose grace period is over:
+
+    <lake>/ndbc/geohash=drt/                          partition being compacted
+    <lake>/_compaction/ndbc/geohash=drt-1a2b3c4d/     staging copy
+    <lake>/_compaction/ndbc/geohash=drt-1a2b3c4d.json journal of the swap
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from loguru import logger
+
+from seantral_data_pipeline.storage.catalog import (
+    Catalog,
+    FileEntry,
+    describe_file,
+    register_files,
+)
+from seantral_data_pipeline.storage.layout import DICTIONARY_COLUMNS
+
+COMPACTION_DIR = "_compaction"
+
+# Files smaller than this are merged; larger ones are considered compacted
+SMALL_FILE_BYTES = 32 * 1024 * 1024
+
+# Uncompressed Arrow bytes per output row group and per output file
+ROW_GROUP_BYTES = 64 * 1024 * 1024
+FILE_BYTES = 512 * 1024 * 1024
+
+# Merged files of a cataloged dataset stay on disk this long after the catalog
+# dropped them, so queries that listed them just before can still read them
+RETIRED_GRACE = timedelta(minutes=10)
+
+SORT_COLUMNS = ("buoy_id", "timestamp")
+
+# renameat2() flag swapping two paths atomically (Linux >= 3.15)
+_RENAME_EXCHANGE = 2
+_AT_FDCWD = -100
+
+
+def _load_renameat2() -> Optional[Callable[..., int]]:
+    libc_name = ctypes.util.find_library("c")
+    if libc_name is None:
+        return None
+    return getattr(ctypes.CDLL(libc_name, use_errno=True), "renameat2", None)
+
+
+# Resolved once; None where the C library has no renameat2
+_RENAMEAT2 = _load_renameat2()
+
+
+def _exchange(a: Path, b: Path) -> bool:
+    """Atomically swap two directories, if the platform supports it."""
+    if _RENAMEAT2 is None:
+        return False
+    result = _RENAMEAT2(_AT_FDCWD, os.fsencode(a), _AT_FDCWD, os.fsencode(b), _RENAME_EXCHANGE)
+    return result == 0
+
+
+def _swap(
+    partition: Path,
+    staged: Path,
+    retired: Path,
+    written: List[str],
+    exchange: bool,
+) -> None:
+    """Put the staged files in place.
+
+    With ``exchange`` and a platform that supports it, the staged directory
+    becomes the partition and the old partition ends up in retired. Otherwise
+    the written files are linked into the partition next to the merged ones,
+    which ``_finish`` unlinks.
+    """
+    if exchange and _exchange(staged, partition):
+        staged.rename(retired)
+        return
+    for name in written:
+        os.link(staged / name, partition / name)
+
+
+def _save_journal(journal: Path, record: Dict[str, Any]) -> None:
+    partial = journal.with_name(journal.name + ".tmp")
+    partial.write_text(json.dumps(record))
+    os.replace(partial, journal)
+
+
+def _finish(
+    journal: Path,
+    dataset_path: Optional[Path],
+    entries: Optional[List[FileEntry]] = None,
+    grace: timedelta = RETIRED_GRACE,
+) -> bool:
+    """Complete the swap a journal records, or undo it if it did not get far enough.
+
+    Safe to run again from any point it may have stopped at. The journal is
+    kept until the merged files are deleted.
+
+    Args:
+        journal: Journal written next to the staged directory before the swap
+        dataset_path: Root of the dataset whose catalog entries are updated
+                      (None to leave the catalog alone)
+        entries: Catalog entries of the written files (described from the
+                 files when None)
+        grace: How long merged files of a cataloged dataset stay on disk
+
+    Returns:
+        Whether the compacted files are in place
+    """
+    record = json.loads(journal.read_text())
+    partition = Path(record["partition"])
+    merged, written = record["merged"], record["written"]
+    staged = journal.with_suffix("")
+    retired = staged.with_name(staged.name + ".old")
+
+    if record.get("committed") is None:
+        if staged.is_dir() and any((staged / name).exists() for name in merged):
+            # Exchanged, but stopped before the old partition was moved aside
+            staged.rename(retired)
+        if retired.is_dir():
+            # Batches written to the old directory during compaction
+            for path in retired.glob("*.parquet"):
+                if path.name not in merged and not (partition / path.name).exists():
+                    os.replace(path, partition / path.name)
+            shutil.rmtree(retired)
+        elif not all((partition / name).exists() for name in written):
+            for name in written:
+                (partition / name).unlink(missing_ok=True)
+            shutil.rmtree(staged, ignore_errors=True)
+            journal.unlink()
+            logger.warning(f"Rolled back an unfinished compaction of {partition}")
+            return False
+
+        if dataset_path is not None:
+            if entries is None:
+                entries = [
+                    describe_file(path, path.relative_to(dataset_path).as_posix())
+                    for path in (partition / name for name in written)
+                ]
+            register_files(
+                dataset_path,
+                entries,
+                replaced=[
+                    (partition / name).relative_to(dataset_path).as_posix() for name in merged
+                ],
+            )
+        record["committed"] = time.time()
+        _save_journal(journal, record)
+
+    if not record.get("cataloged"):
+        # Listers no longer see the merged files, or must stop seeing them now
+        grace = timedelta(0)
+    if time.time() - record["committed"] < grace.total_seconds():
+        return True
+    for name in merged:
+        (partition / name).unlink(missing_ok=True)
+    shutil.rmtree(staged, ignore_errors=True)
+    journal.unlink()
+    return True
+
+
+def _sweep(staging_root: Path, dataset_path: Path, grace: timedelta) -> None:
+    """Finish the journaled swaps of a dataset and drop its staging area once none is left."""
+    for journal in sorted(staging_root.rglob("*.json")):
+        _finish(journal, dataset_path, grace=grace)
+    if staging_root.is_dir() and not any(staging_root.rglob("*.json")):
+        shutil.rmtree(staging_root, ignore_errors=True)
+        try:
+            staging_root.parent.rmdir()
+        except OSError:
+            pass  # Another dataset is being compacted
+
+
+def leaf_partitions(dataset_path: Union[str, Path]) -> Iterator[Path]:
+    """Directories of a dataset that hold Parquet files and no subdirectories."""
+    dataset_path = Path(dataset_path)
+    for root, dirs, files in os.walk(dataset_path):
+        dirs[:] = [d for d in dirs if not d.startswith((".", "_"))]
+        if not dirs and any(name.endswith(".parquet") for name in files):
+            yield Path(root)
+
+
+def _read(files: List[Path]) -> pa.Table:
+    """Read and concatenate files whose schemas may have drifted between batches."""
+    tables = []
+    for path in files:
+        # Station columns are read as dictionaries whatever type older files stored them with
+        table = pq.read_table(path, read_dictionary=DICTIONARY_COLUMNS)
+        # Row indexes and pandas metadata of single batches are meaningless once merged
+        table = table.drop_columns(
+            [name for name in table.column_names if name.startswith("__index_level_")]
+        )
+        tables.append(table.replace_schema_metadata(None))
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def _decoded(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    if pa.types.is_dictionary(column.type):
+        return column.cast(column.type.value_type)
+    return column
+
+
+def _rows_for(table: pa.Table, target_bytes: int) -> int:
+    """Number of rows of a table that take about target_bytes in memory."""
+    row_bytes = max(table.nbytes / max(table.num_rows, 1), 1)
+    return max(int(target_bytes / row_bytes), 1)
+
+
+def _write(
+    table: pa.Table,
+    directory: Path,
+    compression: str,
+    row_group_bytes: int,
+    file_bytes: int,
+) -> List[Tuple[Path, pa.Table]]:
+    """Write a table sorted by station and time, split into files and row groups."""
+    sort_keys = [name for name in SORT_COLUMNS if name in table.column_names]
+    if sort_keys:
+        # Dictionary columns cannot be sorted directly; order by their values
+        keys = pa.table({name: _decoded(table[name]) for name in sort_keys})
+        table = table.take(
+            pc.sort_indices(keys, sort_keys=[(name, "ascending") for name in sort_keys])
+        )
+    sorting = [pq.SortingColumn(table.column_names.index(name)) for name in sort_keys]
+    table = table.replace_schema_metadata(
+        {"compacted_at": datetime.now().isoformat(), "rows": str(table.num_rows)}
+    )
+
+    row_group_rows = _rows_for(table, row_group_bytes)
+    # Files hold whole row groups
+    file_rows = max(_rows_for(table, file_bytes) // row_group_rows, 1) * row_group_rows
+    written = []
+    for offset in range(0, table.num_rows, file_rows):
+        path = directory / f"part-{uuid.uuid4().hex}.parquet"
+        rows = table.slice(offset, file_rows)
+        pq.write_table(
+            rows,
+            path,
+            row_group_size=row_group_rows,
+            compression=compression,
+            write_statistics=True,
+            sorting_columns=sorting or None,
+        )
+        written.append((path, rows))
+    return written
+
+
+def compact_partition(
+    partition: Union[str, Path],
+    staging: Union[str, Path],
+    small_file_bytes: int = SMALL_FILE_BYTES,
+    row_group_bytes: int = ROW_GROUP_BYTES,
+    file_bytes: int = FILE_BYTES,
+    compression: str = "zstd",
+    dataset_path: Optional[Union[str, Path]] = None,
+    grace: timedelta = RETIRED_GRACE,
+) -> Dict[str, int]:
+    """Merge the small files of one partition directory.
+
+    Files at or above ``small_file_bytes`` are kept as they are (hard-linked
+    into the staged partition). Files that ingestion adds to the partition
+    while it is being compacted end up in the new partition after the swap,
+    so no rows are lost.
+
+    Args:
+        partition: Directory holding the partition's Parquet files
+        staging: Directory the new partition is built in; it must be on the
+                 same filesystem and outside of the dataset (DuckDB globs
+                 descend into hidden directories too)
+        small_file_bytes: Size under which files are merged
+        row_group_bytes: Target uncompressed size of output row groups
+        file_bytes: Target uncompressed size of output files
+        compression: Compression codec of output files
+        dataset_path: Root of the dataset the partition belongs to, whose
+                      catalog entries are updated (None to leave the catalog alone)
+        grace: How long merged files of a cataloged dataset stay on disk
+
+    Returns:
+        Dictionary with the number of files merged and written and rows rewritten
+    """
+    # Journals name the partition by its absolute path, for the next run to find
+    partition = Path(partition).resolve()
+    listed = None
+    if dataset_path is not None:
+        dataset_path = Path(dataset_path).resolve()
+        catalog, name = Catalog.for_dataset(dataset_path)
+        relative = partition.relative_to(dataset_path)
+        try:
+            listed = catalog.files(name, partition=relative.as_posix() if relative.parts else None)
+        finally:
+            catalog.close()
+    if listed is not None:
+        # Merged files still in their grace period are not in the catalog
+        files = sorted(f.path for f in listed if f.path.parent == partition)
+    else:
+        files = sorted(partition.glob("*.parquet"))
+    small = [path for path in files if path.stat().st_size < small_file_bytes]
+    summary = {"files_merged": 0, "files_written": 0, "rows": 0}
+    if len(small) < 2:
+        return summary
+
+    staging = Path(staging)
+    staged = staging.with_name(f"{staging.name}-{uuid.uuid4().hex[:8]}")
+    retired = staged.with_name(staged.name + ".old")
+    journal = staged.with_name(staged.name + ".json")
+    staged.mkdir(parents=True)
+    try:
+        for path in files:
+            if path not in small:
+                os.link(path, staged / path.name)
+        table = _read(small)
+        written = _write(table, staged, compression, row_group_bytes, file_bytes)
+    except BaseException:
+        shutil.rmtree(staged, ignore_errors=True)
+        raise
+
+    names = [path.name for path, _ in written]
+    record = {
+        "partition": str(partition),
+        "merged": [path.name for path in small],
+        "written": names,
+        "cataloged": listed is not None,
+        "committed": None,
+    }
+    _save_journal(journal, record)
+    try:
+        _swap(partition, staged, retired, names, exchange=listed is None)
+    except BaseException:
+        _finish(journal, dataset_path, grace=grace)
+        raise
+
+    entries = None
+    if dataset_path is not None:
+        entries = []
+        for path, rows in written:
+            final = partition / path.name
+            entry = FileEntry(
+                final.relative_to(dataset_path).as_posix(), bytes=final.stat().st_size
+            )
+            entry.add(rows)
+            entries.append(entry)
+    _finish(journal, dataset_path, entries, grace)
+
+    summary.update(files_merged=len(small), files_written=len(written), rows=table.num_rows)
+    logger.info(
+        f"Compacted {len(small)} files ({table.num_rows} rows) of {partition} "
+        f"into {len(written)}"
+    )
+    return summary
+
+
+def compact_dataset(
+    dataset_path: Union[str, Path],
+    small_file_bytes: int = SMALL_FILE_BYTES,
+    row_group_bytes: int = ROW_GROUP_BYTES,
+    file_bytes: int = FILE_BYTES,
+    compression: str = "zstd",
+    grace: timedelta = RETIRED_GRACE,
+) -> Dict[str, int]:
+    """Compact every leaf partition of a dataset.
+
+    Partitions are staged under ``<lake>/_compaction/<dataset>/``, next to the
+    dataset but outside of it, so scans of the dataset never pick up files
+    that are still being written. Swaps left unfinished by an earlier run are
+    completed (or undone) first, and merged files whose grace period is over
+    are deleted before and after compacting.
+
+    Args:
+        dataset_path: Root of the dataset (e.g. <lake>/ndbc)
+        small_file_bytes: Size under which files are merged
+        row_group_bytes: Target uncompressed size of output row groups
+        file_bytes: Target uncompressed size of output files
+        compression: Compression codec of output files
+        grace: How long merged files of a cataloged dataset stay on disk
+
+    Returns:
+        Totals over all partitions, including the number of partitions compacted
+    """
+    dataset_path = Path(dataset_path).resolve()
+    staging_root = dataset_path.parent / COMPACTION_DIR / dataset_path.name
+    totals = {"partitions": 0, "files_merged": 0, "files_written": 0, "rows": 0}
+    _sweep(staging_root, dataset_path, grace)
+    for partition in list(leaf_partitions(dataset_path)):
+        relative = partition.relative_to(dataset_path)
+        staging = staging_root / relative if relative.parts else staging_root / "_root"
+        summary = compact_partition(
+            partition,
+            staging=staging,
+            small_file_bytes=small_file_bytes,
+            row_group_bytes=row_group_bytes,
+            file_bytes=file_bytes,
+            compression=compression,
+            dataset_path=dataset_path,
+            grace=grace,
+        )
+        if summary["files_merged"]:
+            totals["partitions"] += 1
+            for name, value in summary.items():
+                totals[name] += value
+    _sweep(staging_root, dataset_path, grace)
+    logger.info(f"Compacted {totals['partitions']} partitions of {dataset_path}")
+    return totals
@@ -0,0 +1,30 @@
+"""Directory layout of the lake shared by its writers and readers.
+
+Kept free of heavy imports so the API can locate datasets and rollups without
+loading pandas, pyarrow or DuckDB at startup.
+"""
+
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Union
+
+# Rollup name -> bucket width
+ROLLUPS: Dict[str, timedelta] = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+}
+
+ROLLUP_DIR = "_rollups"
+
+# Versions of the recent observations published for the API workers
+RECENT_DIR = "_recent"
+
+# String columns repeating a handful of values (the station of every row, the
+# source of a batch), stored and read dictionary-encoded
+DICTIONARY_COLUMNS = ("buoy_id", "source", "file_path")
+
+
+def rollup_path(dataset_path: Union[str, Path], rollup: str) -> Path:
+    """Return the directory of a rollup for a raw dataset directory."""
+    dataset_path = Path(dataset_path)
+    return dataset_path.parent / ROLLUP_DIR / dataset_path.name / rollup
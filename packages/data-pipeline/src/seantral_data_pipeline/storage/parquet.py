@@ -1,21 +1,66 @@
-"""Parquet storage utilities for persisting data frames."""
+"""Parquet storage utilities for persisting data frames.
+
+Partitioned writes record their files in the lake's metadata catalog (see
+catalog.py), and reads of a cataloged dataset open only the files whose
+statistics can match the filters instead of listing the dataset.
+
+Reads come in three shapes over the same file selection: ``read_table``
+returns an Arrow table, ``iter_batches`` streams record batches so a wide
+scan never holds more than one batch, and ``read_from_parquet`` converts to
+pandas for callers that want a DataFrame. Local files are memory-mapped, and
+the repeated string columns (``DICTIONARY_COLUMNS``) are written and read
+dictionary-encoded, so they arrive as one small dictionary plus integer codes
+(categoricals in pandas) instead of one Python string per row.
+"""
 
 import os
-from pathlib import Path
-from typing import Dict, List, Optional, Union, Any
 from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import unquote
 
+import numpy as np
 import pandas as pd
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
 import pyarrow.parquet as pq
 from loguru import logger
 
+from seantral_data_pipeline.spatial.geohash import encode_many
+from seantral_data_pipeline.storage.catalog import Catalog, CatalogFile, FileEntry, register_files
+from seantral_data_pipeline.storage.layout import DICTIONARY_COLUMNS, ROLLUPS, rollup_path
+from seantral_data_pipeline.storage.rollups import update_rollups
+from seantral_data_pipeline.timing import span
+
+# Arrow type of the dictionary-encoded string columns
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+# Rows per record batch yielded by iter_batches
+BATCH_ROWS = 128 * 1024
+
+def encode_dictionaries(table: pa.Table) -> pa.Table:
+    """Give the DICTIONARY_COLUMNS of a table one dictionary type.
+
+    Plain strings are dictionary-encoded and categoricals converted from
+    pandas (int8 codes, large_string values) are cast, so batches from
+    different producers concatenate and share a file schema.
+    """
+    for name in DICTIONARY_COLUMNS:
+        if name in table.column_names and table.schema.field(name).type != DICTIONARY_TYPE:
+            index = table.column_names.index(name)
+            table = table.set_column(index, name, table[name].cast(DICTIONARY_TYPE))
+    return table
+
 def save_to_parquet(
     df: pd.DataFrame,
     output_path: Union[str, Path],
     partition_cols: Optional[List[str]] = None,
     compression: str = "snappy",
     metadata: Optional[Dict[str, str]] = None,
+    geohash_precision: Optional[int] = None,
+    rollups: bool = False,
 ) -> Path:
     """Save DataFrame to Parquet format.
     
@@ -25,12 +70,27 @@ def save_to_parquet(
         partition_cols: Columns to partition by
         compression: Compression algorithm (snappy, gzip, brotli, none)
         metadata: Additional metadata to include
+        geohash_precision: If set, derive a geohash column of this precision from
+                           the lat/lon columns and partition by it first
+        rollups: If set, build the hourly/daily rollups the dataset does not
+                 have yet; the ones it has are always refreshed for the
+                 stations and time range of the new rows, so queries served
+                 from them see the rows
         
     Returns:
         Path to saved file
     """
     output_path = Path(output_path)
     
+    if geohash_precision is not None:
+        if "lat" not in df.columns or "lon" not in df.columns:
+            raise ValueError("Geohash partitioning requires lat and lon columns")
+        if df["lat"].isna().any() or df["lon"].isna().any():
+            raise ValueError("Geohash partitioning requires coordinates on every row")
+        geohashes = encode_many(df["lat"].to_numpy(), df["lon"].to_numpy(), geohash_precision)
+        df = df.assign(geohash=geohashes)
+        partition_cols = ["geohash"] + [c for c in (partition_cols or []) if c != "geohash"]
+    
     # Ensure directory exists
     if partition_cols is None:
         output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -52,26 +112,46 @@ def save_to_parquet(
     try:
         logger.info(f"Saving DataFrame to {output_path} with {compression} compression")
         
-        table = pa.Table.from_pandas(df)
-        
-        # Add metadata to the table
-        metadata_dict = {k.encode(): v.encode() for k, v in full_metadata.items()}
-        table = table.replace_schema_metadata({**table.schema.metadata, **metadata_dict})
+        with span("parquet.write", path=str(output_path)) as timing:
+            table = encode_dictionaries(pa.Table.from_pandas(df))
+            
+            # Add metadata to the table
+            metadata_dict = {k.encode(): v.encode() for k, v in full_metadata.items()}
+            table = table.replace_schema_metadata({**table.schema.metadata, **metadata_dict})
+            
+            if partition_cols:
+                logger.info(f"Partitioning by {partition_cols}")
+                written: List[str] = []
+                pq.write_to_dataset(
+                    table,
+                    root_path=str(output_path),
+                    partition_cols=partition_cols,
+                    compression=compression,
+                    file_visitor=lambda written_file: written.append(written_file.path),
+                )
+                # Geohash-partitioned datasets belong to a lake; other partitioned
+                # outputs only join a catalog their parent directory already has
+                register_files(
+                    output_path,
+                    _describe(table, partition_cols, [Path(p) for p in written], output_path),
+                    create=geohash_precision is not None,
+                )
+            else:
+                pq.write_table(
+                    table,
+                    output_path,
+                    compression=compression,
+                )
+            timing.count(rows=table.num_rows, bytes=table.nbytes)
         
-        if partition_cols:
-            logger.info(f"Partitioning by {partition_cols}")
-            pq.write_to_dataset(
-                table,
-                root_path=str(output_path),
-                partition_cols=partition_cols,
-                compression=compression,
-            )
-        else:
-            pq.write_table(
-                table,
-                output_path,
-                compression=compression,
-            )
+        dataset_path = output_path if partition_cols else output_path.parent
+        names = [
+            name
+            for name in ROLLUPS
+            if rollups or rollup_path(dataset_path, name).is_dir()
+        ]
+        if names and {"timestamp", "buoy_id"} <= set(df.columns):
+            update_rollups(dataset_path, df, rollups=names)
             
         logger.success(f"Successfully saved DataFrame to {output_path}")
         return output_path
@@ -80,6 +160,196 @@ def save_to_parquet(
         logger.error(f"Error saving DataFrame to parquet: {e}")
         raise
 
+def _describe(
+    table: pa.Table,
+    partition_cols: List[str],
+    paths: List[Path],
+    dataset_path: Path,
+) -> List[FileEntry]:
+    """Catalog entries of the files write_to_dataset wrote, from the rows of their partitions."""
+    # Rows are grouped by partition once, so every file is described from a slice
+    combined = np.zeros(table.num_rows, dtype=np.int64)
+    lookups = []
+    for key in partition_cols:
+        column = pc.dictionary_encode(table[key].cast(pa.string()).combine_chunks())
+        lookup = {value: i for i, value in enumerate(column.dictionary.to_pylist())}
+        combined = combined * len(lookup) + column.indices.to_numpy(zero_copy_only=False)
+        lookups.append(lookup)
+    order = np.argsort(combined, kind="stable")
+    groups, starts = np.unique(combined[order], return_index=True)
+    ends = np.append(starts[1:], table.num_rows)
+    rows = table.take(pa.array(order))
+    slices = {
+        int(group): rows.slice(start, end - start)
+        for group, start, end in zip(groups, starts, ends, strict=True)
+    }
+
+    entries = []
+    for path in paths:
+        relative = path.relative_to(dataset_path)
+        values = dict(segment.split("=", 1) for segment in relative.parts[:-1])
+        group: Optional[int] = 0
+        for key, lookup in zip(partition_cols, lookups, strict=True):
+            code = lookup.get(unquote(values.get(key, "")))
+            group = None if group is None or code is None else group * len(lookup) + code
+        entry = FileEntry(relative.as_posix(), bytes=os.path.getsize(path))
+        # A directory name that does not map back to a value (e.g. nulls) gets
+        # the statistics of every row, which never prunes it wrongly
+        entry.add(slices.get(group, table))
+        entries.append(entry)
+    return entries
+
+def _catalog_files(dataset_path: Path, filters: Optional[List]) -> Optional[List[CatalogFile]]:
+    """Files of a cataloged dataset that may match PyArrow filters (None when not cataloged).
+
+    Conditions on timestamp, buoy_id, lat and lon narrow the selection; any
+    other condition is left to the scan.
+    """
+    catalog, dataset = Catalog.for_dataset(dataset_path)
+    try:
+        if not filters:
+            return catalog.files(dataset)
+        # Filters are a conjunction of tuples or a disjunction of such conjunctions
+        conjunctions = filters if isinstance(filters[0], list) else [filters]
+        selected: Dict[Path, CatalogFile] = {}
+        for conjunction in conjunctions:
+            files = catalog.files(dataset, **_catalog_conditions(conjunction))
+            if files is None:
+                return None
+            selected.update((f.path, f) for f in files)
+        if not selected:
+            # Reading one file keeps the dataset's columns in the (empty) result
+            return catalog.files(dataset)[:1] or None
+        return sorted(selected.values())
+    finally:
+        catalog.close()
+
+def _catalog_conditions(conjunction: List) -> Dict[str, Any]:
+    """Catalog.files arguments implied by the (column, op, value) tuples of a conjunction."""
+    conditions: Dict[str, Any] = {}
+    bounds = {"lat": [-90.0, 90.0], "lon": [-180.0, 180.0]}
+    for column, op, value in conjunction:
+        if column == "timestamp" and op in (">", ">=", "==", "="):
+            conditions["start"] = pd.Timestamp(value).to_pydatetime()
+        if column == "timestamp" and op in ("<", "<=", "==", "="):
+            conditions["end"] = pd.Timestamp(value).to_pydatetime()
+        if column == "buoy_id" and op in ("==", "="):
+            conditions["stations"] = [str(value)]
+        elif column == "buoy_id" and op == "in":
+            conditions["stations"] = [str(v) for v in value]
+        if column in bounds and op in (">", ">=", "==", "="):
+            bounds[column][0] = max(bounds[column][0], float(value))
+        if column in bounds and op in ("<", "<=", "==", "="):
+            bounds[column][1] = min(bounds[column][1], float(value))
+    if bounds != {"lat": [-90.0, 90.0], "lon": [-180.0, 180.0]}:
+        (min_lat, max_lat), (min_lon, max_lon) = bounds["lat"], bounds["lon"]
+        conditions["bbox"] = (min_lat, min_lon, max_lat, max_lon)
+    return conditions
+
+def _dataset(
+    input_path: Path,
+    filters: Optional[List],
+    memory_map: bool,
+) -> Tuple[ds.Dataset, List[str]]:
+    """Dataset over the files of a path that may match the filters, and those files."""
+    filesystem = pafs.LocalFileSystem(use_mmap=memory_map)
+    file_format = ds.ParquetFileFormat(
+        read_options=ds.ParquetReadOptions(dictionary_columns=set(DICTIONARY_COLUMNS))
+    )
+    if not input_path.is_dir():
+        dataset = ds.dataset(str(input_path), format=file_format, filesystem=filesystem)
+        return dataset, [str(input_path)]
+
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+    files = _catalog_files(input_path, filters)
+    if files:
+        # Only the files the catalog selected; partition columns still come from their paths
+        paths = [str(f.path) for f in files]
+        dataset = ds.dataset(
+            paths,
+            format=file_format,
+            filesystem=filesystem,
+            partitioning=partitioning,
+            partition_base_dir=str(input_path),
+        )
+        return dataset, paths
+
+    # Uncataloged datasets are listed; partition filters prune the file list
+    dataset = ds.dataset(
+        str(input_path), format=file_format, filesystem=filesystem, partitioning=partitioning
+    )
+    expression = pq.filters_to_expression(filters) if filters else None
+    paths = [fragment.path for fragment in dataset.get_fragments(filter=expression)]
+    return dataset, paths
+
+def read_table(
+    input_path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    filters: Optional[List] = None,
+    memory_map: bool = True,
+) -> pa.Table:
+    """Read an Arrow table from a Parquet file or dataset directory.
+
+    Args:
+        input_path: Path to parquet file or directory
+        columns: Columns to read
+        filters: PyArrow filters to apply
+        memory_map: Map local files into memory instead of reading them into buffers
+
+    Returns:
+        Table with the DICTIONARY_COLUMNS dictionary-encoded and the partition
+        columns of a dataset as dictionaries
+    """
+    input_path = Path(input_path)
+    with span("parquet.read", path=str(input_path)) as timing:
+        dataset, paths = _dataset(input_path, filters, memory_map)
+        table = dataset.to_table(
+            columns=columns,
+            filter=pq.filters_to_expression(filters) if filters else None,
+        )
+        timing.count(
+            rows=table.num_rows,
+            bytes=sum(os.path.getsize(path) for path in paths),
+            files=len(paths) if input_path.is_dir() else None,
+        )
+    return table
+
+def iter_batches(
+    input_path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    filters: Optional[List] = None,
+    batch_rows: int = BATCH_ROWS,
+    memory_map: bool = True,
+) -> Iterator[pa.RecordBatch]:
+    """Stream record batches from a Parquet file or dataset directory.
+
+    Only the batches being decoded are held in memory, so scans of any size
+    run in bounded memory. The "parquet.scan" span covers the whole
+    iteration, including the time the caller spends on each batch.
+
+    Args:
+        input_path: Path to parquet file or directory
+        columns: Columns to read
+        filters: PyArrow filters to apply
+        batch_rows: Maximum rows per batch
+        memory_map: Map local files into memory instead of reading them into buffers
+
+    Yields:
+        Record batches in file order
+    """
+    input_path = Path(input_path)
+    with span("parquet.scan", path=str(input_path)) as timing:
+        dataset, paths = _dataset(input_path, filters, memory_map)
+        timing.count(files=len(paths))
+        for batch in dataset.to_batches(
+            columns=columns,
+            filter=pq.filters_to_expression(filters) if filters else None,
+            batch_size=batch_rows,
+        ):
+            if batch.num_rows:
+                timing.count(rows=batch.num_rows)
+                yield batch
+
 def read_from_parquet(
     input_path: Union[str, Path],
     columns: Optional[List[str]] = None,
@@ -87,40 +357,32 @@ def read_from_parquet(
 ) -> pd.DataFrame:
     """Read DataFrame from Parquet file.
     
+    Callers that can work on Arrow data should use read_table or
+    iter_batches and skip the conversion.
+    
     Args:
         input_path: Path to parquet file or directory
         columns: Columns to read
         filters: PyArrow filters to apply
         
     Returns:
-        DataFrame with data
+        DataFrame with data; dictionary-encoded columns become categoricals
     """
     input_path = Path(input_path)
     
     try:
         logger.info(f"Reading parquet from {input_path}")
         
-        if input_path.is_dir():
-            # Read partitioned dataset
-            table = pq.read_table(
-                input_path,
-                columns=columns,
-                filters=filters,
-            )
-        else:
-            # Read single file
-            table = pq.read_table(
-                input_path,
-                columns=columns,
-                filters=filters,
-            )
-            
-        df = table.to_pandas()
+        table = read_table(input_path, columns=columns, filters=filters)
         
         # Extract metadata
-        metadata = {k.decode(): v.decode() for k, v in table.schema.metadata.items() 
+        metadata = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items() 
                   if k != b'pandas' and isinstance(k, bytes) and isinstance(v, bytes)}
         
+        # Convert column by column, releasing each Arrow column once converted
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+        
         logger.info(f"Read {len(df)} rows from {input_path}")
         logger.debug(f"Metadata: {metadata}")
         
@@ -128,4 +390,4 @@ def read_from_parquet(
         
     except Exception as e:
         logger.error(f"Error reading parquet from {input_path}: {e}")
-        raise 
\ No newline at end of file
+        raise 
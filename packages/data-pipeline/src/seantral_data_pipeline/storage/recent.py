@@ -0,0 +1,418 @@
+"""Recent observations published once and mapped by every API worker.
+
+A worker's own hot tier only sees the batches posted to that worker, and N
+workers would hold N copies of it. Instead, the pipeline (the one process
+that writes the lake) publishes the last days of every station series as
+uncompressed Arrow IPC files, and each worker memory-maps them. The pages
+live once in the OS page cache, so every worker reads the same physical
+memory and the columns are NumPy views of the mapping, copied by no one.
+
+    <lake>/_recent/CURRENT             "v00000042"
+    <lake>/_recent/v00000042/series.arrow
+        timestamp  timestamp[us]   every sample of every series, grouped by
+        value      float64         series and sorted by time within one
+    <lake>/_recent/v00000042/index.arrow
+        station, variable, start, stop   rows [start, stop) of each series
+        schema metadata: since (oldest timestamp published), published_at
+
+A version is written into a staging directory and renamed into place before
+CURRENT is swapped to name it, so readers see either the old or the new
+version and never a partial one. Readers check CURRENT at most every
+``refresh_seconds`` and map the new version when it changes; data mapped
+from an older version stays valid until the last view of it is released.
+Point the directory at a tmpfs (e.g. /dev/shm) to keep it off disk.
+
+A version holds the lake as it was when it was published. Readers answer
+ranges ending after that only while the version is younger than
+``max_age``, so a pipeline that stops publishing makes queries fall through
+to the lake instead of silently missing the rows written since.
+"""
+
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+from loguru import logger
+
+from seantral_data_pipeline.query.engine import VARIABLES, VariableSpec
+from seantral_data_pipeline.storage.layout import RECENT_DIR
+from seantral_data_pipeline.timing import span
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# File naming the current version
+CURRENT_FILE = "CURRENT"
+
+# Span of recent observations published per series
+RECENT_WINDOW = timedelta(days=7)
+
+# Lag behind the lake accepted from a version for ranges ending after it was
+# published; about the interval between pipeline runs
+MAX_AGE = timedelta(minutes=15)
+
+# Versions kept on disk; older ones are deleted, readers still holding a
+# mapping of them keep it (on POSIX systems)
+KEEP_VERSIONS = 3
+
+_VERSION = re.compile(r"^v(\d{8})$")
+
+
+def _version_number(name: str) -> Optional[int]:
+    match = _VERSION.match(name)
+    return int(match.group(1)) if match else None
+
+
+def _write_ipc(path: Path, table: "pa.Table") -> None:
+    import pyarrow as pa
+
+    # One record batch per file, so readers map each column as one buffer
+    batches = table.combine_chunks().to_batches()
+    if not batches:
+        batches = [pa.RecordBatch.from_pylist([], schema=table.schema)]
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+
+
+def _dataset_series(
+    dataset_path: Path,
+    specs: Mapping[str, VariableSpec],
+    since: datetime,
+) -> Tuple[List[np.ndarray], List[np.ndarray], List[Tuple[str, str, int]]]:
+    """Timestamps, values and (station, variable, rows) of every series of one dataset."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    from seantral_data_pipeline.storage.parquet import read_table
+
+    table = read_table(dataset_path, filters=[("timestamp", ">=", since)])
+    if table.num_rows == 0 or "buoy_id" not in table.column_names:
+        return [], [], []
+
+    stations = table["buoy_id"]
+    if pa.types.is_dictionary(stations.type):
+        stations = stations.cast(stations.type.value_type)
+    timestamps = table["timestamp"].cast(pa.timestamp("us"))
+    order = pc.sort_indices(
+        pa.table({"buoy_id": stations, "timestamp": timestamps}),
+        sort_keys=[("buoy_id", "ascending"), ("timestamp", "ascending")],
+    )
+    encoded = pc.dictionary_encode(stations.take(order).combine_chunks())
+    names = encoded.dictionary.to_pylist()
+    codes = encoded.indices.to_numpy(zero_copy_only=False)
+    times = timestamps.take(order).to_numpy()
+    # Rows repeated in the lake keep their first value, as the query engine's readers see it
+    first = np.ones(len(codes), dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (times[1:] != times[:-1])
+
+    all_times: List[np.ndarray] = []
+    all_values: List[np.ndarray] = []
+    series: List[Tuple[str, str, int]] = []
+    for variable, spec in specs.items():
+        if spec.column not in table.column_names:
+            continue
+        column = table[spec.column].take(order)
+        values = column.to_numpy(zero_copy_only=False).astype(np.float64)
+        rows = np.flatnonzero(first & column.is_valid().to_numpy(zero_copy_only=False))
+        if len(rows) == 0:
+            continue
+        held = codes[rows]
+        starts = np.flatnonzero(np.r_[True, held[1:] != held[:-1]])
+        stops = np.r_[starts[1:], len(rows)]
+        all_times.append(times[rows])
+        all_values.append(values[rows])
+        series.extend(
+            (names[held[begin]], variable, int(end - begin))
+            for begin, end in zip(starts, stops, strict=True)
+        )
+    return all_times, all_values, series
+
+
+def publish_recent(
+    lake_path: Union[str, Path],
+    output: Optional[Union[str, Path]] = None,
+    window: timedelta = RECENT_WINDOW,
+    since: Optional[datetime] = None,
+    variables: Optional[Mapping[str, VariableSpec]] = None,
+) -> Path:
+    """Publish the recent rows of every station series as a new version.
+
+    Args:
+        lake_path: Root of the data lake
+        output: Directory of the published versions (defaults to <lake>/_recent)
+        window: Span published, ending now
+        since: Oldest timestamp to publish instead of now - window (naive UTC)
+        variables: Variables to publish (defaults to the query engine's registry)
+
+    Returns:
+        Directory of the new version
+    """
+    import pyarrow as pa
+
+    lake_path = Path(lake_path)
+    output = Path(output) if output else lake_path / RECENT_DIR
+    variables = VARIABLES if variables is None else variables
+    if since is None:
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - window
+
+    with span("recent.publish", path=str(output)) as timing:
+        times: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        series: List[Tuple[str, str, int]] = []
+        for dataset in sorted({spec.dataset for spec in variables.values()}):
+            if not (lake_path / dataset).is_dir():
+                continue
+            specs = {name: spec for name, spec in variables.items() if spec.dataset == dataset}
+            dataset_times, dataset_values, dataset_series = _dataset_series(
+                lake_path / dataset, specs, since
+            )
+            times += dataset_times
+            values += dataset_values
+            series += dataset_series
+
+        counts = np.array([rows for _, _, rows in series], dtype=np.int64)
+        stops = np.cumsum(counts)
+        samples = pa.table(
+            {
+                "timestamp": pa.array(
+                    np.concatenate(times) if times else np.array([], "datetime64[us]"),
+                    pa.timestamp("us"),
+                ),
+                "value": pa.array(
+                    np.concatenate(values) if values else np.array([], np.float64), pa.float64()
+                ),
+            }
+        )
+        index = pa.table(
+            {
+                "station": pa.array([station for station, _, _ in series], pa.string()),
+                "variable": pa.array([variable for _, variable, _ in series], pa.string()),
+                "start": pa.array(stops - counts, pa.int64()),
+                "stop": pa.array(stops, pa.int64()),
+            }
+        ).replace_schema_metadata(
+            {
+                "since": since.isoformat(),
+                "published_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+
+        output.mkdir(parents=True, exist_ok=True)
+        current = _read_current(output)
+        number = (_version_number(current) or 0) + 1 if current else 1
+        name = f"v{number:08d}"
+        staged = output / f".{name}.tmp"
+        shutil.rmtree(staged, ignore_errors=True)
+        staged.mkdir()
+        _write_ipc(staged / "series.arrow", samples)
+        _write_ipc(staged / "index.arrow", index)
+        version = output / name
+        os.replace(staged, version)
+
+        partial = output / f"{CURRENT_FILE}.tmp"
+        partial.write_text(name)
+        os.replace(partial, output / CURRENT_FILE)
+        timing.count(rows=samples.num_rows, series=len(series))
+
+    _remove_old_versions(output, number)
+    logger.info(f"Published {len(series)} recent series ({samples.num_rows} rows) as {version}")
+    return version
+
+
+def _read_current(output: Path) -> Optional[str]:
+    try:
+        return (output / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _remove_old_versions(output: Path, current: int) -> None:
+    for entry in os.scandir(output):
+        number = _version_number(entry.name)
+        if number is not None and number <= current - KEEP_VERSIONS:
+            # Fails on systems that cannot delete mapped files; retried next time
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+class RecentReader:
+    """Memory-mapped view of the current published version of recent series.
+
+    Answers the same queries as the API's in-process hot tier, so a worker
+    can use either one.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        refresh_seconds: float = 0.5,
+        max_age: Optional[timedelta] = MAX_AGE,
+    ):
+        """Create a reader; nothing is mapped until the first query.
+
+        Args:
+            path: Directory of the published versions
+            refresh_seconds: Minimum time between checks for a new version
+            max_age: Age past which a version only answers ranges ending
+                     before it was published (None to always require that)
+        """
+        self.path = Path(path)
+        self.refresh_seconds = refresh_seconds
+        self.max_age = np.timedelta64(max_age, "us") if max_age is not None else None
+        self.version: Optional[str] = None
+        self.since: Optional[np.datetime64] = None
+        self.published_at: Optional[np.datetime64] = None
+        self._timestamps = np.array([], dtype="datetime64[us]")
+        self._values = np.array([], dtype=np.float64)
+        self._index: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._bytes = 0
+        self._checked = float("-inf")
+        self._seen: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def refresh(self, force: bool = False) -> bool:
+        """Map the current version if it changed since the last check.
+
+        Returns:
+            Whether a new version was mapped
+        """
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_seconds:
+            return False
+        self._checked = now
+        try:
+            changed = (self.path / CURRENT_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if changed == self._seen:
+            return False
+        name = _read_current(self.path)
+        if name is None or name == self.version:
+            self._seen = changed
+            return False
+        try:
+            self._map(self.path / name)
+        except (FileNotFoundError, OSError) as e:
+            # Replaced again (and deleted) between reading CURRENT and opening it
+            logger.warning(f"Could not map recent version {name}: {e}")
+            return False
+        self._seen = changed
+        self.version = name
+        return True
+
+    def _map(self, version: Path) -> None:
+        import pyarrow as pa
+
+        def read(path: Path) -> "pa.RecordBatch":
+            reader = pa.ipc.open_file(pa.memory_map(str(path)))
+            if reader.num_record_batches != 1:
+                raise OSError(f"{path} holds {reader.num_record_batches} record batches")
+            return reader.get_batch(0)
+
+        with span("recent.map", version=version.name):
+            samples = read(version / "series.arrow")
+            index = read(version / "index.arrow")
+            metadata = index.schema.metadata or {}
+            since = np.datetime64(metadata[b"since"].decode(), "us")
+            published = datetime.fromisoformat(metadata[b"published_at"].decode())
+            published_at = np.datetime64(
+                published.astimezone(timezone.utc).replace(tzinfo=None), "us"
+            )
+            keys = zip(
+                index.column("station").to_pylist(),
+                index.column("variable").to_pylist(),
+                index.column("start").to_numpy().tolist(),
+                index.column("stop").to_numpy().tolist(),
+                strict=True,
+            )
+            self._index = {(station, variable): (a, b) for station, variable, a, b in keys}
+            self._timestamps = samples.column("timestamp").to_numpy(zero_copy_only=True)
+            self._values = samples.column("value").to_numpy(zero_copy_only=True)
+            self.since = since
+            self.published_at = published_at
+            self._bytes = sum(os.path.getsize(version / f) for f in ("series.arrow", "index.arrow"))
+
+    def _series(self, station: str, variable: str) -> Optional[Tuple[int, int]]:
+        self.refresh()
+        return self._index.get((station, variable))
+
+    def _age(self) -> Optional[np.timedelta64]:
+        if self.published_at is None:
+            return None
+        now = np.datetime64(datetime.now(timezone.utc).replace(tzinfo=None), "us")
+        return now - self.published_at
+
+    def _current(self, end: Optional[datetime] = None) -> bool:
+        """Whether the mapped version holds everything the lake has up to end (or now)."""
+        if self.published_at is None:
+            return False
+        if end is not None and np.datetime64(end, "us") <= self.published_at:
+            return True
+        return self.max_age is not None and self._age() <= self.max_age
+
+    def query(
+        self,
+        station: str,
+        variable: str,
+        start: datetime,
+        end: datetime,
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Rows of a series in [start, end], if the published window holds the whole range.
+
+        Ranges ending after the version was published are only answered
+        while it is younger than max_age.
+
+        Returns:
+            (timestamps, values) read-only views of the mapping, or None when
+            the range must be read from the lake
+        """
+        rows = self._series(station, variable)
+        if (
+            self.since is None
+            or np.datetime64(start, "us") < self.since
+            or not self._current(end)
+        ):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if rows is None:
+            # Published, but without rows in the window
+            return self._timestamps[:0], self._values[:0]
+        timestamps = self._timestamps[rows[0]:rows[1]]
+        lo = np.searchsorted(timestamps, np.datetime64(start, "us"), side="left")
+        hi = np.searchsorted(timestamps, np.datetime64(end, "us"), side="right")
+        return timestamps[lo:hi], self._values[rows[0] + lo:rows[0] + hi]
+
+    def latest(self, station: str, variable: str) -> Optional[Tuple[np.datetime64, float]]:
+        """Newest published observation of a series, or None without one.
+
+        A version older than max_age answers no latest reading, as newer ones
+        may be in the lake.
+        """
+        rows = self._series(station, variable)
+        if rows is None or not self._current():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._timestamps[rows[1] - 1], float(self._values[rows[1] - 1])
+
+    def snapshot(self) -> Dict[str, Optional[int]]:
+        """Counters and the size and age of the mapped version for monitoring."""
+        self.refresh()
+        age = self._age()
+        return {
+            "version": _version_number(self.version or "") or 0,
+            "age_seconds": int(age / np.timedelta64(1, "s")) if age is not None else None,
+            "series": len(self._index),
+            "rows": len(self._values),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,237 @@
+"""Materialized hourly and daily rollups of station time series.
+
+A rollup holds one row per station and time bucket with the count, mean,
+minimum and maximum of every measurement column. Rollups live next to the raw
+dataset they summarize:
+
+    <lake>/ndbc/geohash=drt/...                     raw rows
+    <lake>/_rollups/ndbc/hourly/geohash=drt/year=2025/part-0.parquet
+    <lake>/_rollups/ndbc/daily/geohash=drt/year=2025/part-0.parquet
+
+They are kept up to date incrementally: an ingest only recomputes the buckets
+of the stations it wrote, inside the partitions it touched. Writers of a
+dataset update its rollups one at a time, holding a lock file in the rollup
+directory, so a writer never merges buckets computed before another one's
+rows were in. The raw rows are read through the metadata catalog when it
+covers the dataset, which leaves out files compaction merged but has not
+deleted yet.
+"""
+
+import fcntl
+import os
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from loguru import logger
+
+from seantral_data_pipeline.storage.catalog import Catalog
+from seantral_data_pipeline.storage.layout import ROLLUP_DIR, ROLLUPS, rollup_path  # noqa: F401
+
+STATISTICS = ("count", "mean", "min", "max")
+
+LOCK_FILE = ".lock"
+
+# Columns that describe a row rather than measure something
+_KEY_COLUMNS = {"timestamp", "buoy_id", "lat", "lon", "geohash"}
+
+
+def measurement_columns(df: pd.DataFrame) -> List[str]:
+    """Numeric columns of a raw frame that get rolled up."""
+    return [
+        name
+        for name in df.columns
+        if name not in _KEY_COLUMNS and pd.api.types.is_numeric_dtype(df[name])
+    ]
+
+
+def _glob(path: Path) -> str:
+    return (path / "**" / "*.parquet").as_posix().replace("'", "''")
+
+
+def _quote(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _source(dataset_path: Path, raw_path: Path) -> str:
+    """The files of a raw partition, as the argument of ``read_parquet``."""
+    catalog, name = Catalog.for_dataset(dataset_path)
+    relative = raw_path.relative_to(dataset_path)
+    try:
+        files = catalog.files(name, partition=relative.as_posix() if relative.parts else None)
+    finally:
+        catalog.close()
+    if not files:
+        return f"'{_glob(raw_path)}'"
+    return "[" + ", ".join(_quote(f.path.as_posix()) for f in files) + "]"
+
+
+def _compute(
+    source: str,
+    columns: Sequence[str],
+    coordinates: Sequence[str],
+    stations: Sequence[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    width: timedelta,
+) -> pa.Table:
+    """Aggregate the raw rows of some stations in [start, end) into buckets."""
+    statistics = []
+    for name in columns:
+        statistics += [
+            f"count({name})::INTEGER AS {name}_count",
+            f"avg({name}) AS {name}_mean",
+            f"min({name}) AS {name}_min",
+            f"max({name}) AS {name}_max",
+        ]
+    seconds = int(width.total_seconds())
+    keys = ["buoy_id"] + [f"any_value({name}) AS {name}" for name in coordinates]
+    sql = (
+        f"SELECT time_bucket(INTERVAL {seconds} SECOND, timestamp, TIMESTAMP '1970-01-01') "
+        f"AS timestamp, "
+        f"{', '.join(keys + statistics)} "
+        f"FROM read_parquet({source}, hive_partitioning = false, "
+        f"union_by_name = true) "
+        f"WHERE buoy_id IN ({', '.join(_quote(s) for s in stations)}) "
+        f"AND timestamp >= TIMESTAMP '{start}' AND timestamp < TIMESTAMP '{end}' "
+        f"GROUP BY ALL ORDER BY buoy_id, timestamp"
+    )
+    with duckdb.connect() as conn:
+        # arrow() returns a Table on older DuckDB and a RecordBatchReader on newer ones
+        return pa.table(conn.execute(sql).arrow())
+
+
+def _merge(
+    path: Path,
+    fresh: pa.Table,
+    stations: Sequence[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+) -> None:
+    """Replace the rows of some stations in [start, end) in one rollup file."""
+    if not path.exists() and fresh.num_rows == 0:
+        return
+    if path.exists():
+        existing = pq.read_table(path)
+        stale = pc.and_(
+            pc.is_in(existing["buoy_id"], pa.array(list(stations), existing["buoy_id"].type)),
+            pc.and_(
+                pc.greater_equal(existing["timestamp"], pa.scalar(start, pa.timestamp("us"))),
+                pc.less(existing["timestamp"], pa.scalar(end, pa.timestamp("us"))),
+            ),
+        )
+        kept = existing.filter(pc.invert(stale))
+        fresh = pa.concat_tables([kept, fresh], promote_options="default")
+
+    fresh = fresh.sort_by([("buoy_id", "ascending"), ("timestamp", "ascending")])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write next to the target and swap it in, so readers never see a partial file
+    partial = path.with_name(path.name + ".tmp")
+    pq.write_table(fresh, partial)
+    os.replace(partial, path)
+
+
+@contextmanager
+def _locked(dataset_path: Path) -> Iterator[None]:
+    """Hold the rollup lock of a dataset, across threads and processes."""
+    root = rollup_path(dataset_path, "_").parent
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def update_rollups(
+    dataset_path: Union[str, Path],
+    df: pd.DataFrame,
+    columns: Optional[Sequence[str]] = None,
+    rollups: Sequence[str] = tuple(ROLLUPS),
+) -> Dict[str, int]:
+    """Refresh the rollups of a dataset after new rows were written to it.
+
+    Only the buckets covered by the new rows are recomputed, from the raw rows
+    of the stations in ``df`` and only in the geohash partitions ``df`` touches.
+    Recomputing from the raw dataset (rather than folding ``df`` into the
+    existing statistics) keeps the rollups correct when rows are re-ingested.
+
+    Args:
+        dataset_path: Root of the raw dataset the rows were written to
+        df: The rows just written (with timestamp and buoy_id columns)
+        columns: Measurement columns to roll up (None for every numeric column)
+        rollups: Names of the rollups to maintain
+
+    Returns:
+        Dictionary mapping rollup names to the number of buckets rewritten
+    """
+    dataset_path = Path(dataset_path)
+    if df.empty:
+        return {name: 0 for name in rollups}
+    if "timestamp" not in df.columns or "buoy_id" not in df.columns:
+        raise ValueError("Rollups require timestamp and buoy_id columns")
+    columns = list(columns) if columns is not None else measurement_columns(df)
+    coordinates = [name for name in ("lat", "lon") if name in df.columns]
+
+    if "geohash" in df.columns:
+        partitions = {
+            geohash: dataset_path / f"geohash={geohash}"
+            for geohash in df["geohash"].unique()
+        }
+    else:
+        partitions = {None: dataset_path}
+
+    written: Dict[str, int] = {}
+    with _locked(dataset_path):
+        sources = {
+            geohash: _source(dataset_path, raw_path) for geohash, raw_path in partitions.items()
+        }
+        for name in rollups:
+            written[name] = _update_rollup(dataset_path, name, df, columns, coordinates, sources)
+    return written
+
+
+def _update_rollup(
+    dataset_path: Path,
+    name: str,
+    df: pd.DataFrame,
+    columns: Sequence[str],
+    coordinates: Sequence[str],
+    sources: Dict[Optional[str], str],
+) -> int:
+    """Recompute and merge the buckets of one rollup; returns the buckets rewritten."""
+    width = ROLLUPS[name]
+    written = 0
+    for geohash, source in sources.items():
+        rows = df if geohash is None else df[df["geohash"] == geohash]
+        stations = sorted(rows["buoy_id"].astype(str).unique())
+        start = rows["timestamp"].min().floor(width)
+        end = rows["timestamp"].max().floor(width) + width
+
+        fresh = _compute(source, columns, coordinates, stations, start, end, width)
+        written += fresh.num_rows
+
+        target = rollup_path(dataset_path, name)
+        if geohash is not None:
+            target = target / f"geohash={geohash}"
+        years = fresh["timestamp"].to_numpy().astype("datetime64[Y]").astype(int) + 1970
+        for year in range(start.year, (end - width).year + 1):
+            year_start = max(start, pd.Timestamp(year=year, month=1, day=1))
+            year_end = min(end, pd.Timestamp(year=year + 1, month=1, day=1))
+            _merge(
+                target / f"year={year}" / "part-0.parquet",
+                fresh.filter(pa.array(years == year)),
+                stations,
+                year_start,
+                year_end,
+            )
+
+    logger.info(f"Updated {written} {name} rollup buckets for {dataset_path}")
+    return written
@@ -0,0 +1,197 @@
+"""Precomputed description of the lake for fast process start.
+
+Before the API can answer its first request it needs the station registry
+and the layout of the lake. Reading ``stations.parquet`` pulls in pyarrow,
+and listing partitions walks directories that may sit on a network file
+system. The pipeline therefore writes both into one small JSON file at the
+root of the lake after every run, and the API loads that instead:
+
+    {"version": 1, "created_at": "...", "stations_path": "stations.parquet",
+     "stations": [{"station_id": "44007", "lat": 43.525, "lon": -70.141, ...}],
+     "datasets": {"ndbc": {"partitions": ["drt", ...], "rollups": ["daily", "hourly"],
+                           "files": 12, "bytes": 345678}},
+     "grids": ["sst"]}
+
+A snapshot is ignored when it was built from a different station registry or
+when the registry changed after it was written.
+"""
+
+import dataclasses
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from loguru import logger
+
+from seantral_data_pipeline.copernicus.grid import GRID_DIR, MANIFEST
+from seantral_data_pipeline.spatial.stations import Station, StationRegistry
+from seantral_data_pipeline.storage.layout import ROLLUPS, rollup_path
+
+SNAPSHOT_FILE = "_snapshot.json"
+SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class LakeSnapshot:
+    """Stations and dataset layout of a lake at one point in time."""
+
+    stations: List[Station] = field(default_factory=list)
+    datasets: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    grids: List[str] = field(default_factory=list)
+    stations_path: Optional[str] = None
+    created_at: str = ""
+
+    def registry(self) -> StationRegistry:
+        return StationRegistry(self.stations)
+
+    def partitions(self, dataset: str) -> List[str]:
+        """Geohash partitions of a dataset (empty for unknown or unpartitioned datasets)."""
+        return list(self.datasets.get(dataset, {}).get("partitions", []))
+
+
+def _registry_key(lake_path: Path, stations_path: Path) -> str:
+    """How a snapshot refers to its registry.
+
+    Relative to the lake when the registry is inside it, so a lake mounted at
+    different paths by the pipeline and the API still matches.
+    """
+    try:
+        return stations_path.resolve().relative_to(lake_path.resolve()).as_posix()
+    except ValueError:
+        return str(stations_path.resolve())
+
+
+def _describe_dataset(path: Path) -> Dict[str, Any]:
+    partitions = []
+    files = 0
+    size = 0
+    for entry in os.scandir(path):
+        if entry.is_dir() and entry.name.startswith("geohash="):
+            partitions.append(entry.name.split("=", 1)[1])
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.endswith(".parquet"):
+                files += 1
+                size += os.path.getsize(os.path.join(root, name))
+    return {
+        "partitions": sorted(partitions),
+        "rollups": sorted(name for name in ROLLUPS if rollup_path(path, name).is_dir()),
+        "files": files,
+        "bytes": size,
+    }
+
+
+def build_snapshot(
+    lake_path: Union[str, Path],
+    stations_path: Optional[Union[str, Path]] = None,
+) -> LakeSnapshot:
+    """Describe a lake by listing it.
+
+    Args:
+        lake_path: Root of the data lake
+        stations_path: Station registry (defaults to <lake>/stations.parquet)
+
+    Returns:
+        Snapshot of the lake
+    """
+    lake_path = Path(lake_path)
+    stations_path = Path(stations_path) if stations_path else lake_path / "stations.parquet"
+
+    stations: List[Station] = []
+    if stations_path.exists():
+        stations = list(StationRegistry.load(stations_path))
+
+    datasets = {}
+    grids = []
+    if lake_path.is_dir():
+        for entry in sorted(os.scandir(lake_path), key=lambda e: e.name):
+            # System directories (_rollups, _ingest, ...) and grid stores are not datasets
+            if not entry.is_dir() or entry.name.startswith(("_", ".")) or entry.name == GRID_DIR:
+                continue
+            datasets[entry.name] = _describe_dataset(Path(entry.path))
+        grid_root = lake_path / GRID_DIR
+        if grid_root.is_dir():
+            grids = sorted(
+                entry.name
+                for entry in os.scandir(grid_root)
+                if entry.is_dir() and (Path(entry.path) / MANIFEST).exists()
+            )
+
+    return LakeSnapshot(
+        stations=stations,
+        datasets=datasets,
+        grids=grids,
+        stations_path=_registry_key(lake_path, stations_path),
+        created_at=datetime.now(timezone.utc).isoformat(),
+    )
+
+
+def write_snapshot(
+    lake_path: Union[str, Path],
+    stations_path: Optional[Union[str, Path]] = None,
+) -> Path:
+    """Build the snapshot of a lake and swap it in at <lake>/_snapshot.json.
+
+    Returns:
+        Path of the snapshot file
+    """
+    lake_path = Path(lake_path)
+    snapshot = build_snapshot(lake_path, stations_path)
+    path = lake_path / SNAPSHOT_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    state = {"version": SNAPSHOT_VERSION, **dataclasses.asdict(snapshot)}
+    partial = path.with_name(path.name + ".tmp")
+    partial.write_text(json.dumps(state, separators=(",", ":")))
+    os.replace(partial, path)
+    logger.info(
+        f"Wrote lake snapshot with {len(snapshot.stations)} stations and "
+        f"{len(snapshot.datasets)} datasets to {path}"
+    )
+    return path
+
+
+def load_snapshot(
+    lake_path: Union[str, Path],
+    stations_path: Optional[Union[str, Path]] = None,
+) -> Optional[LakeSnapshot]:
+    """Load the snapshot of a lake, if there is a current one.
+
+    Args:
+        lake_path: Root of the data lake
+        stations_path: Station registry the caller would otherwise load
+
+    Returns:
+        The snapshot, or None when it is missing, from another format version,
+        built from another registry or older than the registry
+    """
+    lake_path = Path(lake_path)
+    stations_path = Path(stations_path) if stations_path else lake_path / "stations.parquet"
+    path = lake_path / SNAPSHOT_FILE
+    try:
+        written = path.stat().st_mtime_ns
+        state = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+    if state.get("version") != SNAPSHOT_VERSION:
+        return None
+    if state.get("stations_path") != _registry_key(lake_path, stations_path):
+        logger.info(f"Ignoring {path}: built from another station registry")
+        return None
+    try:
+        if stations_path.stat().st_mtime_ns > written:
+            logger.info(f"Ignoring {path}: {stations_path} changed since it was written")
+            return None
+    except FileNotFoundError:
+        pass
+
+    return LakeSnapshot(
+        stations=[Station(**station) for station in state["stations"]],
+        datasets=state["datasets"],
+        grids=state["grids"],
+        stations_path=state["stations_path"],
+        created_at=state["created_at"],
+    )
@@ -1,15 +1,48 @@
 """Test script for the data pipeline modules."""
 
 import os
+import sys
+import asyncio
+import concurrent.futures
+import json
+import shutil
 import tempfile
 from pathlib import Path
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 # Import data pipeline modules
 try:
-    from seantral_data_pipeline.storage.parquet import save_to_parquet, read_from_parquet
+    from seantral_data_pipeline.storage.parquet import save_to_parquet, read_from_parquet, read_table, iter_batches
+    from seantral_data_pipeline.alerts.engine import AlertEngine, Rule
+    from seantral_data_pipeline.ingest.notify import ApiNotifier
+    from seantral_data_pipeline.ingest.runner import PipelineRunner
+    from seantral_data_pipeline.ingest.sources import (
+        NDBCBackfillSource,
+        NDBCSource,
+        _join_stdmet,
+    )
+    from seantral_data_pipeline.storage.append import AppendWriter
+    from seantral_data_pipeline.storage.catalog import Catalog
+    from seantral_data_pipeline.storage.compaction import compact_dataset
+    from seantral_data_pipeline.storage.rollups import rollup_path, update_rollups
+    from seantral_data_pipeline.storage.recent import RecentReader, publish_recent
+    from seantral_data_pipeline.storage.snapshot import SNAPSHOT_FILE, load_snapshot, write_snapshot
+    from seantral_data_pipeline.query.downsample import aggregate, bucket_width, downsample
+    from seantral_data_pipeline.query.engine import QueryEngine
+    from seantral_data_pipeline.spatial.geohash import encode, encode_many
+    from seantral_data_pipeline.spatial.stations import Station, StationRegistry
+    from seantral_data_pipeline.copernicus.client import CopernicusClient
+    from seantral_data_pipeline.copernicus.convert import netcdf_to_parquet
+    from seantral_data_pipeline.copernicus.download import plan_tiles
+    from seantral_data_pipeline.copernicus.grid import GridCatalog, GridStore, netcdf_to_grid
+    from seantral_data_pipeline.noaa.async_client import AsyncNDBCClient
+    from seantral_data_pipeline.noaa.client import NDBCClient
+    from seantral_data_pipeline.noaa.parser import parse_stdmet
+    from seantral_data_pipeline import timing
 except ImportError:
     print("Failed to import from seantral_data_pipeline. Make sure it's installed or in your PYTHONPATH.")
     print("You can install it in development mode with: pip install -e .")
@@ -63,10 +96,1363 @@ def test_parquet_storage():
         
         print("Parquet storage test passed!")
 
+def test_query_engine():
+    """Test time series queries against a small lake."""
+    print("Testing query engine...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir)
+        
+        timestamps = pd.date_range(start='2025-01-01', periods=48, freq='h')
+        df = pd.DataFrame({
+            'timestamp': timestamps,
+            'water_temperature': np.linspace(15, 20, 48),
+            'lat': [43.0] * 48,
+            'lon': [-70.0] * 48,
+            'buoy_id': ['44007'] * 48,
+        })
+        save_to_parquet(df=df, output_path=lake_path / 'ndbc' / 'part-0.parquet')
+        
+        engine = QueryEngine(lake_path)
+        start, end = datetime(2025, 1, 1, 6), datetime(2025, 1, 1, 17)
+        
+        result = engine.query_timeseries('sst', start, end, lat=43.1, lon=-70.1)
+        assert len(result) == 12, f"Expected 12 points, got {len(result)}"
+        assert result.unit == '°C'
+        assert np.all(np.diff(result.timestamps.astype('int64')) > 0), "Result is not sorted"
+        
+        # Repeated queries reuse the prepared statement
+        again = engine.query_timeseries('sst', start, end, lat=43.1, lon=-70.1)
+        assert np.array_equal(result.values, again.values)
+        
+        assert len(engine.query_timeseries('sst', start, end, lat=10.0, lon=10.0)) == 0
+        assert len(engine.query_timeseries('sst', start, end, station='44007')) == 12
+        
+        engine.close()
+        
+    print("Query engine test passed!")
+
+def test_spatial_partitioning():
+    """Test nearest-station lookups and geohash-partitioned reads."""
+    print("Testing spatial index and partitioning...")
+    
+    assert encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    lats, lons = np.array([57.64911, -33.9]), np.array([10.40744, 151.2])
+    assert list(encode_many(lats, lons, 5)) == [encode(a, b, 5) for a, b in zip(lats, lons)]
+    
+    registry = StationRegistry([
+        Station('44007', 43.525, -70.141),
+        Station('41001', 34.7, -72.7),
+        Station('51004', 17.5, -152.3),
+    ])
+    station, distance = registry.nearest(43.4, -70.2)
+    assert station.station_id == '44007' and distance < 20
+    assert registry.nearest(0.0, 0.0, max_distance_km=100) is None
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir)
+        registry.save(lake_path / 'stations.parquet')
+        assert len(StationRegistry.load(lake_path / 'stations.parquet')) == 3
+        
+        timestamps = pd.date_range(start='2025-01-01', periods=24, freq='h')
+        df = pd.concat([
+            pd.DataFrame({'timestamp': timestamps, 'water_temperature': 18.0, 'buoy_id': buoy_id})
+            for buoy_id in ['44007', '41001']
+        ])
+        df = registry.annotate(df)
+        save_to_parquet(df=df, output_path=lake_path / 'ndbc', geohash_precision=3)
+        
+        partitions = sorted(p.name for p in (lake_path / 'ndbc').iterdir())
+        assert partitions == sorted(f'geohash={s.geohash}' for s in registry if s.station_id != '51004')
+        
+        engine = QueryEngine(lake_path)
+        result = engine.query_timeseries(
+            'sst', datetime(2025, 1, 1), datetime(2025, 1, 2),
+            station=station.station_id, geohash=station.geohash,
+        )
+        assert len(result) == 24, f"Expected 24 points, got {len(result)}"
+        engine.close()
+    
+    print("Spatial partitioning test passed!")
+
+def test_netcdf_conversion():
+    """Test chunked NetCDF to Parquet conversion."""
+    print("Testing NetCDF conversion...")
+    
+    try:
+        import netCDF4
+    except ImportError:
+        print("netCDF4 not installed, skipping NetCDF conversion test")
+        return
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        nc_path = temp_path / 'sst.nc'
+        
+        n_time, n_lat, n_lon = 48, 10, 12
+        with netCDF4.Dataset(nc_path, 'w') as ds:
+            ds.createDimension('time', n_time)
+            ds.createDimension('lat', n_lat)
+            ds.createDimension('lon', n_lon)
+            time = ds.createVariable('time', 'f8', ('time',))
+            time.units = 'hours since 2025-01-01 00:00:00'
+            time[:] = np.arange(n_time)
+            ds.createVariable('lat', 'f4', ('lat',))[:] = np.linspace(40, 45, n_lat)
+            ds.createVariable('lon', 'f4', ('lon',))[:] = np.linspace(-72, -66, n_lon)
+            sst = ds.createVariable('analysed_sst', 'f4', ('time', 'lat', 'lon'), fill_value=-999.0)
+            values = np.full((n_time, n_lat, n_lon), 290.0, dtype='f4')
+            values[:, 0, 0] = -999.0  # A land cell
+            sst[:] = values
+        
+        paths = netcdf_to_parquet(
+            nc_path, temp_path / 'cmems', time_chunk=10, lat_chunk=4, lon_chunk=5, max_workers=2,
+        )
+        assert len(paths) == len(set(paths)), "Chunks wrote to the same file"
+        
+        df = read_from_parquet(temp_path / 'cmems')
+        assert len(df) == n_time * (n_lat * n_lon - 1), f"Unexpected row count {len(df)}"
+        assert df['analysed_sst'].notna().all()
+        assert df['timestamp'].nunique() == n_time
+        assert sorted(df['date'].astype(str).unique()) == ['2025-01-01', '2025-01-02']
+        assert not (temp_path / '_catalog.sqlite').exists()
+        shutil.rmtree(temp_path / 'cmems')
+        
+        # Converting into a cataloged lake records the files
+        Catalog(temp_path).rebuild('other')
+        paths = netcdf_to_parquet(nc_path, temp_path / 'cmems', time_chunk=24, max_workers=1)
+        catalog = Catalog(temp_path)
+        assert catalog.is_complete('cmems')
+        assert [f.path for f in catalog.files('cmems')] == paths
+        files = catalog.files('cmems', start=datetime(2025, 1, 2))
+        assert [f.path.name for f in files] == ['part-sst-t24-y0-x0.parquet']
+        catalog.close()
+    
+    print("NetCDF conversion test passed!")
+
+def test_grid_store():
+    """Test point series from a chunked grid store."""
+    print("Testing grid store...")
+    
+    try:
+        import netCDF4
+    except ImportError:
+        print("netCDF4 not installed, skipping grid store test")
+        return
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        nc_path = temp_path / 'sst.nc'
+        
+        # Values vary linearly in space, so bilinear interpolation is exact
+        n_time, n_lat, n_lon = 365, 11, 13
+        lats = np.linspace(45, 40, n_lat)  # Descending, as in many products
+        lons = np.linspace(-72, -66, n_lon)
+        with netCDF4.Dataset(nc_path, 'w') as ds:
+            ds.createDimension('time', n_time)
+            ds.createDimension('lat', n_lat)
+            ds.createDimension('lon', n_lon)
+            time = ds.createVariable('time', 'f8', ('time',))
+            time.units = 'days since 2025-01-01 00:00:00'
+            time[:] = np.arange(n_time)
+            ds.createVariable('lat', 'f4', ('lat',))[:] = lats
+            ds.createVariable('lon', 'f4', ('lon',))[:] = lons
+            sst = ds.createVariable('analysed_sst', 'f4', ('time', 'lat', 'lon'), fill_value=-999.0)
+            sst.units = 'kelvin'
+            grid = 280.0 + lats[:, None] * 0.5 + lons[None, :] * 0.1
+            values = np.broadcast_to(grid, (n_time, n_lat, n_lon)).astype('f4').copy()
+            values += np.arange(n_time, dtype='f4')[:, None, None] * 0.01
+            values[:, 0, 0] = -999.0  # A land cell
+            values[:, 5:, 8:] = -999.0  # A land chunk
+            sst[:] = values
+        
+        store_path = netcdf_to_grid(nc_path, temp_path / 'grids' / 'sst',
+                                    time_chunk=100, lat_chunk=4, lon_chunk=4)
+        assert not (store_path / 'analysed_sst' / '0.2.2.npy').exists()
+        
+        store = GridStore(store_path)
+        timestamps, values = store.point_series('analysed_sst', 42.3, -69.1)
+        assert len(timestamps) == n_time
+        expected = 280.0 + 42.3 * 0.5 - 69.1 * 0.1 + np.arange(n_time) * 0.01
+        assert np.allclose(values, expected, atol=1e-3)
+        
+        # Missing cells are left out of the interpolation
+        timestamps, values = store.point_series('analysed_sst', 44.9, -71.9,
+                                                datetime(2025, 3, 1), datetime(2025, 3, 31))
+        assert len(timestamps) == 31 and not np.isnan(values).any()
+        # Chunks are mapped once and then served from the cache
+        store.point_series('analysed_sst', 44.9, -71.9)
+        assert store.cache_info()['hits'] > 0
+        
+        try:
+            store.point_series('analysed_sst', 50.0, -69.0)
+            raise AssertionError("Point outside the grid accepted")
+        except ValueError:
+            pass
+        
+        catalog = GridCatalog(temp_path / 'grids')
+        assert catalog.covers('sst', 42.3, -69.1) and not catalog.covers('sst', 0.0, 0.0)
+        result = catalog.query_timeseries('sst', 42.3, -69.1, datetime(2025, 1, 1),
+                                          datetime(2025, 1, 10))
+        assert len(result) == 10 and result.unit == '°C'
+        assert abs(result.values[0] - (expected[0] - 273.15)) < 1e-3
+    
+    print("Grid store test passed!")
+
+FAKE_MOTUCLIENT = """#!{python}
+import argparse, os, sys
+from datetime import datetime
+import numpy as np
+import netCDF4
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--version', action='store_true')
+for name in ('user', 'pwd', 'motu', 'service-id', 'product-id', 'date-min', 'date-max',
+             'out-dir', 'out-name'):
+    parser.add_argument('--' + name)
+for name in ('longitude-min', 'longitude-max', 'latitude-min', 'latitude-max'):
+    parser.add_argument('--' + name, type=float)
+parser.add_argument('--variable', action='append')
+parser.add_argument('--quiet', action='store_true')
+args = parser.parse_args()
+if args.version:
+    sys.exit(0)
+with open(os.environ['FAKE_MOTU_LOG'], 'a') as log:
+    log.write(f"{{args.date_min}} {{args.longitude_min}}\\n")
+if os.environ.get('FAKE_MOTU_FAIL') == str(args.longitude_min):
+    sys.exit('Server error')
+
+# A 1 degree global grid with daily fields, subset like Motu does
+lats = np.arange(-89.5, 90)
+lons = np.arange(-179.5, 180)
+lats = lats[(lats >= args.latitude_min) & (lats <= args.latitude_max)]
+lons = lons[(lons >= args.longitude_min) & (lons <= args.longitude_max)]
+start = datetime.fromisoformat(args.date_min)
+days = (datetime.fromisoformat(args.date_max) - start).days + 1
+with netCDF4.Dataset(os.path.join(args.out_dir, args.out_name), 'w', format='NETCDF4') as ds:
+    ds.createDimension('time', days)
+    ds.createDimension('lat', len(lats))
+    ds.createDimension('lon', len(lons))
+    time = ds.createVariable('time', 'f8', ('time',))
+    time.units = f'days since {{start:%Y-%m-%d %H:%M:%S}}'
+    time[:] = np.arange(days)
+    ds.createVariable('lat', 'f4', ('lat',))[:] = lats
+    ds.createVariable('lon', 'f4', ('lon',))[:] = lons
+    sst = ds.createVariable('analysed_sst', 'f4', ('time', 'lat', 'lon'))
+    sst[:] = np.full((days, len(lats), len(lons)), 290.0)
+"""
+
+def test_tiled_download():
+    """Test resumable tiled downloads against a fake motuclient."""
+    print("Testing tiled download...")
+    
+    try:
+        import netCDF4
+    except ImportError:
+        print("netCDF4 not installed, skipping tiled download test")
+        return
+    
+    tiles = plan_tiles(datetime(2025, 1, 1), datetime(2025, 2, 14), -80.0, -60.0, 30.0, 40.0,
+                       days=30, degrees=10.0)
+    assert len(tiles) == 2 * 2
+    assert tiles[0].end == datetime(2025, 1, 30, 23, 59, 59)
+    assert tiles[-1].start == datetime(2025, 1, 31) and tiles[-1].end == datetime(2025, 2, 14)
+    assert tiles[0].max_lon < tiles[1].min_lon == -70.0
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        executable = temp_path / 'motuclient'
+        executable.write_text(FAKE_MOTUCLIENT.format(python=sys.executable))
+        executable.chmod(0o755)
+        log = temp_path / 'calls.log'
+        os.environ['FAKE_MOTU_LOG'] = str(log)
+        os.environ['FAKE_MOTU_FAIL'] = '-70.0'
+        
+        client = CopernicusClient('user', 'secret', output_dir=temp_path / 'downloads',
+                                  executable=str(executable))
+        request = dict(
+            dataset_id='SST', product_id='OSTIA', variables=['analysed_sst'],
+            start_date=datetime(2025, 1, 1), end_date=datetime(2025, 2, 14),
+            min_lon=-80.0, max_lon=-60.0, min_lat=30.0, max_lat=40.0,
+            days=30, degrees=10.0, retries=0,
+        )
+        try:
+            client.download_tiled(**request)
+            raise AssertionError("Failed tiles not reported")
+        except RuntimeError as e:
+            assert '2 of 4 tiles failed' in str(e)
+        assert len(log.read_text().splitlines()) == 4
+        
+        # A rerun only fetches the tiles that failed
+        del os.environ['FAKE_MOTU_FAIL']
+        download = client.download_tiled(**request)
+        assert len(log.read_text().splitlines()) == 6
+        assert not download.pending() and len(download.completed()) == 4
+        assert client.download_tiled(**request).completed() == download.completed()
+        assert len(log.read_text().splitlines()) == 6
+        del os.environ['FAKE_MOTU_LOG']
+        
+        download.convert_to_parquet(temp_path / 'cmems', max_workers=1)
+        df = read_from_parquet(temp_path / 'cmems')
+        # 20 x 10 cells over 45 days, without duplicates on tile edges
+        assert len(df) == 20 * 10 * 45
+        assert not df.duplicated(['timestamp', 'lat', 'lon']).any()
+    
+    print("Tiled download test passed!")
+
+def test_async_ndbc_client():
+    """Test concurrent NDBC downloads with retries against a mock transport."""
+    print("Testing async NDBC client...")
+    
+    import httpx
+    
+    attempts = {}
+    
+    def handler(request):
+        buoy_id = request.url.path.rsplit('/', 1)[-1].split('_')[0]
+        attempts[buoy_id] = attempts.get(buoy_id, 0) + 1
+        if buoy_id == 'missing':
+            return httpx.Response(404)
+        if buoy_id == 'flaky' and attempts[buoy_id] < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, content=f"#YY MM DD hh mm\n{buoy_id}\n".encode())
+    
+    async def run(output_dir):
+        async with AsyncNDBCClient(
+            output_dir=output_dir,
+            max_concurrency=4,
+            backoff_base=0.001,
+            transport=httpx.MockTransport(handler),
+        ) as client:
+            return await client.download_multiple_buoys(
+                ['44007', 'flaky', 'missing'] + [f'b{i}' for i in range(20)], year=2025, month=1,
+            )
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = asyncio.run(run(Path(temp_dir)))
+        assert 'missing' not in paths and attempts['missing'] == 1, "404 must not be retried"
+        assert attempts['flaky'] == 3, f"Expected 3 attempts, got {attempts['flaky']}"
+        assert len(paths) == 22
+        assert paths['flaky'].read_text().endswith("flaky\n")
+        assert not list(Path(temp_dir).glob('*.part')), "Partial files left behind"
+    
+    print("Async NDBC client test passed!")
+
+STDMET_SAMPLE = (
+    "#YY  MM DD hh mm WDIR WSPD GST  WVHT   DPD   APD MWD   PRES  ATMP  WTMP  DEWP  VIS PTDY  TIDE\n"
+    "#yr  mo dy hr mn degT m/s  m/s     m   sec   sec degT   hPa  degC  degC  degC  nmi  hPa    ft\n"
+    "2025 01 01 00 00 290  7.0  9.0  1.20  8.00  5.60  MM 1015.2   2.1   5.3  -1.0   MM +0.3    MM\n"
+    "2025 01 01 00 10 999 99.0 99.0 99.00 99.00 99.00 999 9999.0 999.0 999.0 999.0 99.0 -1.2 99.00\n"
+    "2025 01 01 00 20 285  6.5  8.1  1.10  7.70  5.40 270 1015.0 -12.3   5.3  -1.1   MM   MM    MM\n"
+)
+
+def test_stdmet_parser():
+    """Test the typed NDBC stdmet parser."""
+    print("Testing stdmet parser...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = Path(temp_dir) / '44007_stdmet_2025_01.txt'
+        file_path.write_text(STDMET_SAMPLE)
+        
+        table = NDBCClient(output_dir=Path(temp_dir)).parse_buoy_table(file_path)
+        assert table.num_rows == 3
+        assert str(table.schema.field('wave_height').type) == 'float'
+        assert table.column('buoy_id').to_pylist() == ['44007'] * 3
+        
+        df = table.to_pandas()
+        assert list(df['timestamp'].dt.minute) == [0, 10, 20]
+        # Every value in the second row is a sentinel
+        assert df.drop(columns=['timestamp', 'buoy_id']).iloc[1].drop('pressure_tendency').isna().all()
+        assert df['pressure_tendency'].tolist()[:2] == [np.float32(0.3), np.float32(-1.2)]
+        assert df['air_temperature'].iloc[2] == np.float32(-12.3)
+        assert np.isnan(df['mean_wave_direction'].iloc[0])
+    
+    # Pre-2007 layout: two-digit years, no minute column, no units row
+    old = parse_stdmet(
+        b"YY MM DD hh  WD WSPD  GST  WVHT  DPD  APD MWD  BAR  ATMP  WTMP  DEWP  VIS\n"
+        b"95 01 01 00 270  5.1  6.3  0.80 9.09 5.32 999 1021.1  -3.8   6.7 999.0 99.0\n"
+    )
+    assert old.column('timestamp').to_pylist()[0] == datetime(1995, 1, 1)
+    assert old.column('pressure').to_pylist()[0] == np.float32(1021.1)
+    
+    print("Stdmet parser test passed!")
+
+def test_downsampling():
+    """Test in-memory downsampling and bucket aggregation in the engine."""
+    print("Testing downsampling...")
+    
+    n = 10000
+    timestamps = np.arange(n).astype('datetime64[m]').astype('datetime64[ns]')
+    values = np.sin(np.arange(n) / 300.0)
+    values[4321] = 5.0  # A spike that must survive downsampling
+    
+    for method in ('lttb', 'minmax'):
+        ts, vs = downsample(timestamps, values, 500, method)
+        assert len(vs) <= 500, f"{method} returned {len(vs)} points"
+        assert np.all(np.diff(ts.astype('int64')) > 0), f"{method} result is not sorted"
+        assert 5.0 in vs, f"{method} dropped the spike"
+    
+    # Missing values are left out rather than poisoning their bucket
+    gappy = values.copy()
+    gappy[[10, 4000, 4001]] = np.nan
+    gappy[200:300] = np.nan
+    for method in ('lttb', 'minmax'):
+        ts, vs = downsample(timestamps, gappy, 10, method)
+        assert 0 < len(vs) <= 10 and not np.isnan(vs).any(), f"{method} kept NaN"
+    # The bucket holding only missing values produces no point
+    ts, vs = aggregate(timestamps[:600], gappy[:600], timedelta(minutes=100), 'mean')
+    assert len(vs) == 5 and not np.isnan(vs).any()
+    ts, vs = aggregate(timestamps[:600], gappy[:600], timedelta(minutes=50), 'minmax')
+    assert not np.isnan(vs).any() and len(vs) == 2 * 10
+    
+    span = timedelta(days=365)
+    assert span / bucket_width(span, 1000) <= 999
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir)
+        df = pd.DataFrame({
+            'timestamp': pd.date_range(start='2025-01-01', periods=48, freq='h'),
+            'water_temperature': np.arange(48, dtype=float),
+            'buoy_id': ['44007'] * 48,
+        })
+        save_to_parquet(df=df, output_path=lake_path / 'ndbc' / 'part-0.parquet')
+        
+        engine = QueryEngine(lake_path)
+        start, end = datetime(2025, 1, 1), datetime(2025, 1, 2, 23)
+        
+        daily = engine.query_timeseries(
+            'sst', start, end, station='44007', resolution=timedelta(days=1), agg='mean'
+        )
+        assert daily.values.tolist() == [11.5, 35.5], daily.values
+        assert daily.metadata['resolution'] == '86400s'
+        
+        envelope = engine.query_timeseries(
+            'sst', start, end, station='44007', resolution=timedelta(days=1), agg='minmax'
+        )
+        assert envelope.values.tolist() == [0.0, 23.0, 24.0, 47.0], envelope.values
+        
+        engine.close()
+    
+    print("Downsampling test passed!")
+
+def test_rollups():
+    """Test incremental rollup maintenance and rollup planning."""
+    print("Testing rollups...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir)
+        dataset = lake_path / 'ndbc'
+        
+        def ingest(start, periods, value):
+            df = pd.DataFrame({
+                'timestamp': pd.date_range(start=start, periods=periods, freq='10min'),
+                'water_temperature': np.full(periods, value),
+                'lat': [43.0] * periods,
+                'lon': [-70.0] * periods,
+                'buoy_id': ['44007'] * periods,
+            })
+            save_to_parquet(
+                df=df, output_path=dataset, geohash_precision=3, rollups=True
+            )
+        
+        # Two days at 10 minute intervals, then a later day
+        ingest('2025-01-01', 288, 10.0)
+        hourly = read_from_parquet(rollup_path(dataset, 'hourly'))
+        daily = read_from_parquet(rollup_path(dataset, 'daily'))
+        assert len(hourly) == 48, f"Expected 48 hourly buckets, got {len(hourly)}"
+        assert len(daily) == 2
+        assert (daily['water_temperature_count'] == 144).all()
+        
+        # A new ingest only rewrites the buckets it covers
+        ingest('2025-01-02', 144, 20.0)
+        daily = read_from_parquet(rollup_path(dataset, 'daily')).sort_values('timestamp')
+        assert daily['water_temperature_count'].tolist() == [144, 288]
+        assert daily['water_temperature_mean'].tolist() == [10.0, 15.0]
+        assert daily['water_temperature_max'].tolist() == [10.0, 20.0]
+        
+        engine = QueryEngine(lake_path)
+        start, end = datetime(2025, 1, 1), datetime(2025, 1, 2, 23, 59)
+        assert engine.plan_rollup('ndbc', timedelta(days=2)) == 'daily'
+        assert engine.plan_rollup('ndbc', timedelta(hours=3)) == 'hourly'
+        assert engine.plan_rollup('ndbc', timedelta(minutes=30)) is None
+        
+        for resolution in (timedelta(hours=6), timedelta(minutes=30)):
+            planned = engine.query_timeseries(
+                'sst', start, end, station='44007', resolution=resolution, agg='mean'
+            )
+            bucket = pd.Timedelta(resolution)
+            raw = engine.query_timeseries('sst', start, end, station='44007')
+            expected = pd.Series(raw.values, index=raw.timestamps).resample(bucket).mean()
+            assert np.allclose(planned.values, expected.to_numpy()), resolution
+        
+        daily = engine.query_timeseries(
+            'sst', start, end, station='44007', resolution=timedelta(days=1), agg='max'
+        )
+        assert daily.metadata['rollup'] == 'daily'
+        assert daily.values.tolist() == [10.0, 20.0]
+        
+        engine.close()
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir)
+        dataset = lake_path / 'ndbc'
+        
+        def frame(start, value):
+            return pd.DataFrame({
+                'timestamp': pd.date_range(start=start, periods=36, freq='10min'),
+                'water_temperature': np.full(36, value),
+                'lat': [43.0] * 36,
+                'lon': [-70.0] * 36,
+                'buoy_id': ['44007'] * 36,
+            })
+        
+        # Rows appended by the streaming writer land in the existing rollups
+        save_to_parquet(
+            df=frame('2025-01-01 00:00', 10.0), output_path=dataset,
+            geohash_precision=3, rollups=True,
+        )
+        with AppendWriter(dataset, geohash_precision=3) as writer:
+            writer.write(frame('2025-01-01 06:00', 20.0))
+        
+        engine = QueryEngine(lake_path)
+        start, end = datetime(2025, 1, 1), datetime(2025, 1, 1, 23)
+        raw = engine.query_timeseries('sst', start, end, station='44007')
+        assert len(raw.values) == 72
+        hourly = engine.query_timeseries(
+            'sst', start, end, station='44007', resolution=timedelta(hours=1), agg='mean'
+        )
+        assert hourly.metadata['rollup'] == 'hourly'
+        assert len(hourly.values) == 12, f"Expected 12 hourly buckets, got {len(hourly.values)}"
+        assert pd.Timestamp(hourly.timestamps[-1]) == pd.Timestamp('2025-01-01 11:00')
+        assert hourly.values.tolist() == [10.0] * 6 + [20.0] * 6
+        
+        # Plain saves refresh the rollups the dataset has
+        save_to_parquet(df=frame('2025-01-02 00:00', 30.0), output_path=dataset,
+                        geohash_precision=3)
+        daily = engine.query_timeseries('sst', start, datetime(2025, 1, 2, 23), station='44007',
+                                        resolution=timedelta(days=1), agg='max')
+        assert daily.metadata['rollup'] == 'daily' and daily.values.tolist() == [20.0, 30.0]
+        
+        # Writers updating the rollups at once keep each other's buckets
+        frames = [frame('2025-01-03 00:00', 40.0 + i).assign(buoy_id=f'4400{i}')
+                  for i in range(4)]
+        for df in frames:
+            save_to_parquet(df=df, output_path=dataset, geohash_precision=3)
+        # Rows are saved before the rollups, as both writers do
+        with concurrent.futures.ThreadPoolExecutor(4) as pool:
+            list(pool.map(
+                lambda df: update_rollups(dataset, df.assign(geohash=encode(43.0, -70.0, 3))),
+                frames,
+            ))
+        daily = read_from_parquet(rollup_path(dataset, 'daily'))
+        assert sorted(daily.loc[daily['timestamp'] == '2025-01-03', 'buoy_id'].astype(str)) == [
+            f'4400{i}' for i in range(4)
+        ]
+        engine.close()
+    
+    print("Rollups test passed!")
+
+def test_grouped_query():
+    """Test serving several stations and variables from one scan."""
+    print("Testing grouped station queries...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir)
+        n = 48
+        frames = []
+        for station, offset in (('44007', 0.0), ('44013', 100.0), ('44005', 200.0)):
+            frames.append(pd.DataFrame({
+                'timestamp': pd.date_range(start='2025-01-01', periods=n, freq='h'),
+                'water_temperature': np.arange(n) + offset,
+                'wind_speed': np.where(np.arange(n) % 2 == 0, np.nan, offset),
+                'lat': [43.0] * n,
+                'lon': [-70.0] * n,
+                'buoy_id': [station] * n,
+            }))
+        save_to_parquet(
+            df=pd.concat(frames), output_path=lake_path / 'ndbc', geohash_precision=3
+        )
+        geohash = encode(43.0, -70.0, 3)
+        
+        engine = QueryEngine(lake_path)
+        start, end = datetime(2025, 1, 1), datetime(2025, 1, 2, 23)
+        results = engine.query_stations(
+            ['sst', 'wind_speed'], ['44007', '44013', 'missing'], start, end, geohash=geohash
+        )
+        assert len(results) == 6
+        for station in ('44007', '44013'):
+            single = engine.query_timeseries('sst', start, end, station=station)
+            assert np.array_equal(results[(station, 'sst')].values, single.values)
+            assert np.array_equal(results[(station, 'sst')].timestamps, single.timestamps)
+        # Missing values are dropped per variable, not per row
+        assert len(results[('44013', 'wind_speed')]) == n // 2
+        assert len(results[('missing', 'sst')]) == 0
+        
+        daily = engine.query_stations(
+            ['sst'], ['44007', '44005'], start, end, resolution=timedelta(days=1), agg='max'
+        )
+        assert daily[('44007', 'sst')].values.tolist() == [23.0, 47.0]
+        assert daily[('44005', 'sst')].values.tolist() == [223.0, 247.0]
+        
+        # Buckets wider than a day are aligned to the epoch, like in-memory ones
+        month = pd.DataFrame({
+            'timestamp': pd.date_range(start='2024-12-20', periods=30 * 24, freq='h'),
+            'water_temperature': np.arange(30 * 24, dtype=float),
+            'lat': 43.0, 'lon': -70.0, 'buoy_id': '44099',
+        })
+        save_to_parquet(df=month, output_path=lake_path / 'ndbc', geohash_precision=3)
+        start, end = datetime(2024, 12, 20), datetime(2025, 1, 18, 23)
+        for width in (timedelta(days=2), timedelta(days=7)):
+            expected = aggregate(month['timestamp'].to_numpy(),
+                                 month['water_temperature'].to_numpy(), width, 'mean')
+            single = engine.query_timeseries('sst', start, end, station='44099',
+                                             resolution=width, agg='mean')
+            grouped = engine.query_stations(['sst'], ['44099'], start, end,
+                                            resolution=width, agg='mean')[('44099', 'sst')]
+            for result in (single, grouped):
+                assert np.array_equal(result.timestamps.astype('datetime64[us]'),
+                                      expected[0].astype('datetime64[us]')), width
+                assert np.allclose(result.values, expected[1]), width
+        
+        engine.close()
+    
+    print("Grouped query test passed!")
+
+def test_compaction():
+    """Test merging the small files of ingest batches into sorted row groups."""
+    print("Testing compaction...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir)
+        dataset = lake_path / 'ndbc'
+        # Hourly batches of two stations, in two partitions
+        for hour in range(24):
+            df = pd.DataFrame({
+                'timestamp': [pd.Timestamp('2025-01-01') + pd.Timedelta(hours=hour)] * 3,
+                'water_temperature': [float(hour), float(hour) + 100, float(hour) + 200],
+                'lat': [43.0, 43.0, 34.7],
+                'lon': [-70.0, -70.0, -72.7],
+                'buoy_id': ['44013', '44007', '41001'],
+            })
+            save_to_parquet(df=df, output_path=dataset, geohash_precision=3)
+        assert len(list(dataset.rglob('*.parquet'))) == 48
+        
+        engine = QueryEngine(lake_path)
+        start, end = datetime(2025, 1, 1), datetime(2025, 1, 2)
+        before = engine.query_timeseries('sst', start, end, station='44007')
+        
+        totals = compact_dataset(dataset, row_group_bytes=512)
+        assert totals['partitions'] == 2
+        assert totals['files_merged'] == 48 and totals['rows'] == 72
+        # The catalog swapped the files, the merged ones stay for queries already planned
+        catalog = Catalog(lake_path)
+        assert len(catalog.files('ndbc')) == 2
+        catalog.close()
+        assert len(list(dataset.rglob('*.parquet'))) == 50
+        
+        # and go once their grace period is over
+        assert compact_dataset(dataset, grace=timedelta(0))['partitions'] == 0
+        files = list(dataset.rglob('*.parquet'))
+        assert len(files) == 2
+        assert not (lake_path / '_compaction').exists()
+        
+        # Rows are sorted by station and time, in row groups with statistics
+        geohash = encode(43.0, -70.0, 3)
+        path = next((dataset / f'geohash={geohash}').glob('*.parquet'))
+        parquet = pq.ParquetFile(path)
+        assert parquet.metadata.num_row_groups > 1
+        statistics = parquet.metadata.row_group(0).column(
+            parquet.schema_arrow.get_field_index('timestamp')
+        ).statistics
+        assert statistics is not None and statistics.has_min_max
+        table = parquet.read()
+        assert table['buoy_id'].to_pylist() == ['44007'] * 24 + ['44013'] * 24
+        
+        after = engine.query_timeseries('sst', start, end, station='44007')
+        assert np.array_equal(after.values, before.values)
+        assert np.array_equal(after.timestamps, before.timestamps)
+        
+        # Nothing left to merge
+        assert compact_dataset(dataset)['partitions'] == 0
+        
+        # The written files are registered before the merged ones go away, and a
+        # run that stops part way is finished by the next one
+        from seantral_data_pipeline.storage import compaction
+        for hour in range(24, 30):
+            df = pd.DataFrame({
+                'timestamp': [pd.Timestamp('2025-01-01') + pd.Timedelta(hours=hour)] * 2,
+                'water_temperature': [float(hour), float(hour) + 100],
+                'lat': [43.0, 43.0], 'lon': [-70.0, -70.0],
+                'buoy_id': ['44013', '44007'],
+            })
+            save_to_parquet(df=df, output_path=dataset, geohash_precision=3)
+        before = engine.query_timeseries('sst', start, end + timedelta(hours=6), station='44007')
+        
+        def crash(*args, **kwargs):
+            raise RuntimeError('Stopped before the catalog update')
+        
+        register = compaction.register_files
+        compaction.register_files = crash
+        try:
+            compact_dataset(dataset, row_group_bytes=512)
+            raise AssertionError("Expected the compaction to stop")
+        except RuntimeError:
+            pass
+        finally:
+            compaction.register_files = register
+        assert len(list((lake_path / '_compaction' / 'ndbc').glob('*.json'))) == 1
+        # The partition never went missing, and the catalog still lists the merged files
+        assert len(list((dataset / f'geohash={geohash}').glob('*.parquet'))) == 8
+        after = engine.query_timeseries('sst', start, end + timedelta(hours=6), station='44007')
+        assert np.array_equal(after.values, before.values)
+        
+        assert compact_dataset(dataset, grace=timedelta(0))['partitions'] == 0
+        assert not (lake_path / '_compaction').exists()
+        assert len(list((dataset / f'geohash={geohash}').glob('*.parquet'))) == 1
+        catalog = Catalog(lake_path)
+        assert sorted(f.path for f in catalog.files('ndbc')) == sorted(dataset.rglob('*.parquet'))
+        catalog.close()
+        after = engine.query_timeseries('sst', start, end + timedelta(hours=6), station='44007')
+        assert np.array_equal(after.values, before.values) and len(after) == 30
+        
+        # Datasets read by listing are exchanged with the staged directory. An
+        # exchanged partition whose old directory was not cleared yet, holding a
+        # batch that was written to it during the compaction
+        engine.close()
+        for suffix in ('', '-wal', '-shm'):
+            (lake_path / f'_catalog.sqlite{suffix}').unlink(missing_ok=True)
+        engine = QueryEngine(lake_path)
+        
+        def hourly(hour):
+            timestamp = pd.Timestamp('2025-01-01') + pd.Timedelta(hours=hour)
+            return df.assign(timestamp=timestamp, water_temperature=[float(hour), hour + 100.0])
+        
+        for hour in (30, 31):
+            save_to_parquet(df=hourly(hour), output_path=dataset, geohash_precision=3)
+        
+        def stop(journal, *args, **kwargs):
+            retired = journal.with_suffix('')
+            retired = retired.with_name(retired.name + '.old')
+            pq.write_table(pa.Table.from_pandas(hourly(32), preserve_index=False),
+                           retired / 'part-late.parquet')
+            raise RuntimeError('Stopped after the exchange')
+        
+        finish = compaction._finish
+        compaction._finish = stop
+        try:
+            compact_dataset(dataset)
+            raise AssertionError("Expected the compaction to stop")
+        except RuntimeError:
+            pass
+        finally:
+            compaction._finish = finish
+        assert len(list((lake_path / '_compaction' / 'ndbc').glob('*.old'))) == 1
+        compact_dataset(dataset)
+        assert not (lake_path / '_compaction').exists()
+        names = [path.name for path in (dataset / f'geohash={geohash}').glob('*.parquet')]
+        assert len(names) == 1 and 'part-late.parquet' not in names
+        after = engine.query_timeseries('sst', start, end + timedelta(hours=9), station='44007')
+        assert len(after) == 33 and after.values[-1] == 132.0
+        catalog = Catalog(lake_path)
+        assert catalog.files('ndbc') is None
+        catalog.rebuild('ndbc')
+        assert sorted(f.path for f in catalog.files('ndbc')) == sorted(dataset.rglob('*.parquet'))
+        catalog.close()
+        engine.close()
+    
+    print("Compaction test passed!")
+
+def test_append_writer():
+    """Test buffered appends that skip rows already stored."""
+    print("Testing append writer...")
+    
+    def realtime(end_hour, hours=6):
+        # Each "realtime file" holds the last few hours, like NDBC's 45-day files
+        timestamps = pd.date_range(end=pd.Timestamp('2025-01-01') + pd.Timedelta(hours=end_hour),
+                                   periods=hours, freq='h')
+        return pd.DataFrame({
+            'timestamp': timestamps.repeat(2),
+            'water_temperature': np.tile([10.0, 20.0], hours),
+            'lat': [43.0, 34.7] * hours,
+            'lon': [-70.0, -72.7] * hours,
+            'buoy_id': ['44007', '41001'] * hours,
+        })
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir)
+        dataset = lake_path / 'ndbc'
+        with AppendWriter(dataset, geohash_precision=3, buffer_rows=20,
+                          key_window=timedelta(hours=12)) as writer:
+            accepted = [writer.write(realtime(hour)) for hour in range(5, 30)]
+            assert accepted[0] == 12 and accepted[1:] == [2] * 24
+            # Open files stay out of the dataset until they are rolled
+            assert (lake_path / '_ingest').exists()
+            # Keys older than the window are pruned
+            assert len(writer.index) <= 2 * 14 + 24
+        assert writer.stats['duplicates'] == 25 * 12 - 60
+        assert not (lake_path / '_ingest').exists()
+        
+        files = list(dataset.rglob('*.parquet'))
+        assert len(files) == 2
+        table = pq.read_table(dataset)
+        assert table.num_rows == 60
+        
+        # A new writer seeded from the lake skips rows written by the last one
+        with AppendWriter(dataset, geohash_precision=3) as writer:
+            assert writer.load_keys(since=pd.Timestamp('2025-01-01')) == 60
+            assert writer.write(realtime(31)) == 4
+        assert pq.read_table(dataset).num_rows == 64
+        
+        engine = QueryEngine(lake_path)
+        result = engine.query_timeseries('sst', datetime(2025, 1, 1), datetime(2025, 1, 3),
+                                         station='44007')
+        assert len(result.values) == 32
+        engine.close()
+    
+    print("Append writer test passed!")
+
+def test_ingest_runner():
+    """Test a pipelined NDBC ingest run that resumes from its checkpoint."""
+    print("Testing ingest runner...")
+    
+    import httpx
+    
+    requests = []
+    posted = []
+    broken = {'44013'}
+    
+    def handler(request):
+        buoy_id = request.url.path.rsplit('/', 1)[-1].split('_')[0]
+        requests.append(buoy_id)
+        if buoy_id in broken:
+            return httpx.Response(503)
+        return httpx.Response(200, content=STDMET_SAMPLE.encode())
+    
+    def api(request):
+        posted.extend(json.loads(request.content)['buoy_id'])
+        return httpx.Response(200, json={'rows': 0, 'alerts': []})
+    
+    buoys = ['44007', '44013', '41001', '46026']
+    registry = StationRegistry([
+        Station('44007', 43.5, -70.1), Station('44013', 42.3, -70.7),
+        Station('41001', 34.7, -72.7), Station('46026', 37.8, -122.8),
+    ])
+    
+    def run(lake_path, download_dir):
+        client = AsyncNDBCClient(output_dir=download_dir, max_retries=0,
+                                 transport=httpx.MockTransport(handler))
+        source = NDBCSource(buoys, year=2025, month=1, stations=registry, client=client,
+                            max_concurrency=2, rate=1000.0)
+        runner = PipelineRunner(lake_path, [source], parse_workers=2, queue_size=2)
+        # Committed rows of the live source are posted to the API
+        runner.notifier = ApiNotifier('http://api', transport=httpx.MockTransport(api))
+        try:
+            return runner, runner.run()
+        finally:
+            asyncio.run(client.aclose())
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir) / 'lake'
+        download_dir = Path(temp_dir) / 'downloads'
+        
+        runner, stats = run(lake_path, download_dir)
+        assert stats['failed'] == ['ndbc:44013/2025-01']
+        assert stats['rows'] == 9 and stats['tasks'] == 4
+        assert runner.checkpoint.path.exists()
+        assert len(posted) == 9 and '44013' not in posted
+        
+        # The rerun only fetches the task that failed
+        broken.clear()
+        requests.clear()
+        runner, stats = run(lake_path, download_dir)
+        assert requests == ['44013'] and stats['tasks'] == 1 and stats['rows'] == 3
+        assert not runner.checkpoint.path.exists()
+        assert load_snapshot(lake_path).partitions('ndbc') == sorted(
+            s.geohash for s in registry
+        )
+        
+        df = read_from_parquet(lake_path / 'ndbc')
+        assert len(df) == 12 and sorted(df['buoy_id'].unique()) == sorted(buoys)
+        assert 'geohash' in df.columns
+        
+        # Fetched files recorded in a checkpoint are parsed without downloading them again
+        requests.clear()
+        client = AsyncNDBCClient(output_dir=download_dir, transport=httpx.MockTransport(handler))
+        source = NDBCSource(buoys, year=2025, month=1, stations=registry, client=client)
+        runner = PipelineRunner(lake_path, [source], run_id='resume')
+        for buoy_id in buoys:
+            runner.checkpoint.mark_fetched(f'ndbc:{buoy_id}/2025-01',
+                                           download_dir / f'{buoy_id}_stdmet_2025_01.txt')
+        stats = runner.run()
+        asyncio.run(client.aclose())
+        assert requests == [] and stats['tasks'] == 4
+        # Rows stored by the earlier runs are not written again
+        assert stats['rows'] == 0 and stats['duplicates'] == 12
+    
+    print("Ingest runner test passed!")
+
+def test_ndbc_backfill():
+    """Test a backfill run streaming gzipped NDBC archives into the lake."""
+    print("Testing NDBC backfill...")
+    
+    import gzip
+    import httpx
+    
+    def sample(year, month=1):
+        return STDMET_SAMPLE.replace('2025 01', f'{year} {month:02d}').encode()
+    
+    archives = {
+        '/data/historical/stdmet/44007h2023.txt.gz': sample(2023),
+        '/data/historical/stdmet/44007h2024.txt.gz': sample(2024),
+        '/data/historical/stdmet/41001h2024.txt.gz': sample(2024),
+        # 41001 has no annual archive for 2023 yet, only monthly ones
+        '/data/stdmet/Jan/4100112023.txt.gz': sample(2023, 1),
+        '/data/stdmet/Feb/4100122023.txt.gz': sample(2023, 2),
+    }
+    requests = []
+    
+    def handler(request):
+        requests.append(request.url.path)
+        content = archives.get(request.url.path)
+        if content is None:
+            return httpx.Response(404)
+        return httpx.Response(200, content=gzip.compress(content))
+    
+    url, filename = NDBCClient.build_request('44007', 2023)
+    assert url.endswith('/historical/stdmet/44007h2023.txt.gz') and filename.endswith('.gz')
+    assert NDBCClient.build_request('44007', 2023, 5)[0].endswith('/05/44007_stdmet.txt')
+    assert parse_stdmet(gzip.compress(sample(2023))).num_rows == 3
+    
+    registry = StationRegistry([Station('44007', 43.5, -70.1), Station('41001', 34.7, -72.7)])
+    
+    def run(lake_path):
+        client = AsyncNDBCClient(max_retries=0, chunk_size=64,
+                                 transport=httpx.MockTransport(handler))
+        source = NDBCBackfillSource(['44007', '41001'], 2022, 2024, lake_path / 'ndbc',
+                                    stations=registry, client=client, rate=None)
+        try:
+            return PipelineRunner(lake_path, [source], parse_workers=2).run()
+        finally:
+            asyncio.run(client.aclose())
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir) / 'lake'
+        stored = parse_stdmet(sample(2024), buoy_id='44007').to_pandas()
+        save_to_parquet(stored.assign(lat=43.5, lon=-70.1), lake_path / 'ndbc',
+                        geohash_precision=3)
+        
+        stats = run(lake_path)
+        # 44007's stored 2024 rows are not a finished backfill: the year is
+        # fetched and its rows are dropped against the lake
+        assert stats['failed'] == [] and stats['tasks'] == 6 and stats['rows'] == 12
+        assert stats['duplicates'] == 0
+        # Years without an annual archive fall back to their 12 monthly ones
+        assert sum('/data/stdmet/' in path for path in requests) == 3 * 12
+        # Nothing was downloaded to disk and no checkpoint is left behind
+        assert sorted(p.name for p in lake_path.iterdir() if p.name.startswith('_c')) == [
+            '_catalog.sqlite'
+        ]
+        
+        df = read_from_parquet(lake_path / 'ndbc')
+        years = df.groupby(df['buoy_id'].astype(str))['timestamp'].agg(
+            lambda ts: sorted(set(ts.dt.year))
+        )
+        assert years.to_dict() == {'41001': [2023, 2024], '44007': [2023, 2024]}
+        assert len(df[(df['buoy_id'] == '41001') & (df['timestamp'].dt.month == 2)]) == 3
+        
+        ledger = json.loads((lake_path / 'ndbc' / '_backfill.json').read_text())
+        assert ledger['41001'] == {'2023': [1, 2], '2024': list(range(1, 13))}
+        
+        # A rerun only asks for the months that were not published yet
+        requests.clear()
+        stats = run(lake_path)
+        assert stats['tasks'] == 3 and stats['rows'] == 0
+        assert not any('44007h2023' in path or '/Jan/4100112023' in path for path in requests)
+        assert sum('/data/stdmet/' in path for path in requests) == 2 * 12 + 10
+        
+        archives['/data/stdmet/Mar/4100132023.txt.gz'] = sample(2023, 3)
+        stats = run(lake_path)
+        assert stats['rows'] == 3
+        # The annual archive covers the whole year; only the new month is written
+        archives['/data/historical/stdmet/41001h2023.txt.gz'] = _join_stdmet(
+            [sample(2023, 1), sample(2023, 3), sample(2023, 4)]
+        )
+        stats = run(lake_path)
+        assert stats['tasks'] == 3 and stats['rows'] == 3
+        ledger = json.loads((lake_path / 'ndbc' / '_backfill.json').read_text())
+        assert ledger['41001']['2023'] == list(range(1, 13))
+        df = read_from_parquet(lake_path / 'ndbc')
+        assert len(df[df['buoy_id'] == '41001']) == 3 * 5
+    
+    print("NDBC backfill test passed!")
+
+def test_alert_engine():
+    """Test incremental rule evaluation with duration windows."""
+    print("Testing alert engine...")
+    
+    engine = AlertEngine()
+    engine.add_rule(Rule('warm', 'sst', 'gt', 25.0, 43.0, -70.0, duration=30, user_id='u1'))
+    engine.add_rule(Rule('cold', 'sst', 'lt', 5.0, 43.0, -70.0, user_id='u1'))
+    engine.add_rule(Rule('far', 'sst', 'gt', 0.0, 10.0, 10.0, user_id='u2'))
+    
+    def batch(start, values):
+        return pd.DataFrame({
+            'timestamp': pd.date_range(start=start, periods=len(values), freq='10min'),
+            'lat': [43.01] * len(values),
+            'lon': [-70.01] * len(values),
+            'buoy_id': ['44007'] * len(values),
+            'water_temperature': values,
+        })
+    
+    # The warm run starts at 00:10 and is split across two batches
+    assert engine.evaluate(batch('2025-01-01 00:00', [20.0, 26.0, 26.0])) == []
+    raised = engine.evaluate(batch('2025-01-01 00:30', [26.0, 26.0, np.nan, 24.0]))
+    assert [(a.rule.id, a.status) for a in raised] == [('warm', 'resolved')]
+    assert raised[0].triggered_at == datetime(2025, 1, 1, 0, 40)
+    
+    raised = engine.evaluate(batch('2025-01-01 01:10', [4.0]))
+    assert [(a.rule.id, a.status) for a in raised] == [('cold', 'active')]
+    
+    assert [a.rule.id for a in engine.alerts('u1')] == ['cold', 'warm']
+    assert [a.rule.id for a in engine.alerts('u1', status='active')] == ['cold']
+    assert engine.alerts('u2') == []
+    
+    # Replacing a rule keeps the state of the others
+    engine.add_rule(Rule('far', 'sst', 'gt', 1.0, 10.0, 10.0, user_id='u2'))
+    assert engine.evaluate(batch('2025-01-01 01:20', [3.0])) == []
+    raised = engine.evaluate(batch('2025-01-01 01:30', [10.0]))
+    assert [(a.rule.id, a.status) for a in raised] == [('cold', 'resolved')]
+    
+    # Duration state is kept per station, within the rule's radius across cell edges
+    engine = AlertEngine()
+    engine.add_rule(Rule('warm', 'sst', 'gt', 25.0, 43.0, -69.97, duration=10, user_id='u1'))
+    engine.add_rule(Rule('buoy', 'sst', 'gt', 25.0, 0.0, 0.0, user_id='u2', station='B'))
+    
+    def stations(start, readings):
+        rows = [
+            (pd.Timestamp(start) + pd.Timedelta(minutes=10 * i), station, value)
+            for i, step in enumerate(readings)
+            for station, value in step.items()
+        ]
+        return pd.DataFrame({
+            'timestamp': [row[0] for row in rows],
+            'lat': [43.0] * len(rows),
+            'lon': [{'A': -69.95, 'B': -69.98, 'C': -69.0}[row[1]] for row in rows],
+            'buoy_id': [row[1] for row in rows],
+            'water_temperature': [row[2] for row in rows],
+        })
+    
+    raised = engine.evaluate(stations('2025-01-01', [{'A': 27.0, 'B': 15.0, 'C': 30.0}] * 2))
+    assert [(a.rule.id, a.station) for a in raised] == [('warm', 'A')]
+    raised = engine.evaluate(stations('2025-01-01 00:20', [{'B': 15.0}, {'B': 26.0}]))
+    assert [(a.rule.id, a.station) for a in raised] == [('buoy', 'B')]
+    assert [a.station for a in engine.alerts('u1', status='active')] == ['A']
+    
+    # Replacing or removing a rule resolves its open alerts
+    engine.add_rule(Rule('warm', 'sst', 'gt', 26.0, 43.0, -69.97, user_id='u1', active=False))
+    engine.remove_rule('buoy')
+    assert engine.alerts(status='active') == []
+    assert all(a.resolved_at is not None for a in engine.alerts())
+    assert engine.evaluate(stations('2025-01-01 00:40', [{'A': 30.0, 'B': 30.0}])) == []
+    
+    print("Alert engine test passed!")
+
+def test_timing_spans():
+    """Test span totals, listeners and per-context profiling."""
+    print("Testing timing spans...")
+    
+    timing.reset()
+    seen = []
+    timing.add_listener(seen.append)
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            df = pd.DataFrame({'timestamp': pd.date_range('2025-01-01', periods=100, freq='h'),
+                               'value': np.arange(100.0)})
+            path = Path(temp_dir) / 'spans.parquet'
+            with timing.profile() as spans:
+                save_to_parquet(df, path)
+                read_from_parquet(path)
+            assert [s.name for s in spans] == ['parquet.write', 'parquet.read']
+            assert spans[1].counts == {'rows': 100, 'bytes': path.stat().st_size}
+            
+            # Outside the profile, spans still reach the totals and the listeners
+            read_from_parquet(path)
+            assert len(spans) == 2
+            assert [s.name for s in seen] == ['parquet.write', 'parquet.read', 'parquet.read']
+            
+        try:
+            with timing.span('test.fail'):
+                raise ValueError('boom')
+        except ValueError:
+            pass
+        
+        totals = timing.totals()
+        assert totals['parquet.read'].calls == 2
+        assert totals['parquet.read'].counts['rows'] == 200
+        assert totals['test.fail'].errors == 1
+    finally:
+        timing.remove_listener(seen.append)
+    
+    print("Timing spans test passed!")
+
+def test_lake_snapshot():
+    """Test writing the lake snapshot and ignoring it once it is stale."""
+    print("Testing lake snapshot...")
+    
+    registry = StationRegistry([Station('44007', 43.525, -70.141), Station('41001', 34.7, -72.7)])
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir) / 'lake'
+        assert load_snapshot(lake_path) is None
+        
+        registry.save(lake_path / 'stations.parquet')
+        df = registry.annotate(pd.DataFrame({
+            'timestamp': pd.date_range(start='2025-01-01', periods=4, freq='h').repeat(2),
+            'water_temperature': 18.0,
+            'buoy_id': ['44007', '41001'] * 4,
+        }))
+        save_to_parquet(df=df, output_path=lake_path / 'ndbc', geohash_precision=3)
+        
+        path = write_snapshot(lake_path)
+        assert path == lake_path / SNAPSHOT_FILE
+        snapshot = load_snapshot(lake_path)
+        assert [s.station_id for s in snapshot.registry()] == ['44007', '41001']
+        assert snapshot.registry().nearest(43.4, -70.2)[0].station_id == '44007'
+        assert snapshot.partitions('ndbc') == sorted(s.geohash for s in registry)
+        assert snapshot.datasets['ndbc']['files'] == 2
+        assert '_snapshot.json' not in snapshot.datasets
+        
+        # Another registry, or the same one changed after the snapshot, is not served from it
+        assert load_snapshot(lake_path, Path(temp_dir) / 'other.parquet') is None
+        os.utime(lake_path / 'stations.parquet', ns=(0, path.stat().st_mtime_ns + 10**9))
+        assert load_snapshot(lake_path) is None
+    
+    print("Lake snapshot test passed!")
+
+def test_metadata_catalog():
+    """Test that writers catalog their files and readers prune by the catalog."""
+    print("Testing metadata catalog...")
+    
+    def batch(day, buoy_id, lat, lon):
+        return pd.DataFrame({
+            'timestamp': pd.date_range(f'2025-01-{day:02d}', periods=24, freq='h'),
+            'water_temperature': 18.0 + day,
+            'wave_height': np.nan,
+            'lat': lat, 'lon': lon, 'buoy_id': buoy_id,
+        })
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake_path = Path(temp_dir)
+        dataset = lake_path / 'ndbc'
+        for day in (1, 2, 3):
+            save_to_parquet(batch(day, '44007', 43.5, -70.1), dataset, geohash_precision=3)
+        save_to_parquet(batch(2, '41001', 34.7, -72.7), dataset, geohash_precision=3)
+        
+        catalog = Catalog(lake_path)
+        assert catalog.is_complete('ndbc')
+        assert len(catalog.files('ndbc')) == 4
+        selected = catalog.files('ndbc', start=datetime(2025, 1, 2, 6), end=datetime(2025, 1, 2, 8))
+        assert len(selected) == 2
+        assert len(catalog.files('ndbc', stations=['41001'])) == 1
+        assert len(catalog.files('ndbc', bbox=(43.0, -71.0, 44.0, -70.0))) == 3
+        assert catalog.files('ndbc', variables=['wave_height']) == []
+        
+        # Reads open only the files that can match
+        with timing.profile() as spans:
+            df = read_from_parquet(dataset, filters=[('buoy_id', '==', '44007'),
+                                                     ('timestamp', '>=', pd.Timestamp('2025-01-03'))])
+        assert len(df) == 24 and spans[0].counts['files'] == 1
+        assert set(df['geohash']) == {encode(43.5, -70.1, 3)}
+        df = read_from_parquet(dataset, filters=[('timestamp', '>', pd.Timestamp('2026-01-01'))])
+        assert len(df) == 0 and 'water_temperature' in df.columns
+        
+        engine = QueryEngine(lake_path)
+        with timing.profile() as spans:
+            result = engine.query_timeseries('sst', datetime(2025, 1, 2), datetime(2025, 1, 2, 23),
+                                             station='44007', geohash=encode(43.5, -70.1, 3))
+        assert len(result) == 24 and spans[0].counts['files'] == 1
+        assert len(engine.query_timeseries('sst', datetime(2024, 1, 1), datetime(2024, 2, 1),
+                                           station='44007')) == 0
+        
+        # The selected files are a parameter of one prepared statement, shared by threads
+        def day_rows(day):
+            return len(engine.query_timeseries('sst', datetime(2025, 1, day),
+                                               datetime(2025, 1, day, 23), station='44007'))
+        with concurrent.futures.ThreadPoolExecutor(4) as pool:
+            assert list(pool.map(day_rows, [1, 2, 3] * 4)) == [24] * 12
+        assert len(engine.query_timeseries('sst', datetime(2025, 1, 1), datetime(2025, 1, 3, 23),
+                                           station='44007')) == 72
+        
+        # Partitioned outputs outside a lake do not get a catalog
+        save_to_parquet(batch(1, '44007', 43.5, -70.1), lake_path / 'exports' / 'by_station',
+                        partition_cols=['buoy_id'])
+        assert not (lake_path / 'exports' / '_catalog.sqlite').exists()
+        
+        # Appended and compacted files replace their entries
+        seen = catalog.last_change()
+        with AppendWriter(dataset, geohash_precision=3) as writer:
+            writer.write(batch(4, '44007', 43.5, -70.1))
+        assert len(catalog.files('ndbc', start=datetime(2025, 1, 4))) == 1
+        
+        # The change log tells readers what every writer added since they last looked
+        changes = catalog.changes(seen)
+        assert [(c.dataset, c.partition, c.stations) for c in changes] == [
+            ('ndbc', encode(43.5, -70.1, 3), ['44007'])
+        ]
+        assert changes[0].start == datetime(2025, 1, 4) and changes[0].id == catalog.last_change()
+        compact_dataset(dataset, grace=timedelta(0))
+        files = catalog.files('ndbc')
+        assert sorted(f.path for f in files) == sorted(dataset.rglob('*.parquet'))
+        assert sum(f.rows for f in files) == 5 * 24
+        engine.close()
+        
+        # A dataset written before its catalog is listed until the catalog is rebuilt
+        (lake_path / '_catalog.sqlite').unlink()
+        for suffix in ('-wal', '-shm'):
+            (lake_path / f'_catalog.sqlite{suffix}').unlink(missing_ok=True)
+        catalog.close()
+        save_to_parquet(batch(5, '44007', 43.5, -70.1), dataset, geohash_precision=3)
+        catalog = Catalog(lake_path)
+        assert not catalog.is_complete('ndbc') and catalog.files('ndbc') is None
+        assert len(read_from_parquet(dataset)) == 6 * 24
+        assert catalog.rebuild('ndbc') == 3
+        assert catalog.is_complete('ndbc')
+        assert catalog.files('ndbc', variables=['wave_height']) == []
+        assert len(catalog.files('ndbc', stations=['41001'], start=datetime(2025, 1, 2))) == 1
+        catalog.close()
+    
+    print("Metadata catalog test passed!")
+
+def test_arrow_read_path():
+    """Test Arrow and streaming reads and dictionary-encoded station columns."""
+    print("Testing Arrow read path...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir)
+        file_path = temp_path / '44007_stdmet_2025_01.txt'
+        file_path.write_text(STDMET_SAMPLE)
+        df = NDBCClient(output_dir=temp_path).parse_buoy_data(file_path)
+        for name in ('buoy_id', 'source', 'file_path'):
+            assert isinstance(df[name].dtype, pd.CategoricalDtype), name
+        assert df['file_path'].tolist() == [str(file_path)] * 3
+        
+        # A file from before the station columns were dictionary-encoded
+        dataset = temp_path / 'ndbc'
+        old = dataset / f'geohash={encode(43.5, -70.1, 3)}' / 'old.parquet'
+        old.parent.mkdir(parents=True)
+        pq.write_table(pa.table({
+            'timestamp': pd.date_range('2025-01-01', periods=24, freq='h'),
+            'water_temperature': np.full(24, 18.0),
+            'lat': np.full(24, 43.5), 'lon': np.full(24, -70.1), 'buoy_id': ['44007'] * 24,
+        }), old)
+        save_to_parquet(pd.DataFrame({
+            'timestamp': pd.date_range('2025-01-02', periods=48, freq='h'),
+            'water_temperature': 19.0,
+            'lat': np.repeat([43.5, 34.7], 24), 'lon': np.repeat([-70.1, -72.7], 24),
+            'buoy_id': np.repeat(['44007', '41001'], 24),
+        }), dataset, geohash_precision=3)
+        
+        table = read_table(dataset)
+        assert table.num_rows == 72
+        assert pa.types.is_dictionary(table.schema.field('buoy_id').type)
+        assert pa.types.is_dictionary(table.schema.field('geohash').type)
+        filtered = read_table(dataset, columns=['timestamp'], filters=[('buoy_id', '==', '41001')])
+        assert filtered.column_names == ['timestamp'] and filtered.num_rows == 24
+        
+        batches = list(iter_batches(dataset, batch_rows=10))
+        assert max(b.num_rows for b in batches) <= 10
+        assert sum(b.num_rows for b in batches) == 72
+        
+        df = read_from_parquet(dataset, filters=[('buoy_id', '==', '44007')])
+        assert len(df) == 48 and isinstance(df['buoy_id'].dtype, pd.CategoricalDtype)
+        
+        # Compaction merges the old and new files and keeps the dictionary type
+        compact_dataset(dataset)
+        table = read_table(dataset)
+        assert table.num_rows == 72
+        assert table.schema.field('buoy_id').type == pa.dictionary(pa.int32(), pa.string())
+        partition = pq.read_table(old.parent)
+        assert partition['timestamp'].to_pylist() == sorted(partition['timestamp'].to_pylist())
+    
+    print("Arrow read path test passed!")
+
+def test_recent_publish():
+    """Test publishing recent series and reading them from a memory map."""
+    print("Testing recent publish...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lake = Path(temp_dir)
+        dataset = lake / 'ndbc'
+        since = datetime(2025, 1, 2)
+        save_to_parquet(pd.DataFrame({
+            'timestamp': np.tile(pd.date_range('2025-01-01', periods=48, freq='h'), 2),
+            'water_temperature': np.r_[np.full(48, 18.0), np.where(np.arange(48) % 2, np.nan, 9.0)],
+            'lat': np.repeat([43.5, 34.7], 48), 'lon': np.repeat([-70.1, -72.7], 48),
+            'buoy_id': np.repeat(['44007', '41001'], 48),
+        }), dataset, geohash_precision=3)
+        
+        reader = RecentReader(lake / '_recent', refresh_seconds=0)
+        assert reader.query('44007', 'sst', since, since + timedelta(days=1)) is None
+        
+        version = publish_recent(lake, since=since)
+        assert version.name == 'v00000001'
+        timestamps, values = reader.query('44007', 'sst', since, datetime(2025, 1, 2, 5))
+        assert len(timestamps) == 6 and (values == 18.0).all()
+        assert not values.flags.writeable
+        # Null values are left out of the published series
+        timestamps, values = reader.query('41001', 'sst', since, datetime(2025, 1, 3))
+        assert len(timestamps) == 12 and (values == 9.0).all()
+        assert reader.query('44007', 'sst', datetime(2025, 1, 1), since) is None
+        assert reader.latest('44007', 'sst')[1] == 18.0
+        
+        # A new version is picked up without disturbing views of the old one
+        held = reader.query('44007', 'sst', since, datetime(2025, 1, 3))[1]
+        save_to_parquet(pd.DataFrame({
+            'timestamp': pd.date_range('2025-01-03', periods=2, freq='h'),
+            'water_temperature': 20.0, 'lat': 43.5, 'lon': -70.1, 'buoy_id': '44007',
+        }), dataset, geohash_precision=3)
+        for _ in range(4):
+            publish_recent(lake, since=since)
+        assert sorted(p.name for p in (lake / '_recent').glob('v*')) == [
+            'v00000003', 'v00000004', 'v00000005',
+        ]
+        assert reader.latest('44007', 'sst')[1] == 20.0
+        assert reader.snapshot()['version'] == 5 and reader.snapshot()['series'] == 2
+        assert len(held) == 24 and (held == 18.0).all()
+        
+        # Ranges ending after publication are only answered by a fresh version
+        later = datetime.utcnow() + timedelta(hours=1)
+        assert len(reader.query('44007', 'sst', since, later)[0]) == 26
+        stale = RecentReader(lake / '_recent', refresh_seconds=0, max_age=timedelta(0))
+        assert stale.query('44007', 'sst', since, later) is None
+        assert stale.latest('44007', 'sst') is None
+        assert len(stale.query('44007', 'sst', since, datetime(2025, 1, 2, 23))[0]) == 24
+    
+    print("Recent publish test passed!")
+
 def main():
     """Run tests for data pipeline modules."""
     print("Running data pipeline tests...")
     test_parquet_storage()
+    test_query_engine()
+    test_spatial_partitioning()
+    test_netcdf_conversion()
+    test_grid_store()
+    test_tiled_download()
+    test_async_ndbc_client()
+    test_stdmet_parser()
+    test_downsampling()
+    test_rollups()
+    test_grouped_query()
+    test_compaction()
+    test_append_writer()
+    test_ingest_runner()
+    test_ndbc_backfill()
+    test_alert_engine()
+    test_timing_spans()
+    test_lake_snapshot()
+    test_metadata_catalog()
+    test_arrow_read_path()
+    test_recent_publish()
     print("All tests passed!")
 
 if __name__ == "__main__":